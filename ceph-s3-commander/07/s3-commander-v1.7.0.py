@@ -11,13 +11,17 @@ import fnmatch
 import urwid
 import boto3
 import base64
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from botocore.config import Config
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import Credentials
 from datetime import datetime
-import tempfile
 import shutil
 import json
 import threading
+import queue
 import time
 import platform
 
@@ -33,10 +37,17 @@ try:
     HAS_CRYPTO = True
 except ImportError:
     HAS_CRYPTO = False
+# Для постоянного кеша листингов (в минимальных сборках Python может отсутствовать)
+try:
+    import sqlite3
+    HAS_SQLITE = True
+except ImportError:
+    HAS_SQLITE = False
 import socket
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urlencode
 import functools
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 __VERSION__ = "1.7.0"
 __AUTHOR__ = "Тарасов Дмитрий"
@@ -146,6 +157,350 @@ class BookmarksManager:
             self.save()
 
 
+class MultipartCopyState:
+    """
+    Незавершенные multipart-копирования (UploadPartCopy) для докачки после сбоя.
+
+    Ключ - endpoint|bucket|key назначения, значение - UploadId, источник (с ETag)
+    и размер части: докачка возможна, только если источник не изменился.
+    """
+
+    def __init__(self, filepath="multipart_copies.json"):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.uploads = self.load()
+
+    def load(self):
+        if not self.filepath or not os.path.exists(self.filepath):
+            return {}
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except:
+            return {}
+
+    def save(self):
+        if not self.filepath:
+            return
+        try:
+            with self.lock:
+                data = json.dumps(self.uploads, indent=2)
+            with open(self.filepath, 'w', encoding='utf-8') as f:
+                f.write(data)
+        except OSError:
+            pass
+
+    def get(self, key):
+        with self.lock:
+            return self.uploads.get(key)
+
+    def put(self, key, upload):
+        with self.lock:
+            self.uploads[key] = upload
+        self.save()
+
+    def remove(self, key):
+        with self.lock:
+            removed = self.uploads.pop(key, None)
+        if removed is not None:
+            self.save()
+
+
+class PrefixTreeCache:
+    """
+    Кеш листингов и подсчетов объектов S3 в виде дерева префиксов
+    (endpoint -> bucket -> 'a/' -> 'a/b/' ...), плюс атрибуты бакетов
+    (версионирование, квоты) для списка бакетов endpoint'а.
+
+    У каждого узла свои отметки времени листинга и подсчета: узел старше ttl
+    (или помеченный после изменений) отдается как устаревший - его можно сразу
+    показать, но нужно перепроверить в фоне. Изменение ключа затрагивает только
+    предков этого ключа и поддерево под ним, другие бакеты и ветки не трогаются.
+
+    Если доступен sqlite3 и задан filepath, узлы сохраняются на диск и читаются
+    лениво при первом обращении, поэтому открытие большого бакета после
+    перезапуска не ждет листинга. В базе лежат имена бакетов и ключей, поэтому
+    она создается с правами 0600; без filepath кеш живет только в памяти.
+    """
+
+    LISTING_MAX_ROWS = 100000  # листинги больше не кешируются (память, размер базы)
+    MEMORY_LISTINGS = 64  # листинги в памяти; остальные перечитываются из базы
+
+    def __init__(self, filepath=None, listing_ttl=60, count_ttl=600):
+        self.filepath = filepath
+        self.listing_ttl = listing_ttl
+        self.count_ttl = count_ttl
+        self.lock = threading.RLock()
+        self.root = self._new_node()
+        self.listing_lru = OrderedDict()
+        # (endpoint, bucket) -> (info, ts); endpoint'ы, чьи записи уже прочитаны из базы
+        self.bucket_info = {}
+        self.bucket_info_loaded = set()
+        self.db = None
+        if filepath and HAS_SQLITE:
+            try:
+                # файл создается (и уже существующий сужается) с доступом только владельцу
+                os.close(os.open(filepath, os.O_CREAT | os.O_RDWR, 0o600))
+                os.chmod(filepath, 0o600)
+                self.db = sqlite3.connect(filepath, check_same_thread=False)
+                self.db.execute(
+                    'CREATE TABLE IF NOT EXISTS prefix_nodes ('
+                    ' endpoint TEXT NOT NULL, bucket TEXT NOT NULL, prefix TEXT NOT NULL,'
+                    ' listing TEXT, listing_ts REAL NOT NULL DEFAULT 0,'
+                    ' count INTEGER, size INTEGER NOT NULL DEFAULT 0, count_ts REAL NOT NULL DEFAULT 0,'
+                    ' PRIMARY KEY (endpoint, bucket, prefix))')
+                self.db.execute(
+                    'CREATE TABLE IF NOT EXISTS bucket_info ('
+                    ' endpoint TEXT NOT NULL, bucket TEXT NOT NULL, info TEXT NOT NULL, ts REAL NOT NULL DEFAULT 0,'
+                    ' PRIMARY KEY (endpoint, bucket))')
+                self.db.commit()
+            except (sqlite3.Error, OSError):
+                self.db = None
+
+    @staticmethod
+    def _new_node():
+        return {'children': {}, 'loaded': False, 'has_listing': False, 'listing': None, 'listing_ts': 0,
+                'count': None, 'size': 0, 'count_ts': 0}
+
+    @staticmethod
+    def _segments(prefix):
+        """'a/b/' -> ['a/', 'b/']"""
+        return re.findall(r'[^/]*/|[^/]+$', prefix)
+
+    @staticmethod
+    def _ancestors(key):
+        """Префиксы-предки ключа: 'a/b/c' -> ['', 'a/', 'a/b/']"""
+        result = ['']
+        pos = key.find('/')
+        while pos != -1 and pos + 1 < len(key):
+            result.append(key[:pos + 1])
+            pos = key.find('/', pos + 1)
+        return result
+
+    def _execute(self, sql, params=()):
+        """Запрос к базе; при ошибке кеш продолжает работать только в памяти"""
+        if self.db is None:
+            return []
+        try:
+            rows = self.db.execute(sql, params).fetchall()
+            if not sql.startswith('SELECT'):
+                self.db.commit()
+            return rows
+        except sqlite3.Error:
+            self.db = None
+            return []
+
+    def _node(self, endpoint, bucket, prefix, create=True):
+        node = self.root
+        for name in [endpoint, bucket] + self._segments(prefix):
+            child = node['children'].get(name)
+            if child is None:
+                if not create:
+                    return None
+                child = node['children'][name] = self._new_node()
+            node = child
+        if not node['loaded']:
+            node['loaded'] = True
+            rows = self._execute('SELECT listing IS NOT NULL, listing_ts, count, size, count_ts FROM prefix_nodes'
+                                 ' WHERE endpoint=? AND bucket=? AND prefix=?', (endpoint, bucket, prefix))
+            if rows:
+                has_listing, node['listing_ts'], node['count'], node['size'], node['count_ts'] = rows[0]
+                node['has_listing'] = bool(has_listing)
+        return node
+
+    @staticmethod
+    def _fresh(ts, ttl):
+        return ts > 0 and time.time() - ts < ttl
+
+    # --- подсчеты ---
+
+    def get_count(self, endpoint, bucket, prefix):
+        """Вернуть (count, size, fresh) или None"""
+        with self.lock:
+            node = self._node(endpoint, bucket, prefix)
+            if node['count'] is None:
+                return None
+            return node['count'], node['size'], self._fresh(node['count_ts'], self.count_ttl)
+
+    def put_count(self, endpoint, bucket, prefix, count, size):
+        with self.lock:
+            node = self._node(endpoint, bucket, prefix)
+            node['count'], node['size'], node['count_ts'] = count, size, time.time()
+            self._execute('INSERT INTO prefix_nodes (endpoint, bucket, prefix, count, size, count_ts)'
+                          ' VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(endpoint, bucket, prefix) DO UPDATE SET'
+                          ' count=excluded.count, size=excluded.size, count_ts=excluded.count_ts',
+                          (endpoint, bucket, prefix, count, size, node['count_ts']))
+
+    # --- листинги ---
+
+    def get_listing(self, endpoint, bucket, prefix):
+        """Вернуть (folders, files, fresh) в формате S3Manager.list_objects или None"""
+        with self.lock:
+            node = self._node(endpoint, bucket, prefix)
+            if not node['has_listing']:
+                return None
+            listing = node['listing']
+            if listing is None:
+                rows = self._execute('SELECT listing FROM prefix_nodes WHERE endpoint=? AND bucket=? AND prefix=?',
+                                     (endpoint, bucket, prefix))
+                try:
+                    listing = self._decode_listing(rows[0][0])
+                except (IndexError, ValueError, KeyError, TypeError):
+                    node['has_listing'] = False
+                    return None
+                self._remember_listing((endpoint, bucket, prefix), node, listing)
+            else:
+                self.listing_lru.move_to_end((endpoint, bucket, prefix))
+            return listing[0], listing[1], self._fresh(node['listing_ts'], self.listing_ttl)
+
+    def put_listing(self, endpoint, bucket, prefix, folders, files):
+        if len(folders) + len(files) > self.LISTING_MAX_ROWS:
+            return
+        listing = ([{'Key': f['Key']} for f in folders],
+                   [{'Key': f['Key'], 'Size': f.get('Size', 0), 'LastModified': f.get('LastModified'),
+                     'ETag': f.get('ETag'), 'version_count': f.get('version_count', 1)} for f in files])
+        with self.lock:
+            node = self._node(endpoint, bucket, prefix)
+            node['listing_ts'] = time.time()
+            node['has_listing'] = True
+            self._remember_listing((endpoint, bucket, prefix), node, listing)
+            if self.db is not None:
+                self._execute('INSERT INTO prefix_nodes (endpoint, bucket, prefix, listing, listing_ts)'
+                              ' VALUES (?, ?, ?, ?, ?) ON CONFLICT(endpoint, bucket, prefix) DO UPDATE SET'
+                              ' listing=excluded.listing, listing_ts=excluded.listing_ts',
+                              (endpoint, bucket, prefix, self._encode_listing(listing), node['listing_ts']))
+
+    def touch_listing(self, endpoint, bucket, prefix):
+        """Листинг перепроверен и не изменился - продлить его свежесть"""
+        with self.lock:
+            node = self._node(endpoint, bucket, prefix)
+            node['listing_ts'] = time.time()
+            self._execute('UPDATE prefix_nodes SET listing_ts=? WHERE endpoint=? AND bucket=? AND prefix=?',
+                          (node['listing_ts'], endpoint, bucket, prefix))
+
+    def _remember_listing(self, path, node, listing):
+        node['listing'] = listing
+        self.listing_lru[path] = node
+        self.listing_lru.move_to_end(path)
+        while len(self.listing_lru) > self.MEMORY_LISTINGS:
+            _, old = self.listing_lru.popitem(last=False)
+            old['listing'] = None
+            if self.db is None:
+                old['has_listing'] = False  # без базы вытесненный листинг потерян
+
+    @staticmethod
+    def _encode_listing(listing):
+        folders, files = listing
+        return json.dumps([[f['Key'] for f in folders],
+                           [[f['Key'], f['Size'], f['LastModified'].isoformat() if f['LastModified'] else None,
+                             f['ETag'], f['version_count']] for f in files]])
+
+    @staticmethod
+    def _decode_listing(data):
+        folders, files = json.loads(data)
+        return ([{'Key': key} for key in folders],
+                [{'Key': key, 'Size': size, 'LastModified': datetime.fromisoformat(mtime) if mtime else None,
+                  'ETag': etag, 'version_count': version_count}
+                 for key, size, mtime, etag, version_count in files])
+
+    # --- атрибуты бакетов ---
+
+    def get_bucket_info(self, endpoint, bucket):
+        """Вернуть (info, fresh) или None; info - dict S3Manager.fetch_bucket_info"""
+        with self.lock:
+            if endpoint not in self.bucket_info_loaded:
+                self.bucket_info_loaded.add(endpoint)
+                for name, info, ts in self._execute('SELECT bucket, info, ts FROM bucket_info WHERE endpoint=?',
+                                                    (endpoint,)):
+                    try:
+                        self.bucket_info.setdefault((endpoint, name), (json.loads(info), ts))
+                    except ValueError:
+                        pass
+            entry = self.bucket_info.get((endpoint, bucket))
+        if entry is None:
+            return None
+        return entry[0], self._fresh(entry[1], self.count_ttl)
+
+    def put_bucket_info(self, endpoint, bucket, info):
+        with self.lock:
+            ts = time.time()
+            self.bucket_info[(endpoint, bucket)] = (info, ts)
+            self._execute('INSERT OR REPLACE INTO bucket_info (endpoint, bucket, info, ts) VALUES (?, ?, ?, ?)',
+                          (endpoint, bucket, json.dumps(info), ts))
+
+    # --- инвалидация ---
+
+    def invalidate(self, endpoint, bucket=None):
+        """Пометить устаревшими все узлы бакета (или всего endpoint'а) и атрибуты бакетов"""
+        with self.lock:
+            for path, (info, ts) in list(self.bucket_info.items()):
+                if path[0] == endpoint and (bucket is None or path[1] == bucket):
+                    self.bucket_info[path] = (info, 0)
+            node = self._node(endpoint, bucket, '', create=False) if bucket is not None \
+                else self.root['children'].get(endpoint)
+            stack = [node] if node is not None else []
+            while stack:
+                node = stack.pop()
+                node['listing_ts'] = node['count_ts'] = 0
+                stack.extend(node['children'].values())
+            if bucket is None:
+                self._execute('UPDATE prefix_nodes SET listing_ts=0, count_ts=0 WHERE endpoint=?', (endpoint,))
+                self._execute('UPDATE bucket_info SET ts=0 WHERE endpoint=?', (endpoint,))
+            else:
+                self._execute('UPDATE prefix_nodes SET listing_ts=0, count_ts=0 WHERE endpoint=? AND bucket=?',
+                              (endpoint, bucket))
+                self._execute('UPDATE bucket_info SET ts=0 WHERE endpoint=? AND bucket=?', (endpoint, bucket))
+
+    def invalidate_keys(self, endpoint, bucket, keys):
+        """
+        Точная инвалидация после изменения ключей:
+        - листинг префикса, где лежит ключ, удаляется (он точно неверен);
+        - у остальных предков листинг (могли появиться/исчезнуть папки) и подсчеты устаревают;
+        - поддерево под ключом-папкой ('a/b/') удаляется целиком.
+        """
+        parents = set()
+        subtrees = set()
+        for key in keys:
+            # родитель папки 'a/b/' - 'a/', а не она сама
+            name = key.rstrip('/')
+            parents.add(name[:name.rfind('/') + 1])
+            if key.endswith('/'):
+                subtrees.add(key)
+        ancestors = set()
+        for parent in parents:
+            ancestors.update(self._ancestors(parent))
+            ancestors.add(parent)
+
+        with self.lock:
+            for prefix in ancestors:
+                node = self._node(endpoint, bucket, prefix, create=False)
+                if node is not None:
+                    node['count_ts'] = 0
+                    node['listing_ts'] = 0
+                    if prefix in parents:
+                        node['has_listing'] = False
+                        node['listing'] = None
+                        self.listing_lru.pop((endpoint, bucket, prefix), None)
+            for prefix in subtrees:
+                segments = self._segments(prefix)
+                node = self._node(endpoint, bucket, ''.join(segments[:-1]), create=False)
+                if node is not None:
+                    node['children'].pop(segments[-1], None)
+                for path in [p for p in self.listing_lru if p[:2] == (endpoint, bucket) and p[2].startswith(prefix)]:
+                    del self.listing_lru[path]
+
+            if self.db is not None:
+                for prefix in ancestors:
+                    self._execute('UPDATE prefix_nodes SET listing_ts=0, count_ts=0'
+                                  ' WHERE endpoint=? AND bucket=? AND prefix=?', (endpoint, bucket, prefix))
+                for prefix in parents:
+                    self._execute('UPDATE prefix_nodes SET listing=NULL'
+                                  ' WHERE endpoint=? AND bucket=? AND prefix=?', (endpoint, bucket, prefix))
+                for prefix in subtrees:
+                    self._execute('DELETE FROM prefix_nodes WHERE endpoint=? AND bucket=?'
+                                  ' AND substr(prefix, 1, ?)=?', (endpoint, bucket, len(prefix), prefix))
+
+
 def check_s3_endpoint_connectivity(endpoint_url, timeout=2):
     """
     Быстрая проверка доступности S3 endpoint.
@@ -228,10 +583,31 @@ class S3Config:
     2. Encrypted (файл + пароль)
     3. HashiCorp Vault (API)
     """
+    # Параметры передачи по умолчанию (CLI) -> ключи endpoint'а в конфиге.
+    # В конфиге их можно переопределить для отдельного endpoint'а.
+    TRANSFER_DEFAULTS = {
+        'max_parallel': ('endpoint_parallel', 8),            # одновременных передач на endpoint
+        'multipart_threshold_mb': ('multipart_threshold_mb', 64),
+        'multipart_chunk_mb': ('multipart_chunk_mb', 16),
+        'transfer_concurrency': ('transfer_concurrency', 4),  # потоков boto3 на один multipart-файл
+        'copy_threshold_mb': ('copy_threshold_mb', 256),    # серверное копирование частями от этого размера
+        'copy_chunk_mb': ('copy_chunk_mb', 64),
+        'max_attempts': ('max_attempts', 5),                 # попыток на запрос (с backoff)
+        'retry_mode': ('retry_mode', 'adaptive'),            # legacy / standard / adaptive
+    }
+
     def __init__(self, args):
         self.endpoints = []
         self.args = args
         self.load_config()
+        self._apply_transfer_defaults()
+
+    def _apply_transfer_defaults(self):
+        """Дописать в endpoints параметры передачи, не заданные в конфиге"""
+        for ep in self.endpoints:
+            for key, (arg_name, default) in self.TRANSFER_DEFAULTS.items():
+                value = getattr(self.args, arg_name, None)
+                ep.setdefault(key, value if value is not None else default)
 
     def _exit_error(self, message):
         """Вывод ошибки и завершение программы"""
@@ -427,34 +803,269 @@ class LRUCache:
     def __init__(self, maxsize=1000):
         self.cache = OrderedDict()
         self.maxsize = maxsize
+        # к кешу обращаются воркеры копирования (TransferScheduler) и UI
+        self.lock = threading.Lock()
 
     def get(self, key):
-        if key not in self.cache:
-            return None
-        self.cache.move_to_end(key)
-        return self.cache[key]
+        with self.lock:
+            if key not in self.cache:
+                return None
+            self.cache.move_to_end(key)
+            return self.cache[key]
 
     def put(self, key, value):
-        if key in self.cache:
-            self.cache.move_to_end(key)
-        self.cache[key] = value
-        if len(self.cache) > self.maxsize:
-            self.cache.popitem(last=False)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+            self.cache[key] = value
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
 
     def invalidate(self, pattern=None):
         """Инвалидация кеша по паттерну"""
-        if pattern is None:
-            self.cache.clear()
-        else:
-            keys_to_remove = [k for k in self.cache.keys() if pattern in k]
-            for key in keys_to_remove:
-                del self.cache[key]
+        with self.lock:
+            if pattern is None:
+                self.cache.clear()
+            else:
+                keys_to_remove = [k for k in self.cache.keys() if pattern in k]
+                for key in keys_to_remove:
+                    del self.cache[key]
+
+
+class S3ClientPool:
+    """
+    Общие boto3-клиенты по endpoint'ам.
+
+    Панели (S3Manager) на одном endpoint'е с одинаковыми учетными данными используют
+    один клиент и его пул соединений: keep-alive соединения переиспользуются, а TCP-проверка
+    доступности выполняется только при создании клиента. Клиент настраивается с
+    адаптивными повторами (503/SlowDown от RGW не роняют объект) и собирает счетчики
+    запросов и повторов для окна информации. Там же хранится то, что выясняется про
+    endpoint один раз за сессию (доступность RGW Admin Ops API).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    @staticmethod
+    def _key(endpoint_config):
+        return endpoint_config['name'], endpoint_config['url'], endpoint_config['access_key']
+
+    def acquire(self, endpoint_config, pool_size):
+        """
+        Вернуть запись пула для endpoint'а: dict с 'client' (None при ошибке) и 'error'.
+        Клиент пересоздается, если его пул соединений меньше запрошенного.
+        """
+        key = self._key(endpoint_config)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry['client'] is not None and entry['pool_size'] >= pool_size:
+                entry['users'] += 1
+                return entry
+
+            old = entry
+            entry = self._create(endpoint_config, pool_size)
+            if old is not None:
+                entry['admin_api'] = old['admin_api']
+            if entry['client'] is not None:
+                self.entries[key] = entry
+            return entry
+
+    def describe(self, endpoint_config):
+        """Параметры и счетчики клиента endpoint'а для окна информации (None - клиента еще нет)"""
+        with self.lock:
+            entry = self.entries.get(self._key(endpoint_config))
+        if entry is None:
+            return None
+        return self.describe_entry(entry)
+
+    @staticmethod
+    def describe_entry(entry):
+        info = OrderedDict()
+        if entry['client'] is None:
+            info['Client'] = f"not connected: {entry['error']}"
+            return info
+        stats = entry['stats']
+        with entry['lock']:
+            counters = dict(stats)
+        info['Client created'] = datetime.fromtimestamp(entry['created']).strftime('%Y-%m-%d %H:%M:%S')
+        info['Setup time'] = f"{entry['setup_ms']:.0f} ms (probe {entry['probe_ms']:.0f} ms)"
+        info['Shared by'] = f"{entry['users']} panel session(s)"
+        info['Pool size'] = f"{entry['pool_size']} connection(s)"
+        info['Retry mode'] = f"{entry['retry_mode']}, max {entry['max_attempts']} attempt(s)"
+        info['TCP keep-alive'] = 'on' if entry['keepalive'] else 'n/a (old botocore)'
+        opened = S3ClientPool._connections_opened(entry['client'])
+        if opened is not None:
+            info['Connections opened'] = opened
+        info['Requests'] = counters['requests']
+        info['Retried requests'] = f"{counters['retried']} ({counters['retries']} retry attempt(s))"
+        info['Failed requests'] = f"{counters['failed']} (HTTP 5xx: {counters['server_errors']})"
+        return info
+
+    @staticmethod
+    def _connections_opened(client):
+        """Сколько TCP-соединений открыл urllib3 (внутренности botocore - best effort)"""
+        try:
+            pools = client._endpoint.http_session._manager.pools
+            return sum(pools[key].num_connections for key in list(pools.keys()))
+        except Exception:
+            return None
+
+    def _create(self, endpoint_config, pool_size):
+        max_attempts = max(1, int(endpoint_config.get('max_attempts', 5)))
+        retry_mode = endpoint_config.get('retry_mode', 'adaptive')
+        entry = {
+            'client': None, 'error': None, 'pool_size': pool_size, 'users': 1,
+            'created': time.time(), 'setup_ms': 0, 'probe_ms': 0,
+            'retry_mode': retry_mode, 'max_attempts': max_attempts, 'keepalive': True,
+            'lock': threading.Lock(),
+            # RGW Admin Ops API: None - еще не пробовали, False - недоступен (нет caps или не Ceph)
+            'admin_api': None,
+            'stats': {'requests': 0, 'retried': 0, 'retries': 0, 'failed': 0, 'server_errors': 0},
+        }
+        start = time.time()
+
+        # БЫСТРАЯ ПРОВЕРКА: доступен ли endpoint перед созданием клиента (один раз на клиент)
+        can_connect, error_msg = check_s3_endpoint_connectivity(endpoint_config['url'], timeout=2)
+        entry['probe_ms'] = (time.time() - start) * 1000
+        if not can_connect:
+            entry['error'] = error_msg
+            return entry
+
+        try:
+            # Короткие таймауты; повторы с backoff, adaptive еще и притормаживает клиент при throttling
+            options = dict(
+                connect_timeout=3,
+                read_timeout=10,
+                retries={'max_attempts': max_attempts, 'mode': retry_mode},
+                max_pool_connections=pool_size
+            )
+            try:
+                config = Config(tcp_keepalive=True, **options)
+            except TypeError:
+                # botocore < 1.27 не знает tcp_keepalive
+                config = Config(**options)
+                entry['keepalive'] = False
+
+            client = boto3.client(
+                's3',
+                endpoint_url=endpoint_config['url'],
+                aws_access_key_id=endpoint_config['access_key'],
+                aws_secret_access_key=endpoint_config['secret_key'],
+                config=config
+            )
+        except Exception as e:
+            entry['error'] = str(e)
+            return entry
+
+        stats = entry['stats']
+
+        def after_call(http_response=None, parsed=None, **kwargs):
+            attempts = (parsed or {}).get('ResponseMetadata', {}).get('RetryAttempts', 0)
+            status = getattr(http_response, 'status_code', 0)
+            with entry['lock']:
+                stats['requests'] += 1
+                if attempts:
+                    stats['retried'] += 1
+                    stats['retries'] += attempts
+                if status >= 500:
+                    stats['failed'] += 1
+                    stats['server_errors'] += 1
+
+        def after_call_error(**kwargs):
+            # сетевая ошибка после всех повторов
+            with entry['lock']:
+                stats['requests'] += 1
+                stats['failed'] += 1
+
+        client.meta.events.register('after-call.s3', after_call)
+        client.meta.events.register('after-call-error.s3', after_call_error)
+
+        entry['client'] = client
+        entry['setup_ms'] = (time.time() - start) * 1000
+        return entry
+
+
+class S3ObjectStream:
+    """
+    Список объектов префикса, который наполняется в фоне (S3Manager.iter_all_objects_parallel).
+
+    Итерация отдает уже полученные объекты и ждет новые, пока листинг не закончится,
+    поэтому операция может начинаться до окончания листинга. Полученные объекты
+    запоминаются: повторная итерация (например, удаление после перемещения) не ходит в S3.
+    Если листинг упал, в error остается текст первой ошибки, а items содержит только
+    то, что успели получить.
+    """
+
+    def __init__(self, s3_manager, bucket_name, prefix=''):
+        self.items = []
+        self.total_size = 0
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self.cond = threading.Condition()
+
+        thread = threading.Thread(target=self._run, args=(s3_manager, bucket_name, prefix), daemon=True)
+        thread.start()
+
+    def _run(self, s3_manager, bucket_name, prefix):
+        try:
+            for batch in s3_manager.iter_all_objects_parallel(bucket_name, prefix,
+                                                              should_stop=lambda: self.cancelled):
+                with self.cond:
+                    self.items.extend(batch)
+                    self.total_size += sum(obj.get('Size', 0) for obj in batch)
+                    self.cond.notify_all()
+        except (ClientError, Exception) as e:
+            self.error = f"List error: {str(e)}"
+        finally:
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def __len__(self):
+        """Сколько объектов получено на данный момент"""
+        return len(self.items)
+
+    def __iter__(self):
+        position = 0
+        while True:
+            with self.cond:
+                while position >= len(self.items) and not self.done:
+                    self.cond.wait()
+                if position >= len(self.items):
+                    return
+                chunk = self.items[position:]
+            position += len(chunk)
+            yield from chunk
+
+    def iter_batches(self, size):
+        """Отдавать объекты списками не длиннее size (для пакетного удаления)"""
+        batch = []
+        for obj in self:
+            batch.append(obj)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def wait(self, timeout=None):
+        """Дождаться окончания листинга; True, если он закончен"""
+        with self.cond:
+            if not self.done:
+                self.cond.wait_for(lambda: self.done, timeout)
+            return self.done
+
+    def cancel(self):
+        self.cancelled = True
 
 
 class S3Manager:
     """Менеджер для работы с S3 Ceph"""
 
-    def __init__(self, endpoint_config):
+    def __init__(self, endpoint_config, prefix_cache=None, client_pool=None, copy_state=None):
         self.endpoint_name = endpoint_config['name']
         self.endpoint_url = endpoint_config['url']
         self.access_key = endpoint_config['access_key']
@@ -464,36 +1075,52 @@ class S3Manager:
         self.versioning_status_cache = {}
         self.s3_needs_refresh = True
 
-        # Кеш для списков объектов
-        self.object_cache = LRUCache(maxsize=1000)
         self.bucket_cache = LRUCache(maxsize=10)
+        # Кеш листингов и подсчетов по префиксам (PrefixTreeCache), общий для панелей
+        self.prefix_cache = prefix_cache if prefix_cache is not None else PrefixTreeCache(filepath=None)
+        # Ошибка последнего list_objects_lazy (генератор на ошибке отдает пустую страницу)
+        self.last_list_error = None
+        # Блоки ranged GET для просмотра: ключ включает версию и ETag, поэтому
+        # измененный объект не вернет старые данные и инвалидация не нужна
+        self.block_cache = LRUCache(maxsize=256)
+
+        # Параметры передачи (см. S3Config.TRANSFER_DEFAULTS)
+        mb = 1024 * 1024
+        self.max_parallel = max(1, int(endpoint_config.get('max_parallel', 8)))
+        transfer_concurrency = max(1, int(endpoint_config.get('transfer_concurrency', 4)))
+        self.transfer_concurrency = transfer_concurrency
+        # Серверное копирование: выше порога - UploadPartCopy частями (не больше лимита CopyObject)
+        self.copy_threshold = min(max(5, int(endpoint_config.get('copy_threshold_mb', 256))) * mb,
+                                  self.COPY_OBJECT_LIMIT)
+        self.copy_chunk_size = max(5, int(endpoint_config.get('copy_chunk_mb', 64))) * mb
+        self.copy_state = copy_state if copy_state is not None else MultipartCopyState(filepath=None)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=max(5, int(endpoint_config.get('multipart_threshold_mb', 64))) * mb,
+            multipart_chunksize=max(5, int(endpoint_config.get('multipart_chunk_mb', 16))) * mb,
+            max_concurrency=transfer_concurrency,
+            use_threads=True
+        )
 
-        # БЫСТРАЯ ПРОВЕРКА: доступен ли endpoint перед созданием клиента
-        can_connect, error_msg = check_s3_endpoint_connectivity(self.endpoint_url, timeout=2)
+        # Клиент берется из общего пула: панели на одном endpoint'е делят соединения.
+        # Пул соединений - на все параллельные передачи и их multipart-потоки
+        self.client_pool = client_pool if client_pool is not None else S3ClientPool()
+        self.client_entry = self.client_pool.acquire(
+            endpoint_config, pool_size=max(10, self.max_parallel * transfer_concurrency))
+        self.s3_client = self.client_entry['client']
+        self.connection_error = self.client_entry['error']
 
-        if not can_connect:
-            self.s3_client = None
-            self.connection_error = error_msg
-            return
+    def connection_info(self):
+        """Параметры соединения и счетчики повторов для окна информации"""
+        return S3ClientPool.describe_entry(self.client_entry)
 
-        try:
-            # Настройка коротких таймаутов для boto3
-            config = Config(
-                connect_timeout=3,
-                read_timeout=10,
-                retries={'max_attempts': 1}  # Только 1 попытка
-            )
+    @property
+    def admin_api_available(self):
+        """RGW Admin Ops API: None - еще не пробовали, False - недоступен (общее для endpoint'а)"""
+        return self.client_entry['admin_api']
 
-            self.s3_client = boto3.client(
-                's3',
-                endpoint_url=self.endpoint_url,
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key,
-                config=config
-            )
-        except Exception as e:
-            self.s3_client = None
-            self.connection_error = str(e)
+    @admin_api_available.setter
+    def admin_api_available(self, value):
+        self.client_entry['admin_api'] = value
 
     def list_buckets(self):
         if self.s3_client is None:
@@ -567,6 +1194,84 @@ class S3Manager:
         except (ClientError, Exception):
             return []
 
+    def iter_all_objects_parallel(self, bucket_name, prefix='', should_stop=None, fanout_depth=2):
+        """
+        Рекурсивный листинг с параллельным обходом поддеревьев.
+
+        Первые fanout_depth уровней читаются с Delimiter='/': объекты уровня отдаются сразу,
+        а каждый найденный CommonPrefix уходит в пул (не больше max_parallel запросов).
+        Глубже поддерево читается обычным paginator'ом без разделителя.
+        Генератор отдает списки объектов по мере прихода страниц, порядок не гарантируется.
+        Если листинг какого-то поддерева упал, первая ошибка пробрасывается после того,
+        как отданы все полученные объекты - дерево прочитано не целиком.
+        """
+        if self.s3_client is None:
+            return
+
+        results = queue.Queue(maxsize=self.max_parallel * 4)
+        finished = object()
+        state = {'pending': 0, 'stopped': False, 'error': None}
+        lock = threading.Lock()
+        executor = ThreadPoolExecutor(max_workers=self.max_parallel)
+
+        def stopped():
+            return state['stopped'] or (should_stop is not None and should_stop())
+
+        def put(item):
+            # Потребитель мог уйти - не блокируемся навсегда на полной очереди
+            while True:
+                try:
+                    results.put(item, timeout=0.2)
+                    return
+                except queue.Full:
+                    if state['stopped']:
+                        return
+
+        def submit(sub_prefix, depth):
+            with lock:
+                state['pending'] += 1
+            executor.submit(list_prefix, sub_prefix, depth)
+
+        def list_prefix(sub_prefix, depth):
+            try:
+                paginator = self.s3_client.get_paginator('list_objects_v2')
+                if depth < fanout_depth:
+                    pages = paginator.paginate(Bucket=bucket_name, Prefix=sub_prefix, Delimiter='/')
+                else:
+                    pages = paginator.paginate(Bucket=bucket_name, Prefix=sub_prefix)
+                for page in pages:
+                    if stopped():
+                        break
+                    objects = [obj for obj in page.get('Contents', []) if obj['Key'] != prefix]
+                    if objects:
+                        put(objects)
+                    for common in page.get('CommonPrefixes', []):
+                        submit(common['Prefix'], depth + 1)
+            except (ClientError, Exception) as e:
+                self.connection_error = f"List error: {str(e)}"
+                with lock:
+                    if state['error'] is None:
+                        state['error'] = e
+            finally:
+                with lock:
+                    state['pending'] -= 1
+                    last = state['pending'] == 0
+                if last:
+                    put(finished)
+
+        submit(prefix, 0)
+        try:
+            while True:
+                item = results.get()
+                if item is finished:
+                    break
+                yield item
+            if state['error'] is not None and not stopped():
+                raise state['error']
+        finally:
+            state['stopped'] = True
+            executor.shutdown(wait=False)
+
     def count_objects(self, bucket_name, prefix=''):
         """Быстрый подсчет количества объектов без загрузки данных
 
@@ -581,30 +1286,57 @@ class S3Manager:
             return None, None
 
         # Проверяем кеш
-        cache_key = f"count:{bucket_name}:{prefix}"
-        cached = self.object_cache.get(cache_key)
-        if cached is not None:
-            return cached
+        cached = self.get_cached_count(bucket_name, prefix)
+        if cached is not None and cached[2]:
+            return cached[0], cached[1]
 
         try:
-            total_objects = 0
-            total_size = 0
-
-            paginator = self.s3_client.get_paginator('list_objects_v2')
-            pages = paginator.paginate(Bucket=bucket_name, Prefix=prefix)
-
-            for page in pages:
-                if 'Contents' in page:
-                    total_objects += len(page['Contents'])
-                    total_size += sum(obj.get('Size', 0) for obj in page['Contents'])
-
-            result = (total_objects, total_size)
-            self.object_cache.put(cache_key, result)
+            result = (0, 0)
+            for result in self.iter_count_objects(bucket_name, prefix):
+                pass
+            self.store_count(bucket_name, prefix, *result)
             return result
 
         except (ClientError, Exception):
             return None, None
 
+    def iter_count_objects(self, bucket_name, prefix='', should_stop=None):
+        """
+        Инкрементальный подсчет: генератор частичных итогов (count, size) после каждой страницы.
+        Ошибки S3 пробрасываются вызывающему. Если should_stop() вернет True - подсчет прерывается.
+        """
+        total_objects = 0
+        total_size = 0
+
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            if should_stop and should_stop():
+                return
+            if 'Contents' in page:
+                total_objects += len(page['Contents'])
+                total_size += sum(obj.get('Size', 0) for obj in page['Contents'])
+            yield total_objects, total_size
+
+    def get_cached_count(self, bucket_name, prefix=''):
+        """Результат подсчета из кеша: (count, size, fresh) или None"""
+        return self.prefix_cache.get_count(self.endpoint_name, bucket_name, prefix)
+
+    def store_count(self, bucket_name, prefix, count, size):
+        """Сохранить завершенный подсчет в кеш префиксов"""
+        self.prefix_cache.put_count(self.endpoint_name, bucket_name, prefix, count, size)
+
+    def get_cached_listing(self, bucket_name, prefix=''):
+        """Листинг уровня из кеша: (folders, files, fresh) или None"""
+        return self.prefix_cache.get_listing(self.endpoint_name, bucket_name, prefix)
+
+    def store_listing(self, bucket_name, prefix, folders, files):
+        """Сохранить полный листинг уровня (как у list_objects_lazy)"""
+        self.prefix_cache.put_listing(self.endpoint_name, bucket_name, prefix, folders, files)
+
+    def touch_listing(self, bucket_name, prefix=''):
+        """Листинг перепроверен и совпал с кешем"""
+        self.prefix_cache.touch_listing(self.endpoint_name, bucket_name, prefix)
+
     def list_objects_lazy(self, bucket_name, prefix='', page_size=1000, use_versioning=False):
         """
         Генератор для ленивой (постраничной) загрузки объектов из S3.
@@ -620,7 +1352,9 @@ class S3Manager:
         Возвращает:
             Generator: Итератор, возвращающий страницы (ответы API) с объектами или версиями.
         """
+        self.last_list_error = None
         if self.s3_client is None:
+            self.last_list_error = self.connection_error or 'Not connected'
             yield [], []
             return
 
@@ -693,23 +1427,27 @@ class S3Manager:
                     files = list(files_map.values())
                     yield folders, files
 
-        except (ClientError, Exception):
+        except (ClientError, Exception) as e:
+            self.last_list_error = str(e)
             yield [], []
 
-    def invalidate_cache(self, bucket_name=None, prefix=None):
-        """Инвалидация кеша после операций изменения"""
+    def invalidate_cache(self, bucket_name=None, keys=None):
+        """
+        Инвалидация кеша после операций изменения.
+
+        С keys затрагиваются только предки измененных ключей (и поддерево ключа-папки),
+        без keys - весь бакет (или весь endpoint, если бакет не указан).
+        """
         if bucket_name is None:
-            self.object_cache.invalidate()
             self.bucket_cache.invalidate()
             self.versioning_status_cache.clear()  # Очистить кеш версионирования
+            self.prefix_cache.invalidate(self.endpoint_name)
+        elif keys is not None:
+            self.prefix_cache.invalidate_keys(self.endpoint_name, bucket_name, keys)
         else:
-            pattern = f"{bucket_name}:"
-            if prefix:
-                pattern += prefix
-            self.object_cache.invalidate(pattern)
+            self.prefix_cache.invalidate(self.endpoint_name, bucket_name)
             # При изменениях в бакете - сбросить его статус версионирования
-            if bucket_name in self.versioning_status_cache:
-                del self.versioning_status_cache[bucket_name]
+            self.versioning_status_cache.pop(bucket_name, None)
 
     def object_exists(self, bucket_name, key):
         """Проверить существование объекта и вернуть его метаданные"""
@@ -747,6 +1485,49 @@ class S3Manager:
             self.connection_error = f"list version error: {str(e)}"
             return []
 
+    # Размер блока ranged GET для просмотра (кратные блоки кешируются в block_cache)
+    RANGE_BLOCK_SIZE = 64 * 1024
+
+    def read_range(self, bucket_name, key, offset, length, version_id=None, etag=None):
+        """
+        Прочитать length байт объекта с позиции offset через ranged GET, не скачивая объект.
+
+        Данные читаются блоками RANGE_BLOCK_SIZE и кешируются по (bucket, key, version, etag, блок).
+
+        Возвращает:
+            bytes: Прочитанные данные (короче length у конца объекта) или None при ошибке.
+        """
+        if self.s3_client is None or length <= 0:
+            return b'' if self.s3_client is not None else None
+
+        block_size = self.RANGE_BLOCK_SIZE
+        first_block = offset // block_size
+        last_block = (offset + length - 1) // block_size
+        chunks = []
+        try:
+            for block in range(first_block, last_block + 1):
+                cache_key = f"{bucket_name}\0{key}\0{version_id}\0{etag}\0{block}"
+                data = self.block_cache.get(cache_key)
+                if data is None:
+                    extra_args = {}
+                    if version_id:
+                        extra_args['VersionId'] = version_id
+                    start = block * block_size
+                    response = self.s3_client.get_object(Bucket=bucket_name, Key=key,
+                                                         Range=f'bytes={start}-{start + block_size - 1}',
+                                                         **extra_args)
+                    data = response['Body'].read()
+                    self.block_cache.put(cache_key, data)
+                chunks.append(data)
+                if len(data) < block_size:
+                    break  # конец объекта
+        except (ClientError, Exception) as e:
+            self.connection_error = f"Read error: {str(e)}"
+            return None
+
+        start = offset - first_block * block_size
+        return b''.join(chunks)[start:start + length]
+
     def download_object(self, bucket_name, key, local_path, version_id=None, callback=None):
         """
         Скачивает объект из S3 в локальную файловую систему.
@@ -767,7 +1548,8 @@ class S3Manager:
             extra_args = {}
             if version_id:
                 extra_args['VersionId'] = version_id
-            self.s3_client.download_file(bucket_name, key, local_path, ExtraArgs=extra_args, Callback=callback)
+            self.s3_client.download_file(bucket_name, key, local_path, ExtraArgs=extra_args, Callback=callback,
+                                         Config=self.transfer_config)
             return True
         except (ClientError, Exception) as e:
             self.connection_error = f"Download error: {str(e)}"
@@ -778,28 +1560,42 @@ class S3Manager:
         """Отметить что S3 нужно обновить"""
         self.s3_needs_refresh = True
 
-    def upload_file(self, local_path, bucket_name, key):
+    def upload_file(self, local_path, bucket_name, key, callback=None):
         if self.s3_client is None:
             return False
         try:
-            self.s3_client.upload_file(local_path, bucket_name, key)
-            self.invalidate_cache(bucket_name)
+            self.s3_client.upload_file(local_path, bucket_name, key, Callback=callback,
+                                       Config=self.transfer_config)
+            self.invalidate_cache(bucket_name, keys=[key])
             self.mark_s3_for_refresh()
             return True
         except (ClientError, Exception) as e:
             self.connection_error = f"Upload error: {str(e)}"
             return False
 
-    def copy_object(self, source_bucket, source_key, dest_bucket, dest_key, version_id=None):
+    # Максимальный размер объекта для одного CopyObject и число частей multipart (ограничения S3 API)
+    COPY_OBJECT_LIMIT = 5 * 1024 ** 3
+    MAX_PARTS = 10000
+    # Заголовки, которые CopyObject переносит сам, а для multipart их надо передать явно
+    COPY_HEADERS = ('ContentType', 'CacheControl', 'ContentDisposition', 'ContentEncoding',
+                    'ContentLanguage', 'Expires')
+
+    def copy_object(self, source_bucket, source_key, dest_bucket, dest_key, version_id=None, size=None,
+                    callback=None):
         """
         Выполняет копирование объекта внутри S3 (Server-side copy) без скачивания на локальную машину.
 
+        Объекты от copy_threshold (и всегда больше 5 ГБ) копируются через UploadPartCopy
+        частями параллельно, с переносом метаданных и докачкой прерванного копирования.
+
         Аргументы:
             source_bucket (str): Имя исходного бакета.
             source_key (str): Ключ исходного объекта.
             dest_bucket (str): Имя целевого бакета.
             dest_key (str): Ключ целевого объекта.
             version_id (str, optional): ID конкретной версии исходного объекта. Если указан, копируется именно эта версия.
+            size (int, optional): Известный размер источника; если меньше порога - HeadObject не нужен.
+            callback (callable, optional): callback(bytes) после каждой скопированной части.
 
         Возвращает:
             bool: True, если операция копирования прошла успешно, иначе False.
@@ -810,14 +1606,130 @@ class S3Manager:
             copy_source = {'Bucket': source_bucket, 'Key': source_key}
             if version_id:
                 copy_source['VersionId'] = version_id
+
+            if size is None or size >= self.copy_threshold:
+                extra_args = {'VersionId': version_id} if version_id else {}
+                head = self.s3_client.head_object(Bucket=source_bucket, Key=source_key, **extra_args)
+                if head['ContentLength'] >= self.copy_threshold:
+                    return self._multipart_copy(copy_source, dest_bucket, dest_key, head, callback)
+
             self.s3_client.copy_object(CopySource=copy_source, Bucket=dest_bucket, Key=dest_key)
-            self.invalidate_cache(dest_bucket)
+            self.invalidate_cache(dest_bucket, keys=[dest_key])
             self.mark_s3_for_refresh()
             return True
         except (ClientError, Exception) as e:
             self.connection_error = f"Copy error: {str(e)}"
             return False
 
+    def _multipart_copy(self, copy_source, dest_bucket, dest_key, head, callback=None):
+        """
+        Серверное копирование частями: CreateMultipartUpload + параллельные UploadPartCopy
+        (не больше transfer_concurrency на объект) + CompleteMultipartUpload.
+
+        Каждая часть копируется с CopySourceIfMatch=ETag источника. UploadId сохраняется
+        в copy_state: при повторе того же копирования уже скопированные части берутся из
+        ListParts. Если источник изменился или загрузка пропала - загрузка отменяется.
+        """
+        size = head['ContentLength']
+        source_etag = head.get('ETag')
+        part_size = max(self.copy_chunk_size, -(-size // self.MAX_PARTS))
+        part_count = max(1, -(-size // part_size))
+
+        def part_range(number):
+            start = (number - 1) * part_size
+            return start, min(size, start + part_size) - 1
+
+        state_key = f"{self.endpoint_name}|{dest_bucket}|{dest_key}"
+        source_id = f"{copy_source['Bucket']}/{copy_source['Key']}?{copy_source.get('VersionId', '')}#{source_etag}"
+        parts = {}
+        upload_id = None
+
+        # Докачка: та же загрузка, тот же источник и размер части
+        saved = self.copy_state.get(state_key)
+        if saved and saved.get('source') == source_id and saved.get('part_size') == part_size:
+            try:
+                paginator = self.s3_client.get_paginator('list_parts')
+                for page in paginator.paginate(Bucket=dest_bucket, Key=dest_key, UploadId=saved['upload_id']):
+                    for part in page.get('Parts', []):
+                        start, end = part_range(part['PartNumber'])
+                        if part['PartNumber'] <= part_count and part['Size'] == end - start + 1:
+                            parts[part['PartNumber']] = part['ETag']
+                upload_id = saved['upload_id']
+            except (ClientError, Exception):
+                parts = {}  # загрузка завершена или отменена на сервере
+        elif saved:
+            # Прерванное копирование другого источника (или с другим размером части) - отменяем
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=saved['upload_id'])
+            except (ClientError, Exception):
+                pass
+            self.copy_state.remove(state_key)
+
+        try:
+            if upload_id is None:
+                extra_args = {k: head[k] for k in self.COPY_HEADERS if head.get(k)}
+                try:
+                    tags = self.s3_client.get_object_tagging(
+                        Bucket=copy_source['Bucket'], Key=copy_source['Key'],
+                        **({'VersionId': copy_source['VersionId']} if 'VersionId' in copy_source else {}))
+                    if tags.get('TagSet'):
+                        extra_args['Tagging'] = urlencode([(t['Key'], t['Value']) for t in tags['TagSet']])
+                except (ClientError, Exception):
+                    pass
+                response = self.s3_client.create_multipart_upload(Bucket=dest_bucket, Key=dest_key,
+                                                                  Metadata=head.get('Metadata', {}), **extra_args)
+                upload_id = response['UploadId']
+                self.copy_state.put(state_key, {'upload_id': upload_id, 'source': source_id, 'part_size': part_size})
+
+            if callback and parts:
+                # уже скопированные при прошлой попытке части
+                callback(sum(part_range(n)[1] - part_range(n)[0] + 1 for n in parts))
+
+            failed = threading.Event()
+
+            def copy_part(number):
+                if failed.is_set():
+                    return number, None
+                start, end = part_range(number)
+                args = {'Bucket': dest_bucket, 'Key': dest_key, 'UploadId': upload_id, 'PartNumber': number,
+                        'CopySource': copy_source, 'CopySourceRange': f'bytes={start}-{end}'}
+                if source_etag:
+                    args['CopySourceIfMatch'] = source_etag
+                try:
+                    response = self.s3_client.upload_part_copy(**args)
+                except Exception:
+                    failed.set()
+                    raise
+                if callback:
+                    callback(end - start + 1)
+                return number, response['CopyPartResult']['ETag']
+
+            pending = [n for n in range(1, part_count + 1) if n not in parts]
+            if pending:
+                with ThreadPoolExecutor(max_workers=min(self.transfer_concurrency, len(pending))) as executor:
+                    for number, etag in executor.map(copy_part, pending):
+                        parts[number] = etag
+
+            self.s3_client.complete_multipart_upload(
+                Bucket=dest_bucket, Key=dest_key, UploadId=upload_id,
+                MultipartUpload={'Parts': [{'PartNumber': n, 'ETag': parts[n]} for n in sorted(parts)]})
+            self.copy_state.remove(state_key)
+            self.invalidate_cache(dest_bucket, keys=[dest_key])
+            self.mark_s3_for_refresh()
+            return True
+
+        except (ClientError, Exception) as e:
+            code = e.response.get('Error', {}).get('Code') if isinstance(e, ClientError) else None
+            if upload_id is not None and code in ('PreconditionFailed', 'NoSuchUpload', 'NoSuchKey'):
+                # источник изменился или загрузки уже нет - докачивать нечего
+                try:
+                    self.s3_client.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id)
+                except (ClientError, Exception):
+                    pass
+                self.copy_state.remove(state_key)
+            self.connection_error = f"Multipart copy error: {str(e)}"
+            return False
+
     def delete_object(self, bucket_name, key, version_id=None):
         if self.s3_client is None:
             return False
@@ -826,13 +1738,96 @@ class S3Manager:
             if version_id:
                 extra_args['VersionId'] = version_id
             self.s3_client.delete_object(Bucket=bucket_name, Key=key, **extra_args)
-            self.invalidate_cache(bucket_name)
+            self.invalidate_cache(bucket_name, keys=[key])
             self.mark_s3_for_refresh()
             return True
         except (ClientError, Exception) as e:
             self.connection_error = f"Delete error: {str(e)}"
             return False
 
+    # Максимум ключей в одном запросе DeleteObjects (ограничение S3 API)
+    DELETE_BATCH_SIZE = 1000
+
+    def delete_objects_bulk(self, bucket_name, objects, callback=None, should_stop=None):
+        """
+        Пакетное удаление объектов через DeleteObjects.
+
+        Ключи делятся на пакеты по DELETE_BATCH_SIZE, пакеты отправляются параллельно
+        (не больше max_parallel запросов). Кеш инвалидируется один раз на пакет.
+
+        Аргументы:
+            bucket_name (str): Имя бакета.
+            objects (list): Словари с 'Key' и, для версий, 'VersionId' (лишние поля игнорируются).
+            callback (callable, optional): callback(batch, errors) после каждого пакета;
+                batch - отправленные объекты, errors - ошибки по ключам этого пакета.
+            should_stop (callable, optional): Если вернет True - оставшиеся пакеты не отправляются.
+
+        Возвращает:
+            tuple: (число удаленных, список ошибок {'Key', 'VersionId', 'Code', 'Message'})
+        """
+        if self.s3_client is None:
+            return 0, []
+        objects = list(objects)
+        if not objects:
+            return 0, []
+
+        batches = [objects[i:i + self.DELETE_BATCH_SIZE] for i in range(0, len(objects), self.DELETE_BATCH_SIZE)]
+
+        def delete_batch(batch):
+            if should_stop and should_stop():
+                return 0, []
+            request = []
+            for obj in batch:
+                entry = {'Key': obj['Key']}
+                if obj.get('VersionId'):
+                    entry['VersionId'] = obj['VersionId']
+                request.append(entry)
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={'Objects': request, 'Quiet': True}
+                )
+                errors = response.get('Errors', [])
+            except (ClientError, Exception) as e:
+                errors = [dict(entry, Code='RequestFailed', Message=str(e)) for entry in request]
+            self.invalidate_cache(bucket_name, keys=[entry['Key'] for entry in request])
+            if callback:
+                try:
+                    callback(batch, errors)
+                except Exception:
+                    pass
+            return len(batch) - len(errors), errors
+
+        deleted_count = 0
+        all_errors = []
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(batches))) as executor:
+            for deleted, errors in executor.map(delete_batch, batches):
+                deleted_count += deleted
+                all_errors.extend(errors)
+
+        if all_errors:
+            first = all_errors[0]
+            self.connection_error = f"Delete error: {first.get('Key')}: {first.get('Code')} {first.get('Message', '')}"
+        self.mark_s3_for_refresh()
+        return deleted_count, all_errors
+
+    def list_all_versions(self, bucket_name, prefix=''):
+        """Все версии и delete markers под префиксом (для полной очистки бакета)"""
+        if self.s3_client is None:
+            return []
+        try:
+            paginator = self.s3_client.get_paginator('list_object_versions')
+            objects = []
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+                for v in page.get('Versions', []):
+                    objects.append({'Key': v['Key'], 'VersionId': v['VersionId'], 'Size': v.get('Size', 0)})
+                for m in page.get('DeleteMarkers', []):
+                    objects.append({'Key': m['Key'], 'VersionId': m['VersionId'], 'Size': 0})
+            return objects
+        except (ClientError, Exception) as e:
+            self.connection_error = f"list version error: {str(e)}"
+            return []
+
     def delete_old_versions(self, bucket_name, key):
         """Удалить все версии кроме последней"""
         if self.s3_client is None:
@@ -844,12 +1839,7 @@ class S3Manager:
 
             versions.sort(key=lambda x: x.get('LastModified', datetime.min), reverse=True)
 
-            deleted_count = 0
-            for version in versions[1:]:
-                if self.delete_object(bucket_name, key, version['VersionId']):
-                    deleted_count += 1
-
-            self.mark_s3_for_refresh()
+            deleted_count, _ = self.delete_objects_bulk(bucket_name, versions[1:])
             return deleted_count
         except (ClientError, Exception) as e:
             self.connection_error = f"Delete old version error: {str(e)}"
@@ -864,6 +1854,8 @@ class S3Manager:
                 Bucket=bucket_name,
                 VersioningConfiguration={'Status': 'Enabled'}
             )
+            # статус версионирования и листинги бакета (счетчики версий) устарели
+            self.invalidate_cache(bucket_name)
             return True
         except (ClientError, Exception) as e:
             self.connection_error = f"Enable Versioning error: {str(e)}"
@@ -878,6 +1870,8 @@ class S3Manager:
                 Bucket=bucket_name,
                 VersioningConfiguration={'Status': 'Suspended'}
             )
+            # статус версионирования и листинги бакета (счетчики версий) устарели
+            self.invalidate_cache(bucket_name)
             return True
         except (ClientError, Exception) as e:
             self.connection_error = f"Disable Vesrsioning error: {str(e)}"
@@ -890,6 +1884,112 @@ class S3Manager:
             self.versioning_status_cache[bucket_name] = self.get_versioning_status(bucket_name)
         return self.versioning_status_cache[bucket_name]
 
+    def get_bucket_stats(self):
+        """
+        Статистика и квоты всех бакетов через RGW Admin Ops API (GET /admin/bucket?stats=true).
+
+        Нужны caps "buckets=read" у пользователя. Если API нет (401/403/404 или ответ не JSON -
+        нет caps или это не RGW), возвращает None и в этой сессии больше не запрашивается
+        (отметка хранится в записи S3ClientPool, поэтому переживает повторные входы в endpoint).
+        Прочие ошибки (таймаут, обрыв, 5xx) считаются временными: None без отметки,
+        при следующем открытии списка бакетов API будет запрошен снова.
+
+        Возвращает:
+            dict: {bucket: {'count', 'size', 'quota_size', 'quota_objects'}} или None.
+        """
+        if self.s3_client is None or self.admin_api_available is False:
+            return None
+        url = f"{self.endpoint_url.rstrip('/')}/admin/bucket?stats=true&format=json"
+        try:
+            request = AWSRequest(method='GET', url=url)
+            SigV4Auth(Credentials(self.access_key, self.secret_key), 's3',
+                      self.s3_client.meta.region_name or 'us-east-1').add_auth(request)
+            response = requests.get(url, headers=dict(request.headers.items()), timeout=10)
+        except (requests.RequestException, Exception):
+            return None
+        if response.status_code in (401, 403, 404):
+            self.admin_api_available = False
+            return None
+        try:
+            response.raise_for_status()
+        except requests.RequestException:
+            return None
+        try:
+            entries = response.json()
+        except ValueError:
+            self.admin_api_available = False
+            return None
+
+        stats = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict) or 'bucket' not in entry:
+                continue
+            usage = entry.get('usage', {}).get('rgw.main', {})
+            quota = entry.get('bucket_quota', {})
+            enabled = quota.get('enabled', False)
+            stats[entry['bucket']] = {
+                'count': usage.get('num_objects', 0),
+                'size': usage.get('size_actual', usage.get('size', 0)),
+                'quota_size': quota.get('max_size', -1) if enabled else -1,
+                'quota_objects': quota.get('max_objects', -1) if enabled else -1,
+            }
+        self.admin_api_available = True
+        return stats
+
+    def get_cached_bucket_info(self, bucket_name):
+        """Атрибуты бакета из кеша: (info, fresh) или None"""
+        return self.prefix_cache.get_bucket_info(self.endpoint_name, bucket_name)
+
+    def fetch_bucket_info(self, bucket_name, stats=None):
+        """
+        Обновить атрибуты бакета для списка бакетов: версионирование и квоты, а если
+        есть stats get_bucket_stats - и количество/размер объектов. Это дешевые
+        запросы; подсчет листингом (когда Admin API нет) - отдельно, refresh_bucket_count.
+        Свежие значения из кеша повторно не запрашиваются.
+
+        Возвращает:
+            dict: {'versioning', 'quota_size', 'quota_objects'} (подсчет - в get_cached_count).
+        """
+        cached = self.get_cached_bucket_info(bucket_name)
+        entry = (stats or {}).get(bucket_name)
+        if cached is not None and cached[1]:
+            info = cached[0]
+        else:
+            info = {
+                'versioning': self.get_versioning_status(bucket_name),
+                'quota_size': entry['quota_size'] if entry else -1,
+                'quota_objects': entry['quota_objects'] if entry else -1,
+            }
+            self.prefix_cache.put_bucket_info(self.endpoint_name, bucket_name, info)
+        self.versioning_status_cache[bucket_name] = info['versioning']
+
+        if entry is not None:
+            self.store_count(bucket_name, '', entry['count'], entry['size'])
+        return info
+
+    def refresh_bucket_count(self, bucket_name, should_stop=None):
+        """
+        Подсчитать объекты бакета полным листингом, если в кеше нет свежего значения.
+        Дорого для больших бакетов, поэтому вызывается отдельной фазой после атрибутов.
+
+        Возвращает:
+            bool: True, если подсчет выполнен и сохранен.
+        """
+        count = self.get_cached_count(bucket_name, '')
+        if count is not None and count[2]:
+            return False
+        try:
+            result = (0, 0)
+            for result in self.iter_count_objects(bucket_name, '', should_stop=should_stop):
+                pass
+            if should_stop and should_stop():
+                return False
+            self.store_count(bucket_name, '', *result)
+            return True
+        except (ClientError, Exception) as e:
+            self.connection_error = f"Count error: {str(e)}"
+            return False
+
     def get_versioning_status(self, bucket_name):
         """Получить статус версионирования бакета"""
         if self.s3_client is None:
@@ -974,18 +2074,22 @@ class FileSystemBrowser:
             return False
 
 
+def is_binary_data(chunk):
+    """Эвристика бинарности по первым байтам (нули или много управляющих символов)"""
+    if b'\x00' in chunk:
+        return True
+
+    non_printable = sum(1 for byte in chunk if byte < 32 and byte not in (9, 10, 13))
+    if len(chunk) > 0 and non_printable / len(chunk) > 0.3:
+        return True
+
+    return False
+
+
 def is_binary_file(file_path):
     try:
         with open(file_path, 'rb') as f:
-            chunk = f.read(1024)
-            if b'\x00' in chunk:
-                return True
-
-            non_printable = sum(1 for byte in chunk if byte < 32 and byte not in (9, 10, 13))
-            if len(chunk) > 0 and non_printable / len(chunk) > 0.3:
-                return True
-
-            return False
+            return is_binary_data(f.read(1024))
     except:
         return True
 
@@ -1157,6 +2261,145 @@ class SelectableText(urwid.Text):
         return key
 
 
+# Строка таблицы объектов S3 (кортеж - в разы компактнее dict и виджета)
+S3Row = namedtuple('S3Row', 'is_dir name key size mtime etag version_count')
+
+
+class ObjectListWalker(urwid.ListWalker):
+    """
+    Walker панели: фиксированные виджеты (навигация, бакеты, FS) + таблица объектов S3.
+
+    Для строк таблицы виджеты создаются только при обращении ListBox к позиции
+    (make_row(row, selected)) и держатся в небольшом кеше. Фильтр и сортировка
+    меняют только view - список индексов строк в порядке показа.
+    Выбор строк таблицы хранится по ключу объекта.
+    """
+
+    ROW_CACHE_SIZE = 512
+
+    def __init__(self, make_row):
+        self.make_row = make_row
+        self.widgets = []
+        self.rows = []
+        self.view = []
+        self.selected = set()
+        self.row_cache = OrderedDict()
+        self.focus = 0
+
+    # --- интерфейс списка (совместимость с SimpleFocusListWalker) ---
+
+    def __len__(self):
+        return len(self.widgets) + len(self.view)
+
+    def __getitem__(self, position):
+        if not isinstance(position, int) or position < 0:
+            raise IndexError(position)
+        if position < len(self.widgets):
+            return self.widgets[position]
+        row_index = position - len(self.widgets)
+        if row_index >= len(self.view):
+            raise IndexError(position)
+        widget = self.row_cache.get(position)
+        if widget is None:
+            row = self.rows[self.view[row_index]]
+            widget = self.make_row(row, row.key in self.selected)
+            self.row_cache[position] = widget
+            if len(self.row_cache) > self.ROW_CACHE_SIZE:
+                self.row_cache.popitem(last=False)
+        else:
+            self.row_cache.move_to_end(position)
+        return widget
+
+    def __iter__(self):
+        # Медленный путь: создает виджеты всех строк. Для таблицы используйте row_at/find
+        for position in range(len(self)):
+            yield self[position]
+
+    def __delitem__(self, index):
+        start = index.start if isinstance(index, slice) else index
+        start = start or 0
+        del self.widgets[start:]
+        self.set_rows([])
+
+    def append(self, widget):
+        self.widgets.append(widget)
+        self._modified()
+
+    def clear(self):
+        self.widgets = []
+        self.selected = set()
+        self.set_rows([])
+        self.focus = 0
+
+    def next_position(self, position):
+        if position + 1 >= len(self):
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse=False):
+        if reverse:
+            return range(len(self) - 1, -1, -1)
+        return range(len(self))
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    # --- таблица объектов ---
+
+    def set_rows(self, rows, view=None):
+        self.rows = rows
+        self.set_view(list(range(len(rows))) if view is None else view)
+
+    def extend_rows(self, rows, accept=None):
+        """Дописать строки (догрузка страницы); accept(row) - фильтр текущего вида"""
+        start = len(self.rows)
+        self.rows.extend(rows)
+        self.view.extend(start + i for i, row in enumerate(rows) if accept is None or accept(row))
+        self._modified()
+
+    def set_view(self, view):
+        self.view = view
+        self.row_cache.clear()
+        if self.focus >= len(self):
+            self.focus = max(0, len(self) - 1)
+        self._modified()
+
+    def row_at(self, position):
+        """Строка таблицы в позиции списка или None (фиксированный виджет)"""
+        row_index = position - len(self.widgets)
+        if 0 <= row_index < len(self.view):
+            return self.rows[self.view[row_index]]
+        return None
+
+    def find(self, predicate):
+        """Позиция первой показанной строки таблицы, для которой predicate(row) истинен"""
+        base = len(self.widgets)
+        for i, row_index in enumerate(self.view):
+            if predicate(self.rows[row_index]):
+                return base + i
+        return None
+
+    def visible_rows(self):
+        return (self.rows[i] for i in self.view)
+
+    def set_selected(self, key, selected):
+        if selected:
+            self.selected.add(key)
+        else:
+            self.selected.discard(key)
+
+    def refresh_rows(self):
+        """Пересоздать видимые виджеты строк (после массового изменения выбора)"""
+        self.row_cache.clear()
+        self._modified()
+
+
 class FileViewerDialog(urwid.WidgetWrap):
     def __init__(self, title, content, callback):
         self.callback = callback
@@ -1184,6 +2427,163 @@ class FileViewerDialog(urwid.WidgetWrap):
         return super().keypress(size, key)
 
 
+class PagedTextWalker(urwid.ListWalker):
+    """
+    Строки файла для просмотрщика, читаемые блоками по мере прокрутки.
+
+    read(offset, length) -> bytes. Текст дочитывается по CHUNK_SIZE, когда фокус
+    подходит к концу загруженного; HEX-режим полностью виртуальный (строка = 16 байт).
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    MAX_LINE = 16 * 1024  # очень длинные строки режем, чтобы не копить их в памяти
+    HEX_WIDTH = 16
+
+    def __init__(self, read, size, binary=False, hex_formatter=None):
+        self.read = read
+        self.size = size
+        self.binary = binary
+        self.hex_formatter = hex_formatter
+        self.lines = []
+        self.offset = 0
+        self.tail = b''
+        self.focus = 0
+        self.error = None
+        self.widget_cache = OrderedDict()
+        if not binary:
+            self._load_more()
+
+    def loaded_bytes(self):
+        return min(self.size, self.focus * self.HEX_WIDTH) if self.binary else self.offset
+
+    def _eof(self):
+        return self.offset >= self.size or self.error is not None
+
+    def _load_more(self):
+        """Дочитать следующий блок текста; False - дальше читать нечего"""
+        if self._eof():
+            return False
+        try:
+            data = self.read(self.offset, min(self.CHUNK_SIZE, self.size - self.offset))
+        except Exception as e:
+            data = None
+            self.error = str(e)
+        if not data:
+            if self.error is None:
+                self.error = 'read failed'
+            self.lines.append(f'[... Read error: {self.error} ...]')
+            return False
+
+        self.offset += len(data)
+        parts = (self.tail + data).split(b'\n')
+        self.tail = parts.pop()
+        while len(self.tail) > self.MAX_LINE:
+            parts.append(self.tail[:self.MAX_LINE])
+            self.tail = self.tail[self.MAX_LINE:]
+        if self._eof() and self.tail:
+            parts.append(self.tail)
+            self.tail = b''
+        self.lines.extend(p.decode('utf-8', errors='replace').rstrip('\r') for p in parts)
+        return True
+
+    def _count(self):
+        if self.binary:
+            return (self.size + self.HEX_WIDTH - 1) // self.HEX_WIDTH
+        return len(self.lines)
+
+    def _ensure(self, position):
+        if not self.binary:
+            while position >= len(self.lines) and self._load_more():
+                pass
+
+    def __getitem__(self, position):
+        if not isinstance(position, int) or position < 0:
+            raise IndexError(position)
+        self._ensure(position)
+        if position >= self._count():
+            raise IndexError(position)
+        widget = self.widget_cache.get(position)
+        if widget is None:
+            if self.binary:
+                offset = position * self.HEX_WIDTH
+                try:
+                    data = self.read(offset, min(self.HEX_WIDTH, self.size - offset)) or b''
+                except Exception as e:
+                    data = b''
+                    self.error = str(e)
+                text = self.hex_formatter(data, offset) if data else f'{offset:08X} [read error]'
+            else:
+                text = self.lines[position]
+            widget = urwid.Text(text, wrap='any')
+            self.widget_cache[position] = widget
+            if len(self.widget_cache) > 256:
+                self.widget_cache.popitem(last=False)
+        return widget
+
+    def next_position(self, position):
+        self._ensure(position + 1)
+        if position + 1 >= self._count():
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse=False):
+        # Для текста "конец" - последняя загруженная строка (файл не дочитывается целиком)
+        if reverse:
+            return range(self._count() - 1, -1, -1)
+        return range(self._count())
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+
+class PagedViewerDialog(urwid.WidgetWrap):
+    """Просмотрщик больших файлов: данные читаются диапазонами по мере прокрутки"""
+
+    def __init__(self, title, size, read, callback, binary=False, hex_formatter=None):
+        self.callback = callback
+        self.size = size
+        self.walker = PagedTextWalker(read, size, binary=binary, hex_formatter=hex_formatter)
+        self.listbox = urwid.ListBox(self.walker)
+        self.status_text = urwid.Text('', align='right')
+
+        close_button = urwid.Button('Close (ESC)')
+        urwid.connect_signal(close_button, 'click', self.on_close)
+
+        mode = 'HEX' if binary else 'Text'
+        pile = urwid.Pile([
+            ('weight', 1, urwid.LineBox(self.listbox, f'{title} [{mode}, {format_size(size)}]')),
+            ('pack', urwid.Columns([
+                ('pack', urwid.AttrMap(close_button, None, focus_map='selected')),
+                ('weight', 1, self.status_text),
+            ])),
+        ])
+        self.update_status()
+
+        super().__init__(urwid.AttrMap(pile, 'dialog'))
+
+    def update_status(self):
+        loaded = self.walker.loaded_bytes()
+        percent = int(loaded * 100 / self.size) if self.size else 100
+        self.status_text.set_text(f'{format_size(loaded)} / {format_size(self.size)} ({percent}%) ')
+
+    def on_close(self, button):
+        self.callback()
+
+    def keypress(self, size, key):
+        if key == 'esc':
+            self.callback()
+            return None
+        result = super().keypress(size, key)
+        self.update_status()
+        return result
+
+
 class VersionSelectDialog(urwid.WidgetWrap):
     """Диалог выбора версии файла для просмотра или действий"""
 
@@ -1318,11 +2718,13 @@ class VersionSelectDialog(urwid.WidgetWrap):
 class OverwriteDialog(urwid.WidgetWrap):
     """Диалог подтверждения перезаписи файла"""
 
-    def __init__(self, filename, source_info, dest_info, callback, show_version_options=False):
+    def __init__(self, filename, source_info, dest_info, callback, show_version_options=False, pending=0):
         self.callback = callback
 
         title_text = urwid.Text('File already exists!', align='center')
         file_text = urwid.Text(f'File: {filename}')
+        # Конфликты копятся в очереди, пока воркеры продолжают передачу
+        pending_text = urwid.Text(f'(+{pending} more conflict(s) pending)' if pending else '')
 
         src_size = source_info.get("size", 0)
         dst_size = dest_info.get("size", 0)
@@ -1385,6 +2787,7 @@ class OverwriteDialog(urwid.WidgetWrap):
             ('pack', title_text),
             ('pack', urwid.Divider()),
             ('pack', file_text),
+            ('pack', pending_text),
             ('pack', urwid.Divider()),
             ('pack', source_text),
             ('pack', dest_text),
@@ -1426,6 +2829,13 @@ class ProgressDialog(urwid.WidgetWrap):
         self.total_bytes = 0
         self.processed_bytes = 0
         self.start_time = time.time()
+        # Файлы, которые сейчас передаются воркерами TransferScheduler
+        self.active_files = []
+        self.lock = threading.RLock()
+        # Листинги (S3ObjectStream), которые еще наполняются: итоги растут по мере их прихода
+        self.streams = []
+        self.base_files = 0
+        self.base_bytes = 0
 
         skip_button = urwid.Button('[ Skip ]')
         cancel_button = urwid.Button('[ Cancel ]')
@@ -1464,9 +2874,27 @@ class ProgressDialog(urwid.WidgetWrap):
 
     def on_cancel(self, button):
         self.cancelled = True
+        for stream in self.streams:
+            stream.cancel()
         if self.callback:
             self.callback()
 
+    def attach_streams(self, analyzed):
+        """Учитывать в итогах объекты, которые еще приходят из листингов (analyze_items)"""
+        with self.lock:
+            self.streams = [a['files'] for a in analyzed if isinstance(a['files'], S3ObjectStream)]
+            self.base_files = sum(len(a['files']) for a in analyzed if not isinstance(a['files'], S3ObjectStream))
+            # total_bytes уже включает объем, пролистанный к моменту analyze_items
+            self.base_bytes = self.total_bytes - sum(a.get('listed_bytes', 0) for a in analyzed)
+
+    def add_expected(self, files, nbytes=0):
+        """Поправить ожидаемые итоги (например, удаление всех версий вместо текущих объектов)"""
+        with self.lock:
+            self.base_files += files
+            self.base_bytes += nbytes
+            self.total_files += files
+            self.total_bytes += nbytes
+
     def keypress(self, size, key):
         if key == 'esc':
             self.on_cancel(None)
@@ -1481,6 +2909,63 @@ class ProgressDialog(urwid.WidgetWrap):
             return f'{format_size(speed)}/s'
         return '0 B/s'
 
+    def get_files_rate_str(self):
+        """Получить строку скорости в файлах в секунду"""
+        elapsed = time.time() - self.start_time
+        if elapsed > 0:
+            return f'{self.processed_files / elapsed:.1f} files/s'
+        return '0.0 files/s'
+
+    def begin_file(self, name):
+        """Воркер начал передачу файла (вызывается из любого потока)"""
+        with self.lock:
+            self.active_files.append(name)
+            self.current_file = name
+
+    def add_bytes(self, count):
+        """Callback boto3: переданы очередные байты"""
+        with self.lock:
+            self.processed_bytes += count
+
+    def end_file(self, name, success, remaining_bytes=0):
+        """Воркер закончил файл; remaining_bytes - байты, не учтенные через add_bytes"""
+        with self.lock:
+            try:
+                self.active_files.remove(name)
+            except ValueError:
+                pass
+            self.processed_files += 1
+            self.processed_bytes += max(0, remaining_bytes)
+            if success:
+                self.success_count += 1
+            else:
+                self.fail_count += 1
+            if self.active_files:
+                self.current_file = self.active_files[-1]
+
+    def add_batch(self, name, success, failed, nbytes=0):
+        """Учесть пакет файлов сразу (пакетное удаление)"""
+        with self.lock:
+            self.processed_files += success + failed
+            self.success_count += success
+            self.fail_count += failed
+            self.processed_bytes += nbytes
+            self.current_file = name
+
+    def skip_file(self, name):
+        """Файл пропущен (Skip / Skip All / отмена)"""
+        with self.lock:
+            self.processed_files += 1
+            self.current_file = name
+
+    def refresh(self):
+        """Перерисовать счетчики; вызывается только из потока MainLoop"""
+        with self.lock:
+            if self.streams:
+                self.total_files = self.base_files + sum(len(st) for st in self.streams)
+                self.total_bytes = self.base_bytes + sum(st.total_size for st in self.streams)
+            self.update()
+
     def update(self, current_file='', file_size=0):
         if current_file:
             self.current_file = current_file
@@ -1498,11 +2983,14 @@ class ProgressDialog(urwid.WidgetWrap):
             display_file = self.current_file
             if len(display_file) > 60:
                 display_file = '...' + display_file[-57:]
-            self.file_text.set_text(f'File: {display_file}')
+            if len(self.active_files) > 1:
+                self.file_text.set_text(f'File: {display_file} (+{len(self.active_files) - 1} active)')
+            else:
+                self.file_text.set_text(f'File: {display_file}')
 
         self.stats_text.set_text(
             f'Total: {self.total_files} | Processed: {self.processed_files} | '
-            f'Success: {self.success_count} | Failed: {self.fail_count}'
+            f'Success: {self.success_count} | Failed: {self.fail_count} | {self.get_files_rate_str()}'
         )
 
         if self.total_bytes > 0:
@@ -1527,6 +3015,167 @@ class ProgressDialog(urwid.WidgetWrap):
         self.update()
 
 
+class TransferScheduler:
+    """
+    Пул воркеров для копирования/перемещения.
+
+    Задача (task) - словарь:
+        label        - имя файла для прогресса и диалога перезаписи
+        size         - размер в байтах
+        run          - callable(callback) -> bool, сама передача
+        check        - callable() -> dest_info | None, проверка существования цели
+        source_info  - callable() -> {'size', 'mtime'} источника (для диалога)
+        s3_dest      - цель в S3 (доступна опция "New Version")
+        endpoints    - [(имя endpoint'а, лимит параллельных передач)]
+        done         - callable(status), status: 'ok' | 'fail' | 'skip'
+
+    Конфликты перезаписи не останавливают воркеров: задача уходит в очередь
+    конфликтов, а отдельный поток по одному спрашивает пользователя и
+    возвращает подтвержденные задачи в общую очередь.
+    """
+
+    def __init__(self, workers, progress, ask_overwrite):
+        self.workers = max(1, int(workers))
+        self.progress = progress
+        # ask_overwrite(task, dest_info, pending) -> выбор из OverwriteDialog, блокирующий
+        self.ask_overwrite = ask_overwrite
+        self.tasks = queue.Queue(maxsize=self.workers * 4)
+        self.conflicts = queue.Queue()
+        self.overwrite_all = False
+        self.version_all = False
+        self.skip_all = False
+        self.limits = {}
+        self.limits_lock = threading.Lock()
+        self.pending = 0
+        self.pending_cond = threading.Condition()
+        self.threads = []
+
+    def start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        resolver = threading.Thread(target=self._resolver)
+        resolver.daemon = True
+        resolver.start()
+        self.threads.append(resolver)
+
+    def submit(self, task):
+        """Поставить задачу; блокируется, если очередь заполнена"""
+        with self.pending_cond:
+            self.pending += 1
+        if self.progress.cancelled:
+            self._finish(task, 'skip')
+            return
+        self.tasks.put(task)
+
+    def join(self):
+        """Дождаться выполнения всех задач и остановить потоки"""
+        with self.pending_cond:
+            while self.pending > 0:
+                self.pending_cond.wait(0.2)
+        for _ in range(self.workers):
+            self.tasks.put(None)
+        self.conflicts.put(None)
+
+    def _finish(self, task, status):
+        if status == 'skip':
+            self.progress.skip_file(task['label'])
+        try:
+            task['done'](status)
+        except Exception:
+            pass
+        with self.pending_cond:
+            self.pending -= 1
+            self.pending_cond.notify_all()
+
+    def _semaphores(self, task):
+        """Семафоры endpoint'ов задачи в фиксированном порядке (без взаимных блокировок)"""
+        result = []
+        with self.limits_lock:
+            for name, limit in sorted(set(task.get('endpoints', []))):
+                if name not in self.limits:
+                    self.limits[name] = threading.BoundedSemaphore(max(1, int(limit)))
+                result.append(self.limits[name])
+        return result
+
+    def _overwrite_allowed(self, task):
+        return self.overwrite_all or (self.version_all and task['s3_dest'])
+
+    def _worker(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            if self.progress.cancelled:
+                self._finish(task, 'skip')
+                continue
+
+            semaphores = self._semaphores(task)
+            for sem in semaphores:
+                sem.acquire()
+            try:
+                if not task.get('force') and not self._overwrite_allowed(task):
+                    try:
+                        dest_info = task['check']()
+                    except Exception:
+                        dest_info = None
+                    if dest_info:
+                        if self.skip_all:
+                            self._finish(task, 'skip')
+                        else:
+                            task['dest_info'] = dest_info
+                            self.conflicts.put(task)
+                        continue
+
+                transferred = [0]
+
+                def callback(count, transferred=transferred):
+                    transferred[0] += count
+                    self.progress.add_bytes(count)
+
+                self.progress.begin_file(task['label'])
+                try:
+                    ok = bool(task['run'](callback))
+                except Exception:
+                    ok = False
+                self.progress.end_file(task['label'], ok, task.get('size', 0) - transferred[0])
+                self._finish(task, 'ok' if ok else 'fail')
+            finally:
+                for sem in reversed(semaphores):
+                    sem.release()
+
+    def _resolver(self):
+        while True:
+            task = self.conflicts.get()
+            if task is None:
+                break
+            if self.progress.cancelled or self.skip_all:
+                self._finish(task, 'skip')
+                continue
+            if self._overwrite_allowed(task):
+                choice = 'overwrite'
+            else:
+                choice = self.ask_overwrite(task, task['dest_info'], self.conflicts.qsize())
+
+            if choice == 'cancel':
+                self.progress.cancelled = True
+                self._finish(task, 'skip')
+            elif choice in ('skip', 'skip_all'):
+                if choice == 'skip_all':
+                    self.skip_all = True
+                self._finish(task, 'skip')
+            else:
+                if choice == 'all':
+                    self.overwrite_all = True
+                elif choice == 'version_all':
+                    self.version_all = True
+                # 'version' - просто загружаем, S3 создаст новую версию
+                task['force'] = True
+                self.tasks.put(task)
+
+
 class SortDialog(urwid.WidgetWrap):
     """Диалог выбора режима сортировки"""
 
@@ -1712,11 +3361,17 @@ class PanelWidget(urwid.WidgetWrap):
         self.sort_mode = 'name' if panel_type == 'fs' else 'none'
         self.sort_reverse = False
 
-        self.walker = urwid.SimpleFocusListWalker([])
+        self.walker = ObjectListWalker(self._make_row_widget)
 
         # Поддержка ленивой загрузки
         self.loading_in_progress = False
         self.loading_thread = None
+        # Номер текущей загрузки: результаты предыдущих (ушли из префикса, F5) отбрасываются
+        self.load_generation = 0
+        # Фоновый подсчет объектов префикса (Event отмены текущего подсчета)
+        self.count_cancel = None
+        # Виджеты строк списка бакетов по имени (для фонового заполнения атрибутов)
+        self.bucket_widgets = {}
         self.lazy_generator = None
         self.listbox = urwid.ListBox(self.walker)
 
@@ -1770,7 +3425,7 @@ class PanelWidget(urwid.WidgetWrap):
         self.filter_mode = False
         self.frame.focus_position = 'body'
         self.frame.footer = None
-        self.refresh()
+        self._apply_filter()
 
     def show_filter_dialog(self):
         """Вызывается по нажатию клавиши '/' """
@@ -1784,7 +3439,7 @@ class PanelWidget(urwid.WidgetWrap):
                 self.filter_pattern = text
 
             # Перерисовываем панель с учетом нового фильтра
-            self.refresh()
+            self._apply_filter()
 
         # Если фильтр уже есть, показываем его в поле ввода
         default_text = self.filter_pattern if self.filter_pattern else ""
@@ -1813,8 +3468,7 @@ class PanelWidget(urwid.WidgetWrap):
 
             # Если нажата клавиша навигации и включен Preview Mode, обновляем
             if self.app.preview_mode and key in ('up', 'down', 'page up', 'page down', 'home', 'end'):
-                # Вызываем обновление с небольшой задержкой (debounce), чтобы не грузить при быстрой прокрутке
-                # Но для простоты можно сразу
+                # update_preview откладывает загрузку (debounce), чтобы не грузить при быстрой прокрутке
                 self.app.update_preview()
 
             return result
@@ -1841,8 +3495,8 @@ class PanelWidget(urwid.WidgetWrap):
             new_text = self.filter_edit.get_edit_text()
             if new_text != self.filter_pattern:
                 self.filter_pattern = new_text
-                # Вызываем refresh для обновления списка файлов с новым фильтром
-                self.refresh()
+                # Обновляем список файлов с новым фильтром (S3 - по таблице, без запросов)
+                self._apply_filter()
 
             return res
 
@@ -1895,6 +3549,8 @@ class PanelWidget(urwid.WidgetWrap):
 
         # 2. Очистка списка перед обновлением
         self.walker.clear()
+        # Подсчет объектов прежнего префикса больше не нужен (при необходимости перезапустится)
+        self._cancel_object_count()
 
         # Сброс фильтра при смене контекста? (Опционально)
         # self.filter_pattern = ""
@@ -1947,7 +3603,11 @@ class PanelWidget(urwid.WidgetWrap):
         title = "Info"
 
         try:
-            if self.mode == 'fs':
+            if item.get('type') in ('endpoint', 'root_endpoint') and item.get('config'):
+                title = f"Endpoint Info: {item['name']}"
+                info = self._get_endpoint_info(item['config'])
+
+            elif self.mode == 'fs':
                 path = item.get('path')  # Если есть полный путь
                 if not path:
                     # Пытаемся восстановить путь
@@ -2116,6 +3776,27 @@ class PanelWidget(urwid.WidgetWrap):
         except Exception as e:
             info['Error'] = str(e)
 
+        # Общий клиент endpoint'а: пул соединений и счетчики повторов
+        info['--- Connection ---'] = ''
+        info.update(self.s3_manager.connection_info())
+
+        return info
+
+    def _get_endpoint_info(self, endpoint_config):
+        """Информация об endpoint'е и его общем клиенте (если уже подключались)"""
+        info = OrderedDict()
+        info['Name'] = endpoint_config['name']
+        info['URL'] = endpoint_config['url']
+        info['Max parallel'] = endpoint_config.get('max_parallel')
+        info['Multipart'] = (f"threshold {endpoint_config.get('multipart_threshold_mb')} MB, "
+                             f"chunk {endpoint_config.get('multipart_chunk_mb')} MB, "
+                             f"{endpoint_config.get('transfer_concurrency')} thread(s)")
+        info['--- Connection ---'] = ''
+        connection = self.app.client_pool.describe(endpoint_config)
+        if connection is None:
+            info['Client'] = 'not connected yet'
+        else:
+            info.update(connection)
         return info
 
     def _get_s3_object_info(self, bucket, key, itype):
@@ -2344,10 +4025,6 @@ class PanelWidget(urwid.WidgetWrap):
 
                 total_bytes = item_to_copy['Size']
 
-                self.app.overwrite_all = False
-                self.app.version_all = False
-                self.app.skip_all = False
-
                 # Передаем restore_index и callback (on_complete)
                 self.app._do_copy_with_progress(
                     analyzed,
@@ -2403,52 +4080,8 @@ class PanelWidget(urwid.WidgetWrap):
 
     def _resort_current_view(self):
         """Пересортировать текущий вид без перезагрузки из сети"""
-        folders = []
-        files = []
-
-        # 1. Извлекаем данные из текущих виджетов walker
-        for widget in self.walker:
-            w = widget.original_widget if isinstance(widget, urwid.AttrMap) else widget
-            if isinstance(w, SelectableText):
-                data = w.data
-                dtype = data.get('type')
-
-                # FIX: Используем новые типы 's3_dir' и 's3_file'
-                if dtype == 's3_dir':
-                    folders.append({'Key': data['key']})
-                elif dtype == 's3_file':
-                    # Восстанавливаем структуру, которую ожидает _create_display_items
-                    files.append({
-                        'Key': data['key'],
-                        'Size': data.get('size', 0),
-                        'LastModified': data.get('mtime'),
-                        'version_count': data.get('version_count', 1)  # Сохраняем кол-во версий
-                    })
-
-        # 2. Очищаем walker, оставляя только навигацию
-        keep_count = 0
-        keep_types = ['to_root_menu', 'parent', 's3_parent', 's3_back']
-
-        for widget in self.walker:
-            w = widget.original_widget if isinstance(widget, urwid.AttrMap) else widget
-            if isinstance(w, SelectableText):
-                if w.data.get('type') in keep_types:
-                    keep_count += 1
-                else:
-                    break
-
-        del self.walker[keep_count:]
-
-        # 3. Пересоздаем виджеты с учетом новой сортировки
         # self.sort_mode уже был обновлен диалогом перед вызовом этого метода
-        items = self._create_display_items(folders, files, do_sort=True)
-
-        for item in items:
-            self.walker.append(item)
-
-        # 4. Обновляем экран
-        if self.app and hasattr(self.app, 'loop') and self.app.loop:
-            self.app.loop.draw_screen()
+        self._apply_table_view()
 
     # ОБНОВЛЕНИЕ S3 только при изменениях
     def mark_s3_for_refresh(self):
@@ -2543,13 +4176,16 @@ class PanelWidget(urwid.WidgetWrap):
             self.linebox.set_title(self.title)
 
     def set_focus_on_item(self, item_name):
-        for idx, widget in enumerate(self.walker):
+        for idx, widget in enumerate(self.walker.widgets):
             w = widget.original_widget
             if isinstance(w, SelectableText):
                 data = w.data
                 if data.get('name') == item_name or data.get('key', '').rstrip('/').split('/')[-1] == item_name:
                     self.listbox.set_focus(idx)
                     return
+        position = self.walker.find(lambda row: row.name == item_name)
+        if position is not None:
+            self.listbox.set_focus(position)
 
     def _refresh_root_menu(self):
         self.update_header('[Root Menu]')
@@ -2570,30 +4206,9 @@ class PanelWidget(urwid.WidgetWrap):
             self.walker.append(urwid.AttrMap(text, None, focus_map='selected'))
 
     def view_s3_file_version(self, file_data, version_data=None, close_callback=None):
-        """Просмотр S3 файла с указанной версией"""
-        version_id = version_data.get('VersionId') if version_data else None
-        filename = file_data['name']
-
-        if version_id:
-            self.app.show_result(f"Downloading {filename} (version {version_id[:8]})...")
-        else:
-            self.app.show_result(f"Downloading {filename}...")
-
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            tmppath = tmp.name
-
-            if self.s3_manager.download_object(
-                    self.current_bucket,
-                    file_data['key'],
-                    tmppath,
-                    version_id=version_id):
-                self._view_file(tmppath, filename, close_callback=close_callback)
-                try:
-                    os.unlink(tmppath)
-                except:
-                    pass
-            else:
-                self.app.show_result(f"Failed to download {filename}")
+        """Просмотр S3 файла с указанной версией (ranged GET, без скачивания целиком)"""
+        item = dict(file_data, type='s3_file')
+        self._view_file(item, file_data['name'], version_data=version_data, close_callback=close_callback)
 
     def show_version_select_dialog(self, file_data, refresh_on_exit=False):
         # Получаем актуальные версии
@@ -2715,133 +4330,162 @@ class PanelWidget(urwid.WidgetWrap):
             text = SelectableText(f'  {label}', data, self)
             self.walker.append(urwid.AttrMap(text, None, focus_map='selected'))
 
-    def _refresh_s3_objects_lazy(self):
-        """Ленивая загрузка объектов S3 с постепенным отображением"""
+    def _refresh_s3_objects_lazy(self, revalidate=False):
+        """
+        Ленивая загрузка объектов S3 с постепенным отображением.
+
+        revalidate=True: в панели уже показан листинг из кеша - загрузка идет молча,
+        а строки заменяются только если листинг в S3 изменился.
+        """
         prefix = self.current_prefix
 
         # ВАЖНО: Принудительная перерисовка
         if hasattr(self.app, 'loop') and self.app.loop:
             self.app.loop.draw_screen()
 
-        # Запускаем фоновую загрузку
-        if self.loading_thread and self.loading_thread.is_alive():
-            return
-
-        self.loading_in_progress = True
+        # Запускаем фоновую загрузку (предыдущая, если еще идет, будет проигнорирована)
+        self.load_generation += 1
+        self.loading_in_progress = not revalidate
         self.loading_thread = threading.Thread(
             target=self.load_s3_objects_background,
-            args=(self.current_bucket, prefix),
+            args=(self.current_bucket, prefix, self.load_generation, revalidate),
             daemon=True
         )
         self.loading_thread.start()
 
-    def load_s3_objects_background(self, bucket_name, prefix):
+    def load_s3_objects_background(self, bucket_name, prefix, generation, revalidate=False):
         """Фоновая загрузка объектов с обновлением статусной строки"""
+        def post(callback):
+            # Результат устаревшей загрузки в UI не попадает
+            self.app.loop.set_alarm_in(0, lambda l, u: generation == self.load_generation and callback())
+            self.app.wakeup()
+
         try:
             # Сразу показываем статус
-            self.app.loop.set_alarm_in(0, lambda l, u: self.app.show_result("Loading..."))
-            self.app.wakeup()
+            post(lambda: self.app.show_result("Revalidating cached listing..." if revalidate else "Loading..."))
 
             use_versioning = False
             if self.s3_manager:
                 status = self.s3_manager.get_versioning_status_cached(bucket_name)
                 use_versioning = status in ['Enabled', 'Suspended']
 
-            all_folders = []
-            all_files = []
+            total_items = 0
+            # Полный листинг для кеша (большие не кешируются - не копим их)
+            all_folders, all_files = [], []
+            all_rows = []
 
             for folders, files in self.s3_manager.list_objects_lazy(bucket_name, prefix, page_size=1000,
                                                                     use_versioning=use_versioning):
-                all_folders.extend(folders)
-                all_files.extend(files)
-
-                current_folders = list(all_folders)
-                current_files = list(all_files)
+                if generation != self.load_generation:
+                    return
+                # В UI уходит только новая страница, уже в виде строк таблицы
+                rows = self._rows_from_listing(folders, files)
+                total_items += len(rows)
+                if all_folders is not None:
+                    all_folders.extend(folders)
+                    all_files.extend(files)
+                    if total_items > PrefixTreeCache.LISTING_MAX_ROWS:
+                        all_folders = all_files = None
+
+                if revalidate:
+                    all_rows.extend(rows)
+                    continue
 
-                # Обновляем список файлов
-                self.app.loop.set_alarm_in(0, lambda l, u: self._update_display_incremental(current_folders,
-                                                                                            current_files))
+                post(lambda r=rows: self._update_display_incremental(bucket_name, prefix, r))
 
                 # Обновляем статусную строку: Желтый на синем (стиль 'result' в DualPaneApp)
-                count_msg = f"Loading... {len(all_folders) + len(all_files)} items"
-                self.app.loop.set_alarm_in(0, lambda l, u, msg=count_msg: self.app.show_result(msg))
-
-                self.app.wakeup()
+                count_msg = f"Loading... {total_items} items"
+                post(lambda msg=count_msg: self.app.show_result(msg))
+
+            list_error = self.s3_manager.last_list_error
+            if list_error:
+                raise Exception(list_error)
+
+            if revalidate:
+                cached = self.s3_manager.get_cached_listing(bucket_name, prefix)
+                unchanged = cached is not None and all_folders is not None and \
+                    self._listing_fingerprint(cached[0], cached[1]) == self._listing_fingerprint(all_folders, all_files)
+                if unchanged:
+                    self.s3_manager.touch_listing(bucket_name, prefix)
+                    post(lambda: self.app.show_result("Listing is up to date"))
+                    return
+                post(lambda: self._replace_rows(bucket_name, prefix, all_rows))
+            else:
+                # Финальное обновление
+                post(lambda: self._finalize_loading(bucket_name, prefix))
 
-            # Финальное обновление
-            self.app.loop.set_alarm_in(0, lambda l, u: self._finalize_loading(all_folders, all_files))
-            self.app.wakeup()
+            if all_folders is not None:
+                self.s3_manager.store_listing(bucket_name, prefix, all_folders, all_files)
 
         except Exception as e:
             error_msg = str(e)
-            self.app.loop.set_alarm_in(0, lambda l, u, err=error_msg:
-            self.app.show_result(f"Error loading objects: {err}", is_error=True))
-            self.app.wakeup()
+            post(lambda: self.app.show_result(f"Error loading objects: {error_msg}", is_error=True))
         finally:
-            self.loading_in_progress = False
+            if generation == self.load_generation:
+                self.loading_in_progress = False
+
+    @staticmethod
+    def _listing_fingerprint(folders, files):
+        """Сравнение листингов по ключам, ETag, LastModified и размеру (без учета порядка страниц)"""
+        return (sorted(f['Key'] for f in folders),
+                sorted((f['Key'], f.get('ETag'), f.get('LastModified'), f.get('Size', 0), f.get('version_count', 1))
+                       for f in files))
+
+    def _replace_rows(self, bucket_name, prefix, rows):
+        """Заменить показанный (кешированный) листинг свежим, сохранив фокус по имени"""
+        if self.current_bucket != bucket_name or self.current_prefix != prefix:
+            return
+        focused = None
+        try:
+            focused = self.walker.row_at(self.listbox.focus_position)
+        except Exception:
+            pass
 
-    def _update_display_incremental(self, folders, files):
-        """Инкрементальное обновление (без виджета loading в списке)"""
-        # Создаем элементы (без сортировки для скорости во время загрузки)
-        # Сортировка будет применена только в конце, в finalize
-        items = self._create_display_items(folders, files, do_sort=False)
+        self.walker.set_rows(rows)
+        self._apply_table_view()
+        if focused is not None:
+            position = self.walker.find(lambda row: row.name == focused.name)
+            if position is not None:
+                self.listbox.set_focus(position)
 
-        # Сохраняем навигацию ([..])
-        keep_count = 0
-        keep_types = ['to_root_menu', 'parent', 's3_parent', 's3_back']
+        folders_count = sum(1 for row in rows if row.is_dir)
+        self.app.show_result(f"Listing changed: {folders_count} folders, {len(rows) - folders_count} files")
 
-        for widget in self.walker:
-            w = widget.original_widget if isinstance(widget, urwid.AttrMap) else widget
-            if isinstance(w, SelectableText):
-                if w.data.get('type') in keep_types:
-                    keep_count += 1
-                else:
-                    break
+    def _update_display_incremental(self, bucket_name, prefix, rows):
+        """Инкрементальное обновление: строки страницы дописываются в таблицу, виджеты не создаются"""
+        if self.current_bucket != bucket_name or self.current_prefix != prefix:
+            return  # страница от префикса, который уже покинули
 
-        # Заменяем старые файлы новыми
-        del self.walker[keep_count:]
-        for item_widget in items:
-            self.walker.append(item_widget)
+        first_page = not self.walker.rows
+        # Без сортировки во время загрузки; сортировка применяется в finalize
+        self.walker.extend_rows(rows, accept=self._row_visible)
 
-        # Восстанавливаем фокус
-        if len(self.walker) > 0:
+        if first_page and len(self.walker) > 0:
             try:
                 # Фокус на первый элемент после [..]
-                focus_pos = min(keep_count, len(self.walker) - 1)
-                # Если курсор уже был ниже, пытаемся сохранить позицию (опционально, но сложно при инкременте)
-                self.listbox.set_focus(focus_pos)
+                self.listbox.set_focus(min(len(self.walker.widgets), len(self.walker) - 1))
             except:
                 pass
 
         if self.app and hasattr(self.app, 'loop') and self.app.loop:
             self.app.loop.draw_screen()
 
-    def _finalize_loading(self, folders, files):
-        """Завершение загрузки"""
+    def _finalize_loading(self, bucket_name, prefix, note=''):
+        """Завершение загрузки (note - пометка в статусе, например про кеш)"""
         self.loading_in_progress = False
+        if self.current_bucket != bucket_name or self.current_prefix != prefix:
+            return
 
-        # Финальная перестройка списка. 
+        # Финальная перестройка вида.
         # Если sort_mode задан (например 'size'), здесь произойдет сортировка.
         if self.sort_mode != 'none':
-            items = self._create_display_items(folders, files, do_sort=True)
-
-            keep_count = 0
-            keep_types = ['to_root_menu', 'parent', 's3_parent', 's3_back']
-            for widget in self.walker:
-                w = widget.original_widget if isinstance(widget, urwid.AttrMap) else widget
-                if isinstance(w, SelectableText):
-                    if w.data.get('type') in keep_types:
-                        keep_count += 1
-                    else:
-                        break
-
-            del self.walker[keep_count:]
-            for item_widget in items:
-                self.walker.append(item_widget)
+            self._apply_table_view()
 
         # Обновляем статусную строку финальным сообщением
+        folders_count = sum(1 for row in self.walker.rows if row.is_dir)
+        files_count = len(self.walker.rows) - folders_count
         sort_info = f"(sorted by {self.sort_mode})" if self.sort_mode != 'none' else "(unsorted)"
-        msg = f"Loaded: {len(folders)} folders, {len(files)} files {sort_info}"
+        msg = f"Loaded: {folders_count} folders, {files_count} files {sort_info}{note}"
         self.app.show_result(msg)
 
         if len(self.walker) > 0:
@@ -2852,15 +4496,11 @@ class PanelWidget(urwid.WidgetWrap):
                 target_name = getattr(self, '_pending_focus_name', None)
 
                 if target_name:
-                    for i, widget in enumerate(self.walker):
-                        w = widget.original_widget if isinstance(widget, urwid.AttrMap) else widget
-                        if isinstance(w, SelectableText):
-                            # Проверяем совпадение имени.
-                            # У папок S3 имя может быть без слэша в данных, но с ним в Key
-                            if w.data.get('name') == target_name:
-                                self.listbox.set_focus(i)
-                                focus_set = True
-                                break
+                    # У папок S3 имя в таблице без слэша, но с ним в Key
+                    position = self.walker.find(lambda row: row.name == target_name)
+                    if position is not None:
+                        self.listbox.set_focus(position)
+                        focus_set = True
                     # Сбрасываем pending name
                     self._pending_focus_name = None
 
@@ -2886,119 +4526,114 @@ class PanelWidget(urwid.WidgetWrap):
         if self.app and hasattr(self.app, 'loop') and self.app.loop:
             self.app.loop.draw_screen()
 
-    def _create_display_items(self, folders, files, do_sort=True):
-        """Создать виджеты для отображения папок и файлов S3"""
-        items = []
-        combined = []
-
-        # Проверяем статус версионирования ОДИН РАЗ для бакета
-        # (Оставляем для передачи в свойства файла, если понадобится логике, но не для отображения)
-        versioning_enabled_bucket = False
-        if self.current_bucket and self.s3_manager:
-            vs = self.s3_manager.get_versioning_status_cached(self.current_bucket)
-            versioning_enabled_bucket = vs in ['Enabled', 'Suspended']
-
-        # Подготовка списка папок
+    def _rows_from_listing(self, folders, files):
+        """Преобразовать страницу листинга S3 в строки таблицы объектов"""
+        rows = []
         for folder in folders:
             key = folder['Key']
-            folder_name = key.rstrip('/').split('/')[-1]
-            combined.append({
-                'type': 's3_dir',
-                'name': folder_name,
-                'key': key,
-                'size': 0,
-                'mtime': None
-            })
-
-        # Подготовка списка файлов
+            rows.append(S3Row(True, key.rstrip('/').split('/')[-1], key, 0, None, None, 1))
         for file in files:
             key = file['Key']
-            file_name = key.split('/')[-1]
-
-            # Получаем количество версий (если оно было подсчитано в list_objects_lazy)
-            v_count = file.get('version_count', 1)
-
-            combined.append({
-                'type': 's3_file',
-                'name': file_name,
-                'key': key,
-                'size': file.get('Size', 0),
-                'mtime': file.get('LastModified'),
-                'version_count': v_count,
-                'versioning_enabled': versioning_enabled_bucket
-            })
-
-        # --- НАЧАЛО БЛОКА ФИЛЬТРАЦИИ ---
-        if self.filter_pattern:
-            filtered_combined = []
-            pattern_lower = self.filter_pattern.lower()
+            rows.append(S3Row(False, key.split('/')[-1], key, file.get('Size', 0), file.get('LastModified'),
+                              file.get('ETag'), file.get('version_count', 1)))
+        return rows
 
-            for item in combined:
-                # Всегда оставляем ссылку на уровень выше (если она будет в списке как папка)
-                if item['name'] == '..':
-                    filtered_combined.append(item)
-                    continue
+    def _row_visible(self, row):
+        """Фильтр по вхождению строки (case-insensitive)"""
+        if not self.filter_pattern:
+            return True
+        return self.filter_pattern.lower() in row.name.lower()
+
+    def _sort_row_indices(self, indices):
+        """Сортировка индексов таблицы по правилам sort_items (папки сверху)"""
+        rows = self.walker.rows
+        if self.sort_mode == 'none':
+            return indices
 
-                # Фильтруем по вхождению строки (case-insensitive)
-                if pattern_lower in item['name'].lower():
-                    filtered_combined.append(item)
+        dirs = [i for i in indices if rows[i].is_dir]
+        files = [i for i in indices if not rows[i].is_dir]
+
+        key_func = None
+        reverse_files = self.sort_reverse
+        if self.sort_mode == 'name':
+            key_func = lambda i: rows[i].name.lower()
+        elif self.sort_mode == 'ext':
+            key_func = lambda i: rows[i].name.rsplit('.', 1)[1].lower() if '.' in rows[i].name else ''
+        elif self.sort_mode == 'size':
+            key_func = lambda i: rows[i].size
+            reverse_files = not self.sort_reverse  # как в sort_items: по умолчанию большие сверху
+        elif self.sort_mode == 'time':
+            key_func = lambda i: rows[i].mtime or datetime.min
+            reverse_files = not self.sort_reverse
 
-            combined = filtered_combined
+        dirs.sort(key=lambda i: rows[i].name.lower(), reverse=self.sort_reverse)
+        if key_func:
+            files.sort(key=key_func, reverse=reverse_files)
+        return dirs + files
 
+    def _apply_table_view(self):
+        """Перестроить вид таблицы объектов (фильтр + сортировка) без запросов к S3"""
+        rows = self.walker.rows
+        if self.filter_pattern:
+            pattern_lower = self.filter_pattern.lower()
+            view = [i for i, row in enumerate(rows) if pattern_lower in row.name.lower()]
             # Обновляем заголовок, чтобы было видно, что фильтр работает
-            # (Опционально, если у вас есть метод update_header)
             self.update_header(f" [FILTER: {self.filter_pattern}]")
-        # --- КОНЕЦ БЛОКА ФИЛЬТРАЦИИ ---
-
-        # Сортировка
-        if do_sort and self.sort_mode != 'none':
-            combined = self.sort_items(combined)
-
-        # Создание виджетов
-        for item in combined:
-            if item['type'] == 's3_dir':
-                label = f"/{item['name']}"
-                data = {
-                    'type': 's3_dir',
-                    'name': item['name'],
-                    'key': item['key'],
-                    'can_select': False
-                }
-                attr = None
-            else:
-                size_str = self.fs_browser.format_size(item['size']) if hasattr(self.fs_browser,
-                                                                                'format_size') else format_size(
-                    item['size'])
-                time_str = item['mtime'].strftime('%Y-%m-%d %H:%M') if item['mtime'] else ''
-
-                # Логика отображения версий: ПОКАЗЫВАТЬ ТОЛЬКО ЕСЛИ > 1
-                v_count = item.get('version_count', 1)
-                if v_count > 1:
-                    version_hint = f' [{v_count}]'
-                else:
-                    version_hint = ''  # [v] больше не отображается
-
-                # label = f" {item['name']:50} {size_str:>10} {time_str}{version_hint}"
-                name = item["name"]
-                # Если имя длиннее 40, берем 39 символов и добавляем '>', иначе оставляем как есть
-                display_name = name if len(name) <= 50 else name[:49] + ">"
-                label = f" {display_name:50} {size_str:>10} {time_str}{version_hint}"
-
-                data = {
-                    'type': 's3_file',
-                    'name': item['name'],
-                    'key': item['key'],
-                    'size': item['size'],
-                    'mtime': item['mtime'],
-                    'can_select': True,
-                    'version_count': v_count  # Сохраняем кол-во версий в объекте
-                }
-                attr = 'file'
+        else:
+            view = list(range(len(rows)))
+            self.update_header(f'[S3 Mode - {self.current_endpoint}] Sort: {self.sort_mode}')
+        self.walker.set_view(self._sort_row_indices(view))
 
-            text = SelectableText(f'  {label}', data, self)
-            items.append(urwid.AttrMap(text, attr, focus_map='selected'))
+        if self.app and hasattr(self.app, 'loop') and self.app.loop:
+            self.app.loop.draw_screen()
+
+    def _apply_filter(self):
+        """Применить изменившийся фильтр: для объектов S3 - по таблице, иначе перечитать панель"""
+        if self.mode == 's3' and self.current_bucket:
+            self._apply_table_view()
+        else:
+            self.refresh()
+
+    def _row_data(self, row):
+        """Данные элемента панели для строки таблицы (как у SelectableText.data)"""
+        if row.is_dir:
+            return {
+                'type': 's3_dir',
+                'name': row.name,
+                'key': row.key,
+                'can_select': False
+            }
+        return {
+            'type': 's3_file',
+            'name': row.name,
+            'key': row.key,
+            'size': row.size,
+            'mtime': row.mtime,
+            'etag': row.etag,
+            'can_select': True,
+            'version_count': row.version_count  # Сохраняем кол-во версий в объекте
+        }
+
+    def _make_row_widget(self, row, selected=False):
+        """Создать виджет строки таблицы (вызывается walker'ом только для видимых позиций)"""
+        if row.is_dir:
+            label = f"/{row.name}"
+            attr = None
+        else:
+            size_str = format_size(row.size)
+            time_str = row.mtime.strftime('%Y-%m-%d %H:%M') if row.mtime else ''
+
+            # Логика отображения версий: ПОКАЗЫВАТЬ ТОЛЬКО ЕСЛИ > 1
+            version_hint = f' [{row.version_count}]' if row.version_count > 1 else ''
+
+            # Если имя длиннее 50, берем 49 символов и добавляем '>', иначе оставляем как есть
+            display_name = row.name if len(row.name) <= 50 else row.name[:49] + ">"
+            label = f" {display_name:50} {size_str:>10} {time_str}{version_hint}"
+            attr = 'file'
 
-        return items
+        text = SelectableText(f'{"* " if selected else "  "}{label}', self._row_data(row), self)
+        text.selected = selected
+        return urwid.AttrMap(text, attr, focus_map='selected')
 
     def _refresh_s3(self):
         if self.current_bucket is None:
@@ -3020,62 +4655,61 @@ class PanelWidget(urwid.WidgetWrap):
                     f'Cannot connect to {self.current_endpoint}: {self.s3_manager.connection_error[:80]}')
                 return
 
+            # Список показываем сразу по кешу; версионирование, квоты и подсчеты
+            # догружаются пулом в фоне (_start_bucket_enrichment)
             bucket_items = []
+            stale = []
             for bucket in buckets:
-                # Получаем статус версионирования для каждого бакета
-                versioning_status = self.s3_manager.get_versioning_status(bucket['Name'])
-                if versioning_status == 'Enabled':
-                    versioning_mark = '[V]'
-                elif versioning_status == 'Suspended':
-                    versioning_mark = '[S]'
-                else:
-                    versioning_mark = '   '
+                cached_count = self.s3_manager.get_cached_count(bucket['Name'], '')
+                cached_info = self.s3_manager.get_cached_bucket_info(bucket['Name'])
+                if cached_info is None or not cached_info[1] or cached_count is None or not cached_count[2]:
+                    stale.append(bucket['Name'])
 
                 bucket_items.append({
                     'name': bucket['Name'],
                     'type': 'bucket',
                     'CreationDate': bucket.get('CreationDate'),
                     'mtime': bucket.get('CreationDate'),
-                    'size': 0,
-                    'versioning': versioning_status,
-                    'versioning_mark': versioning_mark,
+                    'size': cached_count[1] if cached_count else 0,
                     'can_select': True
                 })
 
             bucket_items = self.sort_items(bucket_items)
 
+            self.bucket_widgets = {}
             for bucket in bucket_items:
-                creation_date = bucket.get('CreationDate')
-                date_str = creation_date.strftime('%Y-%m-%d %H:%M:%S') if creation_date else ' ' * 19
-
-                # label = f'[BUCKET] {bucket["name"]:40} {date_str}'
-                label = f'*{bucket["name"]:40} {date_str} {bucket["versioning_mark"]}'
-
                 data = {'type': 'bucket', 'name': bucket['name'], 'can_select': True}
-                text = SelectableText(f'  {label}', data, self)
+                text = SelectableText(f'  {self._bucket_label(bucket["name"], bucket["CreationDate"])}', data, self)
+                text.creation_date = bucket['CreationDate']
+                self.bucket_widgets[bucket['name']] = text
                 self.walker.append(urwid.AttrMap(text, None, focus_map='selected'))
+
+            if stale:
+                self._start_bucket_enrichment(stale)
         else:
-            # 1. Сначала считаем объекты (это быстро, т.к. данные берутся из cache или HEAD запроса)
-            total_count, total_size = self.s3_manager.count_objects(self.current_bucket, self.current_prefix)
+            # 1. Подсчет объектов берем только из кеша, листинг его не ждет.
+            # Если в кеше нет свежего значения - считаем в фоне (_start_object_count)
+            cached = self.s3_manager.get_cached_count(self.current_bucket, self.current_prefix)
 
             # 2. Логика сброса сортировки:
             # Если объектов много (>1000), принудительно отключаем сортировку для скорости
-            if total_count is not None and total_count > 1000:
+            if cached is not None and cached[0] > 1000:
                 self.sort_mode = 'none'
             # Иначе - оставляем тот режим, который выбрал пользователь (например, 'size')
 
             self.update_header(f'[S3 Mode - {self.current_endpoint}] Sort: {self.sort_mode}')
 
-            # Формируем путь в заголовке
-            display_prefix = self.current_prefix
-            # if self.current_prefix else '/'
-
-            if total_count is not None:
-                count_info = f' [{total_count} objects, {format_size(total_size)}]'
+            if cached is not None:
+                total_count, total_size, fresh = cached
+                # устаревшее значение показываем как приблизительное до конца пересчета
+                mark = '' if fresh else '~'
+                self._set_s3_path_text(f' [{mark}{total_count} objects, {mark}{format_size(total_size)}]')
             else:
-                count_info = ''
+                fresh = False
+                self._set_s3_path_text('')
 
-            self.path_text.set_text(f'S3: /{self.current_endpoint}/{self.current_bucket}/{display_prefix}{count_info}')
+            if not fresh:
+                self._start_object_count(self.current_bucket, self.current_prefix)
 
             # 3. Добавляем навигационные кнопки
             data = {'type': 'parent', 'can_select': False}
@@ -3086,12 +4720,178 @@ class PanelWidget(urwid.WidgetWrap):
                 data = {'type': 's3_back', 'can_select': False}
                 text = SelectableText(' [..] Back to buckets', data, self)
 
-            self.walker.append(urwid.AttrMap(text, None, focus_map='selected'))
+            self.walker.append(urwid.AttrMap(text, None, focus_map='selected'))
+
+            # 4. Листинг из кеша показываем сразу; устаревший перепроверяем в фоне
+            listing = self.s3_manager.get_cached_listing(self.current_bucket, self.current_prefix)
+            if listing is not None:
+                folders, files, fresh = listing
+                self.load_generation += 1  # незавершенная загрузка прошлого префикса больше не нужна
+                self.walker.extend_rows(self._rows_from_listing(folders, files), accept=self._row_visible)
+                self._finalize_loading(self.current_bucket, self.current_prefix,
+                                       note=' [cached]' if fresh else ' [cached, revalidating]')
+                if fresh:
+                    return
+
+            # 5. ЗАПУСКАЕМ ЛЕНИВУЮ ЗАГРУЗКУ
+            self._refresh_s3_objects_lazy(revalidate=listing is not None)
+
+            return  # Выход - остальное в фоновом потоке
+
+    def _bucket_label(self, name, creation_date):
+        """Строка бакета: имя, дата, версионирование, объекты/размер и заполнение квоты (из кеша)"""
+        date_str = creation_date.strftime('%Y-%m-%d %H:%M:%S') if creation_date else ' ' * 19
+
+        cached_info = self.s3_manager.get_cached_bucket_info(name)
+        info = cached_info[0] if cached_info else {}
+        versioning_status = info.get('versioning')
+        if cached_info is None:
+            versioning_mark = ' ? '  # еще не получено
+        elif versioning_status == 'Enabled':
+            versioning_mark = '[V]'
+        elif versioning_status == 'Suspended':
+            versioning_mark = '[S]'
+        else:
+            versioning_mark = '   '
+
+        cached_count = self.s3_manager.get_cached_count(name, '')
+        if cached_count is not None:
+            count, size, fresh = cached_count
+            # устаревшее значение показываем как приблизительное
+            mark = '' if fresh else '~'
+            usage = f'{mark:1}{count:>8} {mark:1}{format_size(size):>8}'
+        else:
+            count = size = 0
+            usage = ' ' * 19
+
+        quota = ''
+        if info.get('quota_size', -1) > 0:
+            quota = f' {size * 100 // info["quota_size"]}% of {format_size(info["quota_size"])}'
+        elif info.get('quota_objects', -1) > 0:
+            quota = f' {count * 100 // info["quota_objects"]}% of {info["quota_objects"]} obj'
+
+        return f'*{name:40} {date_str} {versioning_mark} {usage}{quota}'
+
+    def _start_bucket_enrichment(self, names):
+        """
+        Фоновое заполнение атрибутов бакетов пулом (не больше max_parallel запросов).
+
+        Сначала для всех бакетов - дешевые запросы (версионирование, квоты; с Admin API
+        и подсчеты). Подсчет объектов полным листингом, если Admin API нет, идет второй
+        фазой и меньшим пулом: большие бакеты не задерживают отметки остальных.
+        """
+        self._cancel_object_count()
+        cancel = threading.Event()
+        self.count_cancel = cancel
+        s3_manager = self.s3_manager
+        endpoint = self.current_endpoint
+        done = [0]
+
+        def visible():
+            # Панель могла уйти из списка бакетов, пока шли запросы
+            return not cancel.is_set() and self.mode == 's3' and self.current_endpoint == endpoint \
+                and self.current_bucket is None
+
+        def show(name, info_done=False):
+            if not visible():
+                return
+            text = self.bucket_widgets.get(name)
+            if text is not None:
+                text.set_text(f'  {self._bucket_label(name, text.creation_date)}')
+                self.update_item_display(text)
+            if info_done:
+                done[0] += 1
+                if done[0] == len(names):
+                    self.app.show_result(f'Bucket info updated: {len(names)} bucket(s)')
+
+        def notify(message):
+            if visible():
+                self.app.show_result(message)
+
+        def in_ui(callback, *args):
+            self.app.loop.set_alarm_in(0, lambda l, u: callback(*args))
+            self.app.wakeup()
+
+        def enrich(name, stats):
+            if cancel.is_set():
+                return
+            s3_manager.fetch_bucket_info(name, stats)
+            in_ui(show, name, True)
 
-            # 4. ЗАПУСКАЕМ ЛЕНИВУЮ ЗАГРУЗКУ
-            self._refresh_s3_objects_lazy()
+        def count(name):
+            if cancel.is_set():
+                return
+            if s3_manager.refresh_bucket_count(name, should_stop=cancel.is_set):
+                in_ui(show, name)
+
+        def enrich_thread():
+            stats = s3_manager.get_bucket_stats()
+            with ThreadPoolExecutor(max_workers=max(1, min(s3_manager.max_parallel, len(names)))) as executor:
+                for name in names:
+                    executor.submit(enrich, name, stats)
+            if stats is not None or cancel.is_set():
+                return
 
-            return  # Выход - остальное в фоновом потоке
+            # Admin API нет - подсчет листингом, после атрибутов и меньшим пулом
+            to_count = [name for name in names
+                        if not (s3_manager.get_cached_count(name, '') or (0, 0, False))[2]]
+            if not to_count:
+                return
+            in_ui(notify, f'Counting objects: {len(to_count)} bucket(s)...')
+            workers = max(1, min(s3_manager.max_parallel // 4, len(to_count)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for name in to_count:
+                    executor.submit(count, name)
+            if not cancel.is_set():
+                in_ui(notify, f'Object counts updated: {len(to_count)} bucket(s)')
+
+        self.app.show_result(f'Loading bucket info: {len(names)} bucket(s)...')
+        threading.Thread(target=enrich_thread, daemon=True).start()
+
+    def _set_s3_path_text(self, count_info):
+        self.path_text.set_text(f'S3: /{self.current_endpoint}/{self.current_bucket}/{self.current_prefix}{count_info}')
+
+    def _cancel_object_count(self):
+        if self.count_cancel is not None:
+            self.count_cancel.set()
+            self.count_cancel = None
+
+    def _start_object_count(self, bucket_name, prefix):
+        """Фоновый подсчет объектов префикса с показом промежуточных итогов"""
+        self._cancel_object_count()
+        cancel = threading.Event()
+        self.count_cancel = cancel
+        s3_manager = self.s3_manager
+
+        def show(count, size, done):
+            # Панель могла уйти в другой префикс, пока шел подсчет
+            if cancel.is_set() or self.mode != 's3' or self.current_bucket != bucket_name \
+                    or self.current_prefix != prefix:
+                return
+            if done:
+                self._set_s3_path_text(f' [{count} objects, {format_size(size)}]')
+            else:
+                self._set_s3_path_text(f' [counting... {count} objects, {format_size(size)}]')
+
+        def count_thread():
+            result = (0, 0)
+            last_shown = 0
+            try:
+                for result in s3_manager.iter_count_objects(bucket_name, prefix, should_stop=cancel.is_set):
+                    now = time.time()
+                    if now - last_shown >= 0.5:
+                        last_shown = now
+                        self.app.loop.set_alarm_in(0, lambda l, u, r=result: show(r[0], r[1], False))
+                        self.app.wakeup()
+            except (ClientError, Exception):
+                return
+            if cancel.is_set():
+                return
+            s3_manager.store_count(bucket_name, prefix, *result)
+            self.app.loop.set_alarm_in(0, lambda l, u: show(result[0], result[1], True))
+            self.app.wakeup()
+
+        threading.Thread(target=count_thread, daemon=True).start()
 
     def _refresh_fs(self):
         self.update_header(f'[FS Mode] Sort: {self.sort_mode}')
@@ -3199,7 +4999,8 @@ class PanelWidget(urwid.WidgetWrap):
             self.mode = 's3'
             self.current_endpoint = data['name']
             endpoint_config = data['config']
-            self.s3_manager = S3Manager(endpoint_config)
+            self.s3_manager = S3Manager(endpoint_config, prefix_cache=self.app.prefix_cache,
+                                        client_pool=self.app.client_pool, copy_state=self.app.copy_state)
             self.current_bucket = None
             self.current_prefix = ''
             # FIX: Для S3 отключаем сортировку по умолчанию (грузим как есть)
@@ -3209,7 +5010,8 @@ class PanelWidget(urwid.WidgetWrap):
         elif item_type == 'endpoint':
             self.current_endpoint = data['name']
             endpoint_config = data['config']
-            self.s3_manager = S3Manager(endpoint_config)
+            self.s3_manager = S3Manager(endpoint_config, prefix_cache=self.app.prefix_cache,
+                                        client_pool=self.app.client_pool, copy_state=self.app.copy_state)
             self.current_bucket = None
             self.current_prefix = ''
             self.sort_mode = 'none'  # FIX: То же самое для прямого выбора эндпоинта
@@ -3309,7 +5111,7 @@ class PanelWidget(urwid.WidgetWrap):
             regex = re.compile(regex_pattern, re.IGNORECASE)
             count = 0
 
-            for widget in self.walker:
+            for widget in self.walker.widgets:
                 w = widget.original_widget
                 if isinstance(w, SelectableText) and w.data.get('can_select'):
                     item_type = w.data.get('type')
@@ -3320,6 +5122,13 @@ class PanelWidget(urwid.WidgetWrap):
                             self.update_item_display(w)
                             count += 1
 
+            # Объекты S3 выбираются в таблице, виджеты видимых строк пересоздаются
+            for row in self.walker.visible_rows():
+                if not row.is_dir and regex.match(row.name):
+                    self.walker.set_selected(row.key, select)
+                    count += 1
+            self.walker.refresh_rows()
+
             action = 'Selected' if select else 'Unselected'
             self.app.show_result(f'{action} {count} files')
         except re.error:
@@ -3328,7 +5137,7 @@ class PanelWidget(urwid.WidgetWrap):
     def invert_selection(self):
         """Инвертировать выбор (только файлы)"""
         count = 0
-        for widget in self.walker:
+        for widget in self.walker.widgets:
             w = widget.original_widget
             if isinstance(w, SelectableText) and w.data.get('can_select'):
                 item_type = w.data.get('type')
@@ -3338,6 +5147,14 @@ class PanelWidget(urwid.WidgetWrap):
                     if w.selected:
                         count += 1
 
+        for row in self.walker.visible_rows():
+            if not row.is_dir:
+                selected = row.key not in self.walker.selected
+                self.walker.set_selected(row.key, selected)
+                if selected:
+                    count += 1
+        self.walker.refresh_rows()
+
         self.app.show_result(f'Selected {count} files')
 
     def update_item_display(self, text_widget):
@@ -3345,13 +5162,20 @@ class PanelWidget(urwid.WidgetWrap):
             text_widget.set_text('* ' + text_widget.get_text()[0][2:])
         else:
             text_widget.set_text('  ' + text_widget.get_text()[0][2:])
+        # Строки таблицы объектов: выбор хранится в walker (виджет может быть пересоздан)
+        if text_widget.data.get('type') == 's3_file':
+            self.walker.set_selected(text_widget.data['key'], text_widget.selected)
 
     def get_selected_items(self):
         selected = []
-        for widget in self.walker:
+        for widget in self.walker.widgets:
             w = widget.original_widget
             if isinstance(w, SelectableText) and w.selected:
                 selected.append(w.data)
+        if self.walker.selected:
+            for row in self.walker.visible_rows():
+                if row.key in self.walker.selected:
+                    selected.append(self._row_data(row))
         return selected
 
     def get_focused_item(self):
@@ -3382,8 +5206,7 @@ class PanelWidget(urwid.WidgetWrap):
         item_type = focused['type']
 
         if item_type == 'fs_file':
-            file_path = os.path.join(self.fs_browser.current_path, focused['name'])
-            self._view_file(file_path, focused['name'])
+            self._view_file(focused, focused['name'])
 
         elif item_type == 's3_file':
             # Проверяем количество версий
@@ -3397,45 +5220,60 @@ class PanelWidget(urwid.WidgetWrap):
         elif item_type in ('fs_dir', 's3_dir', 'bucket'):
             self._calculate_size(focused)
 
-    def _view_file(self, file_path, title, close_callback=None):
-        try:
-            content = ""
-
-            # Проверяем на бинарность
-            if is_binary_file(file_path):
-                # Читаем в бинарном режиме для HEX просмотра
-                try:
-                    file_size = os.path.getsize(file_path)
-                    content = f"[Binary file: {title}]\nFile size: {file_size} bytes\n\n"
-
-                    # Читаем начало файла (например, первые 4KB для просмотра)
-                    read_limit = 4096
-                    with open(file_path, 'rb') as f:
-                        data = f.read(read_limit)
-                        content += self.app.format_hex_content(data)
-
-                    if file_size > read_limit:
-                        content += "\n\n[... Binary content truncated ...]"
+    def _item_reader(self, item, version_data=None):
+        """
+        Функция чтения диапазона файла панели: read(offset, length) -> bytes.
 
-                except Exception as e:
-                    content = f"Error reading binary file: {str(e)}"
-            else:
-                # Текстовый режим (как было)
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                        content = f.read(50000)
-                        if len(content) == 50000:
-                            content += "\n\n[... File truncated ...]"
-                except Exception as e:
-                    content = f"Error reading file: {str(e)}"
+        Возвращает (read, size). Для S3 используются ranged GET с кешем блоков
+        в S3Manager, ключ которого учитывает версию и ETag.
+        """
+        if item['type'] == 'fs_file':
+            file_path = os.path.join(self.fs_browser.current_path, item['name'])
+
+            def read(offset, length):
+                with open(file_path, 'rb') as f:
+                    f.seek(offset)
+                    return f.read(length)
+
+            return read, os.path.getsize(file_path)
+
+        bucket_name = self.current_bucket
+        key = item['key']
+        s3_manager = self.s3_manager
+        if version_data:
+            version_id = version_data.get('VersionId')
+            size = version_data.get('Size', 0)
+            etag = version_data.get('ETag')
+        else:
+            version_id = None
+            size = item.get('size')
+            etag = item.get('etag')
+            if size is None:
+                info = s3_manager.object_exists(bucket_name, key) or {}
+                size = info.get('Size', 0)
+
+        def read(offset, length):
+            data = s3_manager.read_range(bucket_name, key, offset, length, version_id=version_id, etag=etag)
+            if data is None:
+                raise IOError(s3_manager.connection_error or 'read failed')
+            return data
+
+        return read, int(size or 0)
+
+    def _view_file(self, item, title, version_data=None, close_callback=None):
+        """Открыть постраничный просмотр: данные читаются диапазонами при прокрутке"""
+        try:
+            read, size = self._item_reader(item, version_data)
+            # Бинарность определяем по первому килобайту, как is_binary_file
+            binary = is_binary_data(read(0, min(1024, size))) if size else False
 
             def on_viewer_close():
                 self.app.close_dialog()
                 if close_callback:
                     close_callback()
 
-            # Используем моноширинный шрифт (обычно по умолчанию в терминале)
-            viewer = FileViewerDialog(f'View: {title}', content, on_viewer_close)
+            viewer = PagedViewerDialog(f'View: {title}', size, read, on_viewer_close,
+                                       binary=binary, hex_formatter=self.app.format_hex_content)
             self.app.show_dialog(viewer, height=('relative', 80))
 
         except Exception as e:
@@ -3456,15 +5294,14 @@ class PanelWidget(urwid.WidgetWrap):
                     file_count = len(files)
                     total_size = sum(f['size'] for f in files)
 
-                elif item_type == 's3_dir':
-                    objects = self.s3_manager.list_all_objects(self.current_bucket, item['key'])
-                    file_count = len(objects)
-                    total_size = sum(obj.get('Size', 0) for obj in objects)
-
-                elif item_type == 'bucket':
-                    objects = self.s3_manager.list_all_objects(item['name'], '')
-                    file_count = len(objects)
-                    total_size = sum(obj.get('Size', 0) for obj in objects)
+                elif item_type in ('s3_dir', 'bucket'):
+                    if item_type == 's3_dir':
+                        bucket_name, prefix = self.current_bucket, item['key']
+                    else:
+                        bucket_name, prefix = item['name'], ''
+                    for objects in self.s3_manager.iter_all_objects_parallel(bucket_name, prefix):
+                        file_count += len(objects)
+                        total_size += sum(obj.get('Size', 0) for obj in objects)
 
                 self.app.loop.draw_screen()
                 result_msg = f'Size: {format_size(total_size)} ({file_count} files)'
@@ -3638,10 +5475,21 @@ class DualPaneApp:
     def __init__(self, s3_config):
         self.s3_config = s3_config
         self.bookmarks_manager = BookmarksManager()  # <--- Инициализация
+        # Кеш листингов и подсчетов по префиксам (с --cache-db переживает перезапуск)
+        # Общие boto3-клиенты по endpoint'ам (пул соединений, повторы, счетчики)
+        self.client_pool = S3ClientPool()
+        # Незавершенные multipart-копирования для докачки (переживают перезапуск)
+        self.copy_state = MultipartCopyState()
+        self.prefix_cache = PrefixTreeCache(filepath=getattr(s3_config.args, 'cache_db', None),
+                                            listing_ttl=getattr(s3_config.args, 'listing_ttl', None) or 60,
+                                            count_ttl=getattr(s3_config.args, 'count_ttl', None) or 600)
 
         self.preview_mode = False
         self.preview_cache = {} # Кеш для версий S3 {key: [versions]}
         self.preview_version_index = 0
+        # Debounce превью: при быстрой прокрутке загружается только последний файл
+        self.preview_alarm = None
+        self.preview_generation = 0
 
         self.left_panel = PanelWidget('', panel_type='root_menu', s3_config=s3_config, app=self)
         self.right_panel = PanelWidget('', panel_type='root_menu', s3_config=s3_config, app=self)
@@ -3700,10 +5548,9 @@ class DualPaneApp:
             ('info_value', 'white', 'dark blue'),
         ]
 
-        # Переменная для режима "перезаписать все"
-        self.overwrite_all = False
-        self.version_all = False
-        self.skip_all = False
+        # Число воркеров копирования/перемещения (режимы "перезаписать все" и т.п.
+        # хранятся в TransferScheduler отдельно для каждой операции)
+        self.transfer_workers = getattr(s3_config.args, 'workers', None) or 8
         if platform.system() != 'Windows':
             self.pipe_r, self.pipe_w = os.pipe()
             self.use_pipe = True
@@ -3778,83 +5625,65 @@ class DualPaneApp:
             inactive = self.get_inactive_panel()
             inactive.refresh()  # Восстановит список файлов
 
+    PREVIEW_DEBOUNCE = 0.15  # сек. без движения курсора до загрузки превью
+    PREVIEW_HEX_BYTES = 2048
+    PREVIEW_TEXT_BYTES = 8192  # ~2000 символов даже для многобайтного UTF-8
+
     def update_preview(self):
+        """Запланировать обновление превью; повторные вызовы при прокрутке откладывают загрузку"""
         if not self.preview_mode:
             return
 
+        if self.preview_alarm is not None:
+            self.loop.remove_alarm(self.preview_alarm)
+        self.preview_generation += 1
+        generation = self.preview_generation
+        self.preview_alarm = self.loop.set_alarm_in(self.PREVIEW_DEBOUNCE,
+                                                    lambda l, u: self._load_preview(generation))
+
+    def _load_preview(self, generation):
+        """Прочитать начало файла в фоне (ranged GET для S3) и показать в неактивной панели"""
+        self.preview_alarm = None
+        if not self.preview_mode or generation != self.preview_generation:
+            return
+
         active_panel = self.get_active_panel()
         inactive_panel = self.get_inactive_panel()
 
         item = active_panel.get_focused_item()
         if not item:
             return
-        if not item or item['type'] not in ('fs_file', 's3_file'):
+        if item['type'] not in ('fs_file', 's3_file'):
             self._show_preview_text(inactive_panel, "", title="Preview")
             return
 
-        try:
-            size = int(item.get('size', 0))
-        except:
-            size = 0
-
-        if size > 1024 * 100:
-            self._show_preview_text(inactive_panel, "File too large for preview", title="Preview")
-            return
-
-        content = ""
-        info_text = f"PREVIEW: {item['name']}"
-        local_path = None
-        temp_file_path = None
+        info_text = f"PREVIEW: {item['name']}" if item['type'] == 'fs_file' else f"PREVIEW (S3): {item['name']}"
+        self._show_preview_text(inactive_panel, "Loading...", title=info_text)
 
-        try:
-            # 1. Получаем путь к файлу
-            if item['type'] == 'fs_file':
-                local_path = os.path.join(active_panel.fs_browser.current_path, item['name'])
-
-            elif item['type'] == 's3_file':
-                import tempfile
-                # Создаем временный файл
-                fd, temp_file_path = tempfile.mkstemp()
-                os.close(fd)
-
-                active_panel.s3_manager.download_object(
-                    active_panel.current_bucket,
-                    item['key'],
-                    temp_file_path
-                )
-                local_path = temp_file_path
-                info_text = f"PREVIEW (S3): {item['name']}"
-
-            # 2. Читаем контент
-            if local_path and os.path.exists(local_path):
-                # Проверяем на бинарность (функция глобальная или метода класса)
-                if is_binary_file(local_path):
-                    with open(local_path, 'rb') as f:
-                        data = f.read(2048)
-                        # ВЫЗОВ ФУНКЦИИ ФОРМАТИРОВАНИЯ
-                        # Если format_hex_content это метод класса DualPaneApp:
-                        content = self.format_hex_content(data)
-
-                        if size > 2048:
-                            content += "\n... Truncated ..."
-                    info_text += " [HEX]"
+        def load():
+            title = info_text
+            try:
+                read, size = active_panel._item_reader(item)
+                data = read(0, min(size, max(self.PREVIEW_HEX_BYTES, self.PREVIEW_TEXT_BYTES)))
+                if is_binary_data(data[:1024]):
+                    content = self.format_hex_content(data[:self.PREVIEW_HEX_BYTES])
+                    if size > self.PREVIEW_HEX_BYTES:
+                        content += "\n... Truncated ..."
+                    title += " [HEX]"
                 else:
-                    # Текстовый режим
-                    with open(local_path, 'r', encoding='utf-8', errors='replace') as f:
-                        content = f.read(2000)
+                    content = data.decode('utf-8', errors='replace')[:2000]
+            except Exception as e:
+                content = f"Error generating preview: {e}"
 
-        except Exception as e:
-            content = f"Error generating preview: {e}"
+            def show(l, u):
+                # Курсор мог уйти дальше, пока шло чтение - старый результат не показываем
+                if self.preview_mode and generation == self.preview_generation:
+                    self._show_preview_text(inactive_panel, content, title=title)
 
-        finally:
-            # Удаляем временный файл
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
+            self.loop.set_alarm_in(0, show)
+            self.wakeup()
 
-        self._show_preview_text(inactive_panel, content, title=info_text)
+        threading.Thread(target=load, daemon=True).start()
 
     def format_hex_content(self, data, offset=0):
         """Форматирует байты в hex-вид (как в mc)"""
@@ -4030,7 +5859,8 @@ class DualPaneApp:
                 panel.current_endpoint = bm_data['endpoint']
                 panel.endpoint_config = ep_config
                 # Инициализируем менеджер, если сменился эндпоинт
-                panel.s3_manager = S3Manager(ep_config)
+                panel.s3_manager = S3Manager(ep_config, prefix_cache=self.prefix_cache,
+                                             client_pool=self.client_pool, copy_state=self.copy_state)
 
                 panel.current_bucket = bm_data.get('bucket')
                 panel.current_prefix = bm_data.get('prefix', '')
@@ -4325,20 +6155,50 @@ class DualPaneApp:
                 total_bytes += item.get('size', 0)
 
             elif item_type == 's3_dir':
-                all_objects = source_panel.s3_manager.list_all_objects(source_panel.current_bucket, item['key'])
+                # Листинг идет в фоне и продолжается, пока открыт диалог и идет операция
+                all_objects = S3ObjectStream(source_panel.s3_manager, source_panel.current_bucket, item['key'])
                 analyzed.append({'type': 's3_dir', 'item': item, 'files': all_objects})
-                # items_info.append(f"[DIR ] {item['name']} ({len(all_objects)} objects)")
-                items_info.append(f"/{item['name']} ({len(all_objects)} objects)")
-                total_bytes += sum(obj.get('Size', 0) for obj in all_objects)
+                items_info.append(None)
 
             elif item_type == 'bucket':
-                all_objects = source_panel.s3_manager.list_all_objects(item['name'], '')
+                all_objects = S3ObjectStream(source_panel.s3_manager, item['name'], '')
                 analyzed.append({'type': 'bucket', 'item': item, 'files': all_objects})
-                items_info.append(f"*{item['name']} ({len(all_objects)} objects)")
-                total_bytes += sum(obj.get('Size', 0) for obj in all_objects)
+                items_info.append(None)
+
+        # Небольшие деревья успевают пролиститься целиком - для них показываем точные итоги
+        deadline = time.time() + 1.0
+        for idx, item_data in enumerate(analyzed):
+            stream = item_data['files']
+            if not isinstance(stream, S3ObjectStream):
+                continue
+            done = stream.wait(max(0.0, deadline - time.time()))
+            count = f"{len(stream)} objects" if done else f"{len(stream)}+ objects, listing..."
+            mark = '*' if item_data['type'] == 'bucket' else '/'
+            items_info[idx] = f"{mark}{item_data['item']['name']} ({count})"
+            item_data['listed_bytes'] = stream.total_size
+            total_bytes += item_data['listed_bytes']
 
         return analyzed, items_info, total_bytes
 
+    def _cancel_listings(self, analyzed):
+        """Остановить фоновые листинги, если операция не будет выполнена"""
+        for item_data in analyzed:
+            if isinstance(item_data['files'], S3ObjectStream):
+                item_data['files'].cancel()
+
+    @staticmethod
+    def _listing_errors_str(analyzed):
+        """Текст для итогового сообщения, если листинг какого-то элемента упал ('' - ошибок нет)"""
+        errors = [(a['item']['name'], a['files'].error) for a in analyzed
+                  if isinstance(a['files'], S3ObjectStream) and a['files'].error]
+        if not errors:
+            return ''
+        name, error = errors[0]
+        message = f' | {name}: {error}'
+        if len(errors) > 1:
+            message += f' (+{len(errors) - 1} more)'
+        return message
+
     def copy_items(self):
         source_panel = self.get_active_panel()
         dest_panel = self.get_inactive_panel()
@@ -4439,6 +6299,7 @@ class DualPaneApp:
         def callback(confirmed, target_name):
             self.close_dialog()
             if not confirmed:
+                self._cancel_listings(analyzed)
                 return
 
             if not target_name:
@@ -4447,20 +6308,16 @@ class DualPaneApp:
             current_item = source_panel.get_focused_item()
             focus_name = current_item.get('name') if current_item else None
 
-            # Сброс флага "перезаписать все"
-            self.overwrite_all = False
-            self.version_all = False
-            self.skip_all = False
-
             self._do_copy_with_progress(analyzed, source_panel, dest_panel, target_name, focus_name, is_move=is_move,
                                         total_bytes=total_bytes, restore_index=restore_index)
 
         dialog = CopyMoveDialog(operation, source_desc, dest_path, callback)
         self.show_dialog(dialog)
 
-    def _check_overwrite(self, filename, source_info, dest_info, callback, is_s3_dest=False):
+    def _check_overwrite(self, filename, source_info, dest_info, callback, is_s3_dest=False, pending=0):
         """Показать диалог подтверждения перезаписи"""
-        dialog = OverwriteDialog(filename, source_info, dest_info, callback, show_version_options=is_s3_dest)
+        dialog = OverwriteDialog(filename, source_info, dest_info, callback, show_version_options=is_s3_dest,
+                                 pending=pending)
         self.show_dialog(dialog)
 
     def _do_copy_with_progress(self, analyzed, source_panel, dest_panel, target_name, focus_name, is_move=False,
@@ -4485,725 +6342,85 @@ class DualPaneApp:
         operation = 'Moving' if is_move else 'Copying'
         progress = ProgressDialog(f'{operation} files...', callback=self.close_dialog)
         progress.set_total(total_files, total_bytes)
+        progress.attach_streams(analyzed)
         self.show_dialog(progress)
 
-        items_to_delete = []
-        user_choice = {'value': None}
-        choice_event = threading.Event()
+        def ask_overwrite(task, dest_info, pending):
+            """Показать диалог перезаписи из потока-резолвера и дождаться ответа"""
+            user_choice = {'value': 'cancel'}
+            choice_event = threading.Event()
+
+            def show_overwrite_dialog():
+                def on_choice(choice):
+                    user_choice['value'] = choice
+                    self.close_dialog()
+                    self.show_dialog(progress)
+                    choice_event.set()
+
+                try:
+                    source_info = task['source_info']()
+                except Exception:
+                    source_info = {}
+                self._check_overwrite(task['label'], source_info, dest_info, on_choice,
+                                      is_s3_dest=task['s3_dest'], pending=pending)
+
+            self.loop.set_alarm_in(0, lambda *args: show_overwrite_dialog())
+            self.wakeup()
+            choice_event.wait()
+            return user_choice['value']
+
+        scheduler = TransferScheduler(self.transfer_workers, progress, ask_overwrite)
+
+        # Для перемещения: по каждому элементу считаем задачи, источник удаляется
+        # только если все его файлы скопированы успешно (пропуск тоже блокирует удаление)
+        groups = []
+        groups_lock = threading.Lock()
+
+        def make_done(group):
+            def done(status):
+                with groups_lock:
+                    if status == 'ok':
+                        group['ok'] += 1
+                    else:
+                        group['failed'] = True
+            return done
 
         def copy_thread():
+            scheduler.start()
+            single = len(analyzed) == 1
             for item_data in analyzed:
                 if progress.cancelled:
                     break
 
-                item_type = item_data['type']
-                item = item_data['item']
-
-                # FS файл -> S3
-                if item_type == 'fs_file' and dest_panel.mode == 's3' and dest_panel.current_bucket:
-                    source_path = os.path.join(source_panel.fs_browser.current_path, item['name'])
-
-                    if len(analyzed) == 1:
-                        dest_key = target_name if target_name else item['name']
-                    else:
-                        if target_name:
-                            dest_key = target_name.rstrip('/') + '/' + item['name']
-                        else:
-                            dest_key = item['name']
-
-                    # Проверка существования
-                    if not self.overwrite_all and not self.version_all and not self.skip_all:
-                        existing = dest_panel.s3_manager.object_exists(dest_panel.current_bucket, dest_key)
-                        if existing:
-                            source_info = {
-                            }
-                            dest_info = {
-                                'size': existing.get('Size', 0),
-                                'mtime': existing.get('LastModified')
-                            }
-
-                            def show_overwrite_dialog():
-                                def on_choice(choice):
-                                    user_choice['value'] = choice
-                                    choice_event.set()
-                                    self.close_dialog()
-                                    self.show_dialog(progress)
-
-                                self._check_overwrite(item['name'], source_info, dest_info, on_choice, is_s3_dest=True)
-
-                            self.loop.set_alarm_in(0, lambda *args: show_overwrite_dialog())
-                            choice_event.wait()
-                            choice_event.clear()
-
-                            if user_choice['value'] == 'cancel':
-                                progress.cancelled = True
-                                break
-                            elif user_choice['value'] == 'all':
-                                self.overwrite_all = True
-                            elif user_choice['value'] == 'version_all':
-                                self.version_all = True
-                            elif user_choice['value'] == 'skip':
-                                progress.update(item['name'], 0)
-                                continue
-                            elif user_choice['value'] == 'skip_all':
-                                self.skip_all = True
-                                progress.update(item['name'], 0)
-                                continue
-                            elif user_choice['value'] == 'version':
-                                pass  # Просто загружаем, S3 создаст версию
-
-                    if self.skip_all:
-                        progress.update(item['name'], 0)
-                        continue
-
-                    file_size = item.get('size', 0)
-                    progress.update(item['name'], file_size)
-                    self.loop.draw_screen()
-
-                    if dest_panel.s3_manager.upload_file(source_path, dest_panel.current_bucket, dest_key):
-                        progress.add_success()
-                        if is_move:
-                            items_to_delete.append(item_data)
-                    else:
-                        progress.add_failure()
-
-                # FS директория -> S3
-                elif item_type == 'fs_dir' and dest_panel.mode == 's3' and dest_panel.current_bucket:
-                    all_success = True
-                    for file_info in item_data['files']:
-                        if progress.cancelled:
-                            break
-
-                        if len(analyzed) == 1:
-                            if target_name:
-                                dest_key = target_name.rstrip('/') + '/' + file_info['rel_path'].replace(os.sep, '/')
-                            else:
-                                dest_key = file_info['rel_path'].replace(os.sep, '/')
-                        else:
-                            if target_name:
-                                dest_key = target_name.rstrip('/') + '/' + item['name'] + '/' + file_info[
-                                    'rel_path'].replace(os.sep, '/')
-                            else:
-                                dest_key = item['name'] + '/' + file_info['rel_path'].replace(os.sep, '/')
-
-                        # Проверка существования для файлов в директории
-                        if not self.overwrite_all and not self.version_all and not self.skip_all:
-                            existing = dest_panel.s3_manager.object_exists(dest_panel.current_bucket, dest_key)
-                            if existing:
-                                try:
-                                    stat = os.stat(file_info['path'])
-                                    source_info = {
-                                        'size': stat.st_size,
-                                        'mtime': datetime.fromtimestamp(stat.st_mtime)
-                                    }
-                                    dest_info = {
-                                        'size': existing.get('Size', 0),
-                                        'mtime': existing.get('LastModified')
-                                    }
-
-                                    def show_overwrite_dialog():
-                                        def on_choice(choice):
-                                            user_choice['value'] = choice
-                                            choice_event.set()
-                                            self.close_dialog()
-                                            self.show_dialog(progress)
-
-                                        self._check_overwrite(file_info['rel_path'], source_info, dest_info, on_choice,
-                                                              is_s3_dest=True)
-
-                                    self.loop.set_alarm_in(0, lambda *args: show_overwrite_dialog())
-                                    choice_event.wait()
-                                    choice_event.clear()
-
-                                    if user_choice['value'] == 'cancel':
-                                        progress.cancelled = True
-                                        break
-                                    elif user_choice['value'] == 'all':
-                                        self.overwrite_all = True
-                                    elif user_choice['value'] == 'version_all':
-                                        self.version_all = True
-                                    elif user_choice['value'] == 'skip':
-                                        progress.update(file_info['rel_path'], 0)
-                                        continue
-                                    elif user_choice['value'] == 'skip_all':
-                                        self.skip_all = True
-                                        progress.update(file_info['rel_path'], 0)
-                                        continue
-                                except:
-                                    pass
-
-                        if self.skip_all:
-                            progress.update(file_info['rel_path'], 0)
-                            continue
-
-                        file_size = file_info.get('size', 0)
-                        progress.update(file_info['rel_path'], file_size)
-                        self.loop.draw_screen()
-
-                        if dest_panel.s3_manager.upload_file(file_info['path'], dest_panel.current_bucket, dest_key):
-                            progress.add_success()
-                        else:
-                            progress.add_failure()
-                            all_success = False
-
-                    if all_success and is_move:
-                        items_to_delete.append(item_data)
-
-                # S3 файл -> FS
-                elif item_type == 's3_file' and dest_panel.mode == 'fs':
-                    if len(analyzed) == 1:
-                        if os.path.isabs(target_name):
-                            dest_path = target_name
-                        else:
-                            dest_path = os.path.join(dest_panel.fs_browser.current_path, target_name)
-                    else:
-                        if target_name:
-                            base_dir = os.path.join(dest_panel.fs_browser.current_path, target_name)
-                        else:
-                            base_dir = dest_panel.fs_browser.current_path
-                        os.makedirs(base_dir, exist_ok=True)
-                        dest_path = os.path.join(base_dir, item['name'])
-
-                    # Проверка существования
-                    if not self.overwrite_all and not self.skip_all:
-                        if os.path.exists(dest_path):
-                            source_info = {
-                                'size': item.get('size', 0),
-                                'mtime': item.get('mtime')
-                                # 'size': item['size'],
-                                # 'mtime': item['mtime']
-                            }
-                            existing_stat = os.stat(dest_path)
-                            dest_info = {
-                                'size': existing_stat.st_size,
-                                'mtime': datetime.fromtimestamp(existing_stat.st_mtime)
-                            }
-
-                            def show_overwrite_dialog():
-                                def on_choice(choice):
-                                    user_choice['value'] = choice
-                                    choice_event.set()
-                                    self.close_dialog()
-                                    self.show_dialog(progress)
-
-                                self._check_overwrite(item['name'], source_info, dest_info, on_choice, is_s3_dest=False)
-
-                            self.loop.set_alarm_in(0, lambda *args: show_overwrite_dialog())
-                            choice_event.wait()
-                            choice_event.clear()
-
-                            if user_choice['value'] == 'cancel':
-                                progress.cancelled = True
-                                break
-                            elif user_choice['value'] == 'all':
-                                self.overwrite_all = True
-                            elif user_choice['value'] == 'skip':
-                                progress.update(item['name'], 0)
-                                continue
-                            elif user_choice['value'] == 'skip_all':
-                                self.skip_all = True
-                                progress.update(item['name'], 0)
-                                continue
-
-                    if self.skip_all:
-                        progress.update(item['name'], 0)
-                        continue
-
-                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-
-                    file_size = item.get('size', 0)
-                    progress.update(item['name'], file_size)
-                    self.loop.draw_screen()
-
-                    if source_panel.s3_manager.download_object(source_panel.current_bucket, item['key'], dest_path,
-                                                               version_id=item.get('VersionId')):
-                        progress.add_success()
-                        if is_move:
-                            items_to_delete.append(item_data)
-                    else:
-                        progress.add_failure()
-
-                # S3 директория -> FS
-                elif item_type == 's3_dir' and dest_panel.mode == 'fs':
-                    all_success = True
-                    for obj in item_data['files']:
-                        if progress.cancelled:
-                            break
-
-                        rel_key = obj['Key'][len(item['key']):]
-
-                        if len(analyzed) == 1:
-                            if target_name:
-                                dest_path = os.path.join(dest_panel.fs_browser.current_path, target_name,
-                                                         rel_key.replace('/', os.sep))
-                            else:
-                                dest_path = os.path.join(dest_panel.fs_browser.current_path,
-                                                         rel_key.replace('/', os.sep))
-                        else:
-                            if target_name:
-                                dest_path = os.path.join(dest_panel.fs_browser.current_path, target_name, item['name'],
-                                                         rel_key.replace('/', os.sep))
-                            else:
-                                dest_path = os.path.join(dest_panel.fs_browser.current_path, item['name'],
-                                                         rel_key.replace('/', os.sep))
-
-                        # Проверка существования
-                        if not self.overwrite_all and not self.skip_all:
-                            if os.path.exists(dest_path):
-                                source_info = {
-                                    'size': obj.get('Size', 0),
-                                    'mtime': obj.get('LastModified', datetime.now())
-                                }
-                                existing_stat = os.stat(dest_path)
-                                dest_info = {
-                                    'size': existing_stat.st_size,
-                                    'mtime': datetime.fromtimestamp(existing_stat.st_mtime)
-                                }
-
-                                def show_overwrite_dialog():
-                                    def on_choice(choice):
-                                        user_choice['value'] = choice
-                                        choice_event.set()
-                                        self.close_dialog()
-                                        self.show_dialog(progress)
-
-                                    self._check_overwrite(rel_key, source_info, dest_info, on_choice, is_s3_dest=False)
-
-                                self.loop.set_alarm_in(0, lambda *args: show_overwrite_dialog())
-                                choice_event.wait()
-                                choice_event.clear()
-
-                                if user_choice['value'] == 'cancel':
-                                    progress.cancelled = True
-                                    break
-                                elif user_choice['value'] == 'all':
-                                    self.overwrite_all = True
-                                elif user_choice['value'] == 'skip':
-                                    progress.update(rel_key, 0)
-                                    continue
-                                elif user_choice['value'] == 'skip_all':
-                                    self.skip_all = True
-                                    progress.update(rel_key, 0)
-                                    continue
-
-                        if self.skip_all:
-                            progress.update(rel_key, 0)
-                            continue
-
-                        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-
-                        file_size = obj.get('Size', 0)
-                        progress.update(rel_key, file_size)
-                        self.loop.draw_screen()
-
-                        if source_panel.s3_manager.download_object(source_panel.current_bucket, obj['Key'], dest_path):
-                            progress.add_success()
-                        else:
-                            progress.add_failure()
-                            all_success = False
-
-                    if all_success and is_move:
-                        items_to_delete.append(item_data)
-
-                # S3 файл -> S3
-                elif item_type == 's3_file' and dest_panel.mode == 's3' and dest_panel.current_bucket:
-                    if len(analyzed) == 1:
-                        dest_key = target_name if target_name else item['name']
-                    else:
-                        if target_name:
-                            dest_key = target_name.rstrip('/') + '/' + item['name']
-                        else:
-                            dest_key = item['name']
-
-                    # Проверка существования
-                    if not self.overwrite_all and not self.version_all and not self.skip_all:
-                        existing = dest_panel.s3_manager.object_exists(dest_panel.current_bucket, dest_key)
-                        if existing:
-                            source_info = {
-                                'size': item.get('size', 0),
-                                'mtime': item.get('mtime', datetime.now())
-                            }
-                            dest_info = {
-                                'size': existing.get('Size', 0),
-                                'mtime': existing.get('LastModified')
-                            }
-
-                            def show_overwrite_dialog():
-                                def on_choice(choice):
-                                    user_choice['value'] = choice
-                                    choice_event.set()
-                                    self.close_dialog()
-                                    self.show_dialog(progress)
-
-                                self._check_overwrite(item['name'], source_info, dest_info, on_choice, is_s3_dest=True)
-
-                            self.loop.set_alarm_in(0, lambda *args: show_overwrite_dialog())
-                            choice_event.wait()
-                            choice_event.clear()
-
-                            if user_choice['value'] == 'cancel':
-                                progress.cancelled = True
-                                break
-                            elif user_choice['value'] == 'all':
-                                self.overwrite_all = True
-                            elif user_choice['value'] == 'version_all':
-                                self.version_all = True
-                            elif user_choice['value'] == 'skip':
-                                progress.update(item['name'], 0)
-                                continue
-                            elif user_choice['value'] == 'skip_all':
-                                self.skip_all = True
-                                progress.update(item['name'], 0)
-                                continue
-
-                    if self.skip_all:
-                        progress.update(item['name'], 0)
+                group = {'item_data': item_data, 'total': 0, 'ok': 0, 'failed': False, 'planned': False}
+                groups.append(group)
+                try:
+                    tasks = self._plan_copy_tasks(item_data, single, source_panel, dest_panel, target_name)
+                    if tasks is None:
+                        # такое направление копирования не поддерживается
+                        group['failed'] = True
                         continue
-
-                    file_size = item.get('size', 0)
-                    progress.update(item['name'], file_size)
-                    self.loop.draw_screen()
-
-                    if source_panel.s3_manager.copy_object(
-                            source_panel.current_bucket,
-                            item['key'],
-                            dest_panel.current_bucket,
-                            dest_key,
-                            version_id=item.get('VersionId')
-                    ):
-                        progress.add_success()
-                        if is_move:
-                            items_to_delete.append(item_data)
-                    else:
-                        progress.add_failure()
-
-                # S3 директория -> S3
-                elif item_type == 's3_dir' and dest_panel.mode == 's3' and dest_panel.current_bucket:
-                    all_success = True
-                    for obj in item_data['files']:
+                    for task in tasks:
                         if progress.cancelled:
                             break
-
-                        rel_key = obj['Key'][len(item['key']):]
-
-                        if len(analyzed) == 1:
-                            if target_name:
-                                dest_key = target_name.rstrip('/') + '/' + rel_key
-                            else:
-                                dest_key = rel_key
-                        else:
-                            if target_name:
-                                dest_key = target_name.rstrip('/') + '/' + item['name'] + '/' + rel_key
-                            else:
-                                dest_key = item['name'] + '/' + rel_key
-
-                        # Проверка существования
-                        if not self.overwrite_all and not self.version_all and not self.skip_all:
-                            existing = dest_panel.s3_manager.object_exists(dest_panel.current_bucket, dest_key)
-                            if existing:
-                                source_info = {
-                                    'size': obj.get('Size', 0),
-                                    'mtime': obj.get('LastModified', datetime.now())
-                                }
-                                dest_info = {
-                                    'size': existing.get('Size', 0),
-                                    'mtime': existing.get('LastModified')
-                                }
-
-                                def show_overwrite_dialog():
-                                    def on_choice(choice):
-                                        user_choice['value'] = choice
-                                        choice_event.set()
-                                        self.close_dialog()
-                                        self.show_dialog(progress)
-
-                                    self._check_overwrite(rel_key, source_info, dest_info, on_choice, is_s3_dest=True)
-
-                                self.loop.set_alarm_in(0, lambda *args: show_overwrite_dialog())
-                                choice_event.wait()
-                                choice_event.clear()
-
-                                if user_choice['value'] == 'cancel':
-                                    progress.cancelled = True
-                                    break
-                                elif user_choice['value'] == 'all':
-                                    self.overwrite_all = True
-                                elif user_choice['value'] == 'version_all':
-                                    self.version_all = True
-                                elif user_choice['value'] == 'skip':
-                                    progress.update(rel_key, 0)
-                                    continue
-                                elif user_choice['value'] == 'skip_all':
-                                    self.skip_all = True
-                                    progress.update(rel_key, 0)
-                                    continue
-
-                        if self.skip_all:
-                            progress.update(rel_key, 0)
-                            continue
-
-                        file_size = obj.get('Size', 0)
-                        progress.update(rel_key, file_size)
-                        self.loop.draw_screen()
-
-                        if source_panel.s3_manager.copy_object(
-                                source_panel.current_bucket,
-                                obj['Key'],
-                                dest_panel.current_bucket,
-                                dest_key
-                        ):
-                            progress.add_success()
-                        else:
-                            progress.add_failure()
-                            all_success = False
-
-                    if all_success and is_move:
-                        items_to_delete.append(item_data)
-
-                # FS файл -> FS
-                elif item_type == 'fs_file' and dest_panel.mode == 'fs':
-                    source_path = os.path.join(source_panel.fs_browser.current_path, item['name'])
-
-                    if len(analyzed) == 1:
-                        if os.path.isabs(target_name):
-                            dest_path = target_name
-                        else:
-                            dest_path = os.path.join(dest_panel.fs_browser.current_path, target_name)
-                    else:
-                        if target_name:
-                            base_dir = os.path.join(dest_panel.fs_browser.current_path, target_name)
-                        else:
-                            base_dir = dest_panel.fs_browser.current_path
-                        os.makedirs(base_dir, exist_ok=True)
-                        dest_path = os.path.join(base_dir, item['name'])
-
-                    # Проверка существования
-                    if not self.overwrite_all and not self.skip_all:
-                        if os.path.exists(dest_path):
-                            source_info = {
-                                'size': item.get('size', 0),
-                                'mtime': item.get('mtime')
-                            }
-                            existing_stat = os.stat(dest_path)
-                            dest_info = {
-                                'size': existing_stat.st_size,
-                                'mtime': datetime.fromtimestamp(existing_stat.st_mtime)
-                            }
-
-                            def show_overwrite_dialog():
-                                def on_choice(choice):
-                                    user_choice['value'] = choice
-                                    choice_event.set()
-                                    self.close_dialog()
-                                    self.show_dialog(progress)
-
-                                self._check_overwrite(item['name'], source_info, dest_info, on_choice, is_s3_dest=False)
-
-                            self.loop.set_alarm_in(0, lambda *args: show_overwrite_dialog())
-                            choice_event.wait()
-                            choice_event.clear()
-
-                            if user_choice['value'] == 'cancel':
-                                progress.cancelled = True
-                                break
-                            elif user_choice['value'] == 'all':
-                                self.overwrite_all = True
-                            elif user_choice['value'] == 'skip':
-                                progress.update(item['name'], 0)
-                                continue
-                            elif user_choice['value'] == 'skip_all':
-                                self.skip_all = True
-                                progress.update(item['name'], 0)
-                                continue
-
-                    if self.skip_all:
-                        progress.update(item['name'], 0)
-                        continue
-
-                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-
-                    file_size = item.get('size', 0)
-                    progress.update(item['name'], file_size)
-                    self.loop.draw_screen()
-
-                    try:
-                        shutil.copy2(source_path, dest_path)
-                        progress.add_success()
-                        if is_move:
-                            items_to_delete.append(item_data)
-                    except (IOError, OSError):
-                        progress.add_failure()
-
-                # FS директория -> FS
-                elif item_type == 'fs_dir' and dest_panel.mode == 'fs':
-                    source_dir = os.path.join(source_panel.fs_browser.current_path, item['name'])
-
-                    if len(analyzed) == 1:
-                        if target_name:
-                            dest_dir = os.path.join(dest_panel.fs_browser.current_path, target_name)
-                        else:
-                            dest_dir = os.path.join(dest_panel.fs_browser.current_path, item['name'])
+                        task['done'] = make_done(group)
+                        with groups_lock:
+                            group['total'] += 1
+                        scheduler.submit(task)
                     else:
-                        if target_name:
-                            dest_dir = os.path.join(dest_panel.fs_browser.current_path, target_name, item['name'])
-                        else:
-                            dest_dir = os.path.join(dest_panel.fs_browser.current_path, item['name'])
-
-                    all_success = True
-                    for file_info in item_data['files']:
-                        if progress.cancelled:
-                            break
-
-                        dest_path = os.path.join(dest_dir, file_info['rel_path'])
-
-                        # Проверка существования
-                        if not self.overwrite_all and not self.skip_all:
-                            if os.path.exists(dest_path):
-                                try:
-                                    stat = os.stat(file_info['path'])
-                                    source_info = {
-                                        'size': stat.st_size,
-                                        'mtime': datetime.fromtimestamp(stat.st_mtime)
-                                    }
-                                    existing_stat = os.stat(dest_path)
-                                    dest_info = {
-                                        'size': existing_stat.st_size,
-                                        'mtime': datetime.fromtimestamp(existing_stat.st_mtime)
-                                    }
-
-                                    def show_overwrite_dialog():
-                                        def on_choice(choice):
-                                            user_choice['value'] = choice
-                                            choice_event.set()
-                                            self.close_dialog()
-                                            self.show_dialog(progress)
-
-                                        self._check_overwrite(file_info['rel_path'], source_info, dest_info, on_choice,
-                                                              is_s3_dest=False)
-
-                                    self.loop.set_alarm_in(0, lambda *args: show_overwrite_dialog())
-                                    choice_event.wait()
-                                    choice_event.clear()
-
-                                    if user_choice['value'] == 'cancel':
-                                        progress.cancelled = True
-                                        break
-                                    elif user_choice['value'] == 'all':
-                                        self.overwrite_all = True
-                                    elif user_choice['value'] == 'skip':
-                                        progress.update(file_info['rel_path'], 0)
-                                        continue
-                                    elif user_choice['value'] == 'skip_all':
-                                        self.skip_all = True
-                                        progress.update(file_info['rel_path'], 0)
-                                        continue
-                                except:
-                                    pass
-
-                        if self.skip_all:
-                            progress.update(file_info['rel_path'], 0)
-                            continue
-
-                        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-
-                        file_size = file_info.get('size', 0)
-                        progress.update(file_info['rel_path'], file_size)
-                        self.loop.draw_screen()
-
-                        try:
-                            shutil.copy2(file_info['path'], dest_path)
-                            progress.add_success()
-                        except (IOError, OSError):
-                            progress.add_failure()
-                            all_success = False
-
-                    if all_success and is_move:
-                        items_to_delete.append(item_data)
-
-                # Бакет -> S3
-                elif item_type == 'bucket' and dest_panel.mode == 's3' and dest_panel.current_bucket:
-                    all_success = True
-                    for obj in item_data['files']:
-                        if progress.cancelled:
-                            break
-
-                        if len(analyzed) == 1:
-                            if target_name:
-                                dest_key = target_name.rstrip('/') + '/' + obj['Key']
-                            else:
-                                dest_key = obj['Key']
-                        else:
-                            if target_name:
-                                dest_key = target_name.rstrip('/') + '/' + item['name'] + '/' + obj['Key']
-                            else:
-                                dest_key = item['name'] + '/' + obj['Key']
-
-                        # Проверка существования
-                        if not self.overwrite_all and not self.version_all and not self.skip_all:
-                            existing = dest_panel.s3_manager.object_exists(dest_panel.current_bucket, dest_key)
-                            if existing:
-                                source_info = {
-                                    'size': obj.get('Size', 0),
-                                    'mtime': obj.get('LastModified', datetime.now())
-                                }
-                                dest_info = {
-                                    'size': existing.get('Size', 0),
-                                    'mtime': existing.get('LastModified')
-                                }
-
-                                def show_overwrite_dialog():
-                                    def on_choice(choice):
-                                        user_choice['value'] = choice
-                                        choice_event.set()
-                                        self.close_dialog()
-                                        self.show_dialog(progress)
-
-                                    self._check_overwrite(obj['Key'], source_info, dest_info, on_choice,
-                                                          is_s3_dest=True)
-
-                                self.loop.set_alarm_in(0, lambda *args: show_overwrite_dialog())
-                                choice_event.wait()
-                                choice_event.clear()
-
-                                if user_choice['value'] == 'cancel':
-                                    progress.cancelled = True
-                                    break
-                                elif user_choice['value'] == 'all':
-                                    self.overwrite_all = True
-                                elif user_choice['value'] == 'version_all':
-                                    self.version_all = True
-                                elif user_choice['value'] == 'skip':
-                                    progress.update(obj['Key'], 0)
-                                    continue
-                                elif user_choice['value'] == 'skip_all':
-                                    self.skip_all = True
-                                    progress.update(obj['Key'], 0)
-                                    continue
-
-                        if self.skip_all:
-                            progress.update(obj['Key'], 0)
-                            continue
-
-                        file_size = obj.get('Size', 0)
-                        progress.update(obj['Key'], file_size)
-                        self.loop.draw_screen()
-
-                        if source_panel.s3_manager.copy_object(
-                                item['name'],
-                                obj['Key'],
-                                dest_panel.current_bucket,
-                                dest_key
-                        ):
-                            progress.add_success()
-                        else:
-                            progress.add_failure()
-                            all_success = False
+                        group['planned'] = not progress.cancelled
+                        # дерево прочитано не целиком - при перемещении исходник не удаляем
+                        if isinstance(item_data['files'], S3ObjectStream) and item_data['files'].error:
+                            group['failed'] = True
+                except Exception:
+                    group['failed'] = True
 
-                    if all_success and is_move:
-                        items_to_delete.append(item_data)
+            scheduler.join()
 
             # Удаляем успешно перемещенные элементы
             if is_move:
+                items_to_delete = [g['item_data'] for g in groups
+                                   if g['planned'] and not g['failed'] and g['ok'] == g['total']]
                 for item_data in items_to_delete:
                     item_type = item_data['type']
                     item = item_data['item']
@@ -5228,23 +6445,19 @@ class DualPaneApp:
                                                               version_id=version_id)
 
                     elif item_type == 's3_dir':
-                        for obj in item_data['files']:
-                            source_panel.s3_manager.delete_object(source_panel.current_bucket, obj['Key'])
+                        source_panel.s3_manager.delete_objects_bulk(source_panel.current_bucket, item_data['files'])
 
                     elif item_type == 'bucket':
-                        for obj in item_data['files']:
-                            source_panel.s3_manager.delete_object(item['name'], obj['Key'])
+                        source_panel.s3_manager.delete_objects_bulk(item['name'], item_data['files'])
                         source_panel.s3_manager.delete_bucket(item['name'])
 
-            time.sleep(0.5)
-            self.loop.draw_screen()
-
         thread = threading.Thread(target=copy_thread)
         thread.daemon = True
         thread.start()
 
         def check_thread():
             if thread.is_alive():
+                progress.refresh()
                 self.loop.set_alarm_in(0.1, lambda *args: check_thread())
             else:
                 self.close_dialog()
@@ -5281,13 +6494,219 @@ class DualPaneApp:
 
                 operation = 'Moved' if is_move else 'Copied'
                 speed_str = progress.get_speed_str()
-                self.show_result(
-                    f'{operation}: {progress.success_count} file(s), Failed: {progress.fail_count} file(s), '
-                    f'Total: {format_size(progress.processed_bytes)}, Speed: {speed_str}'
-                )
+                message = (f'{operation}: {progress.success_count} file(s), Failed: {progress.fail_count} file(s), '
+                           f'Total: {format_size(progress.processed_bytes)}, Speed: {speed_str}')
+                listing_errors = self._listing_errors_str(analyzed)
+                if listing_errors:
+                    self.show_result(message + listing_errors, 'error')
+                else:
+                    self.show_result(message)
 
         self.loop.set_alarm_in(0.1, lambda *args: check_thread())
 
+    def _plan_copy_tasks(self, item_data, single, source_panel, dest_panel, target_name):
+        """
+        Разложить элемент на задачи TransferScheduler (по одной на файл).
+
+        Правила построения путей назначения те же, что и при последовательном копировании.
+        Возвращает генератор задач или None, если направление копирования не поддерживается.
+        """
+        item_type = item_data['type']
+        item = item_data['item']
+        dest_s3 = dest_panel.mode == 's3' and dest_panel.current_bucket
+        dest_fs = dest_panel.mode == 'fs'
+
+        def endpoints(*managers):
+            return [(m.endpoint_name, m.max_parallel) for m in managers if m is not None]
+
+        def s3_check(key):
+            def check():
+                existing = dest_panel.s3_manager.object_exists(dest_panel.current_bucket, key)
+                if existing:
+                    return {'size': existing.get('Size', 0), 'mtime': existing.get('LastModified')}
+                return None
+            return check
+
+        def fs_check(path):
+            def check():
+                if os.path.exists(path):
+                    existing_stat = os.stat(path)
+                    return {'size': existing_stat.st_size, 'mtime': datetime.fromtimestamp(existing_stat.st_mtime)}
+                return None
+            return check
+
+        def fs_source_info(path):
+            def info():
+                stat = os.stat(path)
+                return {'size': stat.st_size, 'mtime': datetime.fromtimestamp(stat.st_mtime)}
+            return info
+
+        def s3_key_for(name):
+            """Ключ назначения для одиночного файла (FS/S3 -> S3)"""
+            if single:
+                return target_name if target_name else name
+            if target_name:
+                return target_name.rstrip('/') + '/' + name
+            return name
+
+        def s3_prefixed_key(rel, name=None):
+            """Ключ назначения для файла внутри директории/бакета"""
+            parts = [p for p in (target_name.rstrip('/') if target_name else '', None if single else name) if p]
+            return '/'.join(parts + [rel])
+
+        def fs_path_for(name):
+            """Путь назначения для одиночного файла (FS/S3 -> FS)"""
+            if single:
+                if os.path.isabs(target_name):
+                    return target_name
+                return os.path.join(dest_panel.fs_browser.current_path, target_name)
+            if target_name:
+                base_dir = os.path.join(dest_panel.fs_browser.current_path, target_name)
+            else:
+                base_dir = dest_panel.fs_browser.current_path
+            os.makedirs(base_dir, exist_ok=True)
+            return os.path.join(base_dir, name)
+
+        def upload(path, key):
+            return lambda callback: dest_panel.s3_manager.upload_file(path, dest_panel.current_bucket, key,
+                                                                      callback=callback)
+
+        def download(key, path, version_id=None):
+            def run(callback):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                return source_panel.s3_manager.download_object(source_panel.current_bucket, key, path,
+                                                               version_id=version_id, callback=callback)
+            return run
+
+        def server_copy(src_bucket, src_key, key, version_id=None, size=None):
+            return lambda callback: source_panel.s3_manager.copy_object(src_bucket, src_key,
+                                                                        dest_panel.current_bucket, key,
+                                                                        version_id=version_id, size=size,
+                                                                        callback=callback)
+
+        def local_copy(src, dst):
+            def run(callback):
+                try:
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    shutil.copy2(src, dst)
+                    return True
+                except (IOError, OSError):
+                    return False
+            return run
+
+        def task(label, size, run, check, source_info, s3_dest, eps):
+            return {'label': label, 'size': size or 0, 'run': run, 'check': check,
+                    'source_info': source_info, 's3_dest': bool(s3_dest), 'endpoints': eps}
+
+        # FS файл -> S3
+        if item_type == 'fs_file' and dest_s3:
+            def gen():
+                source_path = os.path.join(source_panel.fs_browser.current_path, item['name'])
+                dest_key = s3_key_for(item['name'])
+                yield task(item['name'], item.get('size', 0), upload(source_path, dest_key), s3_check(dest_key),
+                           fs_source_info(source_path), True, endpoints(dest_panel.s3_manager))
+            return gen()
+
+        # FS директория -> S3
+        if item_type == 'fs_dir' and dest_s3:
+            def gen():
+                for file_info in item_data['files']:
+                    dest_key = s3_prefixed_key(file_info['rel_path'].replace(os.sep, '/'), item['name'])
+                    yield task(file_info['rel_path'], file_info.get('size', 0), upload(file_info['path'], dest_key),
+                               s3_check(dest_key), fs_source_info(file_info['path']), True,
+                               endpoints(dest_panel.s3_manager))
+            return gen()
+
+        # S3 файл -> FS
+        if item_type == 's3_file' and dest_fs:
+            def gen():
+                dest_path = fs_path_for(item['name'])
+                source_info = {'size': item.get('size', 0), 'mtime': item.get('mtime')}
+                yield task(item['name'], item.get('size', 0),
+                           download(item['key'], dest_path, version_id=item.get('VersionId')),
+                           fs_check(dest_path), lambda: source_info, False, endpoints(source_panel.s3_manager))
+            return gen()
+
+        # S3 директория -> FS
+        if item_type == 's3_dir' and dest_fs:
+            def gen():
+                for obj in item_data['files']:
+                    rel_key = obj['Key'][len(item['key']):]
+                    parts = [dest_panel.fs_browser.current_path]
+                    if target_name:
+                        parts.append(target_name)
+                    if not single:
+                        parts.append(item['name'])
+                    dest_path = os.path.join(*parts, rel_key.replace('/', os.sep))
+                    source_info = {'size': obj.get('Size', 0), 'mtime': obj.get('LastModified', datetime.now())}
+                    yield task(rel_key, obj.get('Size', 0), download(obj['Key'], dest_path), fs_check(dest_path),
+                               lambda info=source_info: info, False, endpoints(source_panel.s3_manager))
+            return gen()
+
+        # S3 файл -> S3
+        if item_type == 's3_file' and dest_s3:
+            def gen():
+                dest_key = s3_key_for(item['name'])
+                source_info = {'size': item.get('size', 0), 'mtime': item.get('mtime', datetime.now())}
+                yield task(item['name'], item.get('size', 0),
+                           server_copy(source_panel.current_bucket, item['key'], dest_key,
+                                       version_id=item.get('VersionId'), size=item.get('size')),
+                           s3_check(dest_key), lambda: source_info, True,
+                           endpoints(source_panel.s3_manager, dest_panel.s3_manager))
+            return gen()
+
+        # S3 директория -> S3
+        if item_type == 's3_dir' and dest_s3:
+            def gen():
+                for obj in item_data['files']:
+                    rel_key = obj['Key'][len(item['key']):]
+                    dest_key = s3_prefixed_key(rel_key, item['name'])
+                    source_info = {'size': obj.get('Size', 0), 'mtime': obj.get('LastModified', datetime.now())}
+                    yield task(rel_key, obj.get('Size', 0),
+                               server_copy(source_panel.current_bucket, obj['Key'], dest_key,
+                                           size=obj.get('Size')),
+                               s3_check(dest_key), lambda info=source_info: info, True,
+                               endpoints(source_panel.s3_manager, dest_panel.s3_manager))
+            return gen()
+
+        # FS файл -> FS
+        if item_type == 'fs_file' and dest_fs:
+            def gen():
+                source_path = os.path.join(source_panel.fs_browser.current_path, item['name'])
+                dest_path = fs_path_for(item['name'])
+                yield task(item['name'], item.get('size', 0), local_copy(source_path, dest_path),
+                           fs_check(dest_path), fs_source_info(source_path), False, [])
+            return gen()
+
+        # FS директория -> FS
+        if item_type == 'fs_dir' and dest_fs:
+            def gen():
+                parts = [dest_panel.fs_browser.current_path]
+                if target_name:
+                    parts.append(target_name)
+                if not (single and target_name):
+                    parts.append(item['name'])
+                dest_dir = os.path.join(*parts)
+                for file_info in item_data['files']:
+                    dest_path = os.path.join(dest_dir, file_info['rel_path'])
+                    yield task(file_info['rel_path'], file_info.get('size', 0),
+                               local_copy(file_info['path'], dest_path), fs_check(dest_path),
+                               fs_source_info(file_info['path']), False, [])
+            return gen()
+
+        # Бакет -> S3
+        if item_type == 'bucket' and dest_s3:
+            def gen():
+                for obj in item_data['files']:
+                    dest_key = s3_prefixed_key(obj['Key'], item['name'])
+                    source_info = {'size': obj.get('Size', 0), 'mtime': obj.get('LastModified', datetime.now())}
+                    yield task(obj['Key'], obj.get('Size', 0), server_copy(item['name'], obj['Key'], dest_key),
+                               s3_check(dest_key), lambda info=source_info: info, True,
+                               endpoints(source_panel.s3_manager, dest_panel.s3_manager))
+            return gen()
+
+        return None
+
     def toggle_versioning(self):
         active_panel = self.get_active_panel()
 
@@ -5346,9 +6765,12 @@ class DualPaneApp:
 
         analyzed, items_info, total_bytes = self.analyze_items(selected_items, active_panel)
         total_files = sum(len(a['files']) for a in analyzed)
+        listing = any(isinstance(a['files'], S3ObjectStream) and not a['files'].done for a in analyzed)
 
         def callback(confirmed):
             self.close_dialog()
+            if not confirmed:
+                self._cancel_listings(analyzed)
             if confirmed:
                 current_item = active_panel.get_focused_item()
                 focus_name = current_item.get('name') if current_item else None
@@ -5357,7 +6779,8 @@ class DualPaneApp:
 
                 self._do_delete_with_progress(analyzed, active_panel, focus_name, total_bytes, restore_index=focus_index)
 
-        message = f'Delete {len(selected_items)} item(s) ({total_files} file(s) total)?\nThis action cannot be undone!'
+        total_str = f'{total_files}+ file(s), still listing' if listing else f'{total_files} file(s) total'
+        message = f'Delete {len(selected_items)} item(s) ({total_str})?\nThis action cannot be undone!'
         dialog = ConfirmDialog('Confirm Delete', message, items_info, callback)
         self.show_dialog(dialog)
 
@@ -5376,8 +6799,31 @@ class DualPaneApp:
 
         progress = ProgressDialog('Deleting files...', callback=self.close_dialog)
         progress.set_total(total_files, total_bytes)
+        progress.attach_streams(analyzed)
         self.show_dialog(progress)
 
+        delete_errors = []
+
+        def delete_all(bucket_name, objects):
+            """Удалять объекты по мере прихода из листинга, пакетами на все воркеры endpoint'а"""
+            if isinstance(objects, S3ObjectStream):
+                chunks = objects.iter_batches(S3Manager.DELETE_BATCH_SIZE * panel.s3_manager.max_parallel)
+            else:
+                chunks = [objects]
+            for chunk in chunks:
+                if progress.cancelled:
+                    break
+                panel.s3_manager.delete_objects_bulk(bucket_name, chunk, callback=on_batch,
+                                                     should_stop=lambda: progress.cancelled)
+
+        def on_batch(batch, errors):
+            """Учесть пакет DeleteObjects в прогрессе"""
+            failed_keys = {(e.get('Key'), e.get('VersionId')) for e in errors}
+            nbytes = sum(obj.get('Size', 0) for obj in batch
+                         if (obj['Key'], obj.get('VersionId')) not in failed_keys)
+            progress.add_batch(batch[-1]['Key'], len(batch) - len(errors), len(errors), nbytes)
+            delete_errors.extend(errors)
+
         def delete_thread():
             for item_data in analyzed:
                 if progress.cancelled:
@@ -5387,19 +6833,20 @@ class DualPaneApp:
                 item = item_data['item']
 
                 if item_type == 'bucket':
-                    for obj in item_data['files']:
-                        if progress.cancelled:
-                            break
-
-                        file_size = obj.get('Size', 0)
-                        progress.update(obj['Key'], file_size)
-                        self.loop.draw_screen()
-
-                        if panel.s3_manager.delete_object(item['name'], obj['Key']):
-                            progress.add_success()
-                        else:
-                            progress.add_failure()
-                    panel.s3_manager.delete_bucket(item['name'])
+                    objects = item_data['files']
+                    # В версионированном бакете удаляем все версии и delete markers,
+                    # иначе DeleteBucket завершится ошибкой BucketNotEmpty
+                    if panel.s3_manager.get_versioning_status_cached(item['name']) in ('Enabled', 'Suspended'):
+                        # текущий листинг не нужен - считаем по списку версий
+                        objects.cancel()
+                        objects.wait()
+                        versions = panel.s3_manager.list_all_versions(item['name'])
+                        progress.add_expected(len(versions) - len(objects))
+                        objects = versions
+                    delete_all(item['name'], objects)
+                    # после неполного листинга бакет не пуст - DeleteBucket не пробуем
+                    if not progress.cancelled and not getattr(objects, 'error', None):
+                        panel.s3_manager.delete_bucket(item['name'])
 
                 elif item_type == 's3_file':
                     file_size = item.get('size', 0)
@@ -5412,18 +6859,7 @@ class DualPaneApp:
                         progress.add_failure()
 
                 elif item_type == 's3_dir':
-                    for obj in item_data['files']:
-                        if progress.cancelled:
-                            break
-
-                        file_size = obj.get('Size', 0)
-                        progress.update(obj['Key'], file_size)
-                        self.loop.draw_screen()
-
-                        if panel.s3_manager.delete_object(panel.current_bucket, obj['Key']):
-                            progress.add_success()
-                        else:
-                            progress.add_failure()
+                    delete_all(panel.current_bucket, item_data['files'])
 
                 elif item_type == 'fs_file':
                     try:
@@ -5464,6 +6900,7 @@ class DualPaneApp:
 
         def check_thread():
             if thread.is_alive():
+                progress.refresh()
                 self.loop.set_alarm_in(0.1, lambda *args: check_thread())
             else:
                 self.close_dialog()
@@ -5487,10 +6924,18 @@ class DualPaneApp:
                     except:
                         pass
 
-                self.show_result(
-                    f'Deleted: {progress.success_count} file(s), Failed: {progress.fail_count} file(s), '
-                    f'Total: {format_size(progress.processed_bytes)}, Speed: {speed_str}'
-                )
+                message = (f'Deleted: {progress.success_count} file(s), Failed: {progress.fail_count} file(s), '
+                           f'Total: {format_size(progress.processed_bytes)}, Speed: {speed_str}')
+                listing_errors = self._listing_errors_str(analyzed)
+                if delete_errors or listing_errors:
+                    if delete_errors:
+                        first = delete_errors[0]
+                        message += f' | {first.get("Key")}: {first.get("Code")}'
+                        if len(delete_errors) > 1:
+                            message += f' (+{len(delete_errors) - 1} more)'
+                    self.show_result(message + listing_errors, 'error')
+                else:
+                    self.show_result(message)
 
         self.loop.set_alarm_in(0.1, lambda *args: check_thread())
 
@@ -5594,7 +7039,35 @@ if __name__ == '__main__':
                         help='Vault username (will prompt if missing)')
     parser.add_argument('--vault-pass', 
                         help='Vault password (will prompt if missing - INSECURE in history)')
-    
+
+    # Параметры передачи (для endpoint'а переопределяются в конфиге)
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Parallel copy/move workers (default: 8)')
+    parser.add_argument('--endpoint-parallel', type=int,
+                        help='Max parallel transfers per endpoint (config key: max_parallel, default: 8)')
+    parser.add_argument('--multipart-threshold-mb', type=int,
+                        help='Multipart threshold in MB (config key: multipart_threshold_mb, default: 64)')
+    parser.add_argument('--multipart-chunk-mb', type=int,
+                        help='Multipart chunk size in MB (config key: multipart_chunk_mb, default: 16)')
+    parser.add_argument('--transfer-concurrency', type=int,
+                        help='Threads per multipart transfer (config key: transfer_concurrency, default: 4)')
+    parser.add_argument('--copy-threshold-mb', type=int,
+                        help='Server-side copies switch to parallel UploadPartCopy from this size in MB '
+                             '(config key: copy_threshold_mb, default: 256, max 5120)')
+    parser.add_argument('--copy-chunk-mb', type=int,
+                        help='Part size in MB for multipart server-side copy (config key: copy_chunk_mb, default: 64)')
+    parser.add_argument('--max-attempts', type=int,
+                        help='Attempts per S3 request including retries (config key: max_attempts, default: 5)')
+    parser.add_argument('--retry-mode', choices=['legacy', 'standard', 'adaptive'],
+                        help='boto3 retry mode (config key: retry_mode, default: adaptive)')
+    parser.add_argument('--count-ttl', type=int, default=600,
+                        help='Seconds a cached prefix object count stays fresh (default: 600)')
+    parser.add_argument('--listing-ttl', type=int, default=60,
+                        help='Seconds a cached directory listing is shown without revalidation (default: 60)')
+    parser.add_argument('--cache-db', default=None,
+                        help='SQLite file to persist the listing/count cache across restarts, created with '
+                             'mode 0600 (default: in memory only)')
+
     args = parser.parse_args()
 
     # Инициализация конфига с аргументами
@@ -11,7 +11,7 @@ import argparse
 import os
 import traceback
 from datetime import datetime
-from scapy.utils import wrpcap, PcapWriter, hexdump
+from scapy.utils import PcapWriter, RawPcapReader, hexdump
 import io
 import json
 from scapy.all import Packet
@@ -19,17 +19,32 @@ from scapy.layers.l2 import Ether, ARP, Dot1Q
 from scapy.layers.inet import IP, TCP, UDP, ICMP
 from scapy.layers.dns import DNS, DNSQR, DNSRR
 from scapy.layers.inet6 import IPv6, ICMPv6EchoRequest, ICMPv6EchoReply
-from scapy.all import rdpcap
 from scapy.all import sniff, conf, get_if_list
 from scapy.packet import Raw
 import re
 from collections import defaultdict
 from collections import Counter
 from collections import deque
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right, insort
+import heapq
+import random
 import threading
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import time
 import binascii
 import hashlib
+import socket
+import select
+import mmap
+import struct
+import zlib
+import gzip
+from array import array
+from collections.abc import Mapping
 from typing import Optional
 
 try:
@@ -39,6 +54,16 @@ except Exception:
     x509 = None
     default_backend = None
 
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
 __version__="1.6.0"
 __author__ = "Tarasov Dmitry"
 
@@ -101,11 +126,14 @@ def safe_str(value, default='N/A'):
     return str(value)
 
 
-def tls_summarize_stream(data: bytes) -> list[str]:
+def tls_summarize_stream(data: bytes, handshake_line=None) -> list[str]:
     """
     Из сырого TCP потока (в одном направлении) вынимает подряд TLS records
     и делает список строк: ClientHello SNI/ALPN, ServerHello ver/cipher, Alert fatal xxx, ...
     best-effort, без decryption.
+
+    handshake_line(offset, hs_type, hs_body) -> str | None: строка для handshake-сообщения
+    (offset — позиция его заголовка в data) вместо разбора здесь; None — разобрать как обычно.
     """
     def _tls_version_name(v: int) -> str:
         # TLS record/legacy versions
@@ -325,6 +353,7 @@ def tls_summarize_stream(data: bytes) -> list[str]:
             break
 
         body = data[p:p+rlen]
+        body_off = p
         p += rlen
 
         # Alert
@@ -346,9 +375,12 @@ def tls_summarize_stream(data: bytes) -> list[str]:
                 if hs_len < 0 or q + hs_len > len(body):
                     break
                 hs_body = body[q:q+hs_len]
+                line = handshake_line(body_off + q - 4, hs_type, hs_body) if handshake_line else None
                 q += hs_len
 
-                if hs_type == 0x01:
+                if line:
+                    out.append(line)
+                elif hs_type == 0x01:
                     out.append(_parse_client_hello(hs_body))
                 elif hs_type == 0x02:
                     out.append(_parse_server_hello(hs_body))
@@ -373,6 +405,113 @@ def tls_summarize_stream(data: bytes) -> list[str]:
     return out
 
 
+def l3_header_offset(frame, linktype=1):
+    """
+    (ethertype, смещение IP-заголовка) для кадра с данным DLT link-layer, без scapy.
+    Поддерживаются Ethernet(+VLAN), raw IP, Linux SLL/SLL2 и BSD loopback;
+    для прочих link-layer — (0, 0).
+    """
+    if linktype == 1:
+        off = 14
+        eth_type = int.from_bytes(frame[12:14], "big")
+        # 802.1Q / 802.1ad
+        while eth_type in (0x8100, 0x88A8) and len(frame) >= off + 4:
+            eth_type = int.from_bytes(frame[off + 2:off + 4], "big")
+            off += 4
+        return eth_type, off
+    if linktype in (12, 14, 101, 228, 229):
+        # raw IP: версия в первом полубайте
+        version = frame[0] >> 4 if frame else 0
+        return {4: 0x0800, 6: 0x86DD}.get(version, 0), 0
+    if linktype == 113:
+        # Linux cooked capture v1: протокол в байтах 14-15
+        return int.from_bytes(frame[14:16], "big"), 16
+    if linktype == 276:
+        # Linux cooked capture v2: протокол в начале 20-байтного заголовка
+        return int.from_bytes(frame[0:2], "big"), 20
+    if linktype in (0, 108):
+        # BSD loopback: 4 байта address family (DLT_NULL — в порядке хоста)
+        family = int.from_bytes(frame[0:4], "big" if linktype == 108 else sys.byteorder)
+        if family == 2:
+            return 0x0800, 4
+        if family in (10, 24, 28, 30):
+            return 0x86DD, 4
+    return 0, 0
+
+
+def raw_flow_hash(frame: bytes, linktype=1) -> int:
+    """
+    Быстрый симметричный хэш потока по сырым байтам кадра (без scapy).
+    Оба направления одного соединения дают одно значение; для не-IP кадров — 0.
+    """
+    try:
+        eth_type, off = l3_header_offset(frame, linktype)
+
+        if eth_type == 0x0800:
+            ihl = (frame[off] & 0x0F) * 4
+            proto = frame[off + 9]
+            a = frame[off + 12:off + 16]
+            b = frame[off + 16:off + 20]
+            l4 = off + ihl
+        elif eth_type == 0x86DD:
+            proto = frame[off + 6]
+            a = frame[off + 8:off + 24]
+            b = frame[off + 24:off + 40]
+            l4 = off + 40
+        else:
+            return 0
+
+        # TCP/UDP: добавляем порты к адресам
+        if proto in (6, 17) and len(frame) >= l4 + 4:
+            a += frame[l4:l4 + 2]
+            b += frame[l4 + 2:l4 + 4]
+
+        lo, hi = (a, b) if a <= b else (b, a)
+        return hash((proto, lo, hi))
+    except Exception:
+        return 0
+
+
+def tcp_seq_payload_bounds(frame, linktype=1):
+    """
+    Best-effort разбор link-layer (см. l3_header_offset) + IPv4/IPv6 + TCP по сырым байтам (без scapy).
+    Возвращает (seq, payload_start, payload_end) — границы payload внутри frame —
+    или None, если кадр не TCP / не разбирается.
+    """
+    try:
+        eth_type, off = l3_header_offset(frame, linktype)
+
+        if eth_type == 0x0800:
+            ihl = (frame[off] & 0x0F) * 4
+            if ihl < 20 or frame[off + 9] != 6:
+                return None
+            total_len = int.from_bytes(frame[off + 2:off + 4], "big")
+            # total length 0 — TSO/GSO-кадры локального захвата: длина неизвестна, берём весь кадр
+            end = off + total_len if total_len >= ihl else len(frame)
+            ip_off = off + ihl
+        elif eth_type == 0x86DD:
+            # IPv6 без extension headers
+            if frame[off + 6] != 6:
+                return None
+            ip_off = off + 40
+            payload_len = int.from_bytes(frame[off + 4:off + 6], "big")
+            end = ip_off + payload_len if payload_len else len(frame)
+        else:
+            return None
+
+        if len(frame) < ip_off + 20:
+            return None
+        tcp_hlen = ((frame[ip_off + 12] >> 4) & 0x0F) * 4
+        if tcp_hlen < 20:
+            return None
+        seq = int.from_bytes(frame[ip_off + 4:ip_off + 8], "big")
+        start = ip_off + tcp_hlen
+        end = min(end, len(frame))
+        return seq, start, max(start, end)
+    except Exception:
+        return None
+
+
 def extract_tcp_payload_from_raw(frame: bytes) -> bytes:
     """
     Best-effort извлечение TCP payload из bytes(pkt) (Ethernet + IPv4/IPv6 + TCP).
@@ -827,6 +966,118 @@ def save_profiles_config(cfg):
     os.replace(tmp, path)
 
 
+# ---- запись pcap/pcapng из сырых кадров ----
+
+# Section Header Block: версия 1.0, длина секции неизвестна
+PCAPNG_SHB = struct.pack('<IIIHHqI', 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28)
+
+PCAP_SNAPLEN = 262144
+
+
+def pcapng_idb(linktype, ifname=None):
+    """Interface Description Block (с опцией if_name, если имя интерфейса известно)."""
+    opts = b""
+    if ifname:
+        name = str(ifname).encode('utf-8', 'replace')[:255]
+        opts = struct.pack('<HH', 2, len(name)) + name + b"\0" * (-len(name) % 4)
+        opts += struct.pack('<HH', 0, 0)
+    total = 20 + len(opts)
+    return struct.pack('<IIHHI', 1, total, int(linktype), 0, PCAP_SNAPLEN) + opts + struct.pack('<I', total)
+
+
+def pcapng_epb_parts(iface_id, ts, caplen, wirelen=None):
+    """Заголовок (28 байт) и хвост Enhanced Packet Block для кадра длиной caplen.
+
+    Кадр пишется между ними как есть; время — в микросекундах (if_tsresol по умолчанию).
+    """
+    us = int(round(ts * 1_000_000))
+    pad = -caplen % 4
+    total = 32 + caplen + pad
+    head = struct.pack('<IIIIIII', 6, total, iface_id, (us >> 32) & 0xFFFFFFFF, us & 0xFFFFFFFF,
+                       caplen, int(wirelen or caplen))
+    return head, b"\0" * pad + struct.pack('<I', total)
+
+
+def pcap_file_header(linktype):
+    """Глобальный заголовок классического pcap (микросекунды, версия 2.4)."""
+    return struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, PCAP_SNAPLEN, int(linktype))
+
+
+def pcap_record_header(ts, caplen, wirelen=None):
+    """Заголовок записи классического pcap."""
+    us = int(round(ts * 1_000_000))
+    return struct.pack('<IIII', (us // 1_000_000) & 0xFFFFFFFF, us % 1_000_000, caplen, int(wirelen or caplen))
+
+
+def packet_linktype(packet_info):
+    """DLT link-layer пакета: из колонки буфера для PacketView, из 'linktype' (offline-разбор),
+    иначе по классу scapy-пакета."""
+    if isinstance(packet_info, PacketView):
+        if packet_info.alive:
+            return packet_info._store.linktype(packet_info._slot)
+        return 1
+    linktype = packet_info.get('linktype')
+    if linktype is not None:
+        return linktype
+    pkt = packet_info.get('raw_packet')
+    if pkt is None:
+        return 1
+    return conf.l2types.layer2num.get(type(pkt), 1)
+
+
+def open_compressed_output(path, compression=None):
+    """Открыть файл на запись с потоковым сжатием: None, 'gzip' или 'zstd' (нужен zstandard)."""
+    if compression == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' module")
+        # threads=-1: zstd сжимает кадры на всех ядрах, не держа GIL
+        cctx = zstandard.ZstdCompressor(level=3, threads=-1)
+        return cctx.stream_writer(open(path, 'wb'), closefd=True)
+    return open(path, 'wb')
+
+
+class PcapRecordEncoder:
+    """Сборка записей pcapng/pcap из сырых кадров без scapy.
+
+    pcapng: SHB в начале, IDB на каждую пару (link-type, интерфейс) при первой встрече,
+    затем EPB. pcap: глобальный заголовок по link-type первого кадра (формат не умеет
+    смешивать link-type — для таких захватов нужен pcapng).
+    """
+
+    def __init__(self, fmt='pcapng'):
+        self.fmt = fmt
+        self.iface_ids = {}
+        self.count = 0
+        self.header_written = False
+
+    def encode(self, out, raw, ts, linktype=1, ifname=None, wirelen=None):
+        """Дописать в список out части записи кадра (и нужные заголовки/IDB перед ней)."""
+        caplen = len(raw)
+        if self.fmt == 'pcap':
+            if not self.header_written:
+                out.append(pcap_file_header(linktype))
+                self.header_written = True
+            out.append(pcap_record_header(ts, caplen, wirelen))
+            out.append(raw)
+        else:
+            if not self.header_written:
+                out.append(PCAPNG_SHB)
+                self.header_written = True
+            key = (linktype, ifname or '')
+            iface_id = self.iface_ids.get(key)
+            if iface_id is None:
+                iface_id = len(self.iface_ids)
+                self.iface_ids[key] = iface_id
+                out.append(pcapng_idb(linktype, ifname))
+            head, tail = pcapng_epb_parts(iface_id, ts, caplen, wirelen)
+            out.append(head)
+            out.append(raw)
+            out.append(tail)
+        self.count += 1
+
+
 class PacketExporter:
     """Класс для экспорта пакетов в различные форматы"""
 
@@ -844,91 +1095,96 @@ class PacketExporter:
             print(f"Warning: Could not create directory {self.default_directory}: {e}")
             self.default_directory = "."
 
-    def save_to_pcapng(self, packets, filename=None):
+    COMPRESSION_SUFFIX = {'gzip': '.gz', 'zstd': '.zst'}
+
+    def build_filepath(self, filename=None, fmt='pcapng', compression=None):
+        """Полный путь файла экспорта: авто-имя, расширение формата и суффикс сжатия."""
+        ext = '.pcap' if fmt == 'pcap' else '.pcapng'
+        suffix = self.COMPRESSION_SUFFIX.get(compression, '')
+
+        # Генерируем имя файла если не указано
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"capture_{timestamp}{ext}"
+
+        if suffix and filename.endswith(suffix):
+            filename = filename[:-len(suffix)]
+        # Добавляем расширение если отсутствует
+        if not filename.endswith('.pcapng') and not filename.endswith('.pcap'):
+            filename += ext
+
+        return os.path.join(self.default_directory, filename + suffix)
+
+    def _write_packets(self, packets, filepath, fmt, compression=None):
+        """Потоково записать packet_info в файл; возвращает число записанных пакетов."""
+        encoder = PcapRecordEncoder(fmt)
+        with open_compressed_output(filepath, compression) as f:
+            for pkt_info in packets:
+                if isinstance(pkt_info, PacketView):
+                    raw = bytes(pkt_info.raw_view())
+                else:
+                    raw = pkt_info.get('raw')
+                    if not raw and pkt_info.get('raw_packet') is not None:
+                        raw = bytes(pkt_info['raw_packet'])
+                if not raw:
+                    continue
+                ts = pkt_info.get('timestamp')
+                ts = ts.timestamp() if isinstance(ts, datetime) else float(ts or 0.0)
+                parts = []
+                encoder.encode(parts, raw, ts, packet_linktype(pkt_info),
+                               pkt_info.get('interface'), pkt_info.get('size'))
+                f.writelines(parts)
+        if encoder.count == 0:
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
+        return encoder.count
+
+    def save_to_pcapng(self, packets, filename=None, compression=None):
         """
         Сохранить пакеты в формат pcapng
 
         Args:
-            packets: список packet_info словарей с raw_packet
+            packets: список packet_info словарей (или PacketView) с raw
             filename: имя файла (если None - генерируется автоматически)
+            compression: None, 'gzip' или 'zstd'
 
         Returns:
             tuple (success: bool, filepath: str, message: str)
         """
         try:
-            # Генерируем имя файла если не указано
-            if filename is None:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"capture_{timestamp}.pcapng"
-
-            # Добавляем расширение если отсутствует
-            if not filename.endswith('.pcapng') and not filename.endswith('.pcap'):
-                filename += '.pcapng'
-
-            # Формируем полный путь
-            filepath = os.path.join(self.default_directory, filename)
+            filepath = self.build_filepath(filename, 'pcapng', compression)
+            count = self._write_packets(packets, filepath, 'pcapng', compression)
 
-            # Извлекаем raw пакеты из packet_info
-            raw_packets = []
-            for pkt_info in packets:
-                raw_packet = pkt_info.get('raw_packet')
-                if raw_packet is None:
-                    raw_packet = pkt_info.get('raw')
-                if raw_packet is not None:
-                    raw_packets.append(raw_packet)
-
-            if len(raw_packets) == 0:
+            if count == 0:
                 return False, "", "No valid packets to save"
 
-            # Сохраняем используя wrpcap из scapy
-            # wrpcap автоматически создает pcapng для Python 3
-            wrpcap(filepath, raw_packets)
-
-            return True, filepath, f"Successfully saved {len(raw_packets)} packets"
+            return True, filepath, f"Successfully saved {count} packets"
 
         except Exception as e:
             return False, "", f"Error saving packets: {str(e)}"
 
-    def save_to_pcap(self, packets, filename=None):
+    def save_to_pcap(self, packets, filename=None, compression=None):
         """
         Сохранить пакеты в формат pcap (старый формат)
 
         Args:
-            packets: список packet_info словарей с raw_packet
+            packets: список packet_info словарей (или PacketView) с raw
             filename: имя файла (если None - генерируется автоматически)
+            compression: None, 'gzip' или 'zstd'
 
         Returns:
             tuple (success: bool, filepath: str, message: str)
         """
         try:
-            # Генерируем имя файла если не указано
-            if filename is None:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"capture_{timestamp}.pcap"
-
-            # Добавляем расширение если отсутствует
-            if not filename.endswith('.pcap'):
-                filename += '.pcap'
+            filepath = self.build_filepath(filename, 'pcap', compression)
+            count = self._write_packets(packets, filepath, 'pcap', compression)
 
-            # Формируем полный путь
-            filepath = os.path.join(self.default_directory, filename)
-
-            # Извлекаем raw пакеты
-            raw_packets = []
-            for pkt_info in packets:
-                raw_packet = pkt_info.get('raw_packet')
-                if raw_packet is None:
-                    raw_packet = pkt_info.get('raw')
-                if raw_packet is not None:
-                    raw_packets.append(raw_packet)
-
-            if len(raw_packets) == 0:
+            if count == 0:
                 return False, "", "No valid packets to save"
 
-            # Сохраняем в pcap формат
-            wrpcap(filepath, raw_packets)
-
-            return True, filepath, f"Successfully saved {len(raw_packets)} packets"
+            return True, filepath, f"Successfully saved {count} packets"
 
         except Exception as e:
             return False, "", f"Error saving packets: {str(e)}"
@@ -954,6 +1210,28 @@ class PacketExporter:
         # Сохраняем
         return self.save_to_pcapng(filtered, filename)
 
+    def start_export(self, capture, filename=None, fmt='pcapng', compression=None,
+                     nums=None, time_range=None):
+        """
+        Запустить фоновый экспорт из буфера PacketCapture (см. PcapExportJob)
+
+        Args:
+            capture: экземпляр PacketCapture
+            filename: имя файла (если None - генерируется автоматически)
+            fmt: 'pcapng' или 'pcap'
+            compression: None, 'gzip' или 'zstd'
+            nums: номера пакетов по возрастанию (None - весь буфер)
+            time_range: (start, end) в секундах от первого пакета буфера
+
+        Returns:
+            запущенный PcapExportJob
+        """
+        filepath = self.build_filepath(filename, fmt, compression)
+        job = PcapExportJob(capture, filepath, fmt=fmt, compression=compression,
+                            nums=nums, time_range=time_range)
+        job.start()
+        return job
+
     def get_capture_info(self, filepath):
         """
         Получить информацию о сохраненном файле
@@ -1037,6 +1315,240 @@ class PacketExporter:
             return False, f"Error deleting file: {str(e)}"
 
 
+class PcapExportJob:
+    """Фоновый потоковый экспорт пакетов из буфера PacketCapture в pcapng/pcap.
+
+    Поток-сборщик идёт по PacketStore порциями: под PacketCapture.lock копирует из
+    арены сырые кадры вместе с временем, интерфейсом и link-type и сразу собирает из
+    них записи (PcapRecordEncoder: IDB на каждый интерфейс, EPB с микросекундным
+    временем). Готовые порции через короткую очередь забирает поток-писатель, который
+    сжимает (gzip/zstd) и пишет файл — сжатие идёт параллельно со сбором, а в памяти
+    лежит не больше нескольких порций. scapy-объекты и списки пакетов не создаются,
+    UI-поток не блокируется.
+
+    Выборка: весь буфер (nums=None) или заданные номера (совпавшие с фильтром, пакеты
+    одного потока), плюс необязательное окно времени. Пакеты, вытесненные из буфера
+    за время экспорта, пропускаются.
+    """
+
+    CHUNK = 2000
+    QUEUE_CHUNKS = 4
+
+    def __init__(self, capture, path, fmt='pcapng', compression=None, nums=None, time_range=None):
+        """
+        Args:
+            capture: PacketCapture, из буфера которого идёт экспорт.
+            path: полный путь выходного файла.
+            fmt: 'pcapng' или 'pcap'.
+            compression: None, 'gzip' или 'zstd'.
+            nums: номера пакетов по возрастанию (None — весь буфер на момент старта).
+            time_range: (start, end) в секундах от первого пакета буфера, включительно.
+        """
+        self.capture = capture
+        self.path = path
+        self.fmt = fmt
+        self.compression = compression
+        self.nums = nums
+        self.time_range = time_range or (None, None)
+
+        self.total = 0
+        self.scanned = 0
+        self.packets_written = 0
+        self.bytes_written = 0
+        self.state = 'idle'  # idle | running | done | cancelled | error
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+        self._stop = threading.Event()
+        self._queue = queue.Queue(maxsize=self.QUEUE_CHUNKS)
+        self._collector = None
+        self._writer = None
+
+    def start(self):
+        """Запустить экспорт в фоновых потоках."""
+        self.state = 'running'
+        self.started_at = time.time()
+        self._writer = threading.Thread(target=self._write_loop, name="pcap-export-writer", daemon=True)
+        self._collector = threading.Thread(target=self._collect_loop, name="pcap-export", daemon=True)
+        self._writer.start()
+        self._collector.start()
+
+    def cancel(self, timeout=2.0):
+        """Прервать экспорт (недописанный файл удаляется)."""
+        self._stop.set()
+        self.wait(timeout)
+
+    def wait(self, timeout=None):
+        """Дождаться окончания экспорта."""
+        for thread in (self._collector, self._writer):
+            if thread is not None:
+                thread.join(timeout=timeout)
+
+    @property
+    def finished(self):
+        return self.state in ('done', 'cancelled', 'error')
+
+    def progress(self):
+        """Снимок прогресса для диалога сохранения."""
+        percent = 100.0 if self.state == 'done' else 0.0
+        if self.state != 'done' and self.total:
+            percent = min(99.0, 100.0 * self.scanned / self.total)
+        end = self.finished_at or time.time()
+        return {
+            'state': self.state,
+            'percent': percent,
+            'scanned': self.scanned,
+            'total': self.total,
+            'packets_written': self.packets_written,
+            'bytes_written': self.bytes_written,
+            'elapsed': end - self.started_at if self.started_at else 0.0,
+            'error': self.error,
+        }
+
+    def result(self):
+        """Итог в формате PacketExporter.save_*: (success, filepath, message)."""
+        if self.state == 'done':
+            return True, self.path, f"Successfully saved {self.packets_written} packets"
+        if self.state == 'cancelled':
+            return False, "", "Export cancelled"
+        if self.state == 'error':
+            return False, "", self.error or "Error saving packets"
+        return False, "", "Export in progress"
+
+    # ---- сборщик ----
+
+    def _fail(self, e):
+        if self.error is None:
+            self.error = f"Error saving packets: {e}"
+        self._stop.set()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _collect_loop(self):
+        try:
+            self._collect()
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(None)
+
+    def _collect(self):
+        cap = self.capture
+        nums = self.nums
+        encoder = PcapRecordEncoder(self.fmt)
+        t_from, t_to = self.time_range
+
+        with cap.lock:
+            store = cap.packets
+            epoch = store._epoch
+            self.total = len(store) if nums is None else len(nums)
+            last_num = store.newest_num
+            base = store._ts[store._head] if len(store) else 0.0
+        lo = base + t_from if t_from is not None else None
+        hi = base + t_to if t_to is not None else None
+
+        cursor = 0  # nums is None: последний пройденный номер, иначе индекс в nums
+        links = {}
+        while not self._stop.is_set():
+            parts = []
+            before = encoder.count
+            with cap.lock:
+                store = cap.packets
+                if store._epoch != epoch:
+                    raise RuntimeError("packet buffer was cleared during export")
+
+                if nums is None:
+                    k = store.lower_bound(cursor + 1)
+                    end = min(len(store), k + self.CHUNK)
+                    slots = []
+                    for idx in range(k, end):
+                        slot = store.slot_at(idx)
+                        if store._num[slot] > last_num:
+                            break
+                        slots.append(slot)
+                    if not slots:
+                        break
+                    cursor = store._num[slots[-1]]
+                else:
+                    if cursor >= len(nums):
+                        break
+                    batch = nums[cursor:cursor + self.CHUNK]
+                    cursor += len(batch)
+                    slots = [s for s in map(store.find_slot, batch) if s is not None]
+                    self.scanned += len(batch) - len(slots)
+
+                for slot in slots:
+                    self.scanned += 1
+                    ts = store._ts[slot]
+                    if (lo is not None and ts < lo) or (hi is not None and ts > hi):
+                        continue
+                    link_id = store._link[slot]
+                    linktype = links.get(link_id)
+                    if linktype is None:
+                        linktype = links[link_id] = store.linktype(slot)
+                    encoder.encode(parts, store.raw_view(slot).tobytes(), ts, linktype,
+                                   store._ifaces[store._iface[slot]], store._size[slot])
+
+            if parts and not self._put((b"".join(parts), encoder.count - before)):
+                break
+
+    # ---- писатель ----
+
+    def _write_loop(self):
+        f = None
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=0.2)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        break
+                    continue
+                if item is None or self._stop.is_set():
+                    break
+                data, count = item
+                if f is None:
+                    f = open_compressed_output(self.path, self.compression)
+                f.write(data)
+                self.bytes_written += len(data)
+                self.packets_written += count
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if f is not None:
+                try:
+                    f.close()
+                except Exception as e:
+                    self._fail(e)
+            self._finish(f is not None)
+
+    def _finish(self, opened):
+        if self.error is None and not self._stop.is_set() and self.packets_written:
+            self.state = 'done'
+        else:
+            if opened:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+            if self.error is not None:
+                self.state = 'error'
+            elif self._stop.is_set():
+                self.state = 'cancelled'
+            else:
+                self.error = "No valid packets to save"
+                self.state = 'error'
+        self.finished_at = time.time()
+
+
 class ProfilesDialog(urwid.WidgetWrap):
     """Диалог управления профилями фильтров/исключений.
 
@@ -1177,6 +1689,32 @@ class PacketExportDialog:
 
         return self.exporter.save_to_pcapng(selected, filename)
 
+    def start_export(self, mode='all', filename=None, fmt='pcapng', compression=None,
+                     time_range=None, flow_key=None):
+        """
+        Запустить фоновый экспорт из буфера (PcapExportJob)
+
+        Args:
+            mode: 'all' - весь буфер, 'filtered' - совпавшие с фильтром, 'flow' - один поток
+            filename: имя файла
+            fmt: 'pcapng' или 'pcap'
+            compression: None, 'gzip' или 'zstd'
+            time_range: (start, end) в секундах от первого пакета буфера
+            flow_key: канонический ключ потока для mode='flow'
+
+        Returns:
+            запущенный PcapExportJob
+        """
+        nums = None
+        if mode == 'filtered':
+            self.packet_filter.sync(self.packet_capture)
+            nums = self.packet_filter.matched_nums()
+        elif mode == 'flow':
+            nums = self.packet_capture.get_flow_nums(flow_key) if flow_key else []
+        return self.exporter.start_export(self.packet_capture, filename, fmt=fmt,
+                                          compression=compression, nums=nums,
+                                          time_range=time_range)
+
 class TlsHandshakeView(urwid.WidgetWrap):
     """Окно сводки TLS handshake (без расшифровки).
 
@@ -1329,18 +1867,20 @@ class FlowDetailView(urwid.WidgetWrap):
 
     Показывает статистику потока и агрегаты по пакетам (порты, длительность, PPS/BPS и т.п.).
     """
-    def __init__(self, flow, packets, on_close_callback):
+    def __init__(self, flow, packets, on_close_callback, packet_capture=None):
         """Создать окно деталей flow.
 
         Args:
             flow: Словарь агрегата flow (proto/a_ip/a_port/b_ip/b_port/bytes/first_ts/...).
             packets: Пакеты, относящиеся к данному flow (list[dict]).
             on_close_callback: callback() -> None. Закрыть окно.
+            packet_capture: PacketCapture — RTT берётся из его индекса потоков (опционально).
         """
 
         self.flow = flow
         self.packets = packets
         self.on_close_callback = on_close_callback
+        self.packet_capture = packet_capture
 
         text = urwid.Text(self._build_text(), wrap='any')
         hint = urwid.Text("Press any key to close", align='center')
@@ -1411,9 +1951,23 @@ class FlowDetailView(urwid.WidgetWrap):
             "",
             f"RTT (TCP SYN): {rtt_line}",
         ]
+
+        # атрибуты потока из разбора TLS handshake при захвате
+        attrs = {}
+        if proto == "TCP" and self.packet_capture is not None:
+            attrs = self.packet_capture.get_flow_attrs(FlowTable.flow_key("TCP", f["a_ip"], f["a_port"], f["b_ip"], f["b_port"]))
+        if attrs:
+            lines.append("")
+            for name, label in (("tls_version", "TLS:"), ("sni", "SNI:"), ("alpn", "ALPN:"), ("ja3", "JA3:"),
+                                ("tls_cipher", "Cipher:"), ("cert_subject", "Cert:"), ("cert_san", "Cert SAN:")):
+                if attrs.get(name):
+                    lines.append(f"{label:<10}{attrs[name]}")
         return "\n".join(lines)
 
     def _estimate_tcp_syn_rtt_ms(self, a_ip, a_port, b_ip, b_port):
+        if self.packet_capture is not None:
+            return self.packet_capture.get_flow_syn_rtt_ms(FlowTable.flow_key("TCP", a_ip, a_port, b_ip, b_port))
+
         syn_time = None
         for p in self.packets:
             info = (p.get("info") or "").upper()
@@ -1450,6 +2004,10 @@ class PacketDetailView(urwid.WidgetWrap):
             packet_info: информация о пакете из PacketCapture
             on_close_callback: функция для вызова при закрытии
         """
+        # PacketView из кольцевого буфера фиксируем в обычный dict:
+        # пакет может быть вытеснен, пока открыт детальный просмотр
+        if isinstance(packet_info, PacketView):
+            packet_info = packet_info.to_dict()
         self.packet_info = packet_info
         self.on_close_callback = on_close_callback
 
@@ -1889,9 +2447,141 @@ class PacketDetailView(urwid.WidgetWrap):
         return super().keypress(size, key)
 
 
+class TrafficStats:
+    """Инкрементальные накопители статистики по набору пакетов.
+
+    Обновляются по мере поступления (add) и вытеснения (remove) пакетов, поэтому
+    чтение статистики не требует прохода по буферу:
+      - счётчики протоколов (TCPv4/TCPv6/UDPv4/UDPv6/ARP/ICMP/...)
+      - количество уникальных IPv4/IPv6 адресов
+      - счётчики TCP флагов SYN/FIN/RST/PSH
+      - топ IP по пакетам и по байтам (пересчитывается не чаще top_interval секунд)
+
+    Уникальные адреса и топы считаются точно по словарям со счётчиками ссылок:
+    вероятностные скетчи (HyperLogLog, Space-Saving) не поддерживают удаление,
+    а пакеты из кольцевого буфера вытесняются постоянно.
+
+    Не thread-safe: вызывается под lock владельца (PacketCapture.lock).
+    """
+
+    # бит TCP флага -> имя счётчика
+    TCP_FLAG_BITS = (('FIN', 0x01), ('SYN', 0x02), ('RST', 0x04), ('PSH', 0x08))
+
+    def __init__(self, top_interval=1.0):
+        self.top_interval = top_interval
+        self.reset()
+
+    def reset(self):
+        """Обнулить все накопители."""
+        self.total_packets = 0
+        self.total_bytes = 0
+        self.proto_count = Counter()
+        self.tcp_flags = Counter()
+        self.ip_packets = {}   # ip -> пакетов с этим адресом (src или dst)
+        self.ip_bytes = {}     # ip -> байт (src + dst)
+        self.distinct = {4: 0, 6: 0}
+        self._top_cache = {}   # (kind, limit) -> (time, result)
+
+    @staticmethod
+    def _ip_family(ip):
+        if ':' in ip and '.' not in ip:
+            return 6
+        if '.' in ip:
+            return 4
+        return 0
+
+    @staticmethod
+    def _proto_key(proto, src_ip, dst_ip):
+        is_v6 = ':' in str(src_ip or '') or ':' in str(dst_ip or '')
+        if 'TCP' in proto:
+            return 'TCPv6' if is_v6 else 'TCPv4'
+        if 'UDP' in proto:
+            return 'UDPv6' if is_v6 else 'UDPv4'
+        return proto
+
+    def _update(self, packet, sign):
+        proto = packet.get('proto', '') or ''
+        src_ip = packet.get('src_ip')
+        dst_ip = packet.get('dst_ip')
+        size = int(packet.get('size', 0) or 0)
+
+        self.total_packets += sign
+        self.total_bytes += sign * size
+        self.proto_count[self._proto_key(proto, src_ip, dst_ip)] += sign
+
+        if 'TCP' in proto:
+            raw_flags = int(packet.get('tcp_flags_raw', 0) or 0)
+            for name, bit in self.TCP_FLAG_BITS:
+                if raw_flags & bit:
+                    self.tcp_flags[name] += sign
+
+        for ip in (src_ip, dst_ip):
+            if not ip:
+                continue
+            n = self.ip_packets.get(ip, 0) + sign
+            if n > 0:
+                self.ip_packets[ip] = n
+                self.ip_bytes[ip] = self.ip_bytes.get(ip, 0) + sign * size
+            else:
+                self.ip_packets.pop(ip, None)
+                self.ip_bytes.pop(ip, None)
+            # адрес появился в наборе или ушёл из него
+            if n == (1 if sign > 0 else 0):
+                family = self._ip_family(ip)
+                if family:
+                    self.distinct[family] += sign
+
+    def add(self, packet):
+        """Учесть пакет (dict packet_info или PacketView)."""
+        self._update(packet, 1)
+
+    def remove(self, packet):
+        """Вычесть ранее учтённый пакет (например, вытесненный из буфера)."""
+        self._update(packet, -1)
+
+    # ---- чтение ----
+
+    def protocol_counts(self):
+        return dict(self.proto_count)
+
+    def tcp_flag_counts(self):
+        return dict(self.tcp_flags)
+
+    def distinct_ipv4(self):
+        return self.distinct[4]
+
+    def distinct_ipv6(self):
+        return self.distinct[6]
+
+    def _top(self, kind, source, limit):
+        now = time.time()
+        cached = self._top_cache.get((kind, limit))
+        if cached and now - cached[0] < self.top_interval:
+            return cached[1]
+        result = heapq.nlargest(limit, source.items(), key=lambda x: x[1])
+        self._top_cache[(kind, limit)] = (now, result)
+        return result
+
+    def top_ips(self, limit=10):
+        """Топ IP по количеству пакетов: [(ip, packets), ...]."""
+        return self._top('ips', self.ip_packets, limit)
+
+    def top_talkers(self, limit=10):
+        """Топ IP по объёму трафика: [(ip, bytes), ...]."""
+        return self._top('talkers', self.ip_bytes, limit)
+
+
 class PacketFilter:
     """Фильтрация пакетов с поддержкой исключений"""
 
+    # фильтры по атрибутам потока (FlowTable.attrs): поле -> ключи атрибутов
+    FLOW_ATTR_FIELDS = {
+        'sni': ('sni',),
+        'alpn': ('alpn',),
+        'ja3': ('ja3',),
+        'tls_cert': ('cert_subject', 'cert_san'),
+    }
+
     def __init__(self):
         """Инициализация фильтров отображения пакетов.
 
@@ -1905,12 +2595,41 @@ class PacketFilter:
         self.exclude_streams = []  # Список исключенных стримов
         self.exclude_protocols = set()  # Множество исключенных протоколов
 
+        # Скомпилированный предикат: пересобирается только при изменении фильтров
+        self._generation = 0
+        self._compiled_generation = -1
+        self._predicate = None
+        self._payload_check = None       # matcher фильтра 'payload' (см. _compile_payload_matcher)
+        self._uses_flow_attrs = False    # есть фильтр из FLOW_ATTR_FIELDS
+        self._flows = None               # FlowTable буфера (задаётся в sync)
+        self._attr_flows = set()         # потоки, уже давшие совпадение по атрибутам
+
+        # Кэш совпадений по буферу PacketCapture (см. sync)
+        self._synced_key = None          # (generation, id(store), store epoch)
+        self._matched = []               # номера совпавших пакетов, по возрастанию
+        self._matched_head = 0           # начало "живой" части _matched
+        self._last_evaluated_num = 0
+        self.match_epoch = 0             # растёт при полном пересчёте кэша и досчёте старых совпадений
+        self._listened_store = None
+
+        # Совпадения старше буфера, подгруженные из спула (см. page_back)
+        self._hist = array('Q')          # номера по возрастанию, все меньше номеров _matched
+        self._hist_low = None            # нижняя граница просмотренного спула; None — история не подгружалась
+
+        # Статистика по отображаемому набору (обновляется в sync и при вытеснении)
+        self.stats = TrafficStats()
+
+    def _invalidate(self):
+        """Фильтры изменились: предикат и кэш совпадений будут пересобраны."""
+        self._generation += 1
+
     def set_filter(self, field, value):
         """Установить фильтр для поля"""
         if value:
             self.filters[field] = value
         elif field in self.filters:
             del self.filters[field]
+        self._invalidate()
 
     def to_profile_dict(self):
         return {
@@ -1923,10 +2642,12 @@ class PacketFilter:
         self.filters = dict(d.get("filters", {}))
         self.exclude_streams = set(tuple(x) for x in d.get("exclude_streams", []))
         self.exclude_protocols = set(d.get("exclude_protocols", []))
+        self._invalidate()
 
     def clear_filter(self):
         """Очистить все фильтры (кроме exclude)"""
         self.filters.clear()
+        self._invalidate()
 
     def add_exclude_stream(self, src_ip, dst_ip, src_port, dst_port, proto):
         """
@@ -1951,12 +2672,14 @@ class PacketFilter:
         # Проверяем что такой stream еще не исключен
         if not self._is_stream_excluded(stream):
             self.exclude_streams.append(stream)
+            self._invalidate()
             return True
         return False
 
     def clear_exclude_streams(self):
         """Очистить все исключения стримов"""
         self.exclude_streams.clear()
+        self._invalidate()
 
     def add_exclude_protocol(self, protocol):
         """
@@ -1971,12 +2694,14 @@ class PacketFilter:
         protocol = protocol.upper()
         if protocol not in self.exclude_protocols:
             self.exclude_protocols.add(protocol)
+            self._invalidate()
             return True
         return False
 
     def clear_exclude_protocols(self):
         """Очистить все исключенные протоколы"""
         self.exclude_protocols.clear()
+        self._invalidate()
 
     def _is_stream_excluded(self, stream):
         """Проверить, исключен ли уже этот stream"""
@@ -2065,26 +2790,458 @@ class PacketFilter:
         Returns:
             отфильтрованный список
         """
-        if not self.filters and not self.exclude_streams and not self.exclude_protocols:
+        predicate = self.get_predicate()
+        if predicate is None:
             return packets
 
-        filtered = []
+        return [packet for packet in packets if predicate(packet)]
 
-        for packet in packets:
-            # Проверяем исключенные протоколы
-            proto = packet.get('proto', '').upper()
-            if proto in self.exclude_protocols:
-                continue
+    # ---- скомпилированный предикат ----
 
-            # Затем проверяем исключенные стримы
-            if self._match_excluded_stream(packet):
-                continue
+    def get_predicate(self):
+        """Скомпилированный предикат packet -> bool (None = фильтров нет, проходят все).
+
+        Пересобирается только после изменения фильтров/исключений; семантика совпадает
+        с цепочкой exclude_protocols -> _match_excluded_stream -> _match_packet.
+        """
+        if self._compiled_generation != self._generation:
+            self._predicate = self._compile()
+            self._compiled_generation = self._generation
+        return self._predicate
+
+    @staticmethod
+    def _compile_text_matcher(pattern):
+        """regex (IGNORECASE) с откатом на поиск подстроки, как в _match_packet."""
+        try:
+            rx = re.compile(pattern, re.IGNORECASE)
+            return lambda value: rx.search(value) is not None
+        except (re.error, TypeError):
+            p = str(pattern).lower()
+            return lambda value: p in value.lower()
+
+    @staticmethod
+    def _compile_payload_matcher(pattern):
+        """Аналог _match_payload: regex по bytes, затем поиск подстроки (через PayloadSearch).
+
+        У PacketView кадр читается из арены без копирования. `match.prefetch(capture)`
+        один раз прогоняет поиск по всему буферу (sync перед полным пересчётом), после
+        чего пакеты этого буфера проверяются по готовому множеству номеров.
+        """
+        search = PayloadSearch(pattern, literal_fallback=True)
+
+        def match(packet):
+            pre = match.prefetched
+            if isinstance(packet, PacketView):
+                if pre is not None and packet._store is pre[0] and packet._epoch == pre[1] and packet.num <= pre[2]:
+                    return packet.num in pre[3]
+                data = packet.raw_view()
+            else:
+                data = packet.get('raw', b'') or b''
+            return search.find(data) >= 0
+
+        def prefetch(capture):
+            try:
+                hits = search.search(capture)
+            except Exception:
+                return
+            store, epoch, newest = search.last_scope
+            match.prefetched = (store, epoch, newest, frozenset(num for num, _ in hits))
+
+        match.prefetched = None
+        match.prefetch = prefetch
+        return match
+
+    def _excluded_stream_keys(self):
+        """Канонические (направление-независимые) ключи исключенных стримов."""
+        keys = set()
+        for excl in self.exclude_streams:
+            if isinstance(excl, dict):
+                a = (excl.get('src_ip'), excl.get('src_port'))
+                b = (excl.get('dst_ip'), excl.get('dst_port'))
+                proto = excl.get('proto')
+            else:
+                # профиль: (a_ip, b_ip, a_port, b_port, proto)
+                try:
+                    a_ip, b_ip, a_port, b_port, proto = excl
+                except (TypeError, ValueError):
+                    continue
+                a, b = (a_ip, a_port), (b_ip, b_port)
+            keys.add((proto, frozenset((a, b))))
+        return keys
+
+    def _compile(self):
+        """Собрать предикат из текущих фильтров (список проверок, все должны пройти)."""
+        checks = []
+
+        # 1) исключенные протоколы
+        if self.exclude_protocols:
+            excluded_protos = frozenset(self.exclude_protocols)
+            checks.append(lambda p: p.get('proto', '').upper() not in excluded_protos)
+
+        # 2) исключенные стримы (bidirectional)
+        if self.exclude_streams:
+            stream_keys = self._excluded_stream_keys()
+
+            def not_excluded(p):
+                src_ip = p.get('src_ip')
+                dst_ip = p.get('dst_ip')
+                src_port = p.get('src_port')
+                dst_port = p.get('dst_port')
+                if not (src_ip and dst_ip and src_port and dst_port):
+                    return True
+                proto = p.get('proto', '').upper()
+                if 'TCP' in proto:
+                    proto = 'TCP'
+                elif 'UDP' in proto:
+                    proto = 'UDP'
+                else:
+                    return True
+                return (proto, frozenset(((src_ip, src_port), (dst_ip, dst_port)))) not in stream_keys
+
+            checks.append(not_excluded)
+
+        # 3) обычные фильтры по полям
+        self._payload_check = None
+        self._uses_flow_attrs = any(field in self.FLOW_ATTR_FIELDS for field in self.filters)
+        for field, pattern in self.filters.items():
+            check = self._compile_field_check(field, pattern)
+            if field == 'payload':
+                self._payload_check = check
+            checks.append(check)
+
+        if not checks:
+            return None
+        if len(checks) == 1:
+            return checks[0]
+        checks = tuple(checks)
+        return lambda p: all(check(p) for check in checks)
+
+    def _compile_field_check(self, field, pattern):
+        """Проверка одного фильтра по полю (семантика _match_packet)."""
+        if field in ("any_port", "any_ip"):
+            suffix = field[4:]
+            src_key, dst_key = f"src_{suffix}", f"dst_{suffix}"
+            text_match = self._compile_text_matcher(pattern)
+
+            def any_check(p):
+                src_v = str(p.get(src_key, "") or "")
+                dst_v = str(p.get(dst_key, "") or "")
+                if not src_v and not dst_v:
+                    return False
+                return text_match(src_v) or text_match(dst_v)
+
+            return any_check
+
+        if field == 'payload':
+            return self._compile_payload_matcher(pattern)
+
+        if field in self.FLOW_ATTR_FIELDS:
+            # атрибут потока известен после разбора handshake; более ранние пакеты
+            # потока досчитываются в sync (см. _backfill_attr_flows)
+            attr_keys = self.FLOW_ATTR_FIELDS[field]
+            text_match = self._compile_text_matcher(pattern)
+
+            def attr_check(p):
+                flows = self._flows
+                k = FlowTable._key_for(p) if flows is not None else None
+                if k is None:
+                    return False
+                attrs = flows.attrs(k[0])
+                return any(text_match(str(attrs[a])) for a in attr_keys if attrs.get(a))
+
+            return attr_check
+
+        if field in ('tcp_syn', 'tcp_ack', 'tcp_fin', 'tcp_rst'):
+            want = pattern
+            if isinstance(want, str):
+                want = want.strip().lower() in ("1", "true", "yes", "y", "on")
+            want = bool(want)
+            return lambda p: bool(p.get(field, False)) == want
+
+        if field == 'tcp_flags':
+            need_set = frozenset(t.strip() for t in str(pattern).strip().upper().split(',') if t.strip())
+
+            def flags_check(p):
+                got = str(p.get('tcp_flags', '')).upper()
+                return need_set.issubset(t.strip() for t in got.split(',') if t.strip())
+
+            return flags_check
+
+        text_match = self._compile_text_matcher(pattern)
+
+        def field_check(p):
+            packet_value = str(p.get(field, ''))
+            return bool(packet_value) and text_match(packet_value)
+
+        return field_check
+
+    # ---- инкрементальный кэш совпадений ----
+
+    def sync(self, capture):
+        """Досчитать кэш совпадений по буферу capture.
 
-            # Затем применяем обычные фильтры
-            if self._match_packet(packet):
-                filtered.append(packet)
+        Проверяются только пакеты новее последнего проверенного `num`; вытесненные из
+        кольцевого буфера номера отбрасываются с головы. Полный пересчёт — только
+        при изменении фильтров или очистке буфера.
 
-        return filtered
+        Под capture.lock снимается только диапазон новых слотов; сам предикат (regex,
+        payload) считается без блокировки, чтобы не тормозить поток захвата. Пакеты,
+        вытесненные за это время, отбрасываются при фиксации результата (их уже
+        обработал _on_evict).
+
+        Returns:
+            int: количество отображаемых (совпавших) пакетов.
+        """
+        predicate = self.get_predicate()
+
+        # полный пересчёт с фильтром payload: сначала один поиск по всей арене (вне lock)
+        payload_check = self._payload_check
+        if payload_check is not None:
+            store = capture.packets
+            pre = payload_check.prefetched
+            if (self._generation, id(store), store._epoch) != self._synced_key and \
+                    (pre is None or pre[0] is not store or pre[1] != store._epoch):
+                payload_check.prefetch(capture)
+
+        with capture.lock:
+            store = capture.packets
+            if store is not self._listened_store:
+                store.evict_listeners.append(self._on_evict)
+                self._listened_store = store
+
+            key = (self._generation, id(store), store._epoch)
+            if key != self._synced_key:
+                self._synced_key = key
+                self._matched = []
+                self._matched_head = 0
+                self._last_evaluated_num = 0
+                self._hist = array('Q')
+                self._hist_low = None
+                self._attr_flows = set()
+                self.stats.reset()
+                self.match_epoch += 1
+            self._flows = capture.flows
+
+            # сегменты спула, удалённые ротацией, уходят и из истории
+            if self._hist_low is not None and capture.spool is not None:
+                self._trim_history(capture.spool.oldest_num)
+
+            count = len(store)
+            if not count:
+                self._matched_head = len(self._matched)
+                self._compact_matched()
+                return self.matched_count()
+
+            # отбрасываем вытесненные номера
+            self._matched_head = bisect_left(self._matched, store.oldest_num, self._matched_head)
+            self._compact_matched()
+
+            # снимок новых пакетов; предикат — уже вне lock
+            start_num = self._last_evaluated_num
+            num_col = store._num
+            views = []
+            for k in range(store.lower_bound(start_num + 1), count):
+                slot = store.slot_at(k)
+                views.append(PacketView(store, slot, num_col[slot]))
+            if not views:
+                return self.matched_count()
+            end_num = views[-1].num
+
+        if predicate is None:
+            hits = views
+        else:
+            hits = [view for view in views if predicate(view)]
+
+        with capture.lock:
+            if self._synced_key != key or self._last_evaluated_num != start_num:
+                # фильтры/буфер сменились или этот диапазон уже зафиксировал другой sync
+                return self.matched_count()
+            matched = self._matched
+            stats = self.stats
+            attr_flows = self._attr_flows if self._uses_flow_attrs else None
+            new_flows = []
+            for view in hits:
+                if not view.alive:
+                    continue
+                matched.append(view.num)
+                stats.add(view)
+                if attr_flows is not None:
+                    fk = FlowTable._key_for(view)
+                    if fk is not None and fk[0] not in attr_flows:
+                        attr_flows.add(fk[0])
+                        new_flows.append(fk[0])
+            if new_flows:
+                self._backfill_attr_flows(capture, new_flows, predicate)
+                # потоки, целиком ушедшие из буфера, больше не нужны (иначе множество растёт
+                # с каждым потоком за всё время захвата)
+                live_flows = capture.flows.flows
+                if len(attr_flows) > 2 * len(live_flows) + 1024:
+                    attr_flows.intersection_update(live_flows.keys())
+            self._last_evaluated_num = end_num
+
+        return self.matched_count()
+
+    def _backfill_attr_flows(self, capture, flow_keys, predicate):
+        """Поток впервые совпал по атрибуту (SNI/ALPN/...): добавить его пакеты, проверенные
+        раньше, когда атрибут ещё не был известен (SYN, рукопожатие). Под capture.lock."""
+        store = capture.packets
+        oldest = store.oldest_num
+        added = False
+        for fk in flow_keys:
+            for num in capture.flows.packet_nums(fk):
+                if num > self._last_evaluated_num:
+                    break
+                if num < oldest:
+                    continue
+                view = store.view_for_num(num)
+                if view is not None and predicate(view):
+                    insort(self._matched, num, self._matched_head)
+                    self.stats.add(view)
+                    added = True
+        if added:
+            self.match_epoch += 1
+
+    def _on_evict(self, store, slot, num):
+        """Пакет вытесняется из буфера (под capture.lock): убираем его из совпадений и статистики.
+
+        Если история из спула уже подгружалась, совпавший пакет переходит в неё,
+        чтобы между историей и буфером не было дыры.
+        """
+        if store is not self._listened_store:
+            return
+        if num > self._last_evaluated_num:
+            # пакет вытеснен, не дождавшись sync — проверяем его сразу
+            if self._hist_low is not None:
+                predicate = self.get_predicate()
+                if predicate is None or predicate(PacketView(store, slot, num)):
+                    self._hist.append(num)
+            return
+        head = self._matched_head
+        if head < len(self._matched) and self._matched[head] == num:
+            self._matched_head = head + 1
+            self.stats.remove(PacketView(store, slot, num))
+            if self._hist_low is not None:
+                self._hist.append(num)
+
+    def _trim_history(self, oldest):
+        i = bisect_left(self._hist, oldest)
+        if i:
+            del self._hist[:i]
+        if self._hist_low < oldest:
+            self._hist_low = oldest
+
+    def page_back(self, capture, max_scan=5000):
+        """Подгрузить из спула совпадения старше уже известных (листание вверх за начало буфера).
+
+        Спул просматривается страницами назад от нижней границы, пока не найдётся хотя бы
+        одно совпадение или не будет проверено max_scan пакетов. Статистика по-прежнему
+        считается только по буферу.
+
+        Returns:
+            int: сколько совпадений добавлено.
+        """
+        spool = capture.spool
+        if spool is None:
+            return 0
+        predicate = self.get_predicate()
+        with capture.lock:
+            key = self._synced_key
+            if self._hist_low is None:
+                store = capture.packets
+                self._hist_low = store.oldest_num if len(store) else self._last_evaluated_num + 1
+            boundary = self._hist_low
+
+        floor = max(1, spool.oldest_num)
+        page = capture.spool_page_size
+        found = []
+        low = boundary
+        while low > floor and not found and boundary - low < max_scan:
+            lo = max(floor, low - page)
+            for view in capture.spool_views(lo, low - 1):
+                if predicate is None or predicate(view):
+                    found.append(view.num)
+            low = lo
+
+        with capture.lock:
+            if self._synced_key != key or self._hist_low != boundary:
+                # фильтры/буфер изменились или историю уже подгрузил другой вызов
+                return 0
+            self._hist[:0] = array('Q', found)
+            self._hist_low = low
+        return len(found)
+
+    def _compact_matched(self):
+        head = self._matched_head
+        if head > 4096 and head * 2 > len(self._matched):
+            del self._matched[:head]
+            self._matched_head = 0
+
+    def matched_count(self):
+        """Количество совпавших пакетов (по состоянию последнего sync, вместе с историей из спула)."""
+        return len(self._matched) - self._matched_head + len(self._hist)
+
+    def history_nums(self):
+        """Номера совпадений, подгруженных из спула (старше буфера)."""
+        return list(self._hist)
+
+    def matched_nums(self, since=0):
+        """Номера совпавших пакетов с num > since (по состоянию последнего sync)."""
+        start = bisect_right(self._matched, since, self._matched_head)
+        return self._matched[start:]
+
+    def first_matched_num(self):
+        """Номер самого старого совпавшего пакета (0, если совпадений нет)."""
+        if self._hist:
+            return self._hist[0]
+        if self._matched_head < len(self._matched):
+            return self._matched[self._matched_head]
+        return 0
+
+    def last_matched_num(self):
+        """Номер самого нового совпавшего пакета (0, если совпадений нет)."""
+        if self._matched_head < len(self._matched):
+            return self._matched[-1]
+        return self._hist[-1] if self._hist else 0
+
+    def is_matched(self, num):
+        """Входит ли пакет num в отображаемый набор."""
+        m = self._matched
+        i = bisect_left(m, num, self._matched_head)
+        if i < len(m) and m[i] == num:
+            return True
+        h = self._hist
+        i = bisect_left(h, num)
+        return i < len(h) and h[i] == num
+
+    def next_matched(self, num):
+        """Следующий совпавший номер после num (None, если нет)."""
+        h = self._hist
+        i = bisect_right(h, num)
+        if i < len(h):
+            return h[i]
+        m = self._matched
+        i = bisect_right(m, num, self._matched_head)
+        return m[i] if i < len(m) else None
+
+    def prev_matched(self, num):
+        """Предыдущий совпавший номер перед num (None, если нет)."""
+        head = self._matched_head
+        i = bisect_left(self._matched, num, head) - 1
+        if i >= head:
+            return self._matched[i]
+        i = bisect_left(self._hist, num) - 1
+        return self._hist[i] if i >= 0 else None
+
+    def displayed_packets(self, capture, since=0):
+        """PacketView совпавших пакетов с num > since (предикат заново не вычисляется)."""
+        with capture.lock:
+            store = capture.packets
+            out = []
+            for num in self.matched_nums(since):
+                view = store.view_for_num(num)
+                if view is not None:
+                    out.append(view)
+            return out
 
     def _match_packet(self, packet):
         """Проверить соответствие пакета фильтрам"""
@@ -2171,27 +3328,13 @@ class PacketFilter:
 
     def _match_payload(self, packet, pattern):
         """Поиск в payload пакета"""
-        raw_data = packet.get('raw', b'')
-
-        if not raw_data:
+        data = packet.raw_view() if isinstance(packet, PacketView) else packet.get('raw', b'')
+        if not data:
             return False
-
-        try:
-            # Пробуем как регулярное выражение
-            pattern_bytes = pattern.encode('utf-8', errors='ignore')
-            if re.search(pattern_bytes, raw_data, re.IGNORECASE):
-                return True
-        except:
-            pass
-
         try:
-            # Пробуем простой поиск
-            if pattern.lower().encode('utf-8') in raw_data.lower():
-                return True
-        except:
-            pass
-
-        return False
+            return PayloadSearch(pattern, literal_fallback=True).find(data) >= 0
+        except Exception:
+            return False
 
     def search_payload(self, packets, search_string, case_sensitive=False):
         """
@@ -2205,27 +3348,25 @@ class PacketFilter:
         Returns:
             список найденных пакетов
         """
-        results = []
-
-        for packet in packets:
-            raw_data = packet.get('raw', b'')
+        try:
+            search = PayloadSearch(search_string, case_sensitive)
+        except Exception:
+            return []
 
-            if not raw_data:
-                continue
+        results = []
+        for packet in packets:
+            data = packet.raw_view() if isinstance(packet, PacketView) else packet.get('raw', b'')
+            if data and search.find(data) >= 0:
+                results.append(packet)
+        return results
 
-            try:
-                if case_sensitive:
-                    pattern = search_string.encode('utf-8')
-                    if re.search(pattern, raw_data):
-                        results.append(packet)
-                else:
-                    pattern = search_string.encode('utf-8')
-                    if re.search(pattern, raw_data, re.IGNORECASE):
-                        results.append(packet)
-            except:
-                continue
+    def search_buffer(self, capture, search_string, case_sensitive=False, executor=None):
+        """Поиск по payload во всём буфере capture прямо по арене (см. PayloadSearch).
 
-        return results
+        Returns:
+            list[(num, offset)]: номера совпавших пакетов и смещение совпадения в кадре.
+        """
+        return PayloadSearch(search_string, case_sensitive).search(capture, executor)
 
     def get_filter_summary(self):
         """Получить краткое описание активных фильтров"""
@@ -2280,1116 +3421,2430 @@ class PacketFilter:
         return sorted(ip_bytes.items(), key=lambda x: x[1], reverse=True)[:limit]
 
 
-class PacketCapture:
-    """
-    Захват пакетов с кольцевым буфером и поддержкой нескольких интерфейсов
-    """
-
-    def __init__(self, interface=None, packet_limit=50000, log_file=None):
-        """
-        Инициализация захвата пакетов
-
-        Args:
-            interface: сетевой интерфейс или список интерфейсов
-                      None - автоопределение
-                      'any' - все интерфейсы
-                      'eth0' - один интерфейс
-                      ['eth0', 'wlan0'] - список интерфейсов
-            packet_limit: максимальное количество пакетов в буфере
-            log_file: путь к файлу логов (None = без логов)
-        """
-        self.packet_limit = packet_limit
-        self.bpf_filter = None  # str|None
-        self.log_file = log_file
+# Протоколы с фиксированными id в колонке proto (прочие имена интернируются на лету)
+PROTO_NAMES = ('UNKNOWN', 'TCP', 'TCPv6', 'UDP', 'UDPv6', 'DNS', 'ARP', 'ICMP', 'ICMPv6', 'ETHER')
 
-        self.tls_ch_buffers = {}  # key -> bytearray
-        self.tls_ch_parsed = set()  # key -> уже распарсили (чтобы не парсить снова)
 
-        # Определяем список интерфейсов для захвата
-        if interface is None:
-            # Автоопределение - основной интерфейс
-            self.interfaces = [conf.iface]
-            self.interface = conf.iface
-        elif interface == 'any':
-            # Захват со всех интерфейсов
-            self.interfaces = self._get_all_interfaces()
-            self.interface = 'any'
-        elif isinstance(interface, list):
-            # Список интерфейсов
-            self.interfaces = interface
-            self.interface = ','.join(interface)
-        else:
-            # Один интерфейс
-            self.interfaces = [interface]
-            self.interface = interface
+def _pack_ip(value):
+    """Упаковать строку IP в (family, 16 байт). None/непарсабельное -> (0, None)."""
+    if not value:
+        return 0, None
+    try:
+        return 4, socket.inet_pton(socket.AF_INET, value).ljust(16, b"\0")
+    except (OSError, TypeError, ValueError):
+        pass
+    try:
+        return 6, socket.inet_pton(socket.AF_INET6, value)
+    except (OSError, TypeError, ValueError):
+        return 0, None
 
-        # Кольцевой буфер с максимальным размером
-        self.packets = deque(maxlen=packet_limit)
 
-        # Lock для thread-safety
-        self.lock = threading.Lock()
+class PacketView(Mapping):
+    """Лёгкое read-only представление пакета из PacketStore.
 
-        # Потоки захвата (по одному на интерфейс)
-        self.capture_threads = []
-        self.running = False
-        self.stop_sniffing = threading.Event()
+    Ведёт себя как прежний dict packet_info (`pkt['proto']`, `pkt.get('src_ip')`),
+    но сам ничего не хранит: поля собираются из колонок буфера при обращении,
+    а `raw_packet` (scapy-объект) пересобирается из байтов только по запросу.
 
-        # Счетчики для статистики
-        self.packet_counter = 0
-        self.total_bytes = 0
-        self.start_time = None
+    Если пакет уже вытеснен из кольцевого буфера, view "мёртвый":
+    доступно только поле `num`, остальные ведут себя как отсутствующие ключи.
+    """
 
-        # Bandwidth tracking
-        self.bytes_last_second = 0
-        self.last_bandwidth_check = None
-        self.current_bandwidth = 0
+    __slots__ = ("_store", "_slot", "_epoch", "num")
+
+    def __init__(self, store, slot, num):
+        self._store = store
+        self._slot = slot
+        self._epoch = store._epoch
+        self.num = num
+
+    @property
+    def alive(self):
+        """True, пока пакет ещё лежит в буфере."""
+        st = self._store
+        return st._epoch == self._epoch and st._num[self._slot] == self.num
+
+    def __getitem__(self, key):
+        if key == "num":
+            return self.num
+        getter = PacketStore.FIELD_GETTERS.get(key)
+        if getter is None or not self.alive:
+            raise KeyError(key)
+        if key == "seq_gap" and not (self._store._flags[self._slot] & PacketStore.F_LOSS):
+            raise KeyError(key)
+        # Чтение идёт без блокировки: если слот вытеснили/перезаписали во время чтения,
+        # значение могло прийти от другого пакета - считаем пакет уже отсутствующим
+        try:
+            value = getter(self._store, self._slot)
+        except Exception:
+            if not self.alive:
+                raise KeyError(key) from None
+            raise
+        if not self.alive:
+            raise KeyError(key)
+        return value
 
-        # Latency tracking
-        self.latency_samples = deque(maxlen=1000)
+    def __iter__(self):
+        if not self.alive:
+            yield "num"
+            return
+        yield from PacketStore.FIELDS
+        if self._store._flags[self._slot] & PacketStore.F_LOSS:
+            yield "seq_gap"
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, PacketView):
+            return self._store is other._store and self.num == other.num and self._epoch == other._epoch
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self._store), self._epoch, self.num))
+
+    def __repr__(self):
+        return f"<PacketView #{self.num}{'' if self.alive else ' evicted'}>"
+
+    def raw_view(self):
+        """memoryview на байты кадра в арене (без копирования); b'' если пакет вытеснен."""
+        if not self.alive:
+            return memoryview(b"")
+        return self._store.raw_view(self._slot)
+
+    def to_dict(self):
+        """Материализовать пакет в обычный dict packet_info (включая scapy `raw_packet`)."""
+        if not self.alive:
+            return {"num": self.num}
+        try:
+            return {k: self[k] for k in self}
+        except KeyError:
+            # вытеснен во время сборки: частичный dict был бы смесью двух пакетов
+            return {"num": self.num}
 
-        # Packet loss detection
-        self.tcp_sequence_tracker = {}
-        self.packet_loss_count = 0
 
-        self._log(f"Initialized with interfaces: {self.interfaces}")
-        self._log(f"Ring buffer max: {packet_limit} packets")
+class PacketStore:
+    """Кольцевой буфер пакетов в колоночном виде.
 
-    def _get_all_interfaces(self):
-        """Получить список всех сетевых интерфейсов"""
-        try:
-            # Получаем все интерфейсы
-            all_ifaces = get_if_list()
+    Вместо deque из dict'ов (каждый держал scapy-объект и копию bytes) поля
+    фиксированной ширины лежат в `array` (timestamp, IP, порты, proto id, флаги, размер),
+    а сырые кадры — в одной общей байтовой арене, которая тоже работает как кольцо.
+    Пакет вытесняется, когда кончаются слоты ИЛИ место в арене.
 
-            # Фильтруем служебные интерфейсы
-            filtered = [
-                iface for iface in all_ifaces
-                if not iface.startswith('lo') and  # loopback
-                   not iface.startswith('docker') and  # docker
-                   not iface.startswith('veth') and  # virtual ethernet
-                   not iface.startswith('br-')  # bridge
-            ]
+    Наружу пакеты отдаются как PacketView — dict-подобные ленивые представления.
+    Не thread-safe: синхронизацию обеспечивает владелец (PacketCapture.lock).
+    """
 
-            # Если список пустой - берем все кроме lo
-            if not filtered:
-                filtered = [iface for iface in all_ifaces if iface != 'lo']
+    # биты колонки flags
+    F_SYN = 0x0001
+    F_ACK = 0x0002
+    F_FIN = 0x0004
+    F_RST = 0x0008
+    F_LOSS = 0x0010
+    F_INFO_SHORT = 0x0020  # info_short == info (TCP), иначе info_short пустой
+    F_HAS_SEQ = 0x0040
+    F_HAS_MAC = 0x0080
+
+    FIELDS = (
+        'num', 'timestamp', 'proto', 'src', 'dst', 'src_ip', 'dst_ip', 'src_port', 'dst_port',
+        'info', 'info_short', 'info_long', 'size', 'raw_packet', 'raw', 'interface',
+        'packet_loss', 'tcp_flags', 'tcp_flags_raw', 'tcp_syn', 'tcp_ack', 'tcp_fin', 'tcp_rst',
+        'tcp_seq', 'tcp_acknum',
+    )
 
-            self._log(f"Detected interfaces: {filtered}")
-            return filtered if filtered else [conf.iface]
+    def __init__(self, capacity=50000, arena_bytes=None):
+        """
+        Args:
+            capacity: максимальное количество пакетов (слотов).
+            arena_bytes: размер арены сырых кадров; None -> 1 KiB на слот (минимум 16 MiB).
+        """
+        self.capacity = max(1, int(capacity))
+        self.arena_bytes = int(arena_bytes or max(self.capacity * 1024, 16 * 1024 * 1024))
+        self._epoch = 0
+
+        self._protos = list(PROTO_NAMES)
+        self._proto_ids = {name: i for i, name in enumerate(self._protos)}
+        self._ifaces = [None]
+        self._iface_ids = {None: 0}
+        self._links = [(None, 1)]     # (класс первого слоя scapy, DLT)
+        self._link_ids = {(None, 1): 0}
+        self._ip_str_cache = {}
+
+        # callback(store, slot, num) перед вытеснением пакета (поля ещё доступны)
+        self.evict_listeners = []
+
+        self._alloc()
+
+    def _alloc(self):
+        cap = self.capacity
+        self._num = array('Q', [0]) * cap
+        self._ts = array('d', [0.0]) * cap
+        self._size = array('I', [0]) * cap
+        self._proto = array('H', [0]) * cap
+        self._flags = array('H', [0]) * cap
+        self._tcp_flags = array('B', [0]) * cap
+        self._sport = array('i', [-1]) * cap
+        self._dport = array('i', [-1]) * cap
+        self._seq = array('I', [0]) * cap
+        self._ack = array('I', [0]) * cap
+        self._seq_gap = array('q', [0]) * cap
+        self._iface = array('H', [0]) * cap
+        self._link = array('H', [0]) * cap
+        self._ipfam = array('B', [0]) * cap
+        self._ip = bytearray(32 * cap)    # src(16) + dst(16)
+        self._mac = bytearray(12 * cap)   # src(6) + dst(6)
+        self._off = array('Q', [0]) * cap
+        self._len = array('I', [0]) * cap
+        self._info = [None] * cap
+        self._info_long = [None] * cap
+        # slot -> (src_ip, dst_ip) для адресов, не влезающих в колонку _ip (разные семейства,
+        # только одна сторона, не-IP строка): редкость, поэтому в разреженном dict
+        self._ip_extra = {}
+        self._arena = bytearray(self.arena_bytes)
+
+        self._head = 0       # слот самого старого пакета
+        self._count = 0
+        self._arena_w = 0    # позиция записи в арене
+
+    # ---- интернирование ----
 
-        except Exception as e:
-            self._log(f"Error getting interfaces: {e}")
-            return [conf.iface]
+    @staticmethod
+    def _intern(table, ids, value):
+        i = ids.get(value)
+        if i is None:
+            i = len(table)
+            table.append(value)
+            ids[value] = i
+        return i
+
+    # ---- запись ----
+
+    def __len__(self):
+        return self._count
+
+    def _evict_oldest(self):
+        slot = self._head
+        for listener in self.evict_listeners:
+            try:
+                listener(self, slot, self._num[slot])
+            except Exception:
+                pass
+        self._num[slot] = 0
+        self._info[slot] = None
+        self._info_long[slot] = None
+        if self._ip_extra:
+            self._ip_extra.pop(slot, None)
+        self._head = (slot + 1) % self.capacity
+        self._count -= 1
+
+    def _arena_reserve(self, n):
+        """Выделить n байт в арене, вытесняя самые старые пакеты, чьи кадры мешают."""
+        w = self._arena_w
+        if w + n > self.arena_bytes:
+            # хвост арены не вмещает кадр: освобождаем хвост и переходим в начало
+            while self._count and self._off[self._head] >= w:
+                self._evict_oldest()
+            w = 0
+        while self._count:
+            h = self._head
+            o = self._off[h]
+            if o < w + n and w < o + self._len[h]:
+                self._evict_oldest()
+            else:
+                break
+        self._arena_w = w + n
+        return w
 
-    def _tls_flow_key(self, packet_info):
-        # направление важно: ClientHello идёт от клиента к серверу.
-        # но нам всё равно — просто копим на оба направления отдельно.
-        return (
-            str(packet_info.get("src_ip")),
-            int(packet_info.get("src_port") or 0),
-            str(packet_info.get("dst_ip")),
-            int(packet_info.get("dst_port") or 0),
-            "TCP"
-        )
+    def append(self, packet_info):
+        """Добавить разобранный пакет (dict из PacketCapture._parse_packet c заполненным 'num').
 
-    def _try_parse_tls_summary_buffered(self, pkt, packet_info):
-        """
-        Буферизуем первые TCP payload по 5-tuple и пытаемся вытащить ClientHello (SNI/ALPN)
-        и иногда ServerHello (cipher) если попался.
-        Возвращает строку или None.
+        Returns:
+            int: слот, в который записан пакет.
         """
+        if self._count == self.capacity:
+            self._evict_oldest()
+
+        raw = packet_info.get('raw') or b""
+        n = min(len(raw), self.arena_bytes)
+        off = self._arena_reserve(n)
+        if self._count == self.capacity:
+            self._evict_oldest()
+
+        i = (self._head + self._count) % self.capacity
+        # Слот свободен (_num == 0) до конца записи: номер публикуется последним,
+        # чтобы читатель без блокировки (PacketView) не принял полузаписанный слот за живой
+        self._num[i] = 0
+        self._arena[off:off + n] = raw[:n]
+        self._off[i] = off
+        self._len[i] = n
+
+        ts = packet_info.get('timestamp')
+        self._ts[i] = ts.timestamp() if isinstance(ts, datetime) else float(ts or 0.0)
+        self._size[i] = int(packet_info.get('size') or 0)
+        self._proto[i] = self._intern(self._protos, self._proto_ids, packet_info.get('proto') or 'UNKNOWN')
+
+        flags = 0
+        if packet_info.get('tcp_syn'):
+            flags |= self.F_SYN
+        if packet_info.get('tcp_ack'):
+            flags |= self.F_ACK
+        if packet_info.get('tcp_fin'):
+            flags |= self.F_FIN
+        if packet_info.get('tcp_rst'):
+            flags |= self.F_RST
+        if packet_info.get('packet_loss'):
+            flags |= self.F_LOSS
+            self._seq_gap[i] = int(packet_info.get('seq_gap') or 0)
+        info = packet_info.get('info') or ''
+        if info and packet_info.get('info_short') == info:
+            flags |= self.F_INFO_SHORT
+        if packet_info.get('tcp_seq') is not None:
+            flags |= self.F_HAS_SEQ
+            self._seq[i] = int(packet_info['tcp_seq']) & 0xFFFFFFFF
+            self._ack[i] = int(packet_info.get('tcp_acknum') or 0) & 0xFFFFFFFF
+        self._tcp_flags[i] = int(packet_info.get('tcp_flags_raw') or 0) & 0xFF
+
+        sp = packet_info.get('src_port')
+        dp = packet_info.get('dst_port')
+        self._sport[i] = int(sp) if sp is not None else -1
+        self._dport[i] = int(dp) if dp is not None else -1
+
+        src_ip = packet_info.get('src_ip')
+        dst_ip = packet_info.get('dst_ip')
+        fam_s, ip_s = _pack_ip(src_ip)
+        fam_d, ip_d = _pack_ip(dst_ip)
+        if fam_s and fam_s == fam_d:
+            self._ipfam[i] = fam_s
+            self._ip[i * 32:i * 32 + 16] = ip_s
+            self._ip[i * 32 + 16:i * 32 + 32] = ip_d
+        else:
+            self._ipfam[i] = 0
+            # сохраняем как есть, чтобы view отдавал те же значения, что видели stats/flows при add
+            if src_ip or dst_ip:
+                self._ip_extra[i] = (str(src_ip) if src_ip else None, str(dst_ip) if dst_ip else None)
+
         try:
-            key = self._tls_flow_key(packet_info)
-            if key in self.tls_ch_parsed:
-                return None
+            mac_s = bytes.fromhex(str(packet_info.get('src') or '').replace(':', ''))
+            mac_d = bytes.fromhex(str(packet_info.get('dst') or '').replace(':', ''))
+        except ValueError:
+            mac_s = mac_d = b""
+        if len(mac_s) == 6 and len(mac_d) == 6:
+            flags |= self.F_HAS_MAC
+            self._mac[i * 12:i * 12 + 6] = mac_s
+            self._mac[i * 12 + 6:i * 12 + 12] = mac_d
+
+        self._flags[i] = flags
+        self._iface[i] = self._intern(self._ifaces, self._iface_ids, packet_info.get('interface'))
+        raw_packet = packet_info.get('raw_packet')
+        linktype = packet_info.get('linktype')
+        if linktype is not None:
+            # offline-разбор: scapy-объект не передаётся между процессами, только DLT файла
+            link = (conf.l2types.num2layer.get(linktype), linktype)
+        elif raw_packet is not None:
+            cls = type(raw_packet)
+            link = (cls, conf.l2types.layer2num.get(cls, 1))
+        else:
+            link = (None, 1)
+        self._link[i] = self._intern(self._links, self._link_ids, link)
+        self._info[i] = info
+        self._info_long[i] = packet_info.get('info_long') or None
 
-            data = self._get_tcp_payload_bytes(pkt)
-            if not data:
-                return None
+        self._num[i] = int(packet_info['num'])
+        self._count += 1
+        return i
 
-            # Ограничим буфер (ClientHello обычно < 8-12 KB)
-            buf = self.tls_ch_buffers.get(key)
-            if buf is None:
-                buf = bytearray()
-                self.tls_ch_buffers[key] = buf
+    def clear(self):
+        """Очистить буфер (уже выданные PacketView становятся мёртвыми)."""
+        self._epoch += 1
+        self._alloc()
 
-            if len(buf) < 16384:
-                need = 16384 - len(buf)
-                buf.extend(data[:need])
+    # ---- чтение ----
 
-            # Пытаемся распарсить уже накопленное
-            # s = self._try_parse_tls_summary_from_bytes(bytes(buf))
-            blob = bytes(buf)
+    def slot_at(self, index):
+        """Слот index-го по возрасту пакета (0 = самый старый)."""
+        return (self._head + index) % self.capacity
 
-            s = self._try_parse_tls_summary_from_bytes(blob)  # ClientHello: SNI/ALPN
-            if not s:
-                s = self._try_parse_tls_serverhello_from_bytes(blob)  # ServerHello: cipher
+    def views(self):
+        """Список PacketView от старых к новым."""
+        cap = self.capacity
+        head = self._head
+        num = self._num
+        out = []
+        for k in range(self._count):
+            slot = (head + k) % cap
+            out.append(PacketView(self, slot, num[slot]))
+        return out
 
-            if s:
-                self.tls_ch_parsed.add(key)
-                # можно чистить буфер, чтобы не росло
-                self.tls_ch_buffers.pop(key, None)
-                return s
+    def lower_bound(self, num):
+        """Индекс (по возрасту) первого пакета с номером >= num; бинарный поиск по кольцу."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._num[(self._head + mid) % self.capacity] < num:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find_slot(self, num):
+        """Найти слот пакета по номеру (номера в буфере монотонны)."""
+        k = self.lower_bound(num)
+        if k < self._count:
+            slot = (self._head + k) % self.capacity
+            if self._num[slot] == num:
+                return slot
+        return None
 
-            # если буфер уже большой, а результата нет — прекращаем
-            if len(buf) >= 16384:
-                self.tls_ch_parsed.add(key)
-                self.tls_ch_buffers.pop(key, None)
+    def view_for_num(self, num):
+        slot = self.find_slot(num)
+        return PacketView(self, slot, num) if slot is not None else None
+
+    @property
+    def oldest_num(self):
+        return self._num[self._head] if self._count else 0
+
+    @property
+    def newest_num(self):
+        return self._num[self.slot_at(self._count - 1)] if self._count else 0
+
+    def raw_view(self, slot):
+        off = self._off[slot]
+        return memoryview(self._arena)[off:off + self._len[slot]]
+
+    def linktype(self, slot):
+        """DLT link-layer пакета (из файла или по классу первого слоя; Ethernet по умолчанию)."""
+        return self._links[self._link[slot]][1]
+
+    def memory_usage(self):
+        """Примерный объём памяти буфера в байтах (колонки + арена)."""
+        cols = (self._num, self._ts, self._size, self._proto, self._flags, self._tcp_flags,
+                self._sport, self._dport, self._seq, self._ack, self._seq_gap, self._iface,
+                self._link, self._ipfam, self._off, self._len)
+        total = sum(a.itemsize * len(a) for a in cols)
+        total += len(self._ip) + len(self._mac) + len(self._arena)
+        total += sys.getsizeof(self._info) + sys.getsizeof(self._info_long)
+        return total
+
+    # ---- сборка полей ----
+
+    def _ip_str(self, slot, offset):
+        fam = self._ipfam[slot]
+        if not fam:
+            extra = self._ip_extra.get(slot)
+            return extra[1 if offset else 0] if extra else None
+        base = slot * 32 + offset
+        key = bytes(self._ip[base:base + (4 if fam == 4 else 16)])
+        s = self._ip_str_cache.get(key)
+        if s is None:
+            s = socket.inet_ntop(socket.AF_INET if fam == 4 else socket.AF_INET6, key)
+            if len(self._ip_str_cache) > 65536:
+                self._ip_str_cache.clear()
+            self._ip_str_cache[key] = s
+        return s
+
+    def _mac_str(self, slot, offset):
+        if not (self._flags[slot] & self.F_HAS_MAC):
+            return ''
+        base = slot * 12 + offset
+        return self._mac[base:base + 6].hex(':')
+
+    def _tcp_flags_str(self, slot):
+        f = self._flags[slot]
+        parts = []
+        if f & self.F_SYN: parts.append("SYN")
+        if f & self.F_ACK: parts.append("ACK")
+        if f & self.F_FIN: parts.append("FIN")
+        if f & self.F_RST: parts.append("RST")
+        return ",".join(parts)
+
+    def rebuild_scapy(self, slot):
+        """Пересобрать scapy-пакет из сырых байтов (с исходным link-layer, .time и .sniffed_on)."""
+        raw = bytes(self.raw_view(slot))
+        cls, linktype = self._links[self._link[slot]]
+        if cls is None:
+            cls = Ether if linktype == 1 else conf.raw_layer
+        try:
+            pkt = cls(raw)
+        except Exception:
+            pkt = Raw(raw)
+        pkt.time = self._ts[slot]
+        iface = self._ifaces[self._iface[slot]]
+        if iface:
+            pkt.sniffed_on = iface
+        return pkt
+
+    FIELD_GETTERS = {
+        'timestamp': lambda s, i: datetime.fromtimestamp(s._ts[i]),
+        'proto': lambda s, i: s._protos[s._proto[i]],
+        'src': lambda s, i: s._mac_str(i, 0),
+        'dst': lambda s, i: s._mac_str(i, 6),
+        'src_ip': lambda s, i: s._ip_str(i, 0),
+        'dst_ip': lambda s, i: s._ip_str(i, 16),
+        'src_port': lambda s, i: s._sport[i] if s._sport[i] >= 0 else None,
+        'dst_port': lambda s, i: s._dport[i] if s._dport[i] >= 0 else None,
+        'info': lambda s, i: s._info[i] or '',
+        'info_short': lambda s, i: (s._info[i] or '') if s._flags[i] & PacketStore.F_INFO_SHORT else '',
+        'info_long': lambda s, i: s._info_long[i] or '',
+        'size': lambda s, i: s._size[i],
+        'raw_packet': lambda s, i: s.rebuild_scapy(i),
+        'raw': lambda s, i: bytes(s.raw_view(i)),
+        'interface': lambda s, i: s._ifaces[s._iface[i]],
+        'packet_loss': lambda s, i: bool(s._flags[i] & PacketStore.F_LOSS),
+        'seq_gap': lambda s, i: s._seq_gap[i],
+        'tcp_flags': lambda s, i: s._tcp_flags_str(i),
+        'tcp_flags_raw': lambda s, i: s._tcp_flags[i],
+        'tcp_syn': lambda s, i: bool(s._flags[i] & PacketStore.F_SYN),
+        'tcp_ack': lambda s, i: bool(s._flags[i] & PacketStore.F_ACK),
+        'tcp_fin': lambda s, i: bool(s._flags[i] & PacketStore.F_FIN),
+        'tcp_rst': lambda s, i: bool(s._flags[i] & PacketStore.F_RST),
+        'tcp_seq': lambda s, i: s._seq[i] if s._flags[i] & PacketStore.F_HAS_SEQ else None,
+        'tcp_acknum': lambda s, i: s._ack[i] if s._flags[i] & PacketStore.F_HAS_SEQ else None,
+    }
+
+
+class FlowTable:
+    """Индекс потоков по каноническому 5-tuple для пакетов из PacketStore.
+
+    Пополняется по мере записи пакетов в буфер (add) и чистится при их вытеснении
+    (remove), поэтому Follow Stream / детали flow — это поиск по ключу, а не проход
+    по всему буферу. Для каждого потока хранится:
+      - nums: номера пакетов потока (по возрастанию);
+      - для TCP по каждому направлению — сегменты (seq, num), упорядоченные по seq,
+        и границы payload внутри сырого кадра (данные читаются из арены при запросе);
+      - первые SYN и SYN+ACK (определение клиента и RTT);
+      - attrs: атрибуты потока из разбора при захвате (SNI, ALPN, JA3, subject
+        сертификата — см. PacketCapture._try_parse_tls_summary_buffered).
+
+    Ключ совпадает с FlowListBox._canon_flow_key: (proto, ip_low, port_low, ip_high, port_high).
+    Не thread-safe: вызывается под PacketCapture.lock.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.flows = {}
+        # ключ потока каждого учтённого пакета в порядке добавления: вытеснение идёт
+        # с головы буфера, поэтому remove снимает ключ с головы, а не пересчитывает его
+        # из полей view (у пакетов без IP-колонки они могли не восстановиться)
+        self._order_nums = deque()
+        self._order_keys = deque()
+
+    @staticmethod
+    def flow_key(proto, src_ip, src_port, dst_ip, dst_port):
+        """Bidirectional canonical key: (proto, ep_low, ep_high)"""
+        a = (str(src_ip), int(src_port))
+        b = (str(dst_ip), int(dst_port))
+        ep1, ep2 = (a, b) if a <= b else (b, a)
+        return (proto, ep1[0], ep1[1], ep2[0], ep2[1])
 
+    @classmethod
+    def _key_for(cls, p):
+        """(key, src_endpoint) для TCP/UDP пакета с IP и портами, иначе None."""
+        proto = (p.get('proto') or '').upper()
+        if 'TCP' in proto:
+            proto = 'TCP'
+        elif 'UDP' in proto:
+            proto = 'UDP'
+        else:
             return None
-        except Exception:
+        src_ip, dst_ip = p.get('src_ip'), p.get('dst_ip')
+        src_port, dst_port = p.get('src_port'), p.get('dst_port')
+        if not src_ip or not dst_ip or src_port is None or dst_port is None:
             return None
+        try:
+            key = cls.flow_key(proto, src_ip, src_port, dst_ip, dst_port)
+        except (TypeError, ValueError):
+            return None
+        return key, (str(src_ip), int(src_port))
 
-    def set_bpf_filter(self, bpf: str | None):
-        bpf = (bpf or "").strip()
-        self.bpf_filter = bpf if bpf else None
-        self._log(f"Set BPF filter: {self.bpf_filter!r}")
+    def add(self, packet_info):
+        """Учесть пакет, только что записанный в буфер (dict packet_info с 'num' и 'raw')."""
+        k = self._key_for(packet_info)
+        if k is None:
+            return
+        key, src_ep = k
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = {'nums': deque(), 'segs': {}, 'dirs': {}, 'syn': deque(), 'synack': deque(), 'attrs': {}}
+            self.flows[key] = flow
+
+        num = packet_info['num']
+        flow['nums'].append(num)
+        self._order_nums.append(num)
+        self._order_keys.append(key)
+        attrs = packet_info.get('flow_attrs')
+        if attrs:
+            flow['attrs'].update(attrs)
+        if key[0] != 'TCP':
+            return
 
-    def _log(self, message):
-        """Логирование в файл вместо print()"""
-        if self.log_file:
+        if packet_info.get('tcp_syn'):
+            flow['synack' if packet_info.get('tcp_ack') else 'syn'].append((num, src_ep))
+
+        bounds = tcp_seq_payload_bounds(packet_info.get('raw') or b"", packet_linktype(packet_info))
+        if bounds is not None:
+            seq, start, end = bounds
+            data = None
+            if end <= start:
+                return
+        else:
+            # нестандартный link-layer: разбираем через scapy и храним payload
+            seq, data = extract_tcp_seq_payload(packet_info)
+            start = end = 0
+            if seq is None or not data:
+                return
+
+        flow['segs'][num] = (src_ep, seq, start, end, data)
+        insort(flow['dirs'].setdefault(src_ep, []), (seq, num))
+
+    def remove(self, packet):
+        """Убрать вытесняемый пакет (PacketView/dict с полями пакета; нужен только 'num')."""
+        num = packet['num']
+        order_nums = self._order_nums
+        while order_nums and order_nums[0] < num:
+            # пакет старше вытесняемого уже ушёл мимо remove (не должно случаться)
+            order_nums.popleft()
+            self._order_keys.popleft()
+        if not order_nums or order_nums[0] != num:
+            return
+        order_nums.popleft()
+        key = self._order_keys.popleft()
+        flow = self.flows.get(key)
+        if flow is None:
+            return
+
+        nums = flow['nums']
+        if nums and nums[0] == num:
+            nums.popleft()
+        else:
             try:
-                with open(self.log_file, 'a') as f:
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    f.write(f"[{timestamp}] {message}\n")
-            except:
+                nums.remove(num)
+            except ValueError:
                 pass
 
-    def _packet_handler(self, pkt):
-        """Обработчик пакета (callback для sniff)"""
-        if not self.running:
-            return
+        seg = flow['segs'].pop(num, None)
+        if seg is not None:
+            lst = flow['dirs'].get(seg[0], [])
+            i = bisect_left(lst, (seg[1], num))
+            if i < len(lst) and lst[i] == (seg[1], num):
+                del lst[i]
 
-        with self.lock:
-            # Парсим пакет
-            packet_info = self._parse_packet(pkt)
+        for name in ('syn', 'synack'):
+            dq = flow[name]
+            if dq and dq[0][0] == num:
+                dq.popleft()
 
-            # Добавляем номер пакета
-            self.packet_counter += 1
-            packet_info['num'] = self.packet_counter
+        if not nums:
+            del self.flows[key]
 
-            # Добавляем в кольцевой буфер
-            self.packets.append(packet_info)
+    def clear(self):
+        self.flows.clear()
+        self._order_nums.clear()
+        self._order_keys.clear()
 
-            # Обновляем статистику bandwidth
-            packet_size = packet_info.get('size', 0)
-            self.total_bytes += packet_size
-            self.bytes_last_second += packet_size
+    # ---- запросы ----
 
-            # Обновляем bandwidth каждую секунду
-            current_time = time.time()
-            if self.last_bandwidth_check is None:
-                self.last_bandwidth_check = current_time
-            elif current_time - self.last_bandwidth_check >= 1.0:
-                self.current_bandwidth = self.bytes_last_second
-                self.bytes_last_second = 0
-                self.last_bandwidth_check = current_time
+    def packet_nums(self, key):
+        """Номера пакетов потока (по возрастанию)."""
+        flow = self.flows.get(key)
+        return list(flow['nums']) if flow else []
 
-            # Детекция packet loss для TCP
-            if packet_info['proto'] in ['TCP', 'TCPv4', 'TCPv6']:
-                self._detect_packet_loss(packet_info, pkt)
+    def attrs(self, key):
+        """Атрибуты потока (dict, пустой — если потока нет или атрибутов не найдено)."""
+        flow = self.flows.get(key)
+        return flow['attrs'] if flow else {}
 
-            # Измерение latency
-            self._measure_latency(pkt)
+    def guess_client_server(self, ip1, port1, ip2, port2):
+        """Аналог guess_tcp_client_server: инициатор первого SYN без ACK — клиент.
 
-    def _detect_packet_loss(self, packet_info, pkt):
-        """Улучшенная детекция потери пакетов"""
-        try:
-            if not pkt.haslayer(TCP):
-                return
+        Returns:
+            tuple[str,int,str,int] | None: (client_ip, client_port, server_ip, server_port)
+        """
+        key = self.flow_key('TCP', ip1, port1, ip2, port2)
+        flow = self.flows.get(key)
+        if not flow or not flow['syn']:
+            return None
+        src_ep = flow['syn'][0][1]
+        ep_a, ep_b = (key[1], key[2]), (key[3], key[4])
+        dst_ep = ep_b if src_ep == ep_a else ep_a
+        return (src_ep[0], src_ep[1], dst_ep[0], dst_ep[1])
+
+    def _payload(self, num, seg):
+        if seg[4] is not None:
+            return seg[4]
+        slot = self.store.find_slot(num)
+        if slot is None:
+            return b""
+        return bytes(self.store.raw_view(slot)[seg[2]:seg[3]])
 
-            tcp = pkt[TCP]
-            seq = tcp.seq
-            payload_len = len(tcp.payload) if tcp.payload else 0
+    def follow(self, client_ip, client_port, server_ip, server_port):
+        """Собрать TCP stream клиент -> сервер.
 
-            src_ip = packet_info.get('src_ip')
-            dst_ip = packet_info.get('dst_ip')
-            src_port = packet_info.get('src_port')
-            dst_port = packet_info.get('dst_port')
+        Returns:
+            tuple: (blocks_c2s, blocks_s2c, c2s_raw, s2c_raw) — как у
+                   build_tcp_stream_reassembled + build_tcp_stream_raw_pair.
+        """
+        client_ep = (str(client_ip), int(client_port))
+        server_ep = (str(server_ip), int(server_port))
+        flow = self.flows.get(self.flow_key('TCP', client_ip, client_port, server_ip, server_port))
+        if not flow:
+            return [], [], b"", b""
 
-            if not all([src_ip, dst_ip, src_port, dst_port]):
-                return
+        segs = flow['segs']
+        payloads = {num: self._payload(num, seg) for num, seg in segs.items()}
 
-            flow_key = (src_ip, dst_ip, src_port, dst_port)
+        def direction_blocks(ep):
+            ordered = flow['dirs'].get(ep, [])
+            return reassemble_tcp_direction([{"seq": seq, "data": payloads[num], "ts": None} for seq, num in ordered])
 
-            if flow_key in self.tcp_sequence_tracker:
-                last_seq, last_len = self.tcp_sequence_tracker[flow_key]
-                expected_seq = last_seq + max(last_len, 1)
+        # raw: простой конкат в порядке прихода (для TLS-детекта)
+        c2s, s2c = bytearray(), bytearray()
+        for num in flow['nums']:
+            seg = segs.get(num)
+            if seg is None:
+                continue
+            if seg[0] == client_ep:
+                c2s.extend(payloads[num])
+            elif seg[0] == server_ep:
+                s2c.extend(payloads[num])
 
-                # Разрыв больше чем ожидаемый размер пакета (обычно 1460-1500)
-                gap = seq - expected_seq
+        return direction_blocks(client_ep), direction_blocks(server_ep), bytes(c2s), bytes(s2c)
 
-                # Игнорируем retransmissions (seq меньше expected)
-                if gap > 1460:  # MSS для Ethernet
-                    self.packet_loss_count += 1
-                    packet_info['packet_loss'] = True
-                    packet_info['seq_gap'] = gap
+    def syn_rtt_ms(self, key):
+        """RTT по первому SYN и следующему за ним SYN+ACK с обратной стороны (мс) или None."""
+        flow = self.flows.get(key)
+        if not flow or not flow['syn']:
+            return None
+        store = self.store
+        syn_num, syn_ep = flow['syn'][0]
+        syn_slot = store.find_slot(syn_num)
+        if syn_slot is None:
+            return None
+        syn_ts = store._ts[syn_slot]
+        for num, ep in flow['synack']:
+            if ep == syn_ep:
+                continue
+            slot = store.find_slot(num)
+            if slot is not None and store._ts[slot] > syn_ts:
+                return (store._ts[slot] - syn_ts) * 1000.0
+        return None
 
-            # Сохраняем текущий seq и длину payload
-            self.tcp_sequence_tracker[flow_key] = (seq, payload_len)
 
-        except Exception:
-            pass
+def _payload_search_chunk(pattern, flags, fallback, data, spans):
+    """Точка входа процесса поиска: regex по кадрам одного чанка арены.
 
-    def _measure_latency(self, pkt):
-        """Измерение latency"""
-        try:
-            if hasattr(pkt, 'time'):
-                capture_time = float(pkt.time)
-                current_time = time.time()
+    Args:
+        pattern, fallback: исходники regex (bytes), fallback может быть None.
+        data: копия участка арены; spans: [(idx, offset_in_data, length)].
 
-                latency_us = (current_time - capture_time) * 1000000
+    Returns:
+        list[(idx, offset)]: первое совпадение в каждом совпавшем кадре.
+    """
+    rx = re.compile(pattern, flags)
+    rx_fallback = re.compile(fallback, flags) if fallback is not None else None
+    out = []
+    with memoryview(data) as mv:
+        for idx, off, n in spans:
+            frame = mv[off:off + n]
+            m = rx.search(frame)
+            if m is None and rx_fallback is not None:
+                m = rx_fallback.search(frame)
+            if m is not None:
+                out.append((idx, m.start()))
+    return out
 
-                if 0 < latency_us < 1000000:
-                    self.latency_samples.append(latency_us)
-        except Exception:
-            pass
 
-    def _safe_decode_ascii(self, b: bytes, limit=2048) -> str:
-        try:
-            return b[:limit].decode("utf-8", errors="replace")
-        except Exception:
-            return ""
+class PayloadSearch:
+    """Поиск по сырым байтам кадров прямо в арене PacketStore.
 
-    def _format_tcp_options(self, tcp) -> list[str]:
-        out = []
-        try:
-            for name, value in getattr(tcp, "options", []) or []:
-                if name == "MSS" and value is not None:
-                    out.append(f"MSS={value}")
-                elif name == "SAckOK":
-                    out.append("SACK_PERM")
-                elif name == "Timestamp" and isinstance(value, tuple) and len(value) >= 2:
-                    out.append(f"TSval={value[0]}")
-                    out.append(f"TSecr={value[1]}")
-                elif name == "WScale" and value is not None:
-                    out.append(f"WS={value}")
-                elif name in ("NOP", "EOL"):
-                    continue
-                elif value is None:
-                    out.append(str(name))
+    Строка без метасимволов regex (или несколько таких строк через `|`) ищется как набор
+    литералов: bytes.find идёт по всей арене сразу, а найденная позиция переводится в
+    пакет бинарным поиском по смещениям кадров. Без учёта регистра арена один раз
+    приводится к нижнему регистру — одна копия на поиск, а не на каждый пакет.
+    Настоящие регулярные выражения проверяются по каждому кадру через memoryview
+    без копирования, а при переданном executor — чанками арены в пуле процессов.
+    """
+
+    REGEX_META = frozenset('.^$*+?{}[]\\|()')
+    POOL_MIN_PACKETS = 5000        # на меньшем буфере пул процессов не окупается
+    POOL_CHUNK_BYTES = 4 << 20
+
+    def __init__(self, pattern, case_sensitive=False, literal_fallback=False):
+        """
+        Args:
+            pattern: строка поиска (regex) или список строк-литералов.
+            case_sensitive: учитывать регистр (без него — ASCII-регистр, как re.IGNORECASE для bytes).
+            literal_fallback: дополнительно искать pattern как подстроку (семантика фильтра 'payload').
+        """
+        self.case_sensitive = bool(case_sensitive)
+        self.flags = 0 if self.case_sensitive else re.IGNORECASE
+        self.literals = None
+        self.pattern = None
+        self.fallback = None
+        self.last_scope = None   # (store, epoch, newest_num) последнего search()
+
+        if isinstance(pattern, (list, tuple)):
+            literals = [str(x).encode('utf-8') for x in pattern if x]
+        else:
+            pattern = str(pattern)
+            literals = self._split_literals(pattern)
+            if literals is None:
+                try:
+                    self.pattern = pattern.encode('utf-8', errors='ignore')
+                    re.compile(self.pattern, self.flags)
+                except re.error:
+                    # некорректный regex ищем как обычную строку
+                    self.pattern = None
+                    literals = [pattern.encode('utf-8')]
                 else:
-                    out.append(f"{name}={value}")
-        except Exception:
+                    if literal_fallback:
+                        self.fallback = re.escape(pattern.encode('utf-8'))
+
+        if literals is not None:
+            if not self.case_sensitive:
+                literals = [x.lower() for x in literals]
+            self.literals = list(dict.fromkeys(literals))
+            if self.literals:
+                self.pattern = b'|'.join(re.escape(x) for x in self.literals)
+
+        self.rx = re.compile(self.pattern, self.flags) if self.pattern is not None else None
+        self.rx_fallback = re.compile(self.fallback, self.flags) if self.fallback is not None else None
+
+    @classmethod
+    def _split_literals(cls, pattern):
+        """"abc" / "abc|def" -> список литералов; None — если в строке есть regex-синтаксис."""
+        if any(ch in cls.REGEX_META for ch in pattern.replace('|', '')):
+            return None
+        parts = pattern.split('|')
+        if not all(parts):
+            return None   # пустая альтернатива совпадает с любым кадром — это regex
+        return [part.encode('utf-8') for part in parts]
+
+    def find(self, data):
+        """Смещение первого совпадения в кадре (bytes/memoryview) или -1."""
+        if self.rx is None or not len(data):
+            return -1
+        m = self.rx.search(data)
+        if m is None and self.rx_fallback is not None:
+            m = self.rx_fallback.search(data)
+        return m.start() if m is not None else -1
+
+    def search(self, capture, executor=None):
+        """Найти совпадения во всём буфере capture.
+
+        Под lock снимается только таблица кадров (номер, смещение, длина); сам поиск
+        идёт без lock. Кадры, вытесненные за время поиска, из результата отбрасываются:
+        байты пакета, пережившего поиск, за это время не перезаписывались.
+
+        Returns:
+            list[(num, offset)]: номера совпавших пакетов по возрастанию и смещение
+            первого совпадения в кадре.
+        """
+        with capture.lock:
+            store = capture.packets
+            epoch = store._epoch
+            n = len(store)
+            slots = [store.slot_at(k) for k in range(n)]
+            nums = [store._num[slot] for slot in slots]
+            offs = [store._off[slot] for slot in slots]
+            lens = [store._len[slot] for slot in slots]
+            self.last_scope = (store, epoch, store.newest_num)
+
+        if self.rx is None or not n:
             return []
-        return out
+        if self.literals is not None:
+            hits = self._scan_arena(store._arena, offs, lens)
+        elif executor is not None and n >= self.POOL_MIN_PACKETS:
+            hits = self._scan_pool(executor, store._arena, offs, lens)
+        else:
+            hits = self._scan_frames(store._arena, offs, lens)
 
-    def _build_tcp_info_summary(self, pkt, flag_str: str) -> str:
-        try:
-            tcp = pkt[TCP]
-            payload_len = len(bytes(tcp.payload)) if tcp.payload is not None else 0
-            parts = [f"[{flag_str or 'NONE'}]", f"Seq={int(tcp.seq)}"]
-            if bool(tcp.flags & 0x10):
-                parts.append(f"Ack={int(tcp.ack)}")
-            parts.append(f"Win={int(tcp.window)}")
-            parts.append(f"Len={payload_len}")
+        with capture.lock:
+            if capture.packets is not store or store._epoch != epoch:
+                return []
+            oldest = store.oldest_num
+        return sorted((nums[i], off) for i, off in hits.items() if nums[i] >= oldest)
 
-            options = self._format_tcp_options(tcp)
-            if options:
-                parts.extend(options[:6])
+    @staticmethod
+    def _arena_order(offs, lens):
+        """Индексы непустых кадров по возрастанию смещения в арене (кадры не пересекаются)."""
+        return sorted((i for i in range(len(offs)) if lens[i]), key=offs.__getitem__)
+
+    def _scan_arena(self, arena, offs, lens):
+        """Литералы: bytes.find по всей арене, совпадения на стыке кадров и в пустых участках отбрасываются."""
+        order = self._arena_order(offs, lens)
+        starts = [offs[i] for i in order]
+        ends = [offs[i] + lens[i] for i in order]
+        last = len(starts) - 1
+        if last < 0:
+            return {}
+
+        buf = arena
+        if not self.case_sensitive and any(x.upper() != x for x in self.literals):
+            buf = arena.lower()
+
+        best = {}
+        for literal in self.literals:
+            find = buf.find
+            size = len(literal)
+            pos = starts[0]
+            while True:
+                s = find(literal, pos)
+                if s < 0:
+                    break
+                k = bisect_right(starts, s) - 1
+                end = ends[k]
+                if s + size <= end:
+                    i = order[k]
+                    off = s - starts[k]
+                    if off < best.get(i, off + 1):
+                        best[i] = off
+                    pos = end          # в этом кадре первое совпадение уже есть
+                elif s < end:
+                    pos = s + 1        # совпадение пересекает конец кадра
+                elif k < last:
+                    pos = starts[k + 1]
+                else:
+                    break
+        return best
+
+    def _scan_frames(self, arena, offs, lens):
+        """Regex по каждому кадру через memoryview арены, без копирования."""
+        best = {}
+        search = self.rx.search
+        fallback = self.rx_fallback.search if self.rx_fallback is not None else None
+        with memoryview(arena) as mv:
+            for i, off in enumerate(offs):
+                n = lens[i]
+                if not n:
+                    continue
+                frame = mv[off:off + n]
+                m = search(frame)
+                if m is None and fallback is not None:
+                    m = fallback(frame)
+                if m is not None:
+                    best[i] = m.start()
+        return best
+
+    def _scan_pool(self, executor, arena, offs, lens):
+        """Regex в пуле процессов: арена режется на чанки ~POOL_CHUNK_BYTES по границам кадров."""
+        futures = []
+        spans = []
+        lo = hi = None
+
+        def submit():
+            futures.append(executor.submit(
+                _payload_search_chunk, self.pattern, self.flags, self.fallback,
+                bytes(arena[lo:hi]), [(i, off - lo, n) for i, off, n in spans]))
+
+        for i in self._arena_order(offs, lens):
+            off, n = offs[i], lens[i]
+            if spans and (off + n - lo > self.POOL_CHUNK_BYTES or off - hi > 65536):
+                submit()
+                spans = []
+            if not spans:
+                lo = off
+            spans.append((i, off, n))
+            hi = off + n
+        if spans:
+            submit()
+
+        best = {}
+        for future in futures:
+            best.update(future.result())
+        return best
+
+
+class CaptureSpool:
+    """Запись захвата на диск: ротируемые сегменты pcapng + индекс к каждому сегменту.
+
+    Каждый пакет, попавший в кольцевой буфер, дописывается Enhanced Packet Block'ом
+    в текущий сегмент `<prefix>-NNNNNN.pcapng`, а в `<prefix>-NNNNNN.idx` — запись
+    фиксированной длины (IDX): номер, время, смещение кадра в pcapng, длины,
+    интерфейс, хэш потока и 5-tuple. Номера в спуле возрастают, поэтому пакет по
+    номеру ищется бинарным поиском по индексу, без чтения pcapng.
+
+    Сегмент закрывается при достижении segment_bytes; хранится не больше
+    max_segments сегментов — самые старые удаляются, так что диск тоже ограничен.
+    Сегменты — обычные pcapng, их можно открыть в Wireshark или через `-r`.
+
+    Thread-safe (свой lock). append вызывается под PacketCapture.lock, чтение —
+    без него.
+    """
 
-            return " ".join(parts)
-        except Exception:
-            return f"Len={len(pkt[TCP]):>5}"
+    # num, ts, offset, caplen, wirelen, iface, flow_hash, l4, family, src, dst, sport, dport
+    IDX = struct.Struct('<QdQIIHIBB16s16sHH')
 
-    def _get_tcp_payload_bytes(self, pkt) -> bytes:
-        try:
-            if pkt.haslayer(TCP):
-                pl = bytes(pkt[TCP].payload)
-                return pl if pl else b""
-        except Exception:
-            pass
-        try:
-            if pkt.haslayer(Raw):
-                return bytes(pkt[Raw].load) if pkt[Raw].load else b""
-        except Exception:
-            pass
-        return b""
+    L4_CODES = {'TCP': 6, 'UDP': 17}
 
-    def _try_parse_http_summary(self, pkt) -> str | None:
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, max_segments=16, prefix=None):
         """
-        HTTP: Host/URL/Status из Raw.
-        Работает как для request, так и для response.
+        Args:
+            directory: каталог для сегментов (создаётся при необходимости).
+            segment_bytes: размер сегмента pcapng, после которого начинается новый.
+            max_segments: сколько сегментов хранить (старые удаляются).
+            prefix: префикс имён файлов (по умолчанию capture-<дата-время>).
         """
-        try:
-            if not pkt.haslayer(Raw):
-                return None
-            raw = bytes(pkt[Raw].load)
-            if not raw:
-                return None
+        self.directory = directory
+        self.segment_bytes = max(1024 * 1024, int(segment_bytes))
+        self.max_segments = max(2, int(max_segments))
+        self.prefix = prefix or datetime.now().strftime('capture-%Y%m%d-%H%M%S')
+        os.makedirs(directory, exist_ok=True)
 
-            s = self._safe_decode_ascii(raw, limit=4096)
-            if not s:
-                return None
+        self.lock = threading.Lock()
+        self.segments = []  # от старых к новым; последний — текущий (открыт на запись)
+        self.generation = 0  # растёт при reset(): кэши страниц сбрасываются
+        self.packets_written = 0
+        self._seq = 0
 
-            # request line
-            # GET /path HTTP/1.1
-            first_line = s.splitlines()[0] if s.splitlines() else ""
-            methods = ("GET ", "POST ", "PUT ", "DELETE ", "HEAD ", "OPTIONS ", "PATCH ", "CONNECT ", "TRACE ")
-            if first_line.startswith(methods) and " HTTP/" in first_line:
-                parts = first_line.split()
-                if len(parts) >= 2:
-                    method = parts[0]
-                    path = parts[1]
-                else:
-                    return None
+    # ---- запись ----
 
-                host = ""
-                for line in s.splitlines()[1:]:
-                    if line.lower().startswith("host:"):
-                        host = line.split(":", 1)[1].strip()
-                        break
+    @staticmethod
+    def flow_hash(key):
+        """Стабильный 32-битный хэш канонического ключа потока (FlowTable.flow_key)."""
+        return zlib.crc32(repr(key).encode()) or 1
+
+    def _open_segment(self):
+        self._seq += 1
+        base = os.path.join(self.directory, f"{self.prefix}-{self._seq:06d}")
+        seg = {
+            'pcap': base + '.pcapng',
+            'idx': base + '.idx',
+            'first_num': 0,
+            'last_num': 0,
+            'count': 0,
+            'size': 0,
+            'ifaces': [],      # [(linktype, ifname)] в порядке IDB
+            'iface_ids': {},   # (linktype, ifname) -> interface id
+            'flows': set(),    # хэши потоков сегмента (Follow Stream пропускает чужие сегменты)
+            'f': open(base + '.pcapng', 'wb'),
+            'fi': open(base + '.idx', 'wb'),
+        }
+        seg['f'].write(PCAPNG_SHB)
+        seg['size'] = len(PCAPNG_SHB)
+        self.segments.append(seg)
 
-                if host:
-                    return f"HTTP {method} {host}{path}"
-                return f"HTTP {method} {path}"
+        while len(self.segments) > self.max_segments:
+            self._remove_segment(self.segments.pop(0))
+        return seg
 
-            # response line
-            # HTTP/1.1 200 OK
-            if first_line.startswith("HTTP/") and len(first_line.split()) >= 2:
-                parts = first_line.split(None, 2)
-                code = parts[1] if len(parts) > 1 else ""
-                msg = parts[2] if len(parts) > 2 else ""
-                msg = msg.strip()
-                if msg:
-                    return f"HTTP {code} {msg}"
-                return f"HTTP {code}"
+    @staticmethod
+    def _close_segment(seg):
+        for name in ('f', 'fi'):
+            fh = seg.get(name)
+            if fh is not None:
+                try:
+                    fh.close()
+                except Exception:
+                    pass
+                seg[name] = None
 
-            return None
-        except Exception:
-            return None
+    def _remove_segment(self, seg):
+        self._close_segment(seg)
+        for name in ('pcap', 'idx'):
+            try:
+                os.remove(seg[name])
+            except OSError:
+                pass
 
-    # ---- TLS helpers ----
+    def _iface_id(self, seg, linktype, ifname):
+        key = (linktype, ifname or '')
+        iface_id = seg['iface_ids'].get(key)
+        if iface_id is not None:
+            return iface_id
 
-    def _tls_ver_name(self, v: int) -> str:
-        return {
-            0x0300: "SSL3.0",
-            0x0301: "TLS1.0",
-            0x0302: "TLS1.1",
-            0x0303: "TLS1.2",
-            0x0304: "TLS1.3",
-        }.get(v, f"0x{v:04x}")
+        block = pcapng_idb(linktype, ifname)
+        seg['f'].write(block)
+        seg['size'] += len(block)
 
-    def _tls_alert_desc(self, d: int) -> str:
-        # неполная таблица 
-        m = {
-            0: "close_notify",
-            10: "unexpected_message",
-            20: "bad_record_mac",
-            21: "decryption_failed",
-            22: "record_overflow",
-            30: "decompression_failure",
-            40: "handshake_failure",
-            41: "no_certificate",
-            42: "bad_certificate",
-            43: "unsupported_certificate",
-            44: "certificate_revoked",
-            45: "certificate_expired",
-            46: "certificate_unknown",
-            47: "illegal_parameter",
-            48: "unknown_ca",
-            49: "access_denied",
-            50: "decode_error",
-            51: "decrypt_error",
-            60: "export_restriction",
-            70: "protocol_version",
-            71: "insufficient_security",
-            80: "internal_error",
-            86: "inappropriate_fallback",
-            90: "user_canceled",
-            100: "no_renegotiation",
-            109: "missing_extension",
-            110: "unsupported_extension",
-            111: "certificate_unobtainable",
-            112: "unrecognized_name",  # SNI
-            113: "bad_certificate_status_response",
-            114: "bad_certificate_hash_value",
-            115: "unknown_psk_identity",
-            116: "certificate_required",
-            120: "no_application_protocol",
-        }
-        return m.get(d, f"desc_{d}")
+        iface_id = len(seg['ifaces'])
+        seg['ifaces'].append(key)
+        seg['iface_ids'][key] = iface_id
+        return iface_id
 
-    def _tls_alert_level(self, lvl: int) -> str:
-        return {1: "warning", 2: "fatal"}.get(lvl, f"lvl_{lvl}")
+    def append(self, packet_info):
+        """Дописать пакет (packet_info с 'num', 'raw', 'timestamp') в текущий сегмент."""
+        raw = packet_info.get('raw') or b""
+        if not raw:
+            return
+        num = int(packet_info['num'])
+        ts = packet_info.get('timestamp')
+        ts = ts.timestamp() if isinstance(ts, datetime) else float(ts or 0.0)
+        linktype = packet_linktype(packet_info)
+        ifname = packet_info.get('interface')
+
+        k = FlowTable._key_for(packet_info)
+        flow = self.flow_hash(k[0]) if k else 0
+        l4 = self.L4_CODES.get(k[0][0], 0) if k else 0
+        fam, src = _pack_ip(packet_info.get('src_ip'))
+        _, dst = _pack_ip(packet_info.get('dst_ip'))
+        sport = packet_info.get('src_port') or 0
+        dport = packet_info.get('dst_port') or 0
 
-    def _read_u8(self, b: bytes, p: int) -> tuple[int, int]:
-        return b[p], p + 1
+        with self.lock:
+            seg = self.segments[-1] if self.segments else None
+            if seg is None or seg['f'] is None or seg['size'] >= self.segment_bytes:
+                if seg is not None:
+                    self._close_segment(seg)
+                seg = self._open_segment()
+
+            iface_id = self._iface_id(seg, linktype, ifname)
+
+            caplen = len(raw)
+            head, tail = pcapng_epb_parts(iface_id, ts, caplen, packet_info.get('size'))
+            offset = seg['size'] + len(head)
+            seg['f'].write(head)
+            seg['f'].write(raw)
+            seg['f'].write(tail)
+            seg['size'] += len(head) + caplen + len(tail)
+
+            seg['fi'].write(self.IDX.pack(num, ts, offset, caplen, int(packet_info.get('size') or caplen),
+                                          iface_id, flow, l4, fam, src or b"", dst or b"",
+                                          int(sport) & 0xFFFF, int(dport) & 0xFFFF))
+            if not seg['count']:
+                seg['first_num'] = num
+            seg['last_num'] = num
+            seg['count'] += 1
+            if flow:
+                seg['flows'].add(flow)
+            self.packets_written += 1
+
+    def reset(self):
+        """Удалить все сегменты (очистка буфера: номера пакетов начнутся заново)."""
+        with self.lock:
+            for seg in self.segments:
+                self._remove_segment(seg)
+            self.segments = []
+            self.generation += 1
 
-    def _read_u16(self, b: bytes, p: int) -> tuple[int, int]:
-        return int.from_bytes(b[p:p + 2], "big"), p + 2
+    def close(self):
+        """Закрыть файлы (сегменты остаются на диске)."""
+        with self.lock:
+            for seg in self.segments:
+                self._close_segment(seg)
 
-    def _read_u24(self, b: bytes, p: int) -> tuple[int, int]:
-        return int.from_bytes(b[p:p + 3], "big"), p + 3
+    # ---- чтение ----
 
-    def _try_parse_tls_serverhello_from_bytes(self, data: bytes) -> str | None:
-        """
-        Минимально: TLS ServerHello -> версия (по record/hello) + cipher_suite.
-        Работает по накопленному потоку server->client.
-        """
-        try:
-            if not data or len(data) < 6:
-                return None
+    @property
+    def oldest_num(self):
+        segs = [seg for seg in self.segments if seg['count']]
+        return segs[0]['first_num'] if segs else 0
 
-            # Найдём начало TLS record (handshake=0x16, version=0x03)
-            start = -1
-            for i in range(0, min(len(data) - 3, 4096)):
-                if data[i] == 0x16 and data[i + 1] == 0x03:
-                    start = i
-                    break
-            if start < 0:
-                return None
+    def stats(self):
+        """Сводка для статусной строки/статистики."""
+        with self.lock:
+            return {
+                'spool_segments': len(self.segments),
+                'spool_bytes': sum(seg['size'] for seg in self.segments),
+                'spool_packets': sum(seg['count'] for seg in self.segments),
+                'spool_oldest_num': self.oldest_num,
+            }
 
-            data = data[start:]
+    def _flush(self, seg):
+        for name in ('f', 'fi'):
+            if seg.get(name) is not None:
+                seg[name].flush()
 
-            if len(data) < 5:
-                return None
+    def _snapshot(self):
+        """Список сегментов для чтения (с flush текущего), под lock."""
+        with self.lock:
+            if self.segments:
+                self._flush(self.segments[-1])
+            return [seg for seg in self.segments if seg['count']]
+
+    def _records(self, seg, fi, i, n):
+        fi.seek(i * self.IDX.size)
+        return list(self.IDX.iter_unpack(fi.read(n * self.IDX.size)))
+
+    def _lower_bound(self, seg, fi, num):
+        """Индекс первой записи сегмента с номером >= num (бинарный поиск по .idx)."""
+        lo, hi = 0, seg['count']
+        size = self.IDX.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            fi.seek(mid * size)
+            if struct.unpack('<Q', fi.read(8))[0] < num:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
 
-            rec_ver = data[1:3]  # 03 01 / 03 03 ...
-            rec_len = int.from_bytes(data[3:5], "big")
-            rec_end = min(5 + rec_len, len(data))
-            if rec_end < 9:
-                return None
+    @staticmethod
+    def _to_record(rec, frame, seg):
+        linktype, ifname = seg['ifaces'][rec[5]]
+        return (rec[0], frame, rec[1], linktype, ifname or None)
 
-            # handshake header
-            hs_type = data[5]
-            if hs_type != 0x02:  # ServerHello
-                return None
-            hs_len = int.from_bytes(data[6:9], "big")
-            hs_end = min(9 + hs_len, rec_end)
-            if hs_end < 9 + 38:  # минимальная длина ServerHello
-                return None
+    def read_range(self, lo, hi):
+        """Кадры с номерами lo..hi включительно.
 
-            p = 9
+        Returns:
+            list: [(num, frame, ts, linktype, ifname)] по возрастанию номера —
+                  тот же формат, что у записей PcapFileLoader.
+        """
+        out = []
+        for seg in self._snapshot():
+            if seg['last_num'] < lo or seg['first_num'] > hi:
+                continue
+            try:
+                with open(seg['idx'], 'rb') as fi, open(seg['pcap'], 'rb') as f:
+                    i = self._lower_bound(seg, fi, lo)
+                    j = self._lower_bound(seg, fi, hi + 1)
+                    for rec in self._records(seg, fi, i, j - i):
+                        f.seek(rec[2])
+                        out.append(self._to_record(rec, f.read(rec[3]), seg))
+            except OSError:
+                # сегмент удалён ротацией во время чтения
+                continue
+        return out
 
-            # legacy_version (2)
-            legacy_ver = data[p:p + 2]
-            p += 2
+    def flow_records(self, key, before_num, limit=50000):
+        """Кадры потока key (FlowTable.flow_key) с номерами < before_num.
 
-            # random (32)
-            p += 32
-            if p > hs_end:
-                return None
+        Сегменты, в которых поток не встречался, не читаются. Возвращает не больше
+        limit самых новых записей, по возрастанию номера (формат как у read_range).
+        """
+        flow = self.flow_hash(key)
+        found = []
+        for seg in reversed(self._snapshot()):
+            if seg['first_num'] >= before_num or flow not in seg['flows']:
+                continue
+            try:
+                with open(seg['idx'], 'rb') as fi, open(seg['pcap'], 'rb') as f:
+                    recs = [rec for rec in self._records(seg, fi, 0, seg['count'])
+                            if rec[6] == flow and rec[0] < before_num]
+                    for rec in reversed(recs):
+                        f.seek(rec[2])
+                        found.append(self._to_record(rec, f.read(rec[3]), seg))
+                        if len(found) >= limit:
+                            break
+            except OSError:
+                continue
+            if len(found) >= limit:
+                break
+        found.reverse()
+        return found
 
-            # session_id
-            if p + 1 > hs_end:
-                return None
-            sid_len = data[p]
-            p += 1 + sid_len
-            if p > hs_end:
-                return None
 
-            # cipher_suite (2)
-            if p + 2 > hs_end:
-                return None
-            cipher = int.from_bytes(data[p:p + 2], "big")
-            p += 2
+class TPacketV3Ring:
+    """Кольцо AF_PACKET TPACKET_V3 (Linux): ядро пишет кадры блоками в общую mmap-память.
 
-            # compression_method (1) - может быть 0
-            if p + 1 > hs_end:
-                return None
-            p += 1
+    В отличие от scapy sniff() на каждый кадр не создаётся scapy-объект и нет
+    системного вызова recv: поток забирает сразу целый блок кадров и возвращает
+    его ядру. Кадры отдаются как bytes вместе с временем захвата ядра.
+    """
 
-            # Версию красиво (эвристика)
-            # В TLS1.3 ServerHello legacy_version = 0x0303 (TLS1.2), реальная версия в supported_versions ext,
-            # но без полного парсинга можно показать "TLS1.3?" по наличию 0x0303 и дальнейших encrypted records.
-            ver_map = {
-                b"\x03\x01": "TLS1.0",
-                b"\x03\x02": "TLS1.1",
-                b"\x03\x03": "TLS1.2/1.3",
-            }
-            ver_s = ver_map.get(legacy_ver, f"0x{legacy_ver.hex()}")
+    SOL_PACKET = 263
+    PACKET_ADD_MEMBERSHIP = 1
+    PACKET_RX_RING = 5
+    PACKET_STATISTICS = 6
+    PACKET_VERSION = 10
+    PACKET_MR_PROMISC = 1
+    TPACKET_V3 = 2
+    ETH_P_ALL = 0x0003
+
+    TP_STATUS_KERNEL = 0
+    TP_STATUS_USER = 1
+    TP_STATUS_VLAN_VALID = 1 << 4
+    TP_STATUS_VLAN_TPID_VALID = 1 << 6
+
+    # tpacket_block_desc: version, offset_to_priv, block_status, num_pkts, offset_to_first_pkt
+    BLOCK_HDR = struct.Struct('=IIIII')
+    # tpacket3_hdr: next_offset, sec, nsec, snaplen, len, status, mac, net, rxhash, vlan_tci, vlan_tpid
+    PKT_HDR = struct.Struct('=IIIIIIHHIIH')
+
+    def __init__(self, interface, block_size=1 << 22, block_count=16, block_timeout_ms=60,
+                 bpf_filter=None, promisc=True):
+        """
+        Args:
+            interface: имя интерфейса.
+            block_size: размер блока кольца (кратен размеру страницы).
+            block_count: число блоков; память кольца = block_size * block_count.
+            block_timeout_ms: через сколько мс ядро отдаёт неполный блок.
+            bpf_filter: BPF (синтаксис tcpdump), компилируется через libpcap/tcpdump.
+            promisc: включить promiscuous mode (как scapy sniff по умолчанию).
+        """
+        self.interface = interface
+        self.block_size = int(block_size)
+        self.block_count = max(2, int(block_count))
+        self.kernel_packets = 0
+        self.kernel_drops = 0
 
-            return f"TLS ServerHello ver={ver_s} cipher=0x{cipher:04x}"
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(self.ETH_P_ALL))
+        try:
+            self.sock.setsockopt(self.SOL_PACKET, self.PACKET_VERSION, self.TPACKET_V3)
+            if bpf_filter:
+                from scapy.arch.linux import attach_filter
+                attach_filter(self.sock, bpf_filter, interface)
+            frame_size = 2048
+            req = struct.pack('=7I', self.block_size, self.block_count, frame_size,
+                              self.block_size * self.block_count // frame_size,
+                              int(block_timeout_ms), 0, 0)
+            self.sock.setsockopt(self.SOL_PACKET, self.PACKET_RX_RING, req)
+            self.mm = mmap.mmap(self.sock.fileno(), self.block_size * self.block_count,
+                                mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            self.sock.bind((interface, self.ETH_P_ALL))
+            if promisc:
+                mreq = struct.pack('IHH8s', socket.if_nametoindex(interface), self.PACKET_MR_PROMISC, 0, b"")
+                self.sock.setsockopt(self.SOL_PACKET, self.PACKET_ADD_MEMBERSHIP, mreq)
         except Exception:
-            return None
+            self.sock.close()
+            raise
+
+        self.poller = select.poll()
+        self.poller.register(self.sock, select.POLLIN | select.POLLERR)
+        self._block = 0
+
+    def read_block(self, timeout_ms=100):
+        """Кадры следующего готового блока: list[(frame, ts)]; [] — если за timeout ничего не пришло."""
+        mm = self.mm
+        base = self._block * self.block_size
+        _, _, status, num_pkts, off = self.BLOCK_HDR.unpack_from(mm, base)
+        if not status & self.TP_STATUS_USER:
+            self.poller.poll(timeout_ms)
+            return []
 
-    def _try_parse_tls_summary_from_bytes(self, data: bytes) -> str | None:
-        """
-        Минимально: TLS ClientHello -> SNI + ALPN.
-        Работает по накопленному потоку.
-        """
-        # try:
-        #     if not data or len(data) < 6:
-        #         return None
+        frames = []
+        off += base
+        unpack = self.PKT_HDR.unpack_from
+        for _ in range(num_pkts):
+            next_off, sec, nsec, snaplen, _, pstatus, mac, _, _, tci, tpid = unpack(mm, off)
+            start = off + mac
+            frame = mm[start:start + snaplen]
+            if pstatus & self.TP_STATUS_VLAN_VALID:
+                # ядро сняло VLAN-тег (offload) — возвращаем его в кадр, как делает scapy
+                if not pstatus & self.TP_STATUS_VLAN_TPID_VALID:
+                    tpid = 0x8100
+                frame = frame[:12] + struct.pack('!HH', tpid, tci & 0xFFFF) + frame[12:]
+            frames.append((frame, sec + nsec / 1e9))
+            off += next_off
+
+        # блок прочитан (кадры скопированы) — возвращаем его ядру
+        struct.pack_into('=I', mm, base + 8, self.TP_STATUS_KERNEL)
+        self._block = (self._block + 1) % self.block_count
+        return frames
+
+    def update_stats(self):
+        """Добавить счётчики ядра (PACKET_STATISTICS сбрасывается при чтении)."""
         try:
-            # TLS record header = 5 байт (type(1) + ver(2) + len(2))
-            if not data or len(data) < 5:
-                return None
+            packets, drops, _ = struct.unpack('=III', self.sock.getsockopt(self.SOL_PACKET, self.PACKET_STATISTICS, 12))
+            self.kernel_packets += packets
+            self.kernel_drops += drops
+        except OSError:
+            pass
 
-            # найдём начало TLS record (handshake=0x16, version=0x03)
-            start = -1
-            for i in range(0, min(len(data) - 3, 4096)):
-                if data[i] == 0x16 and data[i + 1] == 0x03:
-                    start = i
-                    break
-            if start < 0:
-                return None
+    def close(self):
+        self.update_stats()
+        try:
+            self.mm.close()
+        except Exception:
+            pass
+        self.sock.close()
 
-            data = data[start:]
 
-            # record header: type(1)=0x16, version(2), len(2)
-            if len(data) < 5:
-                return None
-            rec_len = int.from_bytes(data[3:5], "big")
-            if rec_len <= 0:
-                return None
-            rec_end = min(5 + rec_len, len(data))
+class FlowStateTable:
+    """Таблица состояния по потокам с ограниченной памятью (thread-safe).
 
-            # handshake header starts at 5: msg_type(1), len(3)
-            if rec_end < 9:
-                return None
-            hs_type = data[5]
-            if hs_type != 0x01:  # ClientHello
-                return None
-            hs_len = int.from_bytes(data[6:9], "big")
-            hs_end = min(9 + hs_len, rec_end)
-            if hs_end <= 9:
-                return None
+    Записи упорядочены по последнему обращению (OrderedDict). При превышении
+    max_entries или max_bytes вытесняется самая давняя запись (LRU). Записи, к
+    которым не обращались дольше idle_ttl секунд, снимаются с головы при вставках.
+    Поток, завершённый FIN/RST, убирается явно (close). Время — timestamp пакета,
+    поэтому offline-файл стареет так же, как live-захват.
+    """
 
-            p = 9
-            # client_version(2) + random(32)
-            if p + 2 + 32 > hs_end:
-                return None
-            p += 2 + 32
+    EXPIRE_INTERVAL = 1.0
 
-            # session id
-            if p + 1 > hs_end:
-                return None
-            sid_len = data[p]
-            p += 1 + sid_len
-            if p > hs_end:
-                return None
+    def __init__(self, max_entries=131072, idle_ttl=120.0, max_bytes=None):
+        """
+        Args:
+            max_entries: максимум записей.
+            idle_ttl: через сколько секунд без обращений запись удаляется.
+            max_bytes: предел суммарного размера значений (см. put/resize), None — без предела.
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.idle_ttl = float(idle_ttl)
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()   # key -> [value, last_ts, nbytes]
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._last_expire = 0.0
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+        self.evicted_closed = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None, now=None):
+        """Значение по ключу; с now — обращение продлевает жизнь записи."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if now is not None:
+                entry[1] = now
+                self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, now, nbytes=0):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._data[key] = [value, now, nbytes]
+                self._bytes += nbytes
+                if now - self._last_expire >= self.EXPIRE_INTERVAL:
+                    self._expire(now)
+            else:
+                self._bytes += nbytes - entry[2]
+                entry[0], entry[1], entry[2] = value, now, nbytes
+                self._data.move_to_end(key)
+            self._enforce_caps()
+
+    def resize(self, key, nbytes):
+        """Значение выросло на месте (bytearray): обновить учёт байт."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._bytes += nbytes - entry[2]
+                entry[2] = nbytes
+                self._enforce_caps()
+
+    def pop(self, key, default=None):
+        """Удалить запись, чья работа закончена (это не вытеснение)."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return default
+            self._bytes -= entry[2]
+            return entry[0]
+
+    def close(self, key):
+        """Поток завершён (FIN/RST): удалить запись и учесть в evicted_closed."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+                self.evicted_closed += 1
+
+    def _expire(self, now):
+        self._last_expire = now
+        cutoff = now - self.idle_ttl
+        data = self._data
+        while data:
+            key = next(iter(data))
+            entry = data[key]
+            if entry[1] >= cutoff:
+                break
+            del data[key]
+            self._bytes -= entry[2]
+            self.evicted_idle += 1
+
+    def _enforce_caps(self):
+        data = self._data
+        while data and (len(data) > self.max_entries or
+                        (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            _, entry = data.popitem(last=False)
+            self._bytes -= entry[2]
+            self.evicted_lru += 1
 
-            # cipher_suites
-            if p + 2 > hs_end:
-                return None
-            cs_len = int.from_bytes(data[p:p + 2], "big")
-            p += 2 + cs_len
-            if p > hs_end:
-                return None
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
 
-            # compression_methods
-            if p + 1 > hs_end:
-                return None
-            cm_len = data[p]
-            p += 1 + cm_len
-            if p > hs_end:
-                return None
+    def stats(self):
+        return {
+            'entries': len(self._data),
+            'bytes': self._bytes,
+            'evicted_lru': self.evicted_lru,
+            'evicted_idle': self.evicted_idle,
+            'evicted_closed': self.evicted_closed,
+        }
 
-            # extensions
-            if p + 2 > hs_end:
-                return None
-            ext_len = int.from_bytes(data[p:p + 2], "big")
-            p += 2
-            ext_end = min(p + ext_len, hs_end)
 
-            sni = None
-            alpn = []
+class DissectionCache(FlowStateTable):
+    """Мемоизация результатов разбора по (направление потока, диапазон seq).
 
-            while p + 4 <= ext_end:
-                etype = int.from_bytes(data[p:p + 2], "big");
-                p += 2
-                elen = int.from_bytes(data[p:p + 2], "big");
-                p += 2
-                if p + elen > ext_end:
-                    break
+    Ключ — (src_ip, src_port, dst_ip, dst_port, proto) направления плюс начальный seq
+    и длина разобранного фрагмента (и вид разбора), поэтому один и тот же ClientHello,
+    ServerHello или сертификат разбирается один раз — при захвате, при повторной
+    буферизации после вытеснения состояния потока, в Follow Stream и т.д.
+    Размер ограничен так же, как у остальных таблиц состояния (LRU + idle_ttl).
+    """
 
-                # server_name (0)
-                if etype == 0x0000 and elen >= 2:
-                    q = p
-                    list_len = int.from_bytes(data[q:q + 2], "big");
-                    q += 2
-                    list_end = min(p + elen, q + list_len)
-                    while q + 3 <= list_end:
-                        name_type = data[q];
-                        q += 1
-                        name_len = int.from_bytes(data[q:q + 2], "big");
-                        q += 2
-                        if q + name_len > list_end:
-                            break
-                        if name_type == 0:
-                            sni = data[q:q + name_len].decode("utf-8", errors="replace").strip()
-                            break
-                        q += name_len
+    def __init__(self, max_entries=65536, idle_ttl=600.0, max_bytes=None):
+        super().__init__(max_entries=max_entries, idle_ttl=idle_ttl, max_bytes=max_bytes)
+        self.hits = 0
+        self.misses = 0
+        # новые записи для передачи в другой процесс (offline-разборщики), см. drain()
+        self._journal = None
+        self._drained = (0, 0)
 
-                # ALPN (16)
-                if etype == 0x0010 and elen >= 2:
-                    q = p
-                    list_len = int.from_bytes(data[q:q + 2], "big");
-                    q += 2
-                    list_end = min(p + elen, q + list_len)
-                    while q < list_end:
-                        if q + 1 > list_end:
-                            break
-                        ln = data[q];
-                        q += 1
-                        if q + ln > list_end:
-                            break
-                        alpn.append(data[q:q + ln].decode("utf-8", errors="replace"))
-                        q += ln
+    def start_journal(self):
+        """Копить новые записи для drain() (кэш процесса-разборщика offline-загрузки)."""
+        self._journal = []
 
-                p += elen
+    def memo(self, key, now, fn, *args, nbytes=0):
+        """Результат fn(*args) из кэша или вычисленный и запомненный.
 
-            parts = []
-            if sni:
-                parts.append(f"SNI={sni}")
-            if alpn:
-                parts.append("ALPN=" + ",".join(alpn[:6]))
+        Запоминается и None ("разобрать не удалось"), чтобы не повторять попытку.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0][0]
+            self.misses += 1
+        value = fn(*args)
+        self.put(key, (value,), now, nbytes)
+        if self._journal is not None:
+            self._journal.append((key, value, now, nbytes))
+        return value
 
-            if parts:
-                return "TLS ClientHello " + " ".join(parts)
-            return None
+    def drain(self):
+        """Записи и приращения hits/misses с прошлого вызова: (entries, hits, misses)."""
+        with self._lock:
+            entries = self._journal or []
+            if self._journal is not None:
+                self._journal = []
+            hits, misses = self.hits - self._drained[0], self.misses - self._drained[1]
+            self._drained = (self.hits, self.misses)
+        return entries, hits, misses
+
+    def absorb(self, drained):
+        """Принять результат drain() другого кэша: записи и счётчики (offline-загрузка)."""
+        entries, hits, misses = drained
+        for key, value, now, nbytes in entries:
+            self.put(key, (value,), now, nbytes)
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self):
+        out = super().stats()
+        out['hits'] = self.hits
+        out['misses'] = self.misses
+        return out
 
-        except Exception:
-            return None
 
-    def _try_parse_tls_summary(self, pkt) -> Optional[str]:
+class PacketCapture:
+    """
+    Захват пакетов с кольцевым буфером и поддержкой нескольких интерфейсов
+    """
+
+    TLS_CH_LIMIT = 16384   # сколько первых байт потока копим для разбора ClientHello/ServerHello
+
+    def __init__(self, interface=None, packet_limit=50000, log_file=None, arena_bytes=None,
+                 dissector_workers=1, queue_size=20000, spool=None, backend='scapy', ring_mb=64,
+                 flow_state_max=131072):
         """
-        TLS summary из Raw:
-          - ClientHello: SNI + ALPN + версия
-          - ServerHello: версия + cipher (и supported_versions, если есть)
-          - Alert: level + desc
-          - (опц) JA3: md5 fingerprint
+        Инициализация захвата пакетов
+
+        Args:
+            interface: сетевой интерфейс или список интерфейсов
+                      None - автоопределение
+                      'any' - все интерфейсы
+                      'eth0' - один интерфейс
+                      ['eth0', 'wlan0'] - список интерфейсов
+            packet_limit: максимальное количество пакетов в буфере
+            log_file: путь к файлу логов (None = без логов)
+            arena_bytes: размер арены сырых кадров в байтах (None = по умолчанию от packet_limit)
+            dissector_workers: количество потоков разбора пакетов
+            queue_size: суммарная ёмкость очередей между захватом и разбором
+            spool: CaptureSpool для записи захвата на диск (None = только память)
+            backend: 'scapy' (sniff) или 'tpacket' (кольцо AF_PACKET TPACKET_V3, Linux)
+            ring_mb: размер кольца TPACKET_V3 на интерфейс в MB
+            flow_state_max: предел записей в таблицах состояния потоков (TLS, TCP seq)
         """
-        try:
-            # if not pkt.haslayer(Raw):
-            #     return None
-            # data = bytes(pkt[Raw].load)
-            data = self._get_tcp_payload_bytes(pkt)
-            if not data:
-                return None
-            if len(data) < 5:
-                return None
+        self.packet_limit = packet_limit
+        self.bpf_filter = None  # str|None
+        self.log_file = log_file
 
-            # TLS record header: type(1), version(2), length(2)
-            rec_type = data[0]
-            rec_ver = int.from_bytes(data[1:3], "big")
-            rec_len = int.from_bytes(data[3:5], "big")
-            if rec_len <= 0:
-                return None
+        # Состояние по направлениям потоков: ограничено по числу записей/байтам,
+        # стареет по времени простоя и снимается по FIN/RST (см. FlowStateTable)
+        flow_state_max = max(16, int(flow_state_max))
+        # key -> bytearray первых байт потока (до TLS_CH_LIMIT)
+        self.tls_ch_buffers = FlowStateTable(max_entries=flow_state_max // 16, idle_ttl=30.0,
+                                             max_bytes=flow_state_max * 256)
+        # key -> True: поток уже разобран (чтобы не парсить снова)
+        self.tls_ch_parsed = FlowStateTable(max_entries=flow_state_max, idle_ttl=300.0)
+        # (направление, seq, длина, вид) -> результат разбора TLS (см. DissectionCache)
+        self.dissection_cache = DissectionCache(max_entries=max(16, flow_state_max // 2), idle_ttl=600.0)
 
-            # ограничим конец рекорда
-            rec_end = min(len(data), 5 + rec_len)
-            body = data[5:rec_end]
+        # Определяем список интерфейсов для захвата
+        if interface is None:
+            # Автоопределение - основной интерфейс
+            self.interfaces = [conf.iface]
+            self.interface = conf.iface
+        elif interface == 'any':
+            # Захват со всех интерфейсов
+            self.interfaces = self._get_all_interfaces()
+            self.interface = 'any'
+        elif isinstance(interface, list):
+            # Список интерфейсов
+            self.interfaces = interface
+            self.interface = ','.join(interface)
+        else:
+            # Один интерфейс
+            self.interfaces = [interface]
+            self.interface = interface
 
-            # 0x15 = Alert
-            if rec_type == 0x15:
-                return self._parse_tls_alert(body, rec_ver)
+        # Кольцевой колоночный буфер (см. PacketStore)
+        self.packets = PacketStore(packet_limit, arena_bytes)
 
-            # 0x16 = Handshake (в TLS1.3 многие сообщения после SH уже шифруются и идут как 0x17)
-            if rec_type != 0x16:
-                return None
+        # Lock для thread-safety
+        self.lock = threading.Lock()
 
-            # Handshake message header: msg_type(1), len(3)
-            if len(body) < 4:
-                return None
-            hs_type = body[0]
-            hs_len = int.from_bytes(body[1:4], "big")
-            hs_body = body[4:4 + hs_len]
-            if not hs_body:
-                return None
+        # Потоки захвата (по одному на интерфейс)
+        self.capture_threads = []
+        self.running = False
+        self.stop_sniffing = threading.Event()
 
-            # ClientHello
-            if hs_type == 0x01:
-                return self._parse_tls_client_hello(hs_body, rec_ver)
+        # Источник кадров: scapy sniff или mmap-кольцо TPACKET_V3
+        self.backend = backend
+        self.ring_mb = max(4, int(ring_mb))
+        self.rings = []
+        self._ring_ethernet = {}  # iface -> есть ли Ethernet-заголовок в кадрах кольца
+
+        # Очереди между sniff-callback и потоками разбора (по одной на воркер)
+        self.dissector_workers = max(1, int(dissector_workers))
+        self.queue_size = max(self.dissector_workers, int(queue_size))
+        self.dissect_queues = []
+        self.dissect_threads = []
+        self.queue_stats_lock = threading.Lock()
+        self.queue_enqueued = 0
+        self.queue_dropped = 0
+        self.queue_dissected = 0
 
-            # ServerHello
-            if hs_type == 0x02:
-                return self._parse_tls_server_hello(hs_body, rec_ver)
+        # Счетчики для статистики
+        self.packet_counter = 0
+        self.total_bytes = 0
+        self.start_time = None
 
-            # Certificate (TLS1.2 и ниже часто виден; в TLS1.3 обычно уже шифруется)
-            if hs_type == 0x0b:
-                cert = self._parse_tls_certificate_brief(hs_body)
-                if cert:
-                    return cert
-                return "TLS Certificate"
+        # Bandwidth tracking
+        self.bytes_last_second = 0
+        self.last_bandwidth_check = None
+        self.current_bandwidth = 0
 
-            return None
-        except Exception:
-            return None
+        # Latency tracking
+        self.latency_samples = deque(maxlen=1000)
+        self.latency_sample_total = 0  # сколько выборок добавлено всего (для отбора новых в HeadlessMonitor)
 
-    def _parse_tls_alert(self, body: bytes, rec_ver: int) -> Optional[str]:
+        # Packet loss detection: (src_ip, dst_ip, src_port, dst_port) -> (seq, payload_len)
+        self.tcp_sequence_tracker = FlowStateTable(max_entries=flow_state_max, idle_ttl=120.0)
+        self.packet_loss_count = 0
+
+        # Статистика по всему буферу (вытесненные пакеты вычитаются)
+        self.stats = TrafficStats()
+        # Индекс потоков для Follow Stream / деталей flow
+        self.flows = FlowTable(self.packets)
+        self.packets.evict_listeners.append(self._on_packet_evicted)
+        # callback(packet_info) для каждого записанного пакета (под lock, см. HeadlessMonitor)
+        self.packet_listeners = []
+
+        # Спул на диск: пакеты старше кольцевого буфера подгружаются страницами
+        self.spool = spool
+        self.spool_page_size = 1000
+        self.spool_max_pages = 32
+        self.spool_errors = 0
+        self._spool_lock = threading.Lock()
+        self._spool_pages = OrderedDict()  # page id -> PacketStore
+        self._spool_pages_gen = None
+        self._spool_parser = None
+
+        self._log(f"Initialized with interfaces: {self.interfaces}")
+        self._log(f"Ring buffer max: {packet_limit} packets, arena {self.packets.arena_bytes // (1024 * 1024)} MB")
+
+    def _get_all_interfaces(self):
+        """Получить список всех сетевых интерфейсов"""
         try:
-            if len(body) < 2:
-                return None
-            lvl = body[0]
-            desc = body[1]
-            return f"TLS Alert {self._tls_alert_level(lvl)} {self._tls_alert_desc(desc)} ({self._tls_ver_name(rec_ver)})"
-        except Exception:
-            return None
+            # Получаем все интерфейсы
+            all_ifaces = get_if_list()
 
-    def _parse_tls_client_hello(self, b: bytes, rec_ver: int) -> Optional[str]:
+            # Фильтруем служебные интерфейсы
+            filtered = [
+                iface for iface in all_ifaces
+                if not iface.startswith('lo') and  # loopback
+                   not iface.startswith('docker') and  # docker
+                   not iface.startswith('veth') and  # virtual ethernet
+                   not iface.startswith('br-')  # bridge
+            ]
+
+            # Если список пустой - берем все кроме lo
+            if not filtered:
+                filtered = [iface for iface in all_ifaces if iface != 'lo']
+
+            self._log(f"Detected interfaces: {filtered}")
+            return filtered if filtered else [conf.iface]
+
+        except Exception as e:
+            self._log(f"Error getting interfaces: {e}")
+            return [conf.iface]
+
+    def _tls_flow_key(self, packet_info):
+        # направление важно: ClientHello идёт от клиента к серверу.
+        # но нам всё равно — просто копим на оба направления отдельно.
+        return (
+            str(packet_info.get("src_ip")),
+            int(packet_info.get("src_port") or 0),
+            str(packet_info.get("dst_ip")),
+            int(packet_info.get("dst_port") or 0),
+            "TCP"
+        )
+
+    def _try_parse_tls_summary_buffered(self, pkt, packet_info):
         """
-        ClientHello (best effort):
-          client_version(2), random(32), session_id, cipher_suites, comp_methods, extensions
-        Из extensions достаём:
-          - SNI (0x0000)
-          - ALPN (0x0010)
-          - supported_versions (0x002b) -> TLS1.3 и т.п.
-          - supported_groups (0x000a), ec_point_formats (0x000b) для JA3
+        Буферизуем первые TCP payload по направлению потока и разбираем TLS handshake:
+        ClientHello (SNI/ALPN/JA3), ServerHello (версия/cipher) и, для TLS1.2 и ниже,
+        Certificate (subject/CN/SAN). Каждое сообщение разбирается один раз: результат
+        запоминается в dissection_cache по (направление, seq начала, длина), а поля
+        уходят в packet_info['flow_attrs'] и становятся атрибутами потока (FlowTable).
+        Возвращает строку или None.
         """
         try:
-            p = 0
-            if len(b) < 2 + 32 + 1:
+            key = self._tls_flow_key(packet_info)
+            now = float(getattr(pkt, 'time', 0) or time.time())
+            if self.tls_ch_parsed.get(key, now=now) is not None:
                 return None
 
-            client_ver = int.from_bytes(b[p:p + 2], "big");
-            p += 2
-            p += 32  # random
-
-            sid_len = b[p];
-            p += 1
-            p += sid_len
-            if p >= len(b):
+            data = self._get_tcp_payload_bytes(pkt)
+            if not data:
                 return None
 
-            cs_len = int.from_bytes(b[p:p + 2], "big");
-            p += 2
-            cs_end = p + cs_len
-            if cs_end > len(b):
-                return None
-            cipher_suites = b[p:cs_end]
-            p = cs_end
+            # Ограничим буфер (ClientHello обычно < 8-12 KB)
+            # state: [seq первого байта буфера, bytearray, сколько сообщений уже разобрано]
+            state = self.tls_ch_buffers.get(key, now=now)
+            if state is None:
+                seq0 = packet_info.get('tcp_seq')
+                state = [int(seq0) if seq0 is not None else None, bytearray(), 0]
+                self.tls_ch_buffers.put(key, state, now)
+            buf = state[1]
+
+            if len(buf) < self.TLS_CH_LIMIT:
+                need = self.TLS_CH_LIMIT - len(buf)
+                buf.extend(data[:need])
+                self.tls_ch_buffers.resize(key, len(buf))
 
-            if p + 1 > len(b):
-                return None
-            cm_len = b[p];
-            p += 1
-            p += cm_len
-            if p > len(b):
-                return None
+            messages, ended = self._tls_handshake_messages(buf)
 
-            if p + 2 > len(b):
-                # no extensions
-                sni = None
-                alpn = None
-                ver = self._tls_ver_name(client_ver)
-                return f"TLS ClientHello ver={ver}" + (f" SNI={sni}" if sni else "")
+            summaries = []
+            attrs = {}
+            done = ended
+            for offset, hs_type, body in messages[state[2]:]:
+                fields = self._dissect_tls_message(key, state[0], offset, hs_type, body, now)
+                if hs_type == 0x01:
+                    done = True
+                    if fields:
+                        parts = []
+                        if fields['sni']:
+                            parts.append(f"SNI={fields['sni']}")
+                        if fields['alpn']:
+                            parts.append("ALPN=" + ",".join(fields['alpn'][:6]))
+                        summaries.append(" ".join(["TLS ClientHello"] + parts))
+                        attrs.update(tls_version=fields['tls_version'], sni=fields['sni'],
+                                     alpn=",".join(fields['alpn']), ja3=fields['ja3'])
+                elif hs_type == 0x02:
+                    if fields:
+                        summaries.append(f"TLS ServerHello ver={fields['tls_version']} cipher=0x{fields['tls_cipher']:04x}")
+                        attrs.update(tls_version=fields['tls_version'], tls_cipher=f"0x{fields['tls_cipher']:04x}")
+                        # в TLS1.3 сертификат уже зашифрован — ждать нечего
+                        done = done or fields['tls_version'] == "TLS1.3"
+                    else:
+                        done = True
+                elif hs_type == 0x0b:
+                    done = True
+                    if fields:
+                        parts = ["TLS Certificate"]
+                        if fields['cert_cn']:
+                            parts.append(f"CN={fields['cert_cn']}")
+                        if fields['cert_san']:
+                            parts.append("SAN=" + ",".join(fields['cert_san']))
+                        summaries.append(" ".join(parts))
+                        attrs.update(cert_subject=fields['cert_subject'], cert_san=",".join(fields['cert_san']))
+                elif state[2] == 0:
+                    # поток начинается не с ClientHello/ServerHello — не TLS handshake
+                    done = True
+                state[2] += 1
+                if done:
+                    break
 
-            ext_len = int.from_bytes(b[p:p + 2], "big");
-            p += 2
-            ext_end = min(len(b), p + ext_len)
+            if attrs:
+                packet_info['flow_attrs'] = {k: v for k, v in attrs.items() if v}
 
-            sni = None
-            alpns = []
-            supported_versions = None
+            # если буфер уже большой, а разбирать больше нечего — прекращаем
+            if done or len(buf) >= self.TLS_CH_LIMIT:
+                self.tls_ch_parsed.put(key, True, now)
+                # можно чистить буфер, чтобы не росло
+                self.tls_ch_buffers.pop(key, None)
 
-            # JA3 pieces
-            ja3_exts = []
-            ja3_groups = []
-            ja3_ecpf = []
+            return "; ".join(summaries) or None
+        except Exception:
+            return None
 
-            while p + 4 <= ext_end:
-                etype = int.from_bytes(b[p:p + 2], "big");
-                p += 2
-                elen = int.from_bytes(b[p:p + 2], "big");
-                p += 2
-                ebody = b[p:p + elen]
-                p += elen
-                if len(ebody) != elen:
-                    break
+    @staticmethod
+    def _tls_handshake_messages(data):
+        """Разрезать начало TLS-потока одного направления на handshake-сообщения.
 
-                ja3_exts.append(str(etype))
+        Тела handshake-записей (0x16) склеиваются, сообщения режутся по заголовку
+        type(1)+len(3) — так собирается и сообщение, разбитое на несколько записей
+        (обычно Certificate). Разбор идёт до первой записи другого типа
+        (ChangeCipherSpec, Application Data, Alert): дальше handshake зашифрован.
 
-                # SNI
-                if etype == 0x0000:
-                    # list_len(2), then entries
-                    if len(ebody) < 2:
-                        continue
-                    q = 2
-                    while q + 3 <= len(ebody):
-                        name_type = ebody[q];
-                        q += 1
-                        name_len = int.from_bytes(ebody[q:q + 2], "big");
-                        q += 2
-                        if q + name_len > len(ebody):
-                            break
-                        if name_type == 0:
-                            sni = ebody[q:q + name_len].decode("utf-8", errors="replace").strip()
-                            break
-                        q += name_len
+        Returns:
+            tuple: ([(offset, hs_type, body)], ended) — offset: позиция заголовка
+            сообщения в data (для записи, где оно начинается); ended: открытая часть
+            handshake закончилась.
+        """
+        start = -1
+        for i in range(0, min(len(data) - 1, 4096)):
+            if data[i] == 0x16 and data[i + 1] == 0x03:
+                start = i
+                break
+        if start < 0:
+            return [], False
+
+        hs = bytearray()
+        origins = []   # (смещение в hs, смещение тела записи в data)
+        p = start
+        ended = False
+        while p + 5 <= len(data):
+            if data[p] != 0x16 or data[p + 1] != 0x03:
+                ended = True
+                break
+            ln = int.from_bytes(data[p + 3:p + 5], "big")
+            if p + 5 + ln > len(data):
+                break
+            origins.append((len(hs), p + 5))
+            hs += data[p + 5:p + 5 + ln]
+            p += 5 + ln
+
+        messages = []
+        q = 0
+        k = 0
+        while q + 4 <= len(hs):
+            ln = int.from_bytes(hs[q + 1:q + 4], "big")
+            if q + 4 + ln > len(hs):
+                break
+            while k + 1 < len(origins) and origins[k + 1][0] <= q:
+                k += 1
+            messages.append((origins[k][1] + q - origins[k][0], hs[q], bytes(hs[q + 4:q + 4 + ln])))
+            q += 4 + ln
+        return messages, ended
+
+    def _dissect_tls_message(self, flow_key, seq0, offset, hs_type, body, now):
+        """Поля handshake-сообщения (ClientHello/ServerHello/Certificate) через dissection_cache."""
+        parser = {
+            0x01: self._parse_tls_client_hello_fields,
+            0x02: self._parse_tls_server_hello_fields,
+            0x0b: self._parse_tls_certificate_fields,
+        }.get(hs_type)
+        if parser is None:
+            return None
+        if seq0 is None:
+            return parser(body)
+        key = (flow_key, (seq0 + offset) & 0xFFFFFFFF, 4 + len(body), hs_type)
+        return self.dissection_cache.memo(key, now, parser, body)
+
+    def tls_stream_summary(self, src_ip, src_port, dst_ip, dst_port, data):
+        """tls_summarize_stream для данных одного направления TCP-потока.
+
+        ClientHello/ServerHello/Certificate берутся из dissection_cache — тех же записей
+        (направление, seq начала сообщения, длина, вид), что создал разбор при захвате,
+        поэтому Follow Stream не разбирает handshake заново. Данные Follow Stream
+        начинаются с первого сегмента направления в индексе потоков — с того же seq,
+        с которого копился буфер разбора при захвате.
+        """
+        if not data:
+            return []
+        seq0, now = None, None
+        with self.lock:
+            flow = self.flows.flows.get(FlowTable.flow_key('TCP', src_ip, src_port, dst_ip, dst_port))
+            if flow:
+                ordered = flow['dirs'].get((str(src_ip), int(src_port)))
+                seq0 = ordered[0][0] if ordered else None
+                # время кэша — время пакетов (как у остальных таблиц), а не часы
+                slot = self.packets.find_slot(flow['nums'][-1]) if flow['nums'] else None
+                if slot is not None:
+                    now = float(self.packets._ts[slot])
+        if seq0 is None or now is None:
+            return tls_summarize_stream(data)
+        flow_key = (str(src_ip), int(src_port), str(dst_ip), int(dst_port), "TCP")
+
+        def handshake_line(offset, hs_type, body):
+            if hs_type not in (0x01, 0x02):
+                return None
+            fields = self._dissect_tls_message(flow_key, seq0, offset, hs_type, body, now)
+            if not fields:
+                return None
+            if hs_type == 0x01:
+                parts = ["ClientHello"]
+                if fields['sni']:
+                    parts.append(f"SNI={fields['sni']}")
+                if fields['alpn']:
+                    parts.append("ALPN=" + ",".join(fields['alpn'][:8]))
+                return " ".join(parts)
+            return f"ServerHello ver={fields['tls_version']} cipher=0x{fields['tls_cipher']:04x}"
 
-                # ALPN
-                elif etype == 0x0010:
-                    # alpn_ext: list_len(2), then (name_len(1), name)
-                    if len(ebody) < 2:
-                        continue
-                    q = 2
-                    while q + 1 <= len(ebody):
-                        ln = ebody[q];
-                        q += 1
-                        if q + ln > len(ebody):
-                            break
-                        proto = ebody[q:q + ln].decode("ascii", errors="replace")
-                        q += ln
-                        if proto:
-                            alpns.append(proto)
+        return tls_summarize_stream(data, handshake_line)
 
-                # supported_versions
-                elif etype == 0x002b:
-                    # client: len(1) then versions(2 each)
-                    if len(ebody) < 1:
-                        continue
-                    ln = ebody[0]
-                    q = 1
-                    vers = []
-                    while q + 2 <= len(ebody) and (q - 1) < ln:
-                        vv = int.from_bytes(ebody[q:q + 2], "big")
-                        vers.append(self._tls_ver_name(vv))
-                        q += 2
-                    if vers:
-                        supported_versions = vers[0]  # обычно самое новое
+    def set_bpf_filter(self, bpf: str | None):
+        bpf = (bpf or "").strip()
+        self.bpf_filter = bpf if bpf else None
+        self._log(f"Set BPF filter: {self.bpf_filter!r}")
 
-                # supported_groups (elliptic curves)
-                elif etype == 0x000a:
-                    if len(ebody) < 2:
-                        continue
-                    glen = int.from_bytes(ebody[0:2], "big")
-                    q = 2
-                    while q + 2 <= len(ebody) and (q - 2) < glen:
-                        gid = int.from_bytes(ebody[q:q + 2], "big")
-                        ja3_groups.append(str(gid))
-                        q += 2
+    def _log(self, message):
+        """Логирование в файл вместо print()"""
+        if self.log_file:
+            try:
+                with open(self.log_file, 'a') as f:
+                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    f.write(f"[{timestamp}] {message}\n")
+            except:
+                pass
 
-                # ec_point_formats
-                elif etype == 0x000b:
-                    if len(ebody) < 1:
-                        continue
-                    flen = ebody[0]
-                    q = 1
-                    for i in range(min(flen, len(ebody) - 1)):
-                        ja3_ecpf.append(str(ebody[q + i]))
+    def _packet_handler(self, pkt):
+        """Обработчик пакета (callback для sniff) — быстрый путь.
 
-            # Версия: для TLS1.3 обычно client_ver=0x0303, реальная в supported_versions
-            ver_name = supported_versions or self._tls_ver_name(client_ver)
+        Только измеряет latency и кладёт пакет в очередь dissector-воркера, lock не берётся.
+        Очередь выбирается по симметричному хэшу потока, так что пакеты одного
+        соединения разбираются по порядку одним воркером. При переполнении пакет
+        отбрасывается и учитывается в `queue_dropped`.
+        """
+        if not self.running:
+            return
 
-            parts = [f"TLS ClientHello ver={ver_name}"]
-            if sni:
-                parts.append(f"SNI={sni}")
-            if alpns:
-                parts.append(f"ALPN={','.join(alpns)}")
+        # Измерение latency (время от захвата до callback)
+        self._measure_latency(pkt)
+        self._enqueue(pkt)
 
-            # JA3 (опционально)
-            ja3 = self._build_ja3(client_ver, cipher_suites, ja3_exts, ja3_groups, ja3_ecpf)
-            if ja3:
-                parts.append(f"JA3={ja3}")
+    def _enqueue(self, item, raw=None):
+        """Положить пакет (scapy-объект или кадр (frame, ts, iface)) в очередь воркера."""
+        queues = self.dissect_queues
+        if not queues:
+            # воркеры не запущены — разбираем синхронно
+            self._dissect_packet(item)
+            return
 
-            return " ".join(parts)
-        except Exception:
-            return None
+        if len(queues) == 1:
+            q = queues[0]
+        else:
+            if raw is None:
+                raw = getattr(item, 'original', None) or bytes(item)
+            q = queues[raw_flow_hash(raw) % len(queues)]
 
-    def _parse_tls_server_hello(self, b: bytes, rec_ver: int) -> Optional[str]:
-        """
-        ServerHello (best effort):
-          server_version(2), random(32), session_id, cipher_suite(2), comp(1), extensions
-        Из extensions:
-          - supported_versions (0x002b) -> TLS1.3 реально
-        """
         try:
-            p = 0
-            if len(b) < 2 + 32 + 1:
-                return None
+            q.put_nowait(item)
+        except queue.Full:
+            with self.queue_stats_lock:
+                self.queue_dropped += 1
+            return
 
-            srv_ver = int.from_bytes(b[p:p + 2], "big");
-            p += 2
-            p += 32
+        with self.queue_stats_lock:
+            self.queue_enqueued += 1
 
-            sid_len = b[p];
-            p += 1
-            p += sid_len
-            if p + 2 + 1 > len(b):
-                return None
+    def _dissector_thread(self, q):
+        """Поток разбора: забирает пакеты из своей очереди до sentinel (None)."""
+        while True:
+            pkt = q.get()
+            if pkt is None:
+                break
+            try:
+                self._dissect_packet(pkt)
+            except Exception as e:
+                self._log(f"Error in dissector thread: {e}")
+            with self.queue_stats_lock:
+                self.queue_dissected += 1
+        self._log(f"{threading.current_thread().name} stopped")
 
-            cipher = int.from_bytes(b[p:p + 2], "big");
-            p += 2
-            _comp = b[p];
-            p += 1
+    def _dissect_packet(self, pkt):
+        """Полный разбор пакета (вне lock) и запись в кольцевой буфер (под lock).
 
-            tls13_ver = None
-            if p + 2 <= len(b):
-                ext_len = int.from_bytes(b[p:p + 2], "big");
-                p += 2
-                ext_end = min(len(b), p + ext_len)
-                while p + 4 <= ext_end:
-                    etype = int.from_bytes(b[p:p + 2], "big");
-                    p += 2
-                    elen = int.from_bytes(b[p:p + 2], "big");
-                    p += 2
-                    ebody = b[p:p + elen];
-                    p += elen
-                    if etype == 0x002b and len(ebody) >= 2:
-                        vv = int.from_bytes(ebody[0:2], "big")
-                        tls13_ver = self._tls_ver_name(vv)
+        pkt — scapy-пакет (backend scapy) или кадр (frame, ts, iface) из кольца TPACKET_V3.
+        """
+        # Парсим пакет
+        if isinstance(pkt, tuple):
+            packet_info, tcp_seg = self._parse_raw_frame(*pkt)
+        else:
+            packet_info = self._parse_packet(pkt)
+            tcp_seg = None
+
+        with self.lock:
+            # Добавляем номер пакета
+            self.packet_counter += 1
+            packet_info['num'] = self.packet_counter
+
+            # Детекция packet loss для TCP (до записи в буфер: флаг хранится в колонке)
+            if packet_info['proto'] in ['TCP', 'TCPv4', 'TCPv6']:
+                if tcp_seg is None:
+                    tcp_seg = self._tcp_seq_len(pkt)
+                if tcp_seg is not None:
+                    self._detect_packet_loss(packet_info, *tcp_seg)
+                if packet_info.get('tcp_fin') or packet_info.get('tcp_rst'):
+                    self._close_flow_state(packet_info)
+
+            # Добавляем в кольцевой буфер
+            self.packets.append(packet_info)
+            self.stats.add(packet_info)
+            self.flows.add(packet_info)
+            if self.spool is not None:
+                self._spool_append(packet_info)
+            for listener in self.packet_listeners:
+                try:
+                    listener(packet_info)
+                except Exception:
+                    pass
+
+            # Обновляем статистику bandwidth
+            packet_size = packet_info.get('size', 0)
+            self.total_bytes += packet_size
+            self.bytes_last_second += packet_size
+
+            # Обновляем bandwidth каждую секунду
+            current_time = time.time()
+            if self.last_bandwidth_check is None:
+                self.last_bandwidth_check = current_time
+            elif current_time - self.last_bandwidth_check >= 1.0:
+                self.current_bandwidth = self.bytes_last_second
+                self.bytes_last_second = 0
+                self.last_bandwidth_check = current_time
 
-            ver_name = tls13_ver or self._tls_ver_name(srv_ver)
-            return f"TLS ServerHello ver={ver_name} cipher=0x{cipher:04x}"
+    @staticmethod
+    def _tcp_seq_len(pkt):
+        """(seq, длина payload) TCP-сегмента scapy-пакета или None."""
+        try:
+            if not pkt.haslayer(TCP):
+                return None
+            tcp = pkt[TCP]
+            return tcp.seq, (len(tcp.payload) if tcp.payload else 0)
         except Exception:
             return None
 
-    def _parse_tls_certificate_brief(self, b: bytes) -> Optional[str]:
-        """
-        Попытка вытащить CN/SAN.
-        Реально работает нормально в TLS1.2 и ниже (в TLS1.3 cert обычно в шифрованных record'ах).
-        Используем cryptography если доступна.
-        """
+    def _detect_packet_loss(self, packet_info, seq, payload_len):
+        """Улучшенная детекция потери пакетов"""
         try:
-            # TLS1.2 Certificate:
-            # cert_list_len(3), then repeated: cert_len(3) + cert_der
-            if len(b) < 3:
-                return None
-            total_len = int.from_bytes(b[0:3], "big")
-            p = 3
-            if p + 3 > len(b):
-                return None
-            cert_len = int.from_bytes(b[p:p + 3], "big");
-            p += 3
-            cert_der = b[p:p + cert_len]
-            if len(cert_der) < 16:
-                return None
+            src_ip = packet_info.get('src_ip')
+            dst_ip = packet_info.get('dst_ip')
+            src_port = packet_info.get('src_port')
+            dst_port = packet_info.get('dst_port')
 
-            if x509 is None or default_backend is None:
-                return "TLS Certificate"
+            if not all([src_ip, dst_ip, src_port, dst_port]):
+                return
 
-            cert = x509.load_der_x509_certificate(cert_der, default_backend())
+            flow_key = (src_ip, dst_ip, src_port, dst_port)
+            ts = packet_info.get('timestamp')
+            now = ts.timestamp() if isinstance(ts, datetime) else time.time()
 
-            # CN
-            cn = ""
-            try:
-                for attr in cert.subject:
-                    if attr.oid.dotted_string == "2.5.4.3":  # CN
-                        cn = str(attr.value)
-                        break
-            except Exception:
-                cn = ""
+            last = self.tcp_sequence_tracker.get(flow_key, now=now)
+            if last is not None:
+                last_seq, last_len = last
+                expected_seq = last_seq + max(last_len, 1)
 
-            # SAN (DNS)
-            san_dns = []
-            try:
-                ext = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
-                san_dns = ext.value.get_values_for_type(x509.DNSName)[:3]
-            except Exception:
-                san_dns = []
+                # Разрыв больше чем ожидаемый размер пакета (обычно 1460-1500)
+                gap = seq - expected_seq
+
+                # Игнорируем retransmissions (seq меньше expected)
+                if gap > 1460:  # MSS для Ethernet
+                    self.packet_loss_count += 1
+                    packet_info['packet_loss'] = True
+                    packet_info['seq_gap'] = gap
+
+            # Сохраняем текущий seq и длину payload
+            self.tcp_sequence_tracker.put(flow_key, (seq, payload_len), now)
 
-            parts = ["TLS Certificate"]
-            if cn:
-                parts.append(f"CN={cn}")
-            if san_dns:
-                parts.append("SAN=" + ",".join(san_dns))
-            return " ".join(parts)
         except Exception:
-            return None
+            pass
 
-    def _build_ja3(self, client_ver: int, cipher_suites_bytes: bytes, exts: list[str], groups: list[str],
-                   ecpf: list[str]) -> Optional[str]:
-        """
-        JA3: <version>,<ciphers>,<extensions>,<elliptic_curves>,<ec_point_formats>
-        Реализация best-effort; если что-то не удалось — вернёт None.
+    def _close_flow_state(self, packet_info):
+        """FIN/RST: снять состояние направления отправителя (при RST — обоих направлений)."""
+        src = (packet_info.get('src_ip'), packet_info.get('src_port'))
+        dst = (packet_info.get('dst_ip'), packet_info.get('dst_port'))
+        directions = [(src, dst)]
+        if packet_info.get('tcp_rst'):
+            directions.append((dst, src))
+        for (a_ip, a_port), (b_ip, b_port) in directions:
+            tls_key = (str(a_ip), int(a_port or 0), str(b_ip), int(b_port or 0), "TCP")
+            self.tls_ch_buffers.close(tls_key)
+            self.tls_ch_parsed.close(tls_key)
+            self.tcp_sequence_tracker.close((a_ip, b_ip, a_port, b_port))
+
+    def get_flow_state_stats(self):
+        """Размер и счётчики вытеснения таблиц состояния потоков.
+
+        Returns:
+            dict: flow_state_entries, flow_state_bytes, flow_state_evicted_{lru,idle,closed}
+            (суммы по таблицам) и flow_state_tables: {имя таблицы: FlowStateTable.stats()}.
         """
+        tables = {
+            'tls_buffers': self.tls_ch_buffers.stats(),
+            'tls_parsed': self.tls_ch_parsed.stats(),
+            'dissection': self.dissection_cache.stats(),
+            'tcp_seq': self.tcp_sequence_tracker.stats(),
+        }
+        out = {f'flow_state_{k}': sum(t[k] for t in tables.values())
+               for k in ('entries', 'bytes', 'evicted_lru', 'evicted_idle', 'evicted_closed')}
+        out['flow_state_tables'] = tables
+        return out
+
+    def _measure_latency(self, pkt):
+        """Измерение latency"""
         try:
-            # ciphers: 2 bytes each
-            ciphers = []
-            for i in range(0, len(cipher_suites_bytes), 2):
-                if i + 2 > len(cipher_suites_bytes):
-                    break
-                cid = int.from_bytes(cipher_suites_bytes[i:i + 2], "big")
-                # игнорируем GREASE (0x?A?A)
-                if (cid & 0x0f0f) == 0x0a0a:
-                    continue
-                ciphers.append(str(cid))
+            if hasattr(pkt, 'time'):
+                self._add_latency_sample(float(pkt.time))
+        except Exception:
+            pass
 
-            # extensions: тоже фильтруем GREASE
-            exts2 = []
-            for e in exts:
-                try:
-                    ei = int(e)
-                except Exception:
-                    continue
-                if (ei & 0x0f0f) == 0x0a0a:
-                    continue
-                exts2.append(str(ei))
+    def _add_latency_sample(self, capture_time):
+        """Добавить выборку latency по времени захвата кадра (epoch, сек)."""
+        latency_us = (time.time() - capture_time) * 1000000
+        if 0 < latency_us < 1000000:
+            self.latency_samples.append(latency_us)
+            self.latency_sample_total += 1
 
-            # groups/ecpf тоже фильтруем GREASE для groups
-            groups2 = []
-            for g in groups:
-                try:
-                    gi = int(g)
-                except Exception:
-                    continue
-                if (gi & 0x0f0f) == 0x0a0a:
+    def _safe_decode_ascii(self, b: bytes, limit=2048) -> str:
+        try:
+            return b[:limit].decode("utf-8", errors="replace")
+        except Exception:
+            return ""
+
+    def _format_tcp_options(self, tcp) -> list[str]:
+        out = []
+        try:
+            for name, value in getattr(tcp, "options", []) or []:
+                if name == "MSS" and value is not None:
+                    out.append(f"MSS={value}")
+                elif name == "SAckOK":
+                    out.append("SACK_PERM")
+                elif name == "Timestamp" and isinstance(value, tuple) and len(value) >= 2:
+                    out.append(f"TSval={value[0]}")
+                    out.append(f"TSecr={value[1]}")
+                elif name == "WScale" and value is not None:
+                    out.append(f"WS={value}")
+                elif name in ("NOP", "EOL"):
                     continue
-                groups2.append(str(gi))
+                elif value is None:
+                    out.append(str(name))
+                else:
+                    out.append(f"{name}={value}")
+        except Exception:
+            return []
+        return out
 
-            ja3_str = f"{client_ver},{'-'.join(ciphers)},{'-'.join(exts2)},{'-'.join(groups2)},{'-'.join(ecpf)}"
-            md5 = hashlib.md5(ja3_str.encode("ascii", errors="ignore")).hexdigest()
-            return md5
+    def _build_tcp_info_summary(self, pkt, flag_str: str) -> str:
+        try:
+            tcp = pkt[TCP]
+            payload_len = len(bytes(tcp.payload)) if tcp.payload is not None else 0
+            parts = [f"[{flag_str or 'NONE'}]", f"Seq={int(tcp.seq)}"]
+            if bool(tcp.flags & 0x10):
+                parts.append(f"Ack={int(tcp.ack)}")
+            parts.append(f"Win={int(tcp.window)}")
+            parts.append(f"Len={payload_len}")
+
+            options = self._format_tcp_options(tcp)
+            if options:
+                parts.extend(options[:6])
+
+            return " ".join(parts)
         except Exception:
-            return None
+            return f"Len={len(pkt[TCP]):>5}"
 
-    def _try_parse_tls_sni(self, pkt) -> str | None:
+    def _get_tcp_payload_bytes(self, pkt) -> bytes:
+        try:
+            if pkt.haslayer(TCP):
+                pl = bytes(pkt[TCP].payload)
+                return pl if pl else b""
+        except Exception:
+            pass
+        try:
+            if pkt.haslayer(Raw):
+                return bytes(pkt[Raw].load) if pkt[Raw].load else b""
+        except Exception:
+            pass
+        return b""
+
+    def _try_parse_http_summary(self, pkt) -> str | None:
         """
-        TLS ClientHello SNI (очень лёгкий парсер по байтам).
-        Ищем TLS record(0x16) -> Handshake(ClientHello=0x01) -> extensions -> server_name(0x0000).
+        HTTP: Host/URL/Status из Raw.
+        Работает как для request, так и для response.
         """
         try:
-            data = self._get_tcp_payload_bytes(pkt)
-            if not data:
+            if not pkt.haslayer(Raw):
                 return None
-
-            if len(data) < 6:
+            raw = bytes(pkt[Raw].load)
+            if not raw:
                 return None
 
-            # TLS record header: type(1)=0x16, version(2), length(2)
-            if data[0] != 0x16:
+            s = self._safe_decode_ascii(raw, limit=4096)
+            if not s:
                 return None
 
-            # record length
-            rec_len = int.from_bytes(data[3:5], "big")
-            if rec_len <= 0 or 5 + rec_len > len(data):
-                # иногда пакет урезан/фрагментирован
-                rec_end = min(len(data), 5 + rec_len)
-            else:
-                rec_end = 5 + rec_len
+            # request line
+            # GET /path HTTP/1.1
+            first_line = s.splitlines()[0] if s.splitlines() else ""
+            methods = ("GET ", "POST ", "PUT ", "DELETE ", "HEAD ", "OPTIONS ", "PATCH ", "CONNECT ", "TRACE ")
+            if first_line.startswith(methods) and " HTTP/" in first_line:
+                parts = first_line.split()
+                if len(parts) >= 2:
+                    method = parts[0]
+                    path = parts[1]
+                else:
+                    return None
 
-            # handshake header starts at 5
-            if len(data) < 9:
-                return None
-            hs_type = data[5]
-            if hs_type != 0x01:  # ClientHello
-                return None
-            hs_len = int.from_bytes(data[6:9], "big")
-            hs_end = 9 + hs_len
-            hs_end = min(hs_end, rec_end)
+                host = ""
+                for line in s.splitlines()[1:]:
+                    if line.lower().startswith("host:"):
+                        host = line.split(":", 1)[1].strip()
+                        break
 
-            p = 9
-            # client_version(2)
-            if p + 2 > hs_end: return None
+                if host:
+                    return f"HTTP {method} {host}{path}"
+                return f"HTTP {method} {path}"
+
+            # response line
+            # HTTP/1.1 200 OK
+            if first_line.startswith("HTTP/") and len(first_line.split()) >= 2:
+                parts = first_line.split(None, 2)
+                code = parts[1] if len(parts) > 1 else ""
+                msg = parts[2] if len(parts) > 2 else ""
+                msg = msg.strip()
+                if msg:
+                    return f"HTTP {code} {msg}"
+                return f"HTTP {code}"
+
+            return None
+        except Exception:
+            return None
+
+    # ---- TLS helpers ----
+
+    def _tls_ver_name(self, v: int) -> str:
+        return {
+            0x0300: "SSL3.0",
+            0x0301: "TLS1.0",
+            0x0302: "TLS1.1",
+            0x0303: "TLS1.2",
+            0x0304: "TLS1.3",
+        }.get(v, f"0x{v:04x}")
+
+    def _tls_alert_desc(self, d: int) -> str:
+        # неполная таблица 
+        m = {
+            0: "close_notify",
+            10: "unexpected_message",
+            20: "bad_record_mac",
+            21: "decryption_failed",
+            22: "record_overflow",
+            30: "decompression_failure",
+            40: "handshake_failure",
+            41: "no_certificate",
+            42: "bad_certificate",
+            43: "unsupported_certificate",
+            44: "certificate_revoked",
+            45: "certificate_expired",
+            46: "certificate_unknown",
+            47: "illegal_parameter",
+            48: "unknown_ca",
+            49: "access_denied",
+            50: "decode_error",
+            51: "decrypt_error",
+            60: "export_restriction",
+            70: "protocol_version",
+            71: "insufficient_security",
+            80: "internal_error",
+            86: "inappropriate_fallback",
+            90: "user_canceled",
+            100: "no_renegotiation",
+            109: "missing_extension",
+            110: "unsupported_extension",
+            111: "certificate_unobtainable",
+            112: "unrecognized_name",  # SNI
+            113: "bad_certificate_status_response",
+            114: "bad_certificate_hash_value",
+            115: "unknown_psk_identity",
+            116: "certificate_required",
+            120: "no_application_protocol",
+        }
+        return m.get(d, f"desc_{d}")
+
+    def _tls_alert_level(self, lvl: int) -> str:
+        return {1: "warning", 2: "fatal"}.get(lvl, f"lvl_{lvl}")
+
+    def _read_u8(self, b: bytes, p: int) -> tuple[int, int]:
+        return b[p], p + 1
+
+    def _read_u16(self, b: bytes, p: int) -> tuple[int, int]:
+        return int.from_bytes(b[p:p + 2], "big"), p + 2
+
+    def _read_u24(self, b: bytes, p: int) -> tuple[int, int]:
+        return int.from_bytes(b[p:p + 3], "big"), p + 3
+
+    def _try_parse_tls_serverhello_from_bytes(self, data: bytes) -> str | None:
+        """
+        Минимально: TLS ServerHello -> версия (по record/hello) + cipher_suite.
+        Работает по накопленному потоку server->client.
+        """
+        try:
+            if not data or len(data) < 6:
+                return None
+
+            # Найдём начало TLS record (handshake=0x16, version=0x03)
+            start = -1
+            for i in range(0, min(len(data) - 3, 4096)):
+                if data[i] == 0x16 and data[i + 1] == 0x03:
+                    start = i
+                    break
+            if start < 0:
+                return None
+
+            data = data[start:]
+
+            if len(data) < 5:
+                return None
+
+            rec_ver = data[1:3]  # 03 01 / 03 03 ...
+            rec_len = int.from_bytes(data[3:5], "big")
+            rec_end = min(5 + rec_len, len(data))
+            if rec_end < 9:
+                return None
+
+            # handshake header
+            hs_type = data[5]
+            if hs_type != 0x02:  # ServerHello
+                return None
+            hs_len = int.from_bytes(data[6:9], "big")
+            hs_end = min(9 + hs_len, rec_end)
+            if hs_end < 9 + 38:  # минимальная длина ServerHello
+                return None
+
+            p = 9
+
+            # legacy_version (2)
+            legacy_ver = data[p:p + 2]
             p += 2
-            # random(32)
-            if p + 32 > hs_end: return None
+
+            # random (32)
             p += 32
+            if p > hs_end:
+                return None
+
             # session_id
-            if p + 1 > hs_end: return None
+            if p + 1 > hs_end:
+                return None
             sid_len = data[p]
             p += 1 + sid_len
-            if p > hs_end: return None
+            if p > hs_end:
+                return None
+
+            # cipher_suite (2)
+            if p + 2 > hs_end:
+                return None
+            cipher = int.from_bytes(data[p:p + 2], "big")
+            p += 2
+
+            # compression_method (1) - может быть 0
+            if p + 1 > hs_end:
+                return None
+            p += 1
+
+            # Версию красиво (эвристика)
+            # В TLS1.3 ServerHello legacy_version = 0x0303 (TLS1.2), реальная версия в supported_versions ext,
+            # но без полного парсинга можно показать "TLS1.3?" по наличию 0x0303 и дальнейших encrypted records.
+            ver_map = {
+                b"\x03\x01": "TLS1.0",
+                b"\x03\x02": "TLS1.1",
+                b"\x03\x03": "TLS1.2/1.3",
+            }
+            ver_s = ver_map.get(legacy_ver, f"0x{legacy_ver.hex()}")
+
+            return f"TLS ServerHello ver={ver_s} cipher=0x{cipher:04x}"
+        except Exception:
+            return None
+
+    def _try_parse_tls_summary_from_bytes(self, data: bytes) -> str | None:
+        """
+        Минимально: TLS ClientHello -> SNI + ALPN.
+        Работает по накопленному потоку.
+        """
+        # try:
+        #     if not data or len(data) < 6:
+        #         return None
+        try:
+            # TLS record header = 5 байт (type(1) + ver(2) + len(2))
+            if not data or len(data) < 5:
+                return None
+
+            # найдём начало TLS record (handshake=0x16, version=0x03)
+            start = -1
+            for i in range(0, min(len(data) - 3, 4096)):
+                if data[i] == 0x16 and data[i + 1] == 0x03:
+                    start = i
+                    break
+            if start < 0:
+                return None
+
+            data = data[start:]
+
+            # record header: type(1)=0x16, version(2), len(2)
+            if len(data) < 5:
+                return None
+            rec_len = int.from_bytes(data[3:5], "big")
+            if rec_len <= 0:
+                return None
+            rec_end = min(5 + rec_len, len(data))
+
+            # handshake header starts at 5: msg_type(1), len(3)
+            if rec_end < 9:
+                return None
+            hs_type = data[5]
+            if hs_type != 0x01:  # ClientHello
+                return None
+            hs_len = int.from_bytes(data[6:9], "big")
+            hs_end = min(9 + hs_len, rec_end)
+            if hs_end <= 9:
+                return None
+
+            p = 9
+            # client_version(2) + random(32)
+            if p + 2 + 32 > hs_end:
+                return None
+            p += 2 + 32
+
+            # session id
+            if p + 1 > hs_end:
+                return None
+            sid_len = data[p]
+            p += 1 + sid_len
+            if p > hs_end:
+                return None
+
             # cipher_suites
-            if p + 2 > hs_end: return None
+            if p + 2 > hs_end:
+                return None
             cs_len = int.from_bytes(data[p:p + 2], "big")
             p += 2 + cs_len
-            if p > hs_end: return None
+            if p > hs_end:
+                return None
+
             # compression_methods
-            if p + 1 > hs_end: return None
+            if p + 1 > hs_end:
+                return None
             cm_len = data[p]
             p += 1 + cm_len
-            if p > hs_end: return None
-            # extensions length
+            if p > hs_end:
+                return None
+
+            # extensions
             if p + 2 > hs_end:
                 return None
             ext_len = int.from_bytes(data[p:p + 2], "big")
             p += 2
             ext_end = min(p + ext_len, hs_end)
 
-            # parse extensions
+            sni = None
+            alpn = []
+
             while p + 4 <= ext_end:
                 etype = int.from_bytes(data[p:p + 2], "big");
                 p += 2
@@ -3398,15 +5853,12 @@ class PacketCapture:
                 if p + elen > ext_end:
                     break
 
-                if etype == 0x0000:  # server_name
-                    # ServerNameList length(2)
-                    if elen < 2:
-                        break
+                # server_name (0)
+                if etype == 0x0000 and elen >= 2:
                     q = p
-                    list_len = int.from_bytes(data[q:q + 2], "big")
+                    list_len = int.from_bytes(data[q:q + 2], "big");
                     q += 2
                     list_end = min(p + elen, q + list_len)
-                    # entries: name_type(1)=0, name_len(2), name(bytes)
                     while q + 3 <= list_end:
                         name_type = data[q];
                         q += 1
@@ -3415,454 +5867,2643 @@ class PacketCapture:
                         if q + name_len > list_end:
                             break
                         if name_type == 0:
-                            sni = data[q:q + name_len].decode("utf-8", errors="replace")
-                            sni = sni.strip()
-                            if sni:
-                                return f"TLS SNI {sni}"
+                            sni = data[q:q + name_len].decode("utf-8", errors="replace").strip()
+                            break
                         q += name_len
 
+                # ALPN (16)
+                if etype == 0x0010 and elen >= 2:
+                    q = p
+                    list_len = int.from_bytes(data[q:q + 2], "big");
+                    q += 2
+                    list_end = min(p + elen, q + list_len)
+                    while q < list_end:
+                        if q + 1 > list_end:
+                            break
+                        ln = data[q];
+                        q += 1
+                        if q + ln > list_end:
+                            break
+                        alpn.append(data[q:q + ln].decode("utf-8", errors="replace"))
+                        q += ln
+
                 p += elen
 
+            parts = []
+            if sni:
+                parts.append(f"SNI={sni}")
+            if alpn:
+                parts.append("ALPN=" + ",".join(alpn[:6]))
+
+            if parts:
+                return "TLS ClientHello " + " ".join(parts)
             return None
+
         except Exception:
             return None
 
-    def _dns_answers_summary(self, dns_layer) -> str:
+    def _try_parse_tls_summary(self, pkt) -> Optional[str]:
         """
-        Вернёт краткий список ответов DNS (A/AAAA/CNAME/NS/MX/TXT...) как строку.
+        TLS summary из Raw:
+          - ClientHello: SNI + ALPN + версия
+          - ServerHello: версия + cipher (и supported_versions, если есть)
+          - Alert: level + desc
+          - (опц) JA3: md5 fingerprint
         """
         try:
-            if dns_layer is None:
-                return ""
-            if getattr(dns_layer, "ancount", 0) == 0:
-                return ""
+            # if not pkt.haslayer(Raw):
+            #     return None
+            # data = bytes(pkt[Raw].load)
+            data = self._get_tcp_payload_bytes(pkt)
+            if not data:
+                return None
+            if len(data) < 5:
+                return None
 
-            answers = []
-            an = dns_layer.an
-            # scapy: DNSRR / chain (an.payload -> next)
-            for _ in range(int(dns_layer.ancount)):
-                if an is None:
-                    break
-                try:
-                    rtype = int(getattr(an, "type", 0))
-                    rdata = getattr(an, "rdata", None)
-                    rrname = getattr(an, "rrname", b"")
-                    rrname_s = rrname.decode(errors="ignore") if isinstance(rrname, (bytes, bytearray)) else str(rrname)
+            # TLS record header: type(1), version(2), length(2)
+            rec_type = data[0]
+            rec_ver = int.from_bytes(data[1:3], "big")
+            rec_len = int.from_bytes(data[3:5], "big")
+            if rec_len <= 0:
+                return None
 
-                    # Превращаем rdata в норм строку
-                    if isinstance(rdata, (bytes, bytearray)):
-                        rdata_s = rdata.decode(errors="ignore")
-                    else:
-                        rdata_s = str(rdata)
+            # ограничим конец рекорда
+            rec_end = min(len(data), 5 + rec_len)
+            body = data[5:rec_end]
 
-                    # типы (минимально)
-                    # 1=A, 28=AAAA, 5=CNAME, 2=NS, 15=MX, 16=TXT
-                    type_name = {
-                        1: "A", 28: "AAAA", 5: "CNAME", 2: "NS", 15: "MX", 16: "TXT"
-                    }.get(rtype, f"T{rtype}")
+            # 0x15 = Alert
+            if rec_type == 0x15:
+                return self._parse_tls_alert(body, rec_ver)
 
-                    answers.append(f"{type_name}:{rdata_s}")
-                except Exception:
-                    pass
+            # 0x16 = Handshake (в TLS1.3 многие сообщения после SH уже шифруются и идут как 0x17)
+            if rec_type != 0x16:
+                return None
 
-                # следующий RR
-                an = getattr(an, "payload", None)
-                if an is None or an.__class__.__name__ == "NoPayload":
-                    break
+            # Handshake message header: msg_type(1), len(3)
+            if len(body) < 4:
+                return None
+            hs_type = body[0]
+            hs_len = int.from_bytes(body[1:4], "big")
+            hs_body = body[4:4 + hs_len]
+            if not hs_body:
+                return None
 
-            if not answers:
-                return ""
-            # ограничим длину
-            s = ", ".join(answers[:6])
-            if len(answers) > 6:
-                s += ", ..."
-            return s
+            # ClientHello
+            if hs_type == 0x01:
+                return self._parse_tls_client_hello(hs_body, rec_ver)
+
+            # ServerHello
+            if hs_type == 0x02:
+                return self._parse_tls_server_hello(hs_body, rec_ver)
+
+            # Certificate (TLS1.2 и ниже часто виден; в TLS1.3 обычно уже шифруется)
+            if hs_type == 0x0b:
+                cert = self._parse_tls_certificate_brief(hs_body)
+                if cert:
+                    return cert
+                return "TLS Certificate"
+
+            return None
         except Exception:
-            return ""
+            return None
 
-    def _parse_packet(self, pkt):
-        """Разобрать scapy-пакет в единый словарь `packet_info`, используемый UI/фильтрами.
+    def _parse_tls_alert(self, body: bytes, rec_ver: int) -> Optional[str]:
+        try:
+            if len(body) < 2:
+                return None
+            lvl = body[0]
+            desc = body[1]
+            return f"TLS Alert {self._tls_alert_level(lvl)} {self._tls_alert_desc(desc)} ({self._tls_ver_name(rec_ver)})"
+        except Exception:
+            return None
 
-            Метод выделяет L2/L3/L4 параметры (MAC/IP/ports), определяет proto (TCP/UDP/DNS/ARP/ICMP...),
-            заполняет служебные поля для фильтрации и анализа (tcp_syn/tcp_ack/tcp_seq и т.п.),
-            а также формирует человекочитаемые строки `info_short` / `info_long` / `info`.
+    def _parse_tls_client_hello(self, b: bytes, rec_ver: int) -> Optional[str]:
+        """ClientHello -> строка "TLS ClientHello ver=... SNI=... ALPN=... JA3=..." (см. _parse_tls_client_hello_fields)."""
+        f = self._parse_tls_client_hello_fields(b)
+        if f is None:
+            return None
+        parts = [f"TLS ClientHello ver={f['tls_version']}"]
+        if f['sni']:
+            parts.append(f"SNI={f['sni']}")
+        if f['alpn']:
+            parts.append(f"ALPN={','.join(f['alpn'])}")
+        if f['ja3']:
+            parts.append(f"JA3={f['ja3']}")
+        return " ".join(parts)
+
+    def _parse_tls_client_hello_fields(self, b: bytes) -> Optional[dict]:
+        """
+        ClientHello (best effort):
+          client_version(2), random(32), session_id, cipher_suites, comp_methods, extensions
+        Из extensions достаём:
+          - SNI (0x0000)
+          - ALPN (0x0010)
+          - supported_versions (0x002b) -> TLS1.3 и т.п.
+          - supported_groups (0x000a), ec_point_formats (0x000b) для JA3
 
-            Args:
-                pkt: Объект scapy packet, полученный в callback sniff(prn=...).
-                     Обычно содержит атрибут `.time`, может иметь `.sniffed_on`.
+        Returns:
+            dict | None: tls_version, sni (str|None), alpn (list[str]), ja3 (md5|None).
+        """
+        try:
+            p = 0
+            if len(b) < 2 + 32 + 1:
+                return None
 
-            Returns:
-                dict: packet_info со стандартным набором ключей, как ожидают:
-                      PacketListBox/FlowListBox/PacketFilter/PacketDetailView/FollowStream.
-            """
+            client_ver = int.from_bytes(b[p:p + 2], "big");
+            p += 2
+            p += 32  # random
 
-        packet_info = {
-            'timestamp': datetime.fromtimestamp(float(pkt.time)),
-            'proto': 'UNKNOWN',
-            'src': '',
-            'dst': '',
-            'src_ip': None,
-            'dst_ip': None,
-            'src_port': None,
-            'dst_port': None,
-            'info': '',
-            'info_short': '',
-            'info_long': '',
-            'size': len(pkt),
-            'raw_packet': pkt,
-            'raw': bytes(pkt),
-            'interface': None,
-            'packet_loss': False,
-            'tcp_flags': '',
-            'tcp_syn': False,
-            'tcp_ack': False,
-            'tcp_fin': False,
-            'tcp_rst': False,
-            'tcp_seq': None,
-            'tcp_acknum': None,
+            sid_len = b[p];
+            p += 1
+            p += sid_len
+            if p >= len(b):
+                return None
 
-        }
+            cs_len = int.from_bytes(b[p:p + 2], "big");
+            p += 2
+            cs_end = p + cs_len
+            if cs_end > len(b):
+                return None
+            cipher_suites = b[p:cs_end]
+            p = cs_end
 
-        # Получаем интерфейс и ВСЕГДА преобразуем в строку
-        if hasattr(pkt, 'sniffed_on'):
-            iface = pkt.sniffed_on
-            # Преобразуем в строку независимо от типа
-            packet_info['interface'] = str(iface) if iface else str(self.interface)
-        else:
-            packet_info['interface'] = str(self.interface)
+            if p + 1 > len(b):
+                return None
+            cm_len = b[p];
+            p += 1
+            p += cm_len
+            if p > len(b):
+                return None
 
-        # Дополнительная проверка
-        if packet_info['interface'] and not isinstance(packet_info['interface'], str):
-            packet_info['interface'] = str(packet_info['interface'])
+            if p + 2 > len(b):
+                # no extensions
+                return {'tls_version': self._tls_ver_name(client_ver), 'sni': None, 'alpn': [],
+                        'ja3': self._build_ja3(client_ver, cipher_suites, [], [], [])}
 
-        # Ethernet layer
-        if pkt.haslayer(Ether):
-            packet_info['src'] = pkt[Ether].src
-            packet_info['dst'] = pkt[Ether].dst
+            ext_len = int.from_bytes(b[p:p + 2], "big");
+            p += 2
+            ext_end = min(len(b), p + ext_len)
 
-        # ARP
-        if pkt.haslayer(ARP):
-            packet_info['proto'] = 'ARP'
-            packet_info['src_ip'] = pkt[ARP].psrc
-            packet_info['dst_ip'] = pkt[ARP].pdst
-            packet_info['info'] = f"Who has {pkt[ARP].pdst}? Tell {pkt[ARP].psrc}"
+            sni = None
+            alpns = []
+            supported_versions = None
+
+            # JA3 pieces
+            ja3_exts = []
+            ja3_groups = []
+            ja3_ecpf = []
+
+            while p + 4 <= ext_end:
+                etype = int.from_bytes(b[p:p + 2], "big");
+                p += 2
+                elen = int.from_bytes(b[p:p + 2], "big");
+                p += 2
+                ebody = b[p:p + elen]
+                p += elen
+                if len(ebody) != elen:
+                    break
+
+                ja3_exts.append(str(etype))
+
+                # SNI
+                if etype == 0x0000:
+                    # list_len(2), then entries
+                    if len(ebody) < 2:
+                        continue
+                    q = 2
+                    while q + 3 <= len(ebody):
+                        name_type = ebody[q];
+                        q += 1
+                        name_len = int.from_bytes(ebody[q:q + 2], "big");
+                        q += 2
+                        if q + name_len > len(ebody):
+                            break
+                        if name_type == 0:
+                            sni = ebody[q:q + name_len].decode("utf-8", errors="replace").strip()
+                            break
+                        q += name_len
+
+                # ALPN
+                elif etype == 0x0010:
+                    # alpn_ext: list_len(2), then (name_len(1), name)
+                    if len(ebody) < 2:
+                        continue
+                    q = 2
+                    while q + 1 <= len(ebody):
+                        ln = ebody[q];
+                        q += 1
+                        if q + ln > len(ebody):
+                            break
+                        proto = ebody[q:q + ln].decode("ascii", errors="replace")
+                        q += ln
+                        if proto:
+                            alpns.append(proto)
+
+                # supported_versions
+                elif etype == 0x002b:
+                    # client: len(1) then versions(2 each)
+                    if len(ebody) < 1:
+                        continue
+                    ln = ebody[0]
+                    q = 1
+                    vers = []
+                    while q + 2 <= len(ebody) and (q - 1) < ln:
+                        vv = int.from_bytes(ebody[q:q + 2], "big")
+                        vers.append(self._tls_ver_name(vv))
+                        q += 2
+                    if vers:
+                        supported_versions = vers[0]  # обычно самое новое
+
+                # supported_groups (elliptic curves)
+                elif etype == 0x000a:
+                    if len(ebody) < 2:
+                        continue
+                    glen = int.from_bytes(ebody[0:2], "big")
+                    q = 2
+                    while q + 2 <= len(ebody) and (q - 2) < glen:
+                        gid = int.from_bytes(ebody[q:q + 2], "big")
+                        ja3_groups.append(str(gid))
+                        q += 2
+
+                # ec_point_formats
+                elif etype == 0x000b:
+                    if len(ebody) < 1:
+                        continue
+                    flen = ebody[0]
+                    q = 1
+                    for i in range(min(flen, len(ebody) - 1)):
+                        ja3_ecpf.append(str(ebody[q + i]))
+
+            # Версия: для TLS1.3 обычно client_ver=0x0303, реальная в supported_versions
+            ver_name = supported_versions or self._tls_ver_name(client_ver)
+
+            return {
+                'tls_version': ver_name,
+                'sni': sni or None,
+                'alpn': alpns,
+                'ja3': self._build_ja3(client_ver, cipher_suites, ja3_exts, ja3_groups, ja3_ecpf),
+            }
+        except Exception:
+            return None
+
+    def _parse_tls_server_hello(self, b: bytes, rec_ver: int) -> Optional[str]:
+        """ServerHello -> строка "TLS ServerHello ver=... cipher=0x..." (см. _parse_tls_server_hello_fields)."""
+        f = self._parse_tls_server_hello_fields(b)
+        if f is None:
+            return None
+        return f"TLS ServerHello ver={f['tls_version']} cipher=0x{f['tls_cipher']:04x}"
+
+    def _parse_tls_server_hello_fields(self, b: bytes) -> Optional[dict]:
+        """
+        ServerHello (best effort):
+          server_version(2), random(32), session_id, cipher_suite(2), comp(1), extensions
+        Из extensions:
+          - supported_versions (0x002b) -> TLS1.3 реально
+
+        Returns:
+            dict | None: tls_version, tls_cipher (int).
+        """
+        try:
+            p = 0
+            if len(b) < 2 + 32 + 1:
+                return None
+
+            srv_ver = int.from_bytes(b[p:p + 2], "big");
+            p += 2
+            p += 32
+
+            sid_len = b[p];
+            p += 1
+            p += sid_len
+            if p + 2 + 1 > len(b):
+                return None
+
+            cipher = int.from_bytes(b[p:p + 2], "big");
+            p += 2
+            _comp = b[p];
+            p += 1
+
+            tls13_ver = None
+            if p + 2 <= len(b):
+                ext_len = int.from_bytes(b[p:p + 2], "big");
+                p += 2
+                ext_end = min(len(b), p + ext_len)
+                while p + 4 <= ext_end:
+                    etype = int.from_bytes(b[p:p + 2], "big");
+                    p += 2
+                    elen = int.from_bytes(b[p:p + 2], "big");
+                    p += 2
+                    ebody = b[p:p + elen];
+                    p += elen
+                    if etype == 0x002b and len(ebody) >= 2:
+                        vv = int.from_bytes(ebody[0:2], "big")
+                        tls13_ver = self._tls_ver_name(vv)
+
+            return {'tls_version': tls13_ver or self._tls_ver_name(srv_ver), 'tls_cipher': cipher}
+        except Exception:
+            return None
+
+    def _parse_tls_certificate_brief(self, b: bytes) -> Optional[str]:
+        """Certificate -> строка "TLS Certificate CN=... SAN=..." (см. _parse_tls_certificate_fields)."""
+        f = self._parse_tls_certificate_fields(b)
+        if f is None:
+            return None
+        parts = ["TLS Certificate"]
+        if f['cert_cn']:
+            parts.append(f"CN={f['cert_cn']}")
+        if f['cert_san']:
+            parts.append("SAN=" + ",".join(f['cert_san']))
+        return " ".join(parts)
+
+    def _parse_tls_certificate_fields(self, b: bytes) -> Optional[dict]:
+        """
+        Попытка вытащить subject/CN/SAN первого (серверного) сертификата.
+        Реально работает нормально в TLS1.2 и ниже (в TLS1.3 cert обычно в шифрованных record'ах).
+        Используем cryptography если доступна.
+
+        Returns:
+            dict | None: cert_subject, cert_cn, cert_san (list[str]); без cryptography — пустые.
+        """
+        try:
+            # TLS1.2 Certificate:
+            # cert_list_len(3), then repeated: cert_len(3) + cert_der
+            if len(b) < 3:
+                return None
+            total_len = int.from_bytes(b[0:3], "big")
+            p = 3
+            if p + 3 > len(b):
+                return None
+            cert_len = int.from_bytes(b[p:p + 3], "big");
+            p += 3
+            cert_der = b[p:p + cert_len]
+            if len(cert_der) < 16:
+                return None
+
+            if x509 is None or default_backend is None:
+                return {'cert_subject': '', 'cert_cn': '', 'cert_san': []}
+
+            cert = x509.load_der_x509_certificate(cert_der, default_backend())
+
+            try:
+                subject = cert.subject.rfc4514_string()
+            except Exception:
+                subject = ""
+
+            # CN
+            cn = ""
+            try:
+                for attr in cert.subject:
+                    if attr.oid.dotted_string == "2.5.4.3":  # CN
+                        cn = str(attr.value)
+                        break
+            except Exception:
+                cn = ""
+
+            # SAN (DNS)
+            san_dns = []
+            try:
+                ext = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+                san_dns = ext.value.get_values_for_type(x509.DNSName)[:3]
+            except Exception:
+                san_dns = []
+
+            return {'cert_subject': subject, 'cert_cn': cn, 'cert_san': list(san_dns)}
+        except Exception:
+            return None
+
+    def _build_ja3(self, client_ver: int, cipher_suites_bytes: bytes, exts: list[str], groups: list[str],
+                   ecpf: list[str]) -> Optional[str]:
+        """
+        JA3: <version>,<ciphers>,<extensions>,<elliptic_curves>,<ec_point_formats>
+        Реализация best-effort; если что-то не удалось — вернёт None.
+        """
+        try:
+            # ciphers: 2 bytes each
+            ciphers = []
+            for i in range(0, len(cipher_suites_bytes), 2):
+                if i + 2 > len(cipher_suites_bytes):
+                    break
+                cid = int.from_bytes(cipher_suites_bytes[i:i + 2], "big")
+                # игнорируем GREASE (0x?A?A)
+                if (cid & 0x0f0f) == 0x0a0a:
+                    continue
+                ciphers.append(str(cid))
+
+            # extensions: тоже фильтруем GREASE
+            exts2 = []
+            for e in exts:
+                try:
+                    ei = int(e)
+                except Exception:
+                    continue
+                if (ei & 0x0f0f) == 0x0a0a:
+                    continue
+                exts2.append(str(ei))
+
+            # groups/ecpf тоже фильтруем GREASE для groups
+            groups2 = []
+            for g in groups:
+                try:
+                    gi = int(g)
+                except Exception:
+                    continue
+                if (gi & 0x0f0f) == 0x0a0a:
+                    continue
+                groups2.append(str(gi))
+
+            ja3_str = f"{client_ver},{'-'.join(ciphers)},{'-'.join(exts2)},{'-'.join(groups2)},{'-'.join(ecpf)}"
+            md5 = hashlib.md5(ja3_str.encode("ascii", errors="ignore")).hexdigest()
+            return md5
+        except Exception:
+            return None
+
+    def _try_parse_tls_sni(self, pkt) -> str | None:
+        """
+        TLS ClientHello SNI (очень лёгкий парсер по байтам).
+        Ищем TLS record(0x16) -> Handshake(ClientHello=0x01) -> extensions -> server_name(0x0000).
+        """
+        try:
+            data = self._get_tcp_payload_bytes(pkt)
+            if not data:
+                return None
+
+            if len(data) < 6:
+                return None
+
+            # TLS record header: type(1)=0x16, version(2), length(2)
+            if data[0] != 0x16:
+                return None
+
+            # record length
+            rec_len = int.from_bytes(data[3:5], "big")
+            if rec_len <= 0 or 5 + rec_len > len(data):
+                # иногда пакет урезан/фрагментирован
+                rec_end = min(len(data), 5 + rec_len)
+            else:
+                rec_end = 5 + rec_len
+
+            # handshake header starts at 5
+            if len(data) < 9:
+                return None
+            hs_type = data[5]
+            if hs_type != 0x01:  # ClientHello
+                return None
+            hs_len = int.from_bytes(data[6:9], "big")
+            hs_end = 9 + hs_len
+            hs_end = min(hs_end, rec_end)
+
+            p = 9
+            # client_version(2)
+            if p + 2 > hs_end: return None
+            p += 2
+            # random(32)
+            if p + 32 > hs_end: return None
+            p += 32
+            # session_id
+            if p + 1 > hs_end: return None
+            sid_len = data[p]
+            p += 1 + sid_len
+            if p > hs_end: return None
+            # cipher_suites
+            if p + 2 > hs_end: return None
+            cs_len = int.from_bytes(data[p:p + 2], "big")
+            p += 2 + cs_len
+            if p > hs_end: return None
+            # compression_methods
+            if p + 1 > hs_end: return None
+            cm_len = data[p]
+            p += 1 + cm_len
+            if p > hs_end: return None
+            # extensions length
+            if p + 2 > hs_end:
+                return None
+            ext_len = int.from_bytes(data[p:p + 2], "big")
+            p += 2
+            ext_end = min(p + ext_len, hs_end)
+
+            # parse extensions
+            while p + 4 <= ext_end:
+                etype = int.from_bytes(data[p:p + 2], "big");
+                p += 2
+                elen = int.from_bytes(data[p:p + 2], "big");
+                p += 2
+                if p + elen > ext_end:
+                    break
+
+                if etype == 0x0000:  # server_name
+                    # ServerNameList length(2)
+                    if elen < 2:
+                        break
+                    q = p
+                    list_len = int.from_bytes(data[q:q + 2], "big")
+                    q += 2
+                    list_end = min(p + elen, q + list_len)
+                    # entries: name_type(1)=0, name_len(2), name(bytes)
+                    while q + 3 <= list_end:
+                        name_type = data[q];
+                        q += 1
+                        name_len = int.from_bytes(data[q:q + 2], "big");
+                        q += 2
+                        if q + name_len > list_end:
+                            break
+                        if name_type == 0:
+                            sni = data[q:q + name_len].decode("utf-8", errors="replace")
+                            sni = sni.strip()
+                            if sni:
+                                return f"TLS SNI {sni}"
+                        q += name_len
+
+                p += elen
+
+            return None
+        except Exception:
+            return None
+
+    def _dns_answers_summary(self, dns_layer) -> str:
+        """
+        Вернёт краткий список ответов DNS (A/AAAA/CNAME/NS/MX/TXT...) как строку.
+        """
+        try:
+            if dns_layer is None:
+                return ""
+            if getattr(dns_layer, "ancount", 0) == 0:
+                return ""
+
+            answers = []
+            an = dns_layer.an
+            # scapy: DNSRR / chain (an.payload -> next)
+            for _ in range(int(dns_layer.ancount)):
+                if an is None:
+                    break
+                try:
+                    rtype = int(getattr(an, "type", 0))
+                    rdata = getattr(an, "rdata", None)
+                    rrname = getattr(an, "rrname", b"")
+                    rrname_s = rrname.decode(errors="ignore") if isinstance(rrname, (bytes, bytearray)) else str(rrname)
+
+                    # Превращаем rdata в норм строку
+                    if isinstance(rdata, (bytes, bytearray)):
+                        rdata_s = rdata.decode(errors="ignore")
+                    else:
+                        rdata_s = str(rdata)
+
+                    # типы (минимально)
+                    # 1=A, 28=AAAA, 5=CNAME, 2=NS, 15=MX, 16=TXT
+                    type_name = {
+                        1: "A", 28: "AAAA", 5: "CNAME", 2: "NS", 15: "MX", 16: "TXT"
+                    }.get(rtype, f"T{rtype}")
+
+                    answers.append(f"{type_name}:{rdata_s}")
+                except Exception:
+                    pass
+
+                # следующий RR
+                an = getattr(an, "payload", None)
+                if an is None or an.__class__.__name__ == "NoPayload":
+                    break
+
+            if not answers:
+                return ""
+            # ограничим длину
+            s = ", ".join(answers[:6])
+            if len(answers) > 6:
+                s += ", ..."
+            return s
+        except Exception:
+            return ""
+
+    def _parse_packet(self, pkt):
+        """Разобрать scapy-пакет в единый словарь `packet_info`, используемый UI/фильтрами.
+
+            Метод выделяет L2/L3/L4 параметры (MAC/IP/ports), определяет proto (TCP/UDP/DNS/ARP/ICMP...),
+            заполняет служебные поля для фильтрации и анализа (tcp_syn/tcp_ack/tcp_seq и т.п.),
+            а также формирует человекочитаемые строки `info_short` / `info_long` / `info`.
+
+            Args:
+                pkt: Объект scapy packet, полученный в callback sniff(prn=...).
+                     Обычно содержит атрибут `.time`, может иметь `.sniffed_on`.
+
+            Returns:
+                dict: packet_info со стандартным набором ключей, как ожидают:
+                      PacketListBox/FlowListBox/PacketFilter/PacketDetailView/FollowStream.
+            """
+
+        packet_info = {
+            'timestamp': datetime.fromtimestamp(float(pkt.time)),
+            'proto': 'UNKNOWN',
+            'src': '',
+            'dst': '',
+            'src_ip': None,
+            'dst_ip': None,
+            'src_port': None,
+            'dst_port': None,
+            'info': '',
+            'info_short': '',
+            'info_long': '',
+            'size': len(pkt),
+            'raw_packet': pkt,
+            'raw': bytes(pkt),
+            'interface': None,
+            'packet_loss': False,
+            'tcp_flags': '',
+            'tcp_flags_raw': 0,
+            'tcp_syn': False,
+            'tcp_ack': False,
+            'tcp_fin': False,
+            'tcp_rst': False,
+            'tcp_seq': None,
+            'tcp_acknum': None,
+
+        }
+
+        # Получаем интерфейс и ВСЕГДА преобразуем в строку
+        if hasattr(pkt, 'sniffed_on'):
+            iface = pkt.sniffed_on
+            # Преобразуем в строку независимо от типа
+            packet_info['interface'] = str(iface) if iface else str(self.interface)
+        else:
+            packet_info['interface'] = str(self.interface)
+
+        # Дополнительная проверка
+        if packet_info['interface'] and not isinstance(packet_info['interface'], str):
+            packet_info['interface'] = str(packet_info['interface'])
+
+        # Ethernet layer
+        if pkt.haslayer(Ether):
+            packet_info['src'] = pkt[Ether].src
+            packet_info['dst'] = pkt[Ether].dst
+
+        # ARP
+        if pkt.haslayer(ARP):
+            packet_info['proto'] = 'ARP'
+            packet_info['src_ip'] = pkt[ARP].psrc
+            packet_info['dst_ip'] = pkt[ARP].pdst
+            packet_info['info'] = f"Who has {pkt[ARP].pdst}? Tell {pkt[ARP].psrc}"
+
+        # IPv4
+        elif pkt.haslayer(IP):
+            packet_info['src_ip'] = pkt[IP].src
+            packet_info['dst_ip'] = pkt[IP].dst
+
+            # TCP
+            if pkt.haslayer(TCP):
+                packet_info['proto'] = 'TCP'
+                packet_info['src_port'] = pkt[TCP].sport
+                packet_info['dst_port'] = pkt[TCP].dport
+
+                packet_info['tcp_seq'] = int(pkt[TCP].seq)
+                packet_info['tcp_acknum'] = int(pkt[TCP].ack)
+
+                flags = pkt[TCP].flags
+                flag_str = self._get_tcp_flags(flags)
+                packet_info['tcp_flags_raw'] = int(flags)
+
+                # --- tcp flags для точной фильтрации ---
+                # Scapy flags — это битовая маска
+                packet_info['tcp_syn'] = bool(flags & 0x02)
+                packet_info['tcp_ack'] = bool(flags & 0x10)
+                packet_info['tcp_fin'] = bool(flags & 0x01)
+                packet_info['tcp_rst'] = bool(flags & 0x04)
+
+                # строковое представление (опционально, но удобно)
+                parts = []
+                if packet_info['tcp_syn']: parts.append("SYN")
+                if packet_info['tcp_ack']: parts.append("ACK")
+                if packet_info['tcp_fin']: parts.append("FIN")
+                if packet_info['tcp_rst']: parts.append("RST")
+                packet_info['tcp_flags'] = ",".join(parts)
+
+                info_short = f"Len={len(pkt[TCP]):>5}"
+                info_long = self._build_tcp_info_summary(pkt, flag_str)
+
+                http = self._try_parse_http_summary(pkt)
+                if http:
+                    info_short = info_short + " | " + http
+                    info_long = info_long + " | " + http
+                else:
+                    tls = self._try_parse_tls_summary_buffered(pkt, packet_info)
+                    if tls:
+                        info_short = info_short + " | " + tls
+                        info_long = info_long + " | " + tls
+
+                packet_info['info_short'] = info_short
+                packet_info['info_long'] = info_long
+
+                # по умолчанию показываем short (UI сможет переключать)
+                packet_info['info'] = info_short
+
+            # UDP
+            elif pkt.haslayer(UDP):
+                packet_info['proto'] = 'UDP'
+                packet_info['src_port'] = pkt[UDP].sport
+                packet_info['dst_port'] = pkt[UDP].dport
+
+                # DNS
+                if pkt.haslayer(DNS):
+                    packet_info['proto'] = 'DNS'
+                    try:
+                        dns_query = pkt[DNS].qd.qname.decode() if pkt[DNS].qd else ''
+                    except:
+                        dns_query = ''
+
+                    ans = self._dns_answers_summary(pkt[DNS]) if pkt.haslayer(DNS) else ""
+                    if ans:
+                        packet_info['info'] = f"DNS {dns_query} | Ans: {ans}"
+                    else:
+                        packet_info['info'] = f"DNS {dns_query}"
+
+                else:
+                    # packet_info['info'] = f"{pkt[UDP].sport} → {pkt[UDP].dport} Len={len(pkt[UDP])}"
+                    packet_info['info'] = f"Len={len(pkt[UDP])}"
+
+            # ICMP
+            elif pkt.haslayer(ICMP):
+                packet_info['proto'] = 'ICMP'
+                packet_info['info'] = f"Type {pkt[ICMP].type} Code {pkt[ICMP].code}"
+
+        # IPv6
+        elif pkt.haslayer(IPv6):
+            packet_info['src_ip'] = pkt[IPv6].src
+            packet_info['dst_ip'] = pkt[IPv6].dst
+
+            # TCP over IPv6
+            if pkt.haslayer(TCP):
+                packet_info['proto'] = 'TCPv6'
+                packet_info['src_port'] = pkt[TCP].sport
+                packet_info['dst_port'] = pkt[TCP].dport
+
+                packet_info['tcp_seq'] = int(pkt[TCP].seq)
+                packet_info['tcp_acknum'] = int(pkt[TCP].ack)
+
+                flags = pkt[TCP].flags
+                flag_str = self._get_tcp_flags(flags)
+                packet_info['tcp_flags_raw'] = int(flags)
+
+                # --- tcp flags для точной фильтрации ---
+                packet_info['tcp_syn'] = bool(flags & 0x02)
+                packet_info['tcp_ack'] = bool(flags & 0x10)
+                packet_info['tcp_fin'] = bool(flags & 0x01)
+                packet_info['tcp_rst'] = bool(flags & 0x04)
+
+                parts = []
+                if packet_info['tcp_syn']: parts.append("SYN")
+                if packet_info['tcp_ack']: parts.append("ACK")
+                if packet_info['tcp_fin']: parts.append("FIN")
+                if packet_info['tcp_rst']: parts.append("RST")
+                packet_info['tcp_flags'] = ",".join(parts)
+
+                info_short = f"Len={len(pkt[TCP]):>5}"
+                info_long = self._build_tcp_info_summary(pkt, flag_str)
+
+                http = self._try_parse_http_summary(pkt)
+                if http:
+                    info_short = info_short + " | " + http
+                    info_long = info_long + " | " + http
+                else:
+                    tls = self._try_parse_tls_summary_buffered(pkt, packet_info)
+                    if tls:
+                        info_short = info_short + " | " + tls
+                        info_long = info_long + " | " + tls
+
+                packet_info['info_short'] = info_short
+                packet_info['info_long'] = info_long
+                packet_info['info'] = info_short
+
+            # UDP over IPv6
+            elif pkt.haslayer(UDP):
+                # packet_info['proto'] = 'UDPv6'
+                # packet_info['src_port'] = pkt[UDP].sport
+                # packet_info['dst_port'] = pkt[UDP].dport
+                # packet_info['info'] = f"Len={len(pkt[UDP])}"
+                # # packet_info['info'] = f"{pkt[UDP].sport} → {pkt[UDP].dport}"
+                packet_info['proto'] = 'UDPv6'
+                packet_info['src_port'] = pkt[UDP].sport
+                packet_info['dst_port'] = pkt[UDP].dport
+
+                if pkt.haslayer(DNS):
+                    packet_info['proto'] = 'DNS'
+                    try:
+                        dns_query = pkt[DNS].qd.qname.decode() if pkt[DNS].qd else ''
+                    except:
+                        dns_query = ''
+                    ans = self._dns_answers_summary(pkt[DNS])
+                    if ans:
+                        packet_info['info'] = f"DNS {dns_query} | Ans: {ans}"
+                    else:
+                        packet_info['info'] = f"DNS {dns_query}"
+                else:
+                    packet_info['info'] = f"Len={len(pkt[UDP])}"
+
+
+            # ICMPv6
+            elif pkt.haslayer(ICMPv6EchoRequest) or pkt.haslayer(ICMPv6EchoReply):
+                packet_info['proto'] = 'ICMPv6'
+                packet_info['info'] = 'Echo Request/Reply'
+
+        # Если протокол не определен
+        if packet_info['proto'] == 'UNKNOWN':
+            packet_info['proto'] = 'ETHER'
+            packet_info['info'] = pkt.summary()
+
+        return packet_info
+
+    # ---- быстрый разбор кадров из кольца TPACKET_V3 (без scapy) ----
+
+    _HTTP_PREFIXES = (b"GET ", b"POST ", b"PUT ", b"DELETE ", b"HEAD ", b"OPTIONS ", b"PATCH ",
+                      b"CONNECT ", b"TRACE ", b"HTTP/")
+    _DNS_PORTS = frozenset((53, 5353, 5355))
+    _TCP_OPTION_KINDS = frozenset((0, 1, 2, 3, 4, 5, 8))
+
+    def _parse_raw_frame(self, frame, ts, iface):
+        """Разобрать кадр из кольца в packet_info.
+
+        Заголовки L2-L4 читаются прямо из байтов (_parse_raw_headers). Через scapy
+        (_parse_packet) идут только кадры, которым нужен разбор приложения или которые
+        быстрый путь не покрывает: DNS, начало HTTP, первые байты TCP-потока (буферизованный
+        разбор TLS), фрагменты, прочие протоколы. Остальным scapy-объект строится лениво —
+        при открытии деталей пакета (PacketView.raw_packet).
+
+        Returns:
+            tuple: (packet_info, (seq, payload_len) | None)
+        """
+        if self._ring_ethernet.get(iface, True):
+            try:
+                fast = self._parse_raw_headers(frame, ts, iface)
+            except Exception:
+                fast = None
+            if fast is not None:
+                return fast
+            pkt = Ether(frame)
+        else:
+            # интерфейсы без Ethernet-заголовка (tun и т.п.): кадр начинается с IP
+            version = frame[0] >> 4 if frame else 0
+            pkt = IP(frame) if version == 4 else IPv6(frame) if version == 6 else conf.raw_layer(frame)
+        pkt.time = ts
+        pkt.sniffed_on = iface
+        return self._parse_packet(pkt), self._tcp_seq_len(pkt)
+
+    def _parse_raw_headers(self, frame, ts, iface):
+        """Быстрый путь _parse_raw_frame: те же поля и строки info, что у _parse_packet, или None."""
+        n = len(frame)
+        if n < 14:
+            return None
+        off = 14
+        eth_type = int.from_bytes(frame[12:14], "big")
+        while eth_type in (0x8100, 0x88A8):
+            if n < off + 4:
+                return None
+            eth_type = int.from_bytes(frame[off + 2:off + 4], "big")
+            off += 4
+
+        packet_info = {
+            'timestamp': datetime.fromtimestamp(float(ts)),
+            'proto': 'UNKNOWN',
+            'src': frame[6:12].hex(':'),
+            'dst': frame[0:6].hex(':'),
+            'src_ip': None,
+            'dst_ip': None,
+            'src_port': None,
+            'dst_port': None,
+            'info': '',
+            'info_short': '',
+            'info_long': '',
+            'size': n,
+            'raw_packet': None,
+            'raw': bytes(frame),
+            'interface': str(iface),
+            'packet_loss': False,
+            'tcp_flags': '',
+            'tcp_flags_raw': 0,
+            'tcp_syn': False,
+            'tcp_ack': False,
+            'tcp_fin': False,
+            'tcp_rst': False,
+            'tcp_seq': None,
+            'tcp_acknum': None,
+        }
+
+        # ARP (Ethernet/IPv4)
+        if eth_type == 0x0806:
+            if n < off + 28:
+                return None
+            _, ptype, hlen, plen = struct.unpack_from('!HHBB', frame, off)
+            if ptype != 0x0800 or hlen != 6 or plen != 4:
+                return None
+            psrc = socket.inet_ntoa(frame[off + 14:off + 18])
+            pdst = socket.inet_ntoa(frame[off + 24:off + 28])
+            packet_info['proto'] = 'ARP'
+            packet_info['src_ip'] = psrc
+            packet_info['dst_ip'] = pdst
+            packet_info['info'] = f"Who has {pdst}? Tell {psrc}"
+            return packet_info, None
+
+        if eth_type == 0x0800:
+            if n < off + 20 or frame[off] >> 4 != 4:
+                return None
+            ihl = (frame[off] & 0x0F) * 4
+            # фрагменты scapy не разбирает как TCP/UDP — оставляем их scapy
+            if ihl < 20 or n < off + ihl or int.from_bytes(frame[off + 6:off + 8], "big") & 0x3FFF:
+                return None
+            l4_proto = frame[off + 9]
+            packet_info['src_ip'] = socket.inet_ntoa(frame[off + 12:off + 16])
+            packet_info['dst_ip'] = socket.inet_ntoa(frame[off + 16:off + 20])
+            l4 = off + ihl
+            v6 = False
+        elif eth_type == 0x86DD:
+            if n < off + 40:
+                return None
+            l4_proto = frame[off + 6]
+            # расширенные заголовки и ICMPv6 — через scapy
+            if l4_proto not in (6, 17):
+                return None
+            packet_info['src_ip'] = socket.inet_ntop(socket.AF_INET6, frame[off + 8:off + 24])
+            packet_info['dst_ip'] = socket.inet_ntop(socket.AF_INET6, frame[off + 24:off + 40])
+            l4 = off + 40
+            v6 = True
+        else:
+            return None
+
+        # TCP
+        if l4_proto == 6:
+            if n < l4 + 20:
+                return None
+            doff = (frame[l4 + 12] >> 4) * 4
+            if doff < 20 or n < l4 + doff:
+                return None
+            sport, dport, seq, ack = struct.unpack_from('!HHII', frame, l4)
+            flags = ((frame[l4 + 12] & 0x01) << 8) | frame[l4 + 13]
+            window = int.from_bytes(frame[l4 + 14:l4 + 16], "big")
+            options = self._raw_tcp_options(frame, l4 + 20, l4 + doff)
+            if options is None:
+                return None
+
+            payload_len = n - l4 - doff
+            packet_info['src_port'] = sport
+            packet_info['dst_port'] = dport
+            if payload_len:
+                payload = frame[l4 + doff:l4 + doff + 16]
+                # HTTP и ещё не разобранные TLS-потоки — через scapy (буферизованный разбор)
+                if payload.startswith(self._HTTP_PREFIXES):
+                    return None
+                if self.tls_ch_parsed.get(self._tls_flow_key(packet_info), now=float(ts)) is None:
+                    return None
+
+            packet_info['proto'] = 'TCPv6' if v6 else 'TCP'
+            packet_info['tcp_seq'] = seq
+            packet_info['tcp_acknum'] = ack
+            packet_info['tcp_flags_raw'] = flags
+            packet_info['tcp_syn'] = bool(flags & 0x02)
+            packet_info['tcp_ack'] = bool(flags & 0x10)
+            packet_info['tcp_fin'] = bool(flags & 0x01)
+            packet_info['tcp_rst'] = bool(flags & 0x04)
+
+            parts = []
+            if packet_info['tcp_syn']: parts.append("SYN")
+            if packet_info['tcp_ack']: parts.append("ACK")
+            if packet_info['tcp_fin']: parts.append("FIN")
+            if packet_info['tcp_rst']: parts.append("RST")
+            packet_info['tcp_flags'] = ",".join(parts)
+
+            summary = [f"[{self._get_tcp_flags(flags) or 'NONE'}]", f"Seq={seq}"]
+            if flags & 0x10:
+                summary.append(f"Ack={ack}")
+            summary.append(f"Win={window}")
+            summary.append(f"Len={payload_len}")
+            summary.extend(options[:6])
+
+            info_short = f"Len={n - l4:>5}"
+            packet_info['info_short'] = info_short
+            packet_info['info_long'] = " ".join(summary)
+            packet_info['info'] = info_short
+            return packet_info, (seq, payload_len)
+
+        # UDP
+        if l4_proto == 17:
+            if n < l4 + 8:
+                return None
+            sport, dport = struct.unpack_from('!HH', frame, l4)
+            if sport in self._DNS_PORTS or dport in self._DNS_PORTS:
+                return None
+            packet_info['proto'] = 'UDPv6' if v6 else 'UDP'
+            packet_info['src_port'] = sport
+            packet_info['dst_port'] = dport
+            packet_info['info'] = f"Len={n - l4}"
+            return packet_info, None
+
+        # ICMP
+        if l4_proto == 1:
+            if n < l4 + 4:
+                return None
+            packet_info['proto'] = 'ICMP'
+            packet_info['info'] = f"Type {frame[l4]} Code {frame[l4 + 1]}"
+            return packet_info, None
+
+        return None
+
+    @staticmethod
+    def _raw_tcp_options(frame, start, end):
+        """TCP-опции из байтов в формате _format_tcp_options; None — если нужен scapy."""
+        out = []
+        i = start
+        while i < end:
+            kind = frame[i]
+            if kind == 0:
+                break
+            if kind == 1:
+                i += 1
+                continue
+            if i + 1 >= end:
+                return None
+            length = frame[i + 1]
+            if length < 2 or i + length > end or kind not in PacketCapture._TCP_OPTION_KINDS:
+                return None
+            value = frame[i + 2:i + length]
+            if kind == 2 and length == 4:
+                out.append(f"MSS={int.from_bytes(value, 'big')}")
+            elif kind == 3 and length == 3:
+                out.append(f"WS={value[0]}")
+            elif kind == 4 and length == 2:
+                out.append("SACK_PERM")
+            elif kind == 5 and len(value) % 4 == 0:
+                out.append(f"SAck={struct.unpack('!%dI' % (len(value) // 4), value)}")
+            elif kind == 8 and length == 10:
+                tsval, tsecr = struct.unpack('!II', value)
+                out.append(f"TSval={tsval}")
+                out.append(f"TSecr={tsecr}")
+            else:
+                return None
+            i += length
+        return out
+
+    def _get_tcp_flags(self, flags):
+        """Преобразовать TCP флаги в строку"""
+        flag_list = []
+        if flags & 0x01:
+            flag_list.append('FIN')
+        if flags & 0x02:
+            flag_list.append('SYN')
+        if flags & 0x04:
+            flag_list.append('RST')
+        if flags & 0x08:
+            flag_list.append('PSH')
+        if flags & 0x10:
+            flag_list.append('ACK')
+        if flags & 0x20:
+            flag_list.append('URG')
+
+        return ', '.join(flag_list) if flag_list else 'None'
+
+    def _sniff_thread(self, interface):
+        """Поток для захвата пакетов с одного интерфейса"""
+        self._log(f"Sniff thread started on {interface} (bpf={self.bpf_filter!r})")
+
+        try:
+            sniff_kwargs = dict(
+                iface=interface,
+                prn=self._packet_handler,
+                store=False,
+                stop_filter=lambda x: self.stop_sniffing.is_set()
+            )
+
+            # BPF применяется на уровне libpcap (до попадания пакетов в Python)
+            if self.bpf_filter:
+                sniff_kwargs["filter"] = self.bpf_filter
+
+            sniff(**sniff_kwargs)
+
+        except Exception as e:
+            self._log(f"Error in sniff thread ({interface}): {e}")
+        finally:
+            self._log(f"Sniff thread stopped ({interface})")
+
+    def _ring_thread(self, interface):
+        """Поток захвата из кольца TPACKET_V3 (backend 'tpacket')."""
+        self._log(f"Ring thread started on {interface} (bpf={self.bpf_filter!r}, ring={self.ring_mb} MB)")
+
+        try:
+            with open(f"/sys/class/net/{interface}/type") as f:
+                hatype = int(f.read().strip() or 1)
+        except (OSError, ValueError):
+            hatype = 1
+        # ARPHRD_ETHER / ARPHRD_LOOPBACK — Ethernet-заголовок, прочее (tun, ppp) — сразу IP
+        self._ring_ethernet[interface] = hatype in (1, 772)
+
+        try:
+            ring = TPacketV3Ring(interface, block_count=self.ring_mb // 4, bpf_filter=self.bpf_filter)
+        except Exception as e:
+            self._log(f"Error opening TPACKET_V3 ring on {interface}: {e}")
+            return
+        self.rings.append(ring)
+
+        last_stats = time.time()
+        try:
+            while not self.stop_sniffing.is_set():
+                frames = ring.read_block()
+                if frames:
+                    # latency по последнему кадру блока
+                    self._add_latency_sample(frames[-1][1])
+                    for frame, ts in frames:
+                        self._enqueue((frame, ts, interface), frame)
+                now = time.time()
+                if now - last_stats >= 1.0:
+                    ring.update_stats()
+                    last_stats = now
+        except Exception as e:
+            self._log(f"Error in ring thread ({interface}): {e}")
+        finally:
+            ring.close()
+            self._log(f"Ring thread stopped ({interface}): kernel packets {ring.kernel_packets}, drops {ring.kernel_drops}")
+
+    def start_capture(self):
+        """Запустить захват пакетов на всех интерфейсах"""
+        if self.running:
+            self._log("Already running")
+            return
+
+        self._log(f"Starting capture on interfaces: {self.interfaces}")
+
+        self.start_time = time.time()
+        self.last_bandwidth_check = time.time()
+        self.stop_sniffing.clear()
+        self.running = True
+
+        try:
+            # Сначала поднимаем воркеры разбора, затем sniff-потоки
+            self._start_dissectors()
+            self.rings = []
+            target = self._ring_thread if self.backend == 'tpacket' else self._sniff_thread
+
+            # Запускаем отдельный поток для каждого интерфейса
+            for iface in self.interfaces:
+                thread = threading.Thread(
+                    target=target,
+                    args=(iface,),
+                    daemon=True,
+                    name=f"Sniffer-{iface}"
+                )
+                thread.start()
+                self.capture_threads.append(thread)
+                self._log(f"Started thread for {iface}")
+
+            time.sleep(0.1)
+            self._log(f"Capture started on {len(self.capture_threads)} interfaces")
+
+        except Exception as e:
+            self._log(f"Error starting capture: {e}")
+            self.running = False
+
+    def stop_capture(self):
+        """Остановить захват пакетов на всех интерфейсах"""
+        if not self.running:
+            self._log("Not running")
+            return
+
+        self._log("Stopping capture...")
+
+        try:
+            # Сигнализируем всем потокам об остановке
+            self.stop_sniffing.set()
+            self.running = False
+
+            # Ждем завершения всех потоков
+            for thread in self.capture_threads:
+                if thread.is_alive():
+                    thread.join(timeout=2.0)
+
+            self.capture_threads.clear()
+
+            # Воркеры дорабатывают очередь до sentinel
+            self._stop_dissectors()
+            self._log("Capture stopped")
+
+        except Exception as e:
+            self._log(f"Error stopping capture: {e}")
+
+    def _start_dissectors(self):
+        """Создать очереди и запустить потоки разбора."""
+        per_queue = max(1, self.queue_size // self.dissector_workers)
+        self.dissect_queues = [queue.Queue(maxsize=per_queue) for _ in range(self.dissector_workers)]
+        self.dissect_threads = []
+        for i, q in enumerate(self.dissect_queues):
+            thread = threading.Thread(
+                target=self._dissector_thread,
+                args=(q,),
+                daemon=True,
+                name=f"Dissector-{i}"
+            )
+            thread.start()
+            self.dissect_threads.append(thread)
+        self._log(f"Started {self.dissector_workers} dissector thread(s), queue {per_queue} per thread")
+
+    def _stop_dissectors(self, timeout=2.0):
+        """Отправить sentinel во все очереди и дождаться, пока воркеры разберут backlog."""
+        queues = self.dissect_queues
+        self.dissect_queues = []
+        for q in queues:
+            q.put(None)
+        deadline = time.time() + timeout
+        for thread in self.dissect_threads:
+            thread.join(timeout=max(0.0, deadline - time.time()))
+        self.dissect_threads = []
+
+    def get_queue_stats(self):
+        """Счётчики очереди захват -> разбор (без захвата основного lock).
+
+        Returns:
+            dict: queue_depth, queue_capacity, queue_dropped, dissect_backlog, dissector_workers
+            (+ kernel_packets, kernel_drops для backend 'tpacket').
+        """
+        queues = self.dissect_queues
+        with self.queue_stats_lock:
+            enqueued = self.queue_enqueued
+            dropped = self.queue_dropped
+            dissected = self.queue_dissected
+        stats = {
+            'queue_depth': sum(q.qsize() for q in queues),
+            'queue_capacity': sum(q.maxsize for q in queues),
+            'queue_dropped': dropped,
+            # принято в очередь, но ещё не записано в буфер (включая пакет "в работе")
+            'dissect_backlog': max(0, enqueued - dissected),
+            'dissector_workers': self.dissector_workers,
+        }
+        if self.backend == 'tpacket':
+            rings = list(self.rings)
+            stats['kernel_packets'] = sum(r.kernel_packets for r in rings)
+            stats['kernel_drops'] = sum(r.kernel_drops for r in rings)
+        return stats
+
+    def get_packets(self):
+        """Получить список захваченных пакетов (thread-safe).
+
+        Returns:
+            list[PacketView]: dict-подобные представления пакетов из кольцевого буфера.
+        """
+        with self.lock:
+            return self.packets.views()
+
+    def add_parsed_packet(self, packet_info):
+        """Записать уже разобранный packet_info в буфер (offline-режим, thread-safe)."""
+        self.add_parsed_packets((packet_info,))
+
+    def add_parsed_packets(self, packet_infos):
+        """Записать пачку разобранных packet_info одним захватом lock (offline-режим).
+
+        Номера пакетов (num) задаёт вызывающий и они должны возрастать.
+        """
+        with self.lock:
+            for packet_info in packet_infos:
+                self.packets.append(packet_info)
+                self.stats.add(packet_info)
+                self.flows.add(packet_info)
+                for listener in self.packet_listeners:
+                    try:
+                        listener(packet_info)
+                    except Exception:
+                        pass
+                self.packet_counter = max(self.packet_counter, packet_info['num'])
+                self.total_bytes += packet_info.get('size', 0)
+                if packet_info.get('packet_loss'):
+                    self.packet_loss_count += 1
+
+    def _on_packet_evicted(self, store, slot, num):
+        """Пакет вытесняется из кольцевого буфера — вычитаем его из статистики и индекса потоков."""
+        view = PacketView(store, slot, num)
+        self.stats.remove(view)
+        self.flows.remove(view)
+
+    def follow_tcp_stream(self, ip1, port1, ip2, port2):
+        """Follow Stream по индексу потоков (thread-safe).
+
+        Клиент определяется по первому SYN без ACK; если его нет — ip1:port1 считается клиентом.
+        Если включён спул, начало потока, уже вытесненное из буфера, читается с диска.
+
+        Returns:
+            tuple: ((client_ip, client_port, server_ip, server_port),
+                    blocks_c2s, blocks_s2c, c2s_raw, s2c_raw)
+        """
+        older = []
+        if self.spool is not None:
+            key = FlowTable.flow_key('TCP', ip1, port1, ip2, port2)
+            with self.lock:
+                before = self.packets.oldest_num if len(self.packets) else self.packet_counter + 1
+            older = self.spool_flow_packets(key, before)
+
+        with self.lock:
+            if not older:
+                endpoints = self.flows.guess_client_server(ip1, port1, ip2, port2)
+                if not endpoints:
+                    endpoints = (ip1, int(port1), ip2, int(port2))
+                return (endpoints,) + self.flows.follow(*endpoints)
+
+            # начало потока в спуле: собираем временный индекс из спула + буфера
+            recent = []
+            for num in self.flows.packet_nums(key):
+                view = self.packets.view_for_num(num)
+                if view is not None and num > older[-1]['num']:
+                    recent.append({k: view[k] for k in self._FLOW_FIELDS})
+
+        infos = older + recent
+        store = PacketStore(len(infos), arena_bytes=sum(len(i.get('raw') or b"") for i in infos) + 64)
+        table = FlowTable(store)
+        for info in infos:
+            store.append(info)
+            table.add(info)
+        endpoints = table.guess_client_server(ip1, port1, ip2, port2)
+        if not endpoints:
+            endpoints = (ip1, int(port1), ip2, int(port2))
+        return (endpoints,) + table.follow(*endpoints)
+
+    # поля пакета, которые нужны FlowTable
+    _FLOW_FIELDS = ('num', 'timestamp', 'size', 'proto', 'src_ip', 'dst_ip', 'src_port', 'dst_port',
+                    'tcp_syn', 'tcp_ack', 'raw')
+
+    # ---- спул на диск (CaptureSpool) ----
+
+    def _spool_append(self, packet_info):
+        """Записать пакет в спул (под self.lock); ошибки диска не останавливают захват."""
+        try:
+            self.spool.append(packet_info)
+        except Exception as e:
+            self.spool_errors += 1
+            if self.spool_errors == 1 or self.spool_errors % 10000 == 0:
+                self._log(f"Spool write failed ({self.spool_errors}): {e}")
+
+    def _spool_decode(self, records):
+        """Разобрать записи спула в packet_info отдельным парсером (не трогает состояние захвата)."""
+        if self._spool_parser is None:
+            self._spool_parser = PacketCapture(interface='offline', packet_limit=1, log_file=None, arena_bytes=4096)
+        return _offline_decode_records(self._spool_parser, records)
+
+    def _spool_page(self, page_id):
+        """Страница спула (PacketStore с разобранными пакетами) из LRU или с диска."""
+        spool = self.spool
+        with self._spool_lock:
+            if self._spool_pages_gen != spool.generation:
+                self._spool_pages.clear()
+                self._spool_pages_gen = spool.generation
+            page = self._spool_pages.get(page_id)
+            if page is not None:
+                self._spool_pages.move_to_end(page_id)
+                return page
+
+            size = self.spool_page_size
+            infos = self._spool_decode(spool.read_range(page_id * size + 1, (page_id + 1) * size))
+            page = PacketStore(max(1, len(infos)), arena_bytes=sum(len(i['raw']) for i in infos) + 64)
+            for info in infos:
+                page.append(info)
+            self._spool_pages[page_id] = page
+            while len(self._spool_pages) > self.spool_max_pages:
+                self._spool_pages.popitem(last=False)
+            return page
+
+    def spool_view(self, num):
+        """PacketView пакета из спула (для номеров, уже вытесненных из буфера) или None."""
+        if self.spool is None or num <= 0:
+            return None
+        page = self._spool_page((num - 1) // self.spool_page_size)
+        return page.view_for_num(num)
+
+    def spool_views(self, lo, hi):
+        """PacketView пакетов спула с номерами lo..hi (по возрастанию)."""
+        if self.spool is None or hi < lo:
+            return []
+        size = self.spool_page_size
+        out = []
+        for page_id in range((max(1, lo) - 1) // size, (hi - 1) // size + 1):
+            page = self._spool_page(page_id)
+            out.extend(v for v in page.views() if lo <= v.num <= hi)
+        return out
+
+    def view_for_num(self, num):
+        """PacketView по номеру: из кольцевого буфера, иначе из спула (thread-safe)."""
+        with self.lock:
+            view = self.packets.view_for_num(num)
+            oldest = self.packets.oldest_num if len(self.packets) else self.packet_counter + 1
+        if view is None and num < oldest:
+            view = self.spool_view(num)
+        return view
+
+    def spool_flow_packets(self, key, before_num, limit=50000):
+        """packet_info пакетов потока key из спула с номерами < before_num."""
+        if self.spool is None:
+            return []
+        try:
+            records = self.spool.flow_records(key, before_num, limit)
+            with self._spool_lock:
+                return self._spool_decode(records)
+        except Exception as e:
+            self._log(f"Spool flow read failed: {e}")
+            return []
+
+    def get_spool_stats(self):
+        """Сводка спула (None, если спул выключен)."""
+        if self.spool is None:
+            return None
+        stats = self.spool.stats()
+        stats['spool_errors'] = self.spool_errors
+        return stats
+
+    def get_flow_packets(self, flow_key):
+        """PacketView пакетов потока по каноническому ключу (thread-safe)."""
+        with self.lock:
+            views = (self.packets.view_for_num(num) for num in self.flows.packet_nums(flow_key))
+            return [v for v in views if v is not None]
+
+    def get_flow_nums(self, flow_key):
+        """Номера пакетов потока в буфере по каноническому ключу (thread-safe)."""
+        with self.lock:
+            return self.flows.packet_nums(flow_key)
+
+    def get_flow_attrs(self, flow_key):
+        """Атрибуты потока (SNI, ALPN, JA3, cert_subject, ...) по каноническому ключу (thread-safe)."""
+        with self.lock:
+            return dict(self.flows.attrs(flow_key))
+
+    def get_flows_attrs(self, flow_keys):
+        """Снимок атрибутов сразу для многих потоков одним захватом lock: {key: attrs}
+        (потоки без атрибутов не попадают). Для отрисовки списка потоков."""
+        out = {}
+        with self.lock:
+            flows = self.flows
+            for key in flow_keys:
+                attrs = flows.attrs(key)
+                if attrs:
+                    out[key] = dict(attrs)
+        return out
+
+    def get_flow_syn_rtt_ms(self, flow_key):
+        """RTT TCP-рукопожатия (SYN -> SYN+ACK) потока в мс или None (thread-safe)."""
+        with self.lock:
+            return self.flows.syn_rtt_ms(flow_key)
+
+    def clear_packets(self):
+        """Очистить буфер пакетов"""
+        with self.lock:
+            self.packets.clear()
+            self.stats.reset()
+            self.flows.clear()
+            self.packet_counter = 0
+            self.total_bytes = 0
+            self.bytes_last_second = 0
+            self.current_bandwidth = 0
+            self.packet_loss_count = 0
+            self.tcp_sequence_tracker.clear()
+            self.tls_ch_buffers.clear()
+            self.tls_ch_parsed.clear()
+            self.dissection_cache.clear()
+            self.latency_samples.clear()
+            with self.queue_stats_lock:
+                self.queue_dropped = 0
+            # номера пакетов начнутся заново — старый спул с ними не сочетается
+            if self.spool is not None:
+                self.spool.reset()
+            self._log("Buffer cleared")
+
+    def get_bandwidth(self):
+        """Получить текущую пропускную способность в bytes/sec"""
+        return self.current_bandwidth
+
+    def get_bandwidth_mbps(self):
+        """Получить пропускную способность в Mbps"""
+        return (self.current_bandwidth * 8) / 1_000_000
+
+    def get_average_latency(self):
+        """Получить среднюю latency в микросекундах"""
+        if not self.latency_samples:
+            return None
+        return sum(self.latency_samples) / len(self.latency_samples)
+
+    def get_packet_loss_count(self):
+        """Получить количество обнаруженных потерянных пакетов"""
+        return self.packet_loss_count
+
+    def get_statistics(self):
+        """Получить полную статистику захвата"""
+        with self.lock:
+            uptime = time.time() - self.start_time if self.start_time else 0
+
+            return {
+                'total_packets': self.packet_counter,
+                'buffer_size': len(self.packets),
+                'buffer_limit': self.packet_limit,
+                'buffer_memory_bytes': self.packets.memory_usage(),
+                'total_bytes': self.total_bytes,
+                'bandwidth_bps': self.current_bandwidth,
+                'bandwidth_mbps': self.get_bandwidth_mbps(),
+                'uptime_seconds': uptime,
+                'avg_latency_us': self.get_average_latency(),
+                'packet_loss_count': self.packet_loss_count,
+                'active_threads': len([t for t in self.capture_threads if t.is_alive()]),
+                **self.get_queue_stats(),
+                **(self.get_spool_stats() or {}),
+                **self.get_flow_state_stats(),
+            }
+
+
+# --- Offline-загрузка pcap/pcapng ---
+#
+# Файл читается потоково (RawPcapReader: только байты кадра и метаданные, без
+# scapy-разбора), кадры собираются в чанки и раздаются процессам-разборщикам.
+# Каждый процесс держит свой PacketCapture-парсер, а кадры одного потока всегда
+# попадают в один и тот же процесс (raw_flow_hash), поэтому буферизованный разбор
+# TLS ClientHello видит все сегменты своего соединения.
+
+_offline_parser = None
+_worker_context = None
+
+
+def worker_mp_context():
+    """multiprocessing-контекст для пулов процессов (разбор файла, поиск).
+
+    Пулы создаются, когда уже работают потоки захвата/UI/загрузчика, а fork процесса
+    с потоками может унести в дочерний захваченные чужими потоками блокировки.
+    Поэтому воркеры порождаются через forkserver (чистый процесс, где заранее
+    импортирован этот модуль со scapy), а где его нет — через spawn.
+    """
+    global _worker_context
+    if _worker_context is None:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            _worker_context = multiprocessing.get_context('forkserver')
+            _worker_context.set_forkserver_preload(['__main__'])
+        else:
+            _worker_context = multiprocessing.get_context('spawn')
+    return _worker_context
+
+
+def _offline_decoder_init():
+    """Инициализатор процесса-разборщика: свой парсер без буфера и логов."""
+    global _offline_parser
+    _offline_parser = PacketCapture(interface='offline', packet_limit=1, log_file=None, arena_bytes=4096)
+    _offline_parser.dissection_cache.start_journal()
+
+
+def _offline_decode_records(parser, records, detect_loss=False):
+    """Разобрать записи (idx, frame, ts, linktype, ifname) в packet_info.
+
+    scapy-объект из результата убирается: он не нужен буферу и дорого сериализуется
+    между процессами. Вместо него передаётся DLT записи ('linktype'): по нему буфер
+    пересобирает пакет с исходным link-layer, а экспорт/спул пишут верный заголовок.
+
+    detect_loss: искать разрывы TCP seq, как при живом захвате. Верно только для записей
+    в порядке файла, где parser видит все пакеты своих потоков (загрузка файла).
+    """
+    out = []
+    for idx, frame, ts, linktype, ifname in records:
+        try:
+            cls = conf.l2types.num2layer.get(linktype) or conf.raw_layer
+            try:
+                pkt = cls(frame)
+            except Exception:
+                pkt = conf.raw_layer(frame)
+            pkt.time = ts
+            if ifname:
+                pkt.sniffed_on = ifname
+            packet_info = parser._parse_packet(pkt)
+            if detect_loss and packet_info['proto'] in ['TCP', 'TCPv4', 'TCPv6']:
+                tcp_seg = parser._tcp_seq_len(pkt)
+                if tcp_seg is not None:
+                    parser._detect_packet_loss(packet_info, *tcp_seg)
+                if packet_info.get('tcp_fin') or packet_info.get('tcp_rst'):
+                    parser._close_flow_state(packet_info)
+        except Exception:
+            continue
+        packet_info.pop('raw_packet', None)
+        packet_info['linktype'] = linktype
+        packet_info['num'] = idx
+        out.append(packet_info)
+    return out
+
+
+def _offline_decode_chunk(records):
+    """Точка входа процесса-разборщика (см. _offline_decoder_init).
+
+    Returns:
+        tuple: (packet_infos, DissectionCache.drain() разборщика) — разобранные TLS-сообщения
+        переносятся в кэш основного процесса для Follow Stream и статистики.
+    """
+    infos = _offline_decode_records(_offline_parser, records, detect_loss=True)
+    return infos, _offline_parser.dissection_cache.drain()
+
+
+def parse_num_range(text):
+    """Разобрать диапазон вида "A-B", "A-", "-B" или "A" в (start, end); None — без границы."""
+    text = (text or "").strip()
+    if not text:
+        return None, None
+    if "-" not in text:
+        v = float(text)
+        return v, v
+    lo, hi = text.split("-", 1)
+    start = float(lo) if lo.strip() else None
+    end = float(hi) if hi.strip() else None
+    if start is not None and end is not None and end < start:
+        raise ValueError(f"empty range: {text}")
+    return start, end
+
+
+class PcapFileLoader:
+    """Потоковая загрузка pcap/pcapng в PacketCapture в фоновом потоке.
+
+    Поток-читатель идёт по файлу RawPcapReader'ом, отбирает записи по диапазону номеров
+    и окну времени, режет их на чанки и раздаёт процессам-разборщикам (по одному
+    ProcessPoolExecutor на процесс — так сохраняется привязка потока к процессу).
+    Результаты пишутся в буфер строго в порядке файла, поэтому UI стартует сразу
+    и заполняется по мере готовности чанков. Число чанков в работе ограничено,
+    так что память не растёт быстрее, чем идёт разбор.
+    """
+
+    def __init__(self, capture, path, decode_workers=0, chunk_size=2000,
+                 packet_range=None, time_window=None):
+        """
+        Args:
+            capture: PacketCapture, в который пишутся пакеты.
+            path: путь к pcap/pcapng (в т.ч. .gz).
+            decode_workers: число процессов разбора (0 = разбор в потоке-читателе).
+            chunk_size: записей в одном чанке.
+            packet_range: (start, end) номеров пакетов в файле, с 1, включительно.
+            time_window: (start, end) в секундах от первого пакета файла, включительно.
+        """
+        self.capture = capture
+        self.path = path
+        self.decode_workers = max(0, int(decode_workers))
+        self.chunk_size = max(1, int(chunk_size))
+        self.packet_range = packet_range or (None, None)
+        self.time_window = time_window or (None, None)
+
+        self.total_bytes = 0
+        self.bytes_read = 0
+        self.records_read = 0
+        self.packets_loaded = 0
+        self.state = 'idle'  # idle | loading | done | cancelled | error
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._pools = []
+        self._checked_links = set()
+
+    def start(self):
+        """Запустить загрузку в фоновом потоке."""
+        try:
+            self.total_bytes = os.path.getsize(self.path)
+        except OSError:
+            self.total_bytes = 0
+        # Процессы пула стартуют лениво, на первом submit() из потока pcap-loader,
+        # когда уже идут другие потоки — поэтому не fork, а forkserver/spawn
+        self._pools = [
+            ProcessPoolExecutor(max_workers=1, mp_context=worker_mp_context(),
+                                initializer=_offline_decoder_init)
+            for _ in range(self.decode_workers)
+        ]
+        self.state = 'loading'
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="pcap-loader", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Прервать загрузку (уже загруженные пакеты остаются в буфере)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._shutdown_pools()
+
+    def wait(self, timeout=None):
+        """Дождаться окончания загрузки."""
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    @property
+    def finished(self):
+        return self.state in ('done', 'cancelled', 'error')
+
+    def progress(self):
+        """Снимок прогресса для статусной строки."""
+        percent = 100.0 if self.state == 'done' else 0.0
+        if self.state != 'done' and self.total_bytes:
+            # для .gz позиция считается в распакованных байтах — ограничиваем 99%
+            percent = min(99.0, 100.0 * self.bytes_read / self.total_bytes)
+        end = self.finished_at or time.time()
+        return {
+            'state': self.state,
+            'percent': percent,
+            'records_read': self.records_read,
+            'packets_loaded': self.packets_loaded,
+            'bytes_read': self.bytes_read,
+            'total_bytes': self.total_bytes,
+            'elapsed': end - self.started_at if self.started_at else 0.0,
+            'error': self.error,
+        }
+
+    def _shutdown_pools(self):
+        pools, self._pools = self._pools, []
+        for pool in pools:
+            try:
+                pool.shutdown(wait=False, cancel_futures=True)
+            except Exception:
+                pass
+
+    def _iter_records(self):
+        """Записи файла (idx, frame, ts, linktype, ifname) с учётом диапазона и окна времени."""
+        first_idx, last_idx = self.packet_range
+        t_from, t_to = self.time_window
+        t0 = None
+
+        reader = RawPcapReader(self.path)
+        try:
+            # pcap: метаданные (sec, usec, ...), pcapng: (linktype, tsresol, tshigh, tslow, ...)
+            ts_scale = 1e-9 if getattr(reader, 'nano', False) else 1e-6
+            idx = 0
+            for frame, meta in reader:
+                if self._stop.is_set():
+                    break
+                idx += 1
+                self.records_read = idx
+                try:
+                    self.bytes_read = reader.f.tell()
+                except Exception:
+                    pass
+
+                if hasattr(meta, 'tshigh'):
+                    if meta.tshigh is None:
+                        continue
+                    ts = ((meta.tshigh << 32) + meta.tslow) / meta.tsresol
+                    linktype = meta.linktype
+                    ifname = meta.ifname.decode('utf-8', 'backslashreplace') if meta.ifname else None
+                else:
+                    ts = meta.sec + meta.usec * ts_scale
+                    linktype = reader.linktype
+                    ifname = None
+
+                if t0 is None:
+                    t0 = ts
+                if first_idx is not None and idx < first_idx:
+                    continue
+                if last_idx is not None and idx > last_idx:
+                    break
+                rel = ts - t0
+                if t_from is not None and rel < t_from:
+                    continue
+                if t_to is not None and rel > t_to:
+                    # файлы пишутся по времени — дальше читать незачем
+                    break
+                yield idx, frame, ts, linktype, ifname
+        finally:
+            try:
+                reader.close()
+            except Exception:
+                pass
+
+    def _iter_chunks(self):
+        chunk = []
+        for record in self._iter_records():
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _commit(self, packet_infos):
+        if packet_infos and not self._stop.is_set():
+            self.capture.add_parsed_packets(packet_infos)
+            self.packets_loaded += len(packet_infos)
+            self._check_link_roundtrip(packet_infos)
+
+    def _check_link_roundtrip(self, packet_infos):
+        """Первый пакет каждого DLT файла: буфер должен вернуть тот же DLT и те же байты кадра.
+
+        Иначе экспорт/спул запишут кадры под чужим link-layer, а разбор по raw_packet
+        (детали, Follow Stream) пойдёт по неверному заголовку — пишем предупреждение в лог.
+        """
+        for packet_info in packet_infos:
+            linktype = packet_info.get('linktype')
+            if linktype in self._checked_links:
+                continue
+            self._checked_links.add(linktype)
+            capture = self.capture
+            with capture.lock:
+                store = capture.packets
+                slot = store.find_slot(packet_info['num'])
+                if slot is None:
+                    continue
+                stored = store.linktype(slot)
+                try:
+                    same = bytes(store.rebuild_scapy(slot)) == bytes(store.raw_view(slot))
+                except Exception:
+                    same = False
+            if stored != linktype or not same:
+                capture._log(f"Offline load: link-layer round-trip mismatch for DLT {linktype} "
+                             f"(stored DLT {stored}, frame {'ok' if same else 'differs'}) in {self.path}")
 
-        # IPv4
-        elif pkt.haslayer(IP):
-            packet_info['src_ip'] = pkt[IP].src
-            packet_info['dst_ip'] = pkt[IP].dst
+    def _run(self):
+        try:
+            if self._pools:
+                self._run_parallel()
+            else:
+                parser = PacketCapture(interface='offline', packet_limit=1, log_file=None, arena_bytes=4096)
+                parser.dissection_cache.start_journal()
+                for chunk in self._iter_chunks():
+                    infos = _offline_decode_records(parser, chunk, detect_loss=True)
+                    self.capture.dissection_cache.absorb(parser.dissection_cache.drain())
+                    self._commit(infos)
+            self.state = 'cancelled' if self._stop.is_set() else 'done'
+            self.capture._log(f"Offline load {self.state}: {self.packets_loaded} packets from {self.path}")
+        except Exception as e:
+            self.state = 'error'
+            self.error = str(e)
+            self.capture._log(f"Offline load failed ({self.path}): {e}\n{traceback.format_exc()}")
+        finally:
+            self.finished_at = time.time()
+            self._shutdown_pools()
+
+    def _run_parallel(self):
+        n = len(self._pools)
+        pending = deque()  # чанки в работе, в порядке файла: список futures по шардам
+        max_pending = 2 * n
+
+        def drain_one():
+            merged = []
+            for fut in pending.popleft():
+                infos, drained = fut.result()
+                merged.extend(infos)
+                self.capture.dissection_cache.absorb(drained)
+            merged.sort(key=lambda info: info['num'])
+            self._commit(merged)
+
+        for chunk in self._iter_chunks():
+            shards = [[] for _ in range(n)]
+            for record in chunk:
+                shards[raw_flow_hash(record[1], record[3]) % n].append(record)
+            pending.append([
+                self._pools[i].submit(_offline_decode_chunk, shard)
+                for i, shard in enumerate(shards) if shard
+            ])
+            while len(pending) >= max_pending or (pending and all(f.done() for f in pending[0])):
+                drain_one()
+                if self._stop.is_set():
+                    return
 
-            # TCP
-            if pkt.haslayer(TCP):
-                packet_info['proto'] = 'TCP'
-                packet_info['src_port'] = pkt[TCP].sport
-                packet_info['dst_port'] = pkt[TCP].dport
+        while pending and not self._stop.is_set():
+            drain_one()
 
-                packet_info['tcp_seq'] = int(pkt[TCP].seq)
-                packet_info['tcp_acknum'] = int(pkt[TCP].ack)
 
-                flags = pkt[TCP].flags
-                flag_str = self._get_tcp_flags(flags)
+# --- Headless-режим ---
+#
+# Тот же разбор, что и в TUI, но без urwid: агрегаты считаются слушателем
+# PacketCapture.packet_listeners по мере поступления пакетов и отдаются по HTTP
+# в формате OpenMetrics; завершённые потоки пишутся в JSONL. Вся память
+# ограничена: посекундные корзины — размером самого длинного окна, таблица
+# потоков — max_flows (при переполнении экспортируется самый давний поток).
 
-                # --- tcp flags для точной фильтрации ---
-                # Scapy flags — это битовая маска
-                packet_info['tcp_syn'] = bool(flags & 0x02)
-                packet_info['tcp_ack'] = bool(flags & 0x10)
-                packet_info['tcp_fin'] = bool(flags & 0x01)
-                packet_info['tcp_rst'] = bool(flags & 0x04)
+class HeadlessMonitor:
+    """Агрегаты headless-режима: счётчики, скользящие окна и NetFlow-подобные записи потоков."""
 
-                # строковое представление (опционально, но удобно)
-                parts = []
-                if packet_info['tcp_syn']: parts.append("SYN")
-                if packet_info['tcp_ack']: parts.append("ACK")
-                if packet_info['tcp_fin']: parts.append("FIN")
-                if packet_info['tcp_rst']: parts.append("RST")
-                packet_info['tcp_flags'] = ",".join(parts)
+    OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+    LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+    LATENCY_SAMPLES_PER_SECOND = 200   # сколько выборок latency хранится на секунду окна
 
-                info_short = f"Len={len(pkt[TCP]):>5}"
-                info_long = self._build_tcp_info_summary(pkt, flag_str)
+    def __init__(self, capture, windows=(10, 60, 300), flow_log=None, flow_interval=60,
+                 flow_idle=15, max_flows=100000, live=True):
+        """
+        Args:
+            capture: PacketCapture, к которому подключается слушатель.
+            windows: длины скользящих окон в секундах.
+            flow_log: путь к JSONL-файлу записей потоков (None — не писать).
+            flow_interval: active timeout — длинный поток выгружается записью не реже раза в N секунд.
+            flow_idle: inactive timeout — поток без пакетов N секунд завершается.
+            max_flows: предел таблицы потоков.
+            live: True — окна считаются от текущего времени, False (offline) — от времени последнего пакета.
+        """
+        self.capture = capture
+        self.windows = sorted(set(int(w) for w in windows if int(w) > 0)) or [60]
+        self.flow_interval = max(1, int(flow_interval))
+        self.flow_idle = max(1, int(flow_idle))
+        self.max_flows = max(1, int(max_flows))
+        self.live = live
+        self.lock = threading.Lock()
 
-                http = self._try_parse_http_summary(pkt)
-                if http:
-                    info_short = info_short + " | " + http
-                    info_long = info_long + " | " + http
-                else:
-                    tls = self._try_parse_tls_summary_buffered(pkt, packet_info)
-                    if tls:
-                        info_short = info_short + " | " + tls
-                        info_long = info_long + " | " + tls
+        # накопительные счётчики
+        self.packets_by_proto = Counter()
+        self.bytes_by_proto = Counter()
+        self.loss_total = 0
+        self.flow_records_total = 0
+        self.flows_evicted_total = 0
 
-                packet_info['info_short'] = info_short
-                packet_info['info_long'] = info_long
+        # посекундные корзины: [sec, packets, bytes, tcp_packets, loss, Counter(proto)]
+        self._buckets = deque(maxlen=self.windows[-1])
+        self._last_ts = 0.0
 
-                # по умолчанию показываем short (UI сможет переключать)
-                packet_info['info'] = info_short
+        # выборки latency (sec, (us, ...)), набираемые в tick() из capture.latency_samples
+        self._latency = deque()
+        self._latency_seen = 0
 
-            # UDP
-            elif pkt.haslayer(UDP):
-                packet_info['proto'] = 'UDP'
-                packet_info['src_port'] = pkt[UDP].sport
-                packet_info['dst_port'] = pkt[UDP].dport
+        # key -> [first_ts, last_ts, packets, bytes, tcp_flags, iface, exported_at]
+        self.flows = OrderedDict()
 
-                # DNS
-                if pkt.haslayer(DNS):
-                    packet_info['proto'] = 'DNS'
-                    try:
-                        dns_query = pkt[DNS].qd.qname.decode() if pkt[DNS].qd else ''
-                    except:
-                        dns_query = ''
+        self.flow_log = flow_log
+        self._flow_file = open(flow_log, 'a', encoding='utf-8') if flow_log else None
 
-                    ans = self._dns_answers_summary(pkt[DNS]) if pkt.haslayer(DNS) else ""
-                    if ans:
-                        packet_info['info'] = f"DNS {dns_query} | Ans: {ans}"
-                    else:
-                        packet_info['info'] = f"DNS {dns_query}"
+        capture.packet_listeners.append(self.on_packet)
 
-                else:
-                    # packet_info['info'] = f"{pkt[UDP].sport} → {pkt[UDP].dport} Len={len(pkt[UDP])}"
-                    packet_info['info'] = f"Len={len(pkt[UDP])}"
+    # ---- приём пакетов (под capture.lock, должен быть дешёвым) ----
 
-            # ICMP
-            elif pkt.haslayer(ICMP):
-                packet_info['proto'] = 'ICMP'
-                packet_info['info'] = f"Type {pkt[ICMP].type} Code {pkt[ICMP].code}"
+    def on_packet(self, packet_info):
+        ts = packet_info.get('timestamp')
+        ts = ts.timestamp() if isinstance(ts, datetime) else float(ts or time.time())
+        proto = packet_info.get('proto') or 'UNKNOWN'
+        size = int(packet_info.get('size') or 0)
+        is_tcp = 'TCP' in proto
+        loss = bool(packet_info.get('packet_loss'))
 
-        # IPv6
-        elif pkt.haslayer(IPv6):
-            packet_info['src_ip'] = pkt[IPv6].src
-            packet_info['dst_ip'] = pkt[IPv6].dst
+        with self.lock:
+            self._last_ts = max(self._last_ts, ts)
+            self.packets_by_proto[proto] += 1
+            self.bytes_by_proto[proto] += size
+            if loss:
+                self.loss_total += 1
+
+            sec = int(ts)
+            buckets = self._buckets
+            if buckets and buckets[-1][0] >= sec:
+                # та же секунда (или чуть более ранний пакет от другого разборщика)
+                bucket = buckets[-1]
+            else:
+                bucket = [sec, 0, 0, 0, 0, Counter()]
+                buckets.append(bucket)
+            bucket[1] += 1
+            bucket[2] += size
+            bucket[3] += is_tcp
+            bucket[4] += loss
+            bucket[5][proto] += 1
+
+            key = (proto, packet_info.get('src_ip'), packet_info.get('src_port'),
+                   packet_info.get('dst_ip'), packet_info.get('dst_port'))
+            flow = self.flows.get(key)
+            if flow is None:
+                if len(self.flows) >= self.max_flows:
+                    old_key, old_flow = self.flows.popitem(last=False)
+                    self.flows_evicted_total += 1
+                    self._export_flow(old_key, old_flow)
+                flow = [ts, ts, 0, 0, 0, packet_info.get('interface'), ts]
+                self.flows[key] = flow
+            else:
+                self.flows.move_to_end(key)
+            flow[1] = max(flow[1], ts)
+            flow[2] += 1
+            flow[3] += size
+            flow[4] |= int(packet_info.get('tcp_flags_raw') or 0)
+
+    # ---- записи потоков ----
+
+    def _export_flow(self, key, flow):
+        """Записать поток в JSONL (под self.lock)."""
+        self.flow_records_total += 1
+        if self._flow_file is None:
+            return
+        proto, src_ip, src_port, dst_ip, dst_port = key
+        record = {
+            'start': datetime.fromtimestamp(flow[0]).isoformat(timespec='milliseconds'),
+            'end': datetime.fromtimestamp(flow[1]).isoformat(timespec='milliseconds'),
+            'proto': proto,
+            'src_ip': src_ip,
+            'src_port': src_port,
+            'dst_ip': dst_ip,
+            'dst_port': dst_port,
+            'packets': flow[2],
+            'bytes': flow[3],
+            'interface': flow[5],
+        }
+        if flow[4]:
+            record['tcp_flags'] = self.capture._get_tcp_flags(flow[4])
+        try:
+            self._flow_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception:
+            pass
 
-            # TCP over IPv6
-            if pkt.haslayer(TCP):
-                packet_info['proto'] = 'TCPv6'
-                packet_info['src_port'] = pkt[TCP].sport
-                packet_info['dst_port'] = pkt[TCP].dport
+    def now(self):
+        return time.time() if self.live else self._last_ts
 
-                packet_info['tcp_seq'] = int(pkt[TCP].seq)
-                packet_info['tcp_acknum'] = int(pkt[TCP].ack)
+    def tick(self):
+        """Раз в секунду: выгрузить завершённые (idle) и долгие (active timeout) потоки,
+        забрать новые выборки latency."""
+        now = self.now()
+        self._collect_latency(now)
+        with self.lock:
+            expired = []
+            for key, flow in self.flows.items():
+                # потоки упорядочены по последнему пакету: дальше только более свежие
+                if now - flow[1] < self.flow_idle:
+                    break
+                expired.append(key)
+            for key in expired:
+                self._export_flow(key, self.flows.pop(key))
+
+            for key, flow in self.flows.items():
+                if now - flow[6] >= self.flow_interval:
+                    self._export_flow(key, flow)
+                    flow[0] = flow[1]
+                    flow[2] = flow[3] = flow[4] = 0
+                    flow[6] = now
+            if self._flow_file is not None:
+                self._flow_file.flush()
+
+    def _collect_latency(self, now):
+        """Перенести выборки latency, появившиеся с прошлого tick, в окно с меткой времени."""
+        capture = self.capture
+        total = capture.latency_sample_total
+        new = total - self._latency_seen
+        if new < 0:
+            # буфер захвата очищали — счётчик начался заново
+            new = total
+        self._latency_seen = total
+        recent = ()
+        if new > 0:
+            for _ in range(3):
+                try:
+                    # deque пополняется без lock — при гонке просто пробуем ещё раз
+                    recent = list(capture.latency_samples)[-new:]
+                    break
+                except RuntimeError:
+                    continue
+            limit = self.LATENCY_SAMPLES_PER_SECOND
+            if len(recent) > limit:
+                step = len(recent) / limit
+                recent = [recent[int(i * step)] for i in range(limit)]
+        sec = int(now)
+        start = sec - self.windows[-1]
+        with self.lock:
+            if recent:
+                self._latency.append((sec, tuple(recent)))
+            while self._latency and self._latency[0][0] <= start:
+                self._latency.popleft()
 
-                flags = pkt[TCP].flags
-                flag_str = self._get_tcp_flags(flags)
+    def close(self):
+        """Выгрузить все потоки и закрыть JSONL."""
+        with self.lock:
+            while self.flows:
+                key, flow = self.flows.popitem(last=False)
+                if flow[2]:
+                    self._export_flow(key, flow)
+            if self._flow_file is not None:
+                self._flow_file.close()
+                self._flow_file = None
+        try:
+            self.capture.packet_listeners.remove(self.on_packet)
+        except ValueError:
+            pass
 
-                # --- tcp flags для точной фильтрации ---
-                packet_info['tcp_syn'] = bool(flags & 0x02)
-                packet_info['tcp_ack'] = bool(flags & 0x10)
-                packet_info['tcp_fin'] = bool(flags & 0x01)
-                packet_info['tcp_rst'] = bool(flags & 0x04)
+    # ---- окна и метрики ----
 
-                parts = []
-                if packet_info['tcp_syn']: parts.append("SYN")
-                if packet_info['tcp_ack']: parts.append("ACK")
-                if packet_info['tcp_fin']: parts.append("FIN")
-                if packet_info['tcp_rst']: parts.append("RST")
-                packet_info['tcp_flags'] = ",".join(parts)
+    def window_totals(self, window):
+        """Суммы за последние window секунд: packets, bytes, tcp_packets, loss, Counter(proto)."""
+        start = int(self.now()) - window
+        packets = size = tcp = loss = 0
+        protos = Counter()
+        with self.lock:
+            for bucket in reversed(self._buckets):
+                if bucket[0] <= start:
+                    break
+                packets += bucket[1]
+                size += bucket[2]
+                tcp += bucket[3]
+                loss += bucket[4]
+                protos.update(bucket[5])
+        return packets, size, tcp, loss, protos
 
-                info_short = f"Len={len(pkt[TCP]):>5}"
-                info_long = self._build_tcp_info_summary(pkt, flag_str)
+    @staticmethod
+    def _labels(**labels):
+        def esc(v):
+            return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in labels.items()) + '}' if labels else ''
+
+    def render_metrics(self):
+        """Текст метрик в формате OpenMetrics (заканчивается `# EOF`)."""
+        stats = self.capture.get_statistics()
+        out = []
 
-                http = self._try_parse_http_summary(pkt)
-                if http:
-                    info_short = info_short + " | " + http
-                    info_long = info_long + " | " + http
-                else:
-                    tls = self._try_parse_tls_summary_buffered(pkt, packet_info)
-                    if tls:
-                        info_short = info_short + " | " + tls
-                        info_long = info_long + " | " + tls
+        def family(name, mtype, help_text, samples, suffix=''):
+            out.append(f"# TYPE {name} {mtype}")
+            out.append(f"# HELP {name} {help_text}")
+            for labels, value in samples:
+                out.append(f"{name}{suffix}{self._labels(**labels)} {value}")
 
-                packet_info['info_short'] = info_short
-                packet_info['info_long'] = info_long
-                packet_info['info'] = info_short
+        with self.lock:
+            packets_by_proto = sorted(self.packets_by_proto.items())
+            bytes_by_proto = sorted(self.bytes_by_proto.items())
+            loss_total = self.loss_total
+            active_flows = len(self.flows)
+            flow_records = self.flow_records_total
+            flows_evicted = self.flows_evicted_total
+
+        family('packet_monitor_packets', 'counter', 'Packets dissected.',
+               [({'proto': p}, n) for p, n in packets_by_proto], '_total')
+        family('packet_monitor_bytes', 'counter', 'Bytes of dissected packets.',
+               [({'proto': p}, n) for p, n in bytes_by_proto], '_total')
+        family('packet_monitor_tcp_loss_events', 'counter', 'TCP sequence gaps detected.',
+               [({}, loss_total)], '_total')
+
+        rates, bits, loss_ratio, window_protos = [], [], [], []
+        for window in self.windows:
+            packets, size, tcp, loss, protos = self.window_totals(window)
+            label = f"{window}s"
+            rates.append(({'window': label}, f"{packets / window:.3f}"))
+            bits.append(({'window': label}, f"{size * 8 / window:.3f}"))
+            loss_ratio.append(({'window': label}, f"{(loss / tcp) if tcp else 0.0:.6f}"))
+            window_protos.extend(({'window': label, 'proto': p}, n) for p, n in sorted(protos.items()))
+        family('packet_monitor_packets_per_second', 'gauge', 'Packet rate over a sliding window.', rates)
+        family('packet_monitor_bits_per_second', 'gauge', 'Bandwidth over a sliding window.', bits)
+        family('packet_monitor_tcp_loss_ratio', 'gauge', 'TCP sequence gaps per TCP packet over a sliding window.', loss_ratio)
+        family('packet_monitor_window_packets', 'gauge', 'Packets per protocol over a sliding window.', window_protos)
+
+        latency = []
+        with self.lock:
+            latency_buckets = list(self._latency)
+        for window in self.windows:
+            start = int(self.now()) - window
+            samples = sorted(v for sec, values in latency_buckets if sec > start for v in values)
+            if samples:
+                latency.extend(({'window': f"{window}s", 'quantile': q},
+                                f"{samples[min(len(samples) - 1, int(q * len(samples)))]:.1f}")
+                               for q in self.LATENCY_QUANTILES)
+        if latency:
+            # только живой захват: offline-кадрам задержка до разбора не определена
+            family('packet_monitor_capture_latency_microseconds', 'summary',
+                   'Delay between capture timestamp and dissection over a sliding window.', latency)
+
+        family('packet_monitor_flows_active', 'gauge', 'Flows in the flow table.', [({}, active_flows)])
+        family('packet_monitor_flow_records', 'counter', 'Flow records emitted.', [({}, flow_records)], '_total')
+        family('packet_monitor_flows_evicted', 'counter', 'Flows exported early because the flow table was full.',
+               [({}, flows_evicted)], '_total')
+
+        family('packet_monitor_buffer_packets', 'gauge', 'Packets in the ring buffer.', [({}, stats['buffer_size'])])
+        family('packet_monitor_queue_depth', 'gauge', 'Packets waiting in the dissector queue.',
+               [({}, stats.get('queue_depth', 0))])
+        family('packet_monitor_queue_dropped', 'counter', 'Packets dropped because the dissector queue was full.',
+               [({}, stats.get('queue_dropped', 0))], '_total')
+        if 'kernel_drops' in stats:
+            family('packet_monitor_kernel_dropped', 'counter', 'Frames dropped by the kernel ring.',
+                   [({}, stats['kernel_drops'])], '_total')
+        tables = sorted(stats.get('flow_state_tables', {}).items())
+        family('packet_monitor_flow_state_entries', 'gauge', 'Entries in per-flow state tables (TLS buffers, TCP seq).',
+               [({'table': name}, t['entries']) for name, t in tables])
+        family('packet_monitor_flow_state_evictions', 'counter', 'Per-flow state entries removed, by reason.',
+               [({'table': name, 'reason': reason}, t[f'evicted_{reason}'])
+                for name, t in tables for reason in ('lru', 'idle', 'closed')], '_total')
+        family('packet_monitor_dissection_cache_lookups', 'counter', 'Dissection cache lookups, by result.',
+               [({'result': result}, t[result]) for name, t in tables if 'hits' in t
+                for result in ('hits', 'misses')], '_total')
+        family('packet_monitor_uptime_seconds', 'gauge', 'Seconds since capture start.',
+               [({}, f"{stats['uptime_seconds']:.0f}")])
+        out.append("# EOF")
+        return "\n".join(out) + "\n"
+
+    def serve(self, host, port):
+        """Запустить HTTP-сервер /metrics в фоновом потоке; возвращает сервер (shutdown() для остановки)."""
+        monitor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                try:
+                    body = monitor.render_metrics().encode('utf-8')
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', monitor.OPENMETRICS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
 
-            # UDP over IPv6
-            elif pkt.haslayer(UDP):
-                # packet_info['proto'] = 'UDPv6'
-                # packet_info['src_port'] = pkt[UDP].sport
-                # packet_info['dst_port'] = pkt[UDP].dport
-                # packet_info['info'] = f"Len={len(pkt[UDP])}"
-                # # packet_info['info'] = f"{pkt[UDP].sport} → {pkt[UDP].dport}"
-                packet_info['proto'] = 'UDPv6'
-                packet_info['src_port'] = pkt[UDP].sport
-                packet_info['dst_port'] = pkt[UDP].dport
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True, name="MetricsServer").start()
+        return server
 
-                if pkt.haslayer(DNS):
-                    packet_info['proto'] = 'DNS'
-                    try:
-                        dns_query = pkt[DNS].qd.qname.decode() if pkt[DNS].qd else ''
-                    except:
-                        dns_query = ''
-                    ans = self._dns_answers_summary(pkt[DNS])
-                    if ans:
-                        packet_info['info'] = f"DNS {dns_query} | Ans: {ans}"
-                    else:
-                        packet_info['info'] = f"DNS {dns_query}"
-                else:
-                    packet_info['info'] = f"Len={len(pkt[UDP])}"
 
+def parse_listen_address(text):
+    """"host:port" или ":port" -> (host, port); пустой host — 127.0.0.1."""
+    host, sep, port = (text or "").rpartition(':')
+    if not sep:
+        host, port = "", text
+    return (host.strip('[]') or '127.0.0.1'), int(port)
 
-            # ICMPv6
-            elif pkt.haslayer(ICMPv6EchoRequest) or pkt.haslayer(ICMPv6EchoReply):
-                packet_info['proto'] = 'ICMPv6'
-                packet_info['info'] = 'Echo Request/Reply'
 
-        # Если протокол не определен
-        if packet_info['proto'] == 'UNKNOWN':
-            packet_info['proto'] = 'ETHER'
-            packet_info['info'] = pkt.summary()
+def _inet_checksum(data):
+    """Интернет-контрольная сумма (RFC 1071) в сетевом порядке байт."""
+    if len(data) % 2:
+        data += b"\0"
+    s = sum(array('H', data))
+    s = (s & 0xFFFF) + (s >> 16)
+    s = (s & 0xFFFF) + (s >> 16)
+    # сумма по словам в порядке хоста, записанная в порядке хоста, корректна (RFC 1071, 2.B)
+    return struct.pack('=H', ~s & 0xFFFF)
 
-        return packet_info
 
-    def _get_tcp_flags(self, flags):
-        """Преобразовать TCP флаги в строку"""
-        flag_list = []
-        if flags & 0x01:
-            flag_list.append('FIN')
-        if flags & 0x02:
-            flag_list.append('SYN')
-        if flags & 0x04:
-            flag_list.append('RST')
-        if flags & 0x08:
-            flag_list.append('PSH')
-        if flags & 0x10:
-            flag_list.append('ACK')
-        if flags & 0x20:
-            flag_list.append('URG')
+class SyntheticTraffic:
+    """Синтетический трафик для --replay-bench: детерминированный набор кадров Ethernet/IPv4.
 
-        return ', '.join(flag_list) if flag_list else 'None'
+    Смесь повторяет типичную нагрузку: много коротких TCP-потоков (HTTP запрос/ответ),
+    несколько «слонов» — длинных TCP-потоков из MSS-сегментов с редкими потерями,
+    TLS-рукопожатия (ClientHello с SNI/ALPN, ServerHello) и всплески DNS-запросов.
+    Доли задаются от общего числа пакетов, генератор случайных чисел — с фиксированным
+    seed, поэтому прогоны сравнимы между собой. Адреса серверов — из 198.18.0.0/15
+    (диапазон для тестов производительности, RFC 2544).
+    """
 
-    def _sniff_thread(self, interface):
-        """Поток для захвата пакетов с одного интерфейса"""
-        self._log(f"Sniff thread started on {interface} (bpf={self.bpf_filter!r})")
+    MIX = (('small_flows', 0.4), ('elephant_flows', 0.4), ('tls_handshakes', 0.1), ('dns_bursts', 0.1))
+    MSS = 1448
+    PPS = 20000              # номинальная скорость: задаёт длительность трафика
+    LOSS_EVERY = 997         # на каждые N сегментов «слона» два подряд теряются (разрыв seq > MSS)
+    IFACE = 'synth0'
+    CLIENT_MAC = bytes.fromhex('02005e000001')
+    SERVER_MAC = bytes.fromhex('02005e000002')
+    RESOLVER = bytes([10, 0, 0, 53])
 
-        try:
-            sniff_kwargs = dict(
-                iface=interface,
-                prn=self._packet_handler,
-                store=False,
-                stop_filter=lambda x: self.stop_sniffing.is_set()
-            )
+    def __init__(self, packets=50000, seed=1, elephants=4):
+        """
+        Args:
+            packets: примерное общее число пакетов.
+            seed: seed генератора (одинаковый seed — одинаковые кадры).
+            elephants: число длинных TCP-потоков.
+        """
+        self.packets = max(100, int(packets))
+        self.seed = seed
+        self.elephants = max(1, int(elephants))
+        self.base_ts = 1700000000.0
+        self.duration = self.packets / self.PPS
+        self._rng = random.Random(seed)
+        self._ip_id = 0
+
+    # ---- кадры ----
+
+    def _frame(self, src, dst, sport, dport, payload=b"", proto=6, flags=0x18, seq=0, ack=0, reverse=False):
+        """Кадр Ethernet/IPv4/TCP|UDP с корректными контрольными суммами."""
+        if proto == 6:
+            l4 = struct.pack('!HHIIBBHHH', sport, dport, seq & 0xFFFFFFFF, ack & 0xFFFFFFFF,
+                             5 << 4, flags, 65535, 0, 0)
+            csum_off = 16
+        else:
+            l4 = struct.pack('!HHHH', sport, dport, 8 + len(payload), 0)
+            csum_off = 6
+        seg = l4 + payload
+        csum = _inet_checksum(src + dst + struct.pack('!BBH', 0, proto, len(seg)) + seg)
+        seg = seg[:csum_off] + csum + seg[csum_off + 2:]
+
+        self._ip_id = (self._ip_id + 1) & 0xFFFF
+        ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(seg), self._ip_id, 0x4000, 64, proto, 0, src, dst)
+        ip = ip[:10] + _inet_checksum(ip) + ip[12:]
+        macs = self.CLIENT_MAC + self.SERVER_MAC if reverse else self.SERVER_MAC + self.CLIENT_MAC
+        return macs + b"\x08\x00" + ip + seg
+
+    def _client_ip(self):
+        rng = self._rng
+        return bytes([10, rng.randint(0, 255), rng.randint(0, 255), rng.randint(1, 254)])
 
-            # BPF применяется на уровне libpcap (до попадания пакетов в Python)
-            if self.bpf_filter:
-                sniff_kwargs["filter"] = self.bpf_filter
+    @staticmethod
+    def _server_ip(i):
+        return bytes([198, 18 + (i >> 16) % 2, (i >> 8) & 0xFF, (i & 0xFF) or 1])
+
+    def _start(self, spread=1.0):
+        return self.base_ts + self._rng.uniform(0, self.duration * spread)
+
+    def _handshake(self, out, cli, srv, cport, sport, t, rtt):
+        """SYN, SYN+ACK, ACK; возвращает (seq клиента, seq сервера, время) после рукопожатия."""
+        rng = self._rng
+        cseq, sseq = rng.getrandbits(32), rng.getrandbits(32)
+        out.append((t, self._frame(cli, srv, cport, sport, flags=0x02, seq=cseq)))
+        out.append((t + rtt, self._frame(srv, cli, sport, cport, flags=0x12, seq=sseq, ack=cseq + 1, reverse=True)))
+        t += rtt * 1.01
+        out.append((t, self._frame(cli, srv, cport, sport, flags=0x10, seq=cseq + 1, ack=sseq + 1)))
+        return cseq + 1, sseq + 1, t
 
-            sniff(**sniff_kwargs)
+    @staticmethod
+    def _client_hello(rng, sni, alpn=(b'h2', b'http/1.1')):
+        name = sni.encode()
+        sni_ext = struct.pack('!HBH', len(name) + 3, 0, len(name)) + name
+        protos = b"".join(bytes([len(p)]) + p for p in alpn)
+        alpn_ext = struct.pack('!H', len(protos)) + protos
+        versions = b"\x04\x03\x04\x03\x03"
+        exts = (struct.pack('!HH', 0, len(sni_ext)) + sni_ext
+                + struct.pack('!HH', 16, len(alpn_ext)) + alpn_ext
+                + struct.pack('!HH', 43, len(versions)) + versions)
+        ciphers = struct.pack('!5H', 0x1301, 0x1302, 0x1303, 0xC02F, 0xC030)
+        body = (b"\x03\x03" + rng.randbytes(32) + b"\x00" + struct.pack('!H', len(ciphers)) + ciphers
+                + b"\x01\x00" + struct.pack('!H', len(exts)) + exts)
+        hs = b"\x01" + len(body).to_bytes(3, 'big') + body
+        return b"\x16\x03\x01" + struct.pack('!H', len(hs)) + hs
 
-        except Exception as e:
-            self._log(f"Error in sniff thread ({interface}): {e}")
-        finally:
-            self._log(f"Sniff thread stopped ({interface})")
+    @staticmethod
+    def _server_hello(rng):
+        exts = struct.pack('!HHH', 43, 2, 0x0304)
+        body = b"\x03\x03" + rng.randbytes(32) + b"\x00" + struct.pack('!HB', 0x1301, 0) + struct.pack('!H', len(exts)) + exts
+        hs = b"\x02" + len(body).to_bytes(3, 'big') + body
+        return b"\x16\x03\x03" + struct.pack('!H', len(hs)) + hs
 
-    def start_capture(self):
-        """Запустить захват пакетов на всех интерфейсах"""
-        if self.running:
-            self._log("Already running")
-            return
+    # ---- составляющие смеси: списки (ts, frame) ----
 
-        self._log(f"Starting capture on interfaces: {self.interfaces}")
+    def small_flows(self, packets):
+        """Короткие HTTP-потоки: рукопожатие, запрос, ответ, закрытие (8 пакетов)."""
+        rng = self._rng
+        out = []
+        for i in range(max(1, packets // 8)):
+            cli, srv = self._client_ip(), self._server_ip(i % 200)
+            cport = rng.randint(32768, 60999)
+            rtt = rng.uniform(0.0005, 0.02)
+            cseq, sseq, t = self._handshake(out, cli, srv, cport, 80, self._start(), rtt)
+            req = b"GET /item/%d HTTP/1.1\r\nHost: svc%d.example\r\n\r\n" % (i, i % 50)
+            body = b"x" * rng.randint(100, 1200)
+            resp = b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(body) + body
+            out.append((t + 0.0001, self._frame(cli, srv, cport, 80, req, seq=cseq, ack=sseq)))
+            cseq += len(req)
+            t += rtt
+            out.append((t, self._frame(srv, cli, 80, cport, resp, seq=sseq, ack=cseq, reverse=True)))
+            sseq += len(resp)
+            out.append((t + 0.0001, self._frame(cli, srv, cport, 80, flags=0x11, seq=cseq, ack=sseq)))
+            out.append((t + rtt, self._frame(srv, cli, 80, cport, flags=0x11, seq=sseq, ack=cseq + 1, reverse=True)))
+            out.append((t + rtt * 1.01, self._frame(cli, srv, cport, 80, flags=0x10, seq=cseq + 1, ack=sseq + 1)))
+        return out
 
-        self.start_time = time.time()
-        self.last_bandwidth_check = time.time()
-        self.stop_sniffing.clear()
-        self.running = True
+    def elephant_flows(self, packets):
+        """Длинные TCP-потоки: MSS-сегменты от сервера, ACK клиента на каждые два сегмента."""
+        rng = self._rng
+        out = []
+        chunk = (bytes(range(256)) * (self.MSS // 256 + 1))[:self.MSS]
+        per_flow = max(10, packets // self.elephants)
+        for i in range(self.elephants):
+            cli, srv = self._client_ip(), self._server_ip(i)
+            cport, sport = rng.randint(32768, 60999), 5001 + i
+            cseq, sseq, t = self._handshake(out, cli, srv, cport, sport, self._start(0.1), 0.01)
+            segments = (per_flow - 3) * 2 // 3
+            step = max(1e-6, (self.base_ts + self.duration - t) / max(1, segments))
+            for k in range(segments):
+                t += step
+                if k % self.LOSS_EVERY < self.LOSS_EVERY - 2:
+                    out.append((t, self._frame(srv, cli, sport, cport, chunk, flags=0x10,
+                                               seq=sseq, ack=cseq, reverse=True)))
+                sseq += self.MSS
+                if k % 2:
+                    out.append((t + step / 2, self._frame(cli, srv, cport, sport, flags=0x10, seq=cseq, ack=sseq)))
+        return out
 
-        try:
-            # Запускаем отдельный поток для каждого интерфейса
-            for iface in self.interfaces:
-                thread = threading.Thread(
-                    target=self._sniff_thread,
-                    args=(iface,),
-                    daemon=True,
-                    name=f"Sniffer-{iface}"
-                )
-                thread.start()
-                self.capture_threads.append(thread)
-                self._log(f"Started thread for {iface}")
+    def tls_handshakes(self, packets):
+        """TLS: рукопожатие TCP, ClientHello (SNI/ALPN), ServerHello, ACK (6 пакетов)."""
+        rng = self._rng
+        out = []
+        for i in range(max(1, packets // 6)):
+            cli, srv = self._client_ip(), self._server_ip(i % 100)
+            cport = rng.randint(32768, 60999)
+            rtt = rng.uniform(0.001, 0.03)
+            cseq, sseq, t = self._handshake(out, cli, srv, cport, 443, self._start(), rtt)
+            ch = self._client_hello(rng, f"host{i % 500}.example.com")
+            out.append((t + 0.0001, self._frame(cli, srv, cport, 443, ch, seq=cseq, ack=sseq)))
+            cseq += len(ch)
+            t += rtt
+            sh = self._server_hello(rng)
+            out.append((t, self._frame(srv, cli, 443, cport, sh, seq=sseq, ack=cseq, reverse=True)))
+            sseq += len(sh)
+            out.append((t + 0.0001, self._frame(cli, srv, cport, 443, flags=0x10, seq=cseq, ack=sseq)))
+        return out
 
-            time.sleep(0.1)
-            self._log(f"Capture started on {len(self.capture_threads)} interfaces")
+    def dns_bursts(self, packets, burst=50):
+        """Всплески DNS: по burst запросов A от одного клиента и ответы резолвера."""
+        rng = self._rng
+        out = []
+        queries = max(1, packets // 2)
+        done = 0
+        while done < queries:
+            t = self._start()
+            cli = self._client_ip()
+            for k in range(min(burst, queries - done)):
+                name = f"svc{rng.randint(0, 999)}.internal.example"
+                qname = b"".join(bytes([len(p)]) + p.encode() for p in name.split('.')) + b"\0"
+                question = qname + struct.pack('!HH', 1, 1)
+                txid = rng.getrandbits(16)
+                cport = rng.randint(32768, 60999)
+                query = struct.pack('!6H', txid, 0x0100, 1, 0, 0, 0) + question
+                answer = struct.pack('!HHHIH', 0xC00C, 1, 1, 60, 4) + self._server_ip(rng.randint(0, 65535))
+                resp = struct.pack('!6H', txid, 0x8180, 1, 1, 0, 0) + question + answer
+                tq = t + k * 0.0001
+                out.append((tq, self._frame(cli, self.RESOLVER, cport, 53, query, proto=17)))
+                out.append((tq + rng.uniform(0.001, 0.005),
+                            self._frame(self.RESOLVER, cli, 53, cport, resp, proto=17, reverse=True)))
+                done += 1
+        return out
 
-        except Exception as e:
-            self._log(f"Error starting capture: {e}")
-            self.running = False
+    def records(self):
+        """Вся смесь по времени: список (frame, ts, linktype, ifname)."""
+        frames = []
+        for name, share in self.MIX:
+            frames.extend(getattr(self, name)(int(self.packets * share)))
+        frames.sort(key=lambda r: r[0])
+        return [(frame, ts, 1, self.IFACE) for ts, frame in frames]
+
+    @staticmethod
+    def write(path, records):
+        """Записать записи (frame, ts, linktype, ifname) в pcapng (или pcap по расширению, .gz — сжатие)."""
+        fmt = 'pcap' if path.endswith(('.pcap', '.pcap.gz')) else 'pcapng'
+        encoder = PcapRecordEncoder(fmt)
+        with open_compressed_output(path, 'gzip' if path.endswith('.gz') else None) as f:
+            for frame, ts, linktype, ifname in records:
+                parts = []
+                encoder.encode(parts, frame, ts, linktype, ifname)
+                f.writelines(parts)
+        return encoder.count
 
-    def stop_capture(self):
-        """Остановить захват пакетов на всех интерфейсах"""
-        if not self.running:
-            self._log("Not running")
-            return
 
-        self._log("Stopping capture...")
+class ReplayBenchmark:
+    """Прогон записанного трафика через конвейер разбора без сетевого интерфейса (--replay-bench).
 
-        try:
-            # Сигнализируем всем потокам об остановке
-            self.stop_sniffing.set()
-            self.running = False
+    Кадры подаются в PacketCapture._dissect_packet так же, как их подают потоки захвата:
+    scapy-пакетом (backend scapy) и кортежем (frame, ts, iface) с быстрым разбором
+    заголовков (backend tpacket). По заполненному буферу затем замеряются горячие пути
+    UI: PacketFilter.filter_packets на наборе типичных фильтров, полная пересборка
+    FlowListBox._update_cache и build_tcp_stream_reassembled по самым большим TCP-потокам.
 
-            # Ждем завершения всех потоков
-            for thread in self.capture_threads:
-                if thread.is_alive():
-                    thread.join(timeout=2.0)
+    Для каждой стадии — перцентили задержки одного вызова, плюс пакеты в секунду
+    и пиковый RSS процесса. Результат — dict, пригодный для JSON: его можно сохранить
+    как baseline и сравнить с ним следующий прогон (compare).
+    """
 
-            self.capture_threads.clear()
-            self._log("Capture stopped")
+    FILTER_PRESETS = (
+        ('proto=TCP', {'proto': 'TCP'}),
+        ('any_ip=10.1.', {'any_ip': '10.1.'}),
+        ('any_port=53', {'any_port': '53'}),
+        ('tcp_syn', {'tcp_syn': True}),
+        ('info=ClientHello', {'info': 'ClientHello'}),
+        ('payload=HTTP/1.1', {'payload': 'HTTP/1.1'}),
+    )
+    REPEATS = 5
+    MAX_STREAMS = 200
 
-        except Exception as e:
-            self._log(f"Error stopping capture: {e}")
+    # link-type -> кадр с Ethernet-заголовком (True) или сразу IP (False) для быстрого пути
+    RING_LINKTYPES = {1: True, 12: False, 101: False, 228: False, 229: False}
 
-    def get_packets(self):
-        """Получить список захваченных пакетов (thread-safe)"""
-        with self.lock:
-            return list(self.packets)
+    # метрики стадий, сравниваемые с baseline (меньше — лучше)
+    STAGE_METRICS = ('p50_us', 'p99_us')
 
-    def clear_packets(self):
-        """Очистить буфер пакетов"""
-        with self.lock:
-            self.packets.clear()
-            self.packet_counter = 0
-            self.total_bytes = 0
-            self.bytes_last_second = 0
-            self.current_bandwidth = 0
-            self.packet_loss_count = 0
-            self.tcp_sequence_tracker.clear()
-            self.latency_samples.clear()
-            self._log("Buffer cleared")
+    def __init__(self, records, workload='', flow_state_max=131072, log=print):
+        """
+        Args:
+            records: список (frame, ts, linktype, ifname).
+            workload: описание нагрузки для отчёта и baseline.
+            flow_state_max: размер таблиц состояния потоков PacketCapture.
+            log: функция вывода прогресса.
+        """
+        self.records = records
+        self.workload = workload
+        self.flow_state_max = flow_state_max
+        self.log = log
+        self.samples = {}      # стадия -> [ns]
+        self.throughput = {}   # backend -> пакетов в секунду
+        self.buffer_mb = 0.0
+
+    def _timed(self, stage, fn, *args):
+        t0 = time.perf_counter_ns()
+        result = fn(*args)
+        self.samples.setdefault(stage, []).append(time.perf_counter_ns() - t0)
+        return result
+
+    def _new_capture(self):
+        total = sum(len(r[0]) for r in self.records)
+        # весь прогон помещается в буфер: фильтры и flows видят одинаковый набор
+        return PacketCapture(interface='offline', packet_limit=max(1, len(self.records)), log_file=None,
+                             arena_bytes=total + 1024 * 1024, flow_state_max=self.flow_state_max)
+
+    def _replay(self, capture, backend):
+        samples = self.samples.setdefault(f'dissect.{backend}', [])
+        perf = time.perf_counter_ns
+        dissect = capture._dissect_packet
+        started = perf()
+        for frame, ts, linktype, ifname in self.records:
+            t0 = perf()
+            ethernet = self.RING_LINKTYPES.get(linktype)
+            if backend == 'tpacket' and ethernet is not None:
+                iface = ifname or 'replay'
+                capture._ring_ethernet[iface] = ethernet
+                item = (frame, ts, iface)
+            else:
+                cls = conf.l2types.num2layer.get(linktype) or conf.raw_layer
+                try:
+                    item = cls(frame)
+                except Exception:
+                    item = conf.raw_layer(frame)
+                item.time = ts
+                if ifname:
+                    item.sniffed_on = ifname
+            try:
+                dissect(item)
+            except Exception:
+                pass
+            samples.append(perf() - t0)
+        elapsed = max(1, perf() - started) / 1e9
+        self.throughput[backend] = len(self.records) / elapsed
+
+    def _bench_ui(self, capture):
+        views = capture.get_packets()
+
+        for label, filters in self.FILTER_PRESETS:
+            pf = PacketFilter()
+            for field, value in filters.items():
+                pf.set_filter(field, value)
+            for _ in range(self.REPEATS):
+                self._timed(f'filter.{label}', pf.filter_packets, views)
+
+        flow_view = FlowListBox(capture, PacketFilter())
+        for _ in range(self.REPEATS):
+            flow_view.reset_cache()
+            self._timed('flows.update_cache', flow_view._update_cache, views)
+
+        with capture.lock:
+            flows = capture.flows.flows
+            keys = sorted((k for k in flows if k[0] == 'TCP'), key=lambda k: -len(flows[k]['nums']))
+            keys = keys[:self.MAX_STREAMS]
+            endpoints = [capture.flows.guess_client_server(k[1], k[2], k[3], k[4]) for k in keys]
+        for key, ep in zip(keys, endpoints):
+            if ep is not None:
+                self._timed('stream.reassembly', build_tcp_stream_reassembled, capture.get_flow_packets(key), *ep)
+
+    def run(self):
+        """Прогнать оба backend'а и стадии UI; возвращает results()."""
+        capture = None
+        for backend in ('scapy', 'tpacket'):
+            self.log(f"  Replaying {len(self.records)} packets through the {backend} dissector...")
+            capture = self._new_capture()
+            self._replay(capture, backend)
+        self.buffer_mb = capture.packets.memory_usage() / (1024 * 1024)
+        self.log("  Measuring filters, flows and stream reassembly...")
+        self._bench_ui(capture)
+        return self.results()
 
-    def get_bandwidth(self):
-        """Получить текущую пропускную способность в bytes/sec"""
-        return self.current_bandwidth
+    @staticmethod
+    def percentiles(samples):
+        """count / p50 / p90 / p99 / max (мкс) и суммарное время (мс) по выборке в нс."""
+        s = sorted(samples)
+        n = len(s)
+        if not n:
+            return {'count': 0}
 
-    def get_bandwidth_mbps(self):
-        """Получить пропускную способность в Mbps"""
-        return (self.current_bandwidth * 8) / 1_000_000
+        def pick(q):
+            return round(s[min(n - 1, int(q * n))] / 1000.0, 3)
 
-    def get_average_latency(self):
-        """Получить среднюю latency в микросекундах"""
-        if not self.latency_samples:
+        return {'count': n, 'p50_us': pick(0.50), 'p90_us': pick(0.90), 'p99_us': pick(0.99),
+                'max_us': round(s[-1] / 1000.0, 3), 'total_ms': round(sum(s) / 1e6, 3)}
+
+    @staticmethod
+    def peak_rss_mb():
+        """Пиковый RSS процесса в MB (None, если модуль resource недоступен)."""
+        if resource is None:
             return None
-        return sum(self.latency_samples) / len(self.latency_samples)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux отдаёт KB, macOS — байты
+        return round(rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024, 1)
 
-    def get_packet_loss_count(self):
-        """Получить количество обнаруженных потерянных пакетов"""
-        return self.packet_loss_count
+    def results(self):
+        return {
+            'version': __version__,
+            'workload': self.workload,
+            'packets': len(self.records),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'throughput_pps': {k: round(v, 1) for k, v in self.throughput.items()},
+            'stages': {k: self.percentiles(v) for k, v in self.samples.items()},
+            'peak_rss_mb': self.peak_rss_mb(),
+            'buffer_mb': round(self.buffer_mb, 1),
+        }
 
-    def get_statistics(self):
-        """Получить полную статистику захвата"""
-        with self.lock:
-            uptime = time.time() - self.start_time if self.start_time else 0
+    @classmethod
+    def compare(cls, baseline, current, tolerance=0.2):
+        """Сравнить результаты с baseline.
 
-            return {
-                'total_packets': self.packet_counter,
-                'buffer_size': len(self.packets),
-                'buffer_limit': self.packet_limit,
-                'total_bytes': self.total_bytes,
-                'bandwidth_bps': self.current_bandwidth,
-                'bandwidth_mbps': self.get_bandwidth_mbps(),
-                'uptime_seconds': uptime,
-                'avg_latency_us': self.get_average_latency(),
-                'packet_loss_count': self.packet_loss_count,
-                'active_threads': len([t for t in self.capture_threads if t.is_alive()]),
-            }
+        Returns:
+            list[tuple]: (метрика, baseline, current, изменение в %, регрессия: bool).
+            Регрессия — пакеты в секунду ниже baseline или задержка/RSS выше больше чем на tolerance.
+        """
+        rows = []
+
+        def add(name, base, cur, higher_is_better):
+            if not base or cur is None:
+                return
+            delta = (cur - base) / base
+            worse = -delta if higher_is_better else delta
+            rows.append((name, base, cur, delta * 100.0, worse > tolerance))
+
+        for backend, base in (baseline.get('throughput_pps') or {}).items():
+            add(f'throughput.{backend} pps', base, current.get('throughput_pps', {}).get(backend), True)
+        for stage, base in (baseline.get('stages') or {}).items():
+            cur = current.get('stages', {}).get(stage)
+            if not cur:
+                continue
+            for metric in cls.STAGE_METRICS:
+                add(f'{stage} {metric}', base.get(metric), cur.get(metric), False)
+        add('peak_rss_mb', baseline.get('peak_rss_mb'), current.get('peak_rss_mb'), False)
+        return rows
 
 
 class SelectableText(urwid.Text):
@@ -3909,65 +8550,23 @@ class StatisticsPanel(urwid.WidgetWrap):
         
         super().__init__(urwid.AttrMap(content, 'stat_panel'))
     
-    def update(self, packets, packet_filter, packet_capture):
-        """Обновить статистику с расширенной информацией"""
-        # Счетчики протоколов
-        proto_count = defaultdict(int)
-        ipv4_addrs = set()
-        ipv6_addrs = set()
-        tcp_flags = defaultdict(int)
-        
-        for pkt in packets:
-            proto = pkt['proto']
-            
-            if 'TCP' in proto:
-                if '::' in str(pkt.get('src_ip', '')) or '::' in str(pkt.get('dst_ip', '')):
-                    proto_count['TCPv6'] += 1
-                else:
-                    proto_count['TCPv4'] += 1
-            elif 'UDP' in proto:
-                if '::' in str(pkt.get('src_ip', '')) or '::' in str(pkt.get('dst_ip', '')):
-                    proto_count['UDPv6'] += 1
-                else:
-                    proto_count['UDPv4'] += 1
-            elif proto == 'ARP':
-                proto_count['ARP'] += 1
-            elif proto == 'ICMP':
-                proto_count['ICMP'] += 1
-            elif proto == 'ICMPv6':
-                proto_count['ICMPv6'] += 1
-            else:
-                proto_count[proto] += 1
-            
-            src_ip = pkt.get('src_ip')
-            dst_ip = pkt.get('dst_ip')
-            
-            if src_ip:
-                if ':' in src_ip and '.' not in src_ip:
-                    ipv6_addrs.add(src_ip)
-                elif '.' in src_ip:
-                    ipv4_addrs.add(src_ip)
-            
-            if dst_ip:
-                if ':' in dst_ip and '.' not in dst_ip:
-                    ipv6_addrs.add(dst_ip)
-                elif '.' in dst_ip:
-                    ipv4_addrs.add(dst_ip)
-            
-            if 'TCP' in proto:
-                info = pkt.get('info', '')
-                if 'RST' in info:
-                    tcp_flags['RST'] += 1
-                if 'SYN' in info:
-                    tcp_flags['SYN'] += 1
-                if 'FIN' in info:
-                    tcp_flags['FIN'] += 1
-                if 'PSH' in info:
-                    tcp_flags['PSH'] += 1
-        
+    def update(self, traffic_stats, packet_filter, packet_capture):
+        """Обновить статистику с расширенной информацией.
+
+        Args:
+            traffic_stats: TrafficStats отображаемого набора (обычно packet_filter.stats);
+                           значения читаются из накопителей, без прохода по пакетам.
+            packet_filter: PacketFilter (для информации об исключениях).
+            packet_capture: PacketCapture (bandwidth/latency/loss).
+        """
+        proto_count = traffic_stats.protocol_counts()
+        tcp_flags = traffic_stats.tcp_flag_counts()
+        ipv4_count = traffic_stats.distinct_ipv4()
+        ipv6_count = traffic_stats.distinct_ipv6()
+
         stats = packet_capture.get_statistics()
-        top_ips = packet_filter.get_top_ips(packets, limit=10)
-        top_talkers = packet_filter.get_top_talkers(packets, limit=10)
+        top_ips = traffic_stats.top_ips(limit=10)
+        top_talkers = traffic_stats.top_talkers(limit=10)
         
         bw_mbps = stats.get('bandwidth_mbps', 0)
         bw_kbps = (stats.get('bandwidth_bps', 0) / 1000)
@@ -3998,10 +8597,10 @@ class StatisticsPanel(urwid.WidgetWrap):
         # Unique IPs - ВСЕГДА ПОКАЗЫВАЕМ
         widgets.append(urwid.Divider())
         widgets.append(urwid.AttrMap(urwid.Text('═══ Unique IPs ═══'), 'stat_title'))
-        widgets.append(urwid.AttrMap(urwid.Text(f"IPv4:   {len(ipv4_addrs)}"), 'stat_label'))
+        widgets.append(urwid.AttrMap(urwid.Text(f"IPv4:   {ipv4_count}"), 'stat_label'))
         
         if self.enable_ipv6_stats:
-            widgets.append(urwid.AttrMap(urwid.Text(f"IPv6:   {len(ipv6_addrs)}"), 'stat_label'))
+            widgets.append(urwid.AttrMap(urwid.Text(f"IPv6:   {ipv6_count}"), 'stat_label'))
         
         # TCP Flags - ВСЕГДА ПОКАЗЫВАЕМ
         widgets.append(urwid.Divider())
@@ -4171,7 +8770,7 @@ class PayloadSearchDialog(urwid.WidgetWrap):
         widgets.append(urwid.Text(('dialog_title', 'Payload Search\n')))
         widgets.append(urwid.Divider())
         
-        widgets.append(urwid.Text('Search string (supports regex):'))
+        widgets.append(urwid.Text('Search string (regex; "a|b|c" = several plain strings):'))
         self.search_edit = urwid.Edit(edit_text='')
         widgets.append(urwid.AttrMap(self.search_edit, 'edit', 'edit_focus'))
         widgets.append(urwid.Divider())
@@ -4486,6 +9085,10 @@ class FilterDialog(urwid.WidgetWrap):
             'interface': 'Network Interface (eth0, wlan0, etc.):',
             'info': 'Info (regex supported):',
             'payload': 'Payload Search (regex):',
+            'sni': 'TLS SNI (flow attribute, regex):',
+            'alpn': 'TLS ALPN (flow attribute, regex):',
+            'ja3': 'TLS JA3 hash (flow attribute):',
+            'tls_cert': 'TLS certificate subject/SAN (flow attribute, regex):',
         }
         
         current_filters = self.packet_filter.get_active_filters()
@@ -4655,18 +9258,24 @@ class ConfirmDialog(urwid.WidgetWrap):
 class SaveDialog(urwid.WidgetWrap):
     """Диалог для сохранения пакетов"""
     
-    def __init__(self, export_dialog, on_save_callback, on_cancel_callback):
+    def __init__(self, export_dialog, on_save_callback, on_cancel_callback, flow_key=None):
         """Диалог сохранения/экспорта пакетов.
 
+        Экспорт идёт в фоне (PcapExportJob); прогресс обновляет poll(), который
+        вызывается из периодического refresh приложения.
+
         Args:
             export_dialog: UI/логика экспорта (обычно PacketExportDialog).
             on_save_callback: callback(success: bool, filepath: str, message: str) -> None.
             on_cancel_callback: callback() -> None.
+            flow_key: канонический ключ выбранного потока (режим "Selected flow"), или None.
         """
 
         self.export_dialog = export_dialog
         self.on_save_callback = on_save_callback
         self.on_cancel_callback = on_cancel_callback
+        self.flow_key = flow_key
+        self.job = None
         
         widgets = []
         widgets.append(urwid.Text(('dialog_title', 'Save Captured Packets\n')))
@@ -4685,17 +9294,42 @@ class SaveDialog(urwid.WidgetWrap):
         
         widgets.append(urwid.AttrMap(rb1, 'radio', 'radio_focus'))
         widgets.append(urwid.AttrMap(rb2, 'radio', 'radio_focus'))
+        if flow_key:
+            proto, ip1, port1, ip2, port2 = flow_key
+            rb3 = urwid.RadioButton(self.save_mode, f'Selected flow: {proto} {ip1}:{port1} <-> {ip2}:{port2}')
+            widgets.append(urwid.AttrMap(rb3, 'radio', 'radio_focus'))
+        widgets.append(urwid.Divider())
+
+        widgets.append(urwid.Text('Time range, sec from first packet (A-B, empty = all):'))
+        self.time_edit = urwid.Edit(edit_text='')
+        widgets.append(urwid.AttrMap(self.time_edit, 'edit', 'edit_focus'))
+        widgets.append(urwid.Divider())
+
+        self.format_mode = []
+        widgets.append(urwid.Text('Format:'))
+        for label in ('pcapng', 'pcap'):
+            rb = urwid.RadioButton(self.format_mode, label, state=(label == 'pcapng'))
+            widgets.append(urwid.AttrMap(rb, 'radio', 'radio_focus'))
+        widgets.append(urwid.Divider())
+
+        self.compression_mode = []
+        widgets.append(urwid.Text('Compression:'))
+        for label in ('none', 'gzip', 'zstd') if zstandard is not None else ('none', 'gzip'):
+            rb = urwid.RadioButton(self.compression_mode, label, state=(label == 'none'))
+            widgets.append(urwid.AttrMap(rb, 'radio', 'radio_focus'))
         widgets.append(urwid.Divider())
         
-        total_packets = len(self.export_dialog.packet_capture.get_packets())
-        filtered_packets = len(self.export_dialog.packet_filter.filter_packets(
-            self.export_dialog.packet_capture.get_packets()
-        ))
+        capture = self.export_dialog.packet_capture
+        with capture.lock:
+            total_packets = len(capture.packets)
+        filtered_packets = self.export_dialog.packet_filter.matched_count()
         
         widgets.append(urwid.Text([
             ('info', f'Total packets: {total_packets}\n'),
             ('info', f'Filtered packets: {filtered_packets}\n'),
         ]))
+        self.progress_text = urwid.Text('')
+        widgets.append(self.progress_text)
         widgets.append(urwid.Divider())
         
         buttons = urwid.Columns([
@@ -4724,22 +9358,58 @@ class SaveDialog(urwid.WidgetWrap):
             self._on_cancel(None)
             return None
         return super().keypress(size, key)
+
+    @staticmethod
+    def _selected_label(group):
+        for rb in group:
+            if rb.get_state():
+                return rb.get_label()
+        return None
     
     def _on_save(self, button):
+        if self.job is not None:
+            return
+
         filename = self.filename_edit.get_edit_text().strip()
         filename = filename if filename else None
-        
-        save_all = self.save_mode[0].get_state()
-        
-        if save_all:
-            success, filepath, message = self.export_dialog.export_all_packets(filename)
-        else:
-            success, filepath, message = self.export_dialog.export_filtered_packets(filename)
-        
-        if self.on_save_callback:
-            self.on_save_callback(success, filepath, message)
+
+        try:
+            time_range = parse_num_range(self.time_edit.get_edit_text())
+        except ValueError as e:
+            self.progress_text.set_text(('rst', f'Invalid time range: {e}'))
+            return
+
+        modes = ('all', 'filtered', 'flow')
+        mode = next((m for m, rb in zip(modes, self.save_mode) if rb.get_state()), 'all')
+        compression = self._selected_label(self.compression_mode)
+
+        self.job = self.export_dialog.start_export(
+            mode, filename,
+            fmt=self._selected_label(self.format_mode) or 'pcapng',
+            compression=None if compression in (None, 'none') else compression,
+            time_range=time_range if time_range != (None, None) else None,
+            flow_key=self.flow_key,
+        )
+        self.poll()
+
+    def poll(self):
+        """Обновить прогресс фонового экспорта; по окончании вызвать on_save_callback."""
+        job = self.job
+        if job is None:
+            return
+        p = job.progress()
+        self.progress_text.set_text(('info',
+            f"Exporting: {p['percent']:.0f}% ({p['scanned']}/{p['total']}), "
+            f"{p['packets_written']} packets, {p['bytes_written'] / (1024 * 1024):.1f} MiB"))
+        if job.finished:
+            self.job = None
+            if self.on_save_callback:
+                self.on_save_callback(*job.result())
     
     def _on_cancel(self, button):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
         if self.on_cancel_callback:
             self.on_cancel_callback()
 
@@ -4825,6 +9495,98 @@ class HelpDialog(urwid.WidgetWrap):
         return None
 
 
+class PacketListWalker(urwid.ListWalker):
+    """Ленивый ListWalker для списка пакетов.
+
+    Позиции — номера пакетов (num) из кэша совпадений PacketFilter, поэтому они не
+    сдвигаются при вытеснении старых пакетов. Виджет строки создаётся только когда
+    ListBox его запрашивает (видимое окно и соседние строки), и хранится в LRU.
+    Стоимость пересборки списка не зависит от размера буфера.
+    """
+
+    def __init__(self, packet_capture, packet_filter, formatter, cache_size=1024):
+        """
+        Args:
+            packet_capture: PacketCapture (источник PacketView).
+            packet_filter: PacketFilter (отображаемый набор номеров, см. sync).
+            formatter: callable(packet) -> widget строки.
+            cache_size: сколько отформатированных строк держать в LRU.
+        """
+        self.packet_capture = packet_capture
+        self.packet_filter = packet_filter
+        self.formatter = formatter
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # num -> widget
+        self.focus = None
+
+    def __len__(self):
+        return self.packet_filter.matched_count()
+
+    def __getitem__(self, position):
+        if position is None or not self.packet_filter.is_matched(position):
+            raise IndexError(position)
+        widget = self._cache.get(position)
+        if widget is not None:
+            self._cache.move_to_end(position)
+            return widget
+
+        capture = self.packet_capture
+        with capture.lock:
+            view = capture.packets.view_for_num(position)
+            if view is not None:
+                widget = self.formatter(view)
+        if view is None:
+            # пакет старше буфера — страница из спула
+            view = capture.spool_view(position)
+            if view is None:
+                raise IndexError(position)
+            widget = self.formatter(view)
+
+        self._cache[position] = widget
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return widget
+
+    def next_position(self, position):
+        nxt = self.packet_filter.next_matched(position)
+        if nxt is None:
+            raise IndexError(position)
+        return nxt
+
+    def prev_position(self, position):
+        pf = self.packet_filter
+        prev = pf.prev_matched(position)
+        if prev is None and pf.page_back(self.packet_capture):
+            # дошли до начала — подгружаем более старые совпадения из спула
+            prev = pf.prev_matched(position)
+        if prev is None:
+            raise IndexError(position)
+        return prev
+
+    def positions(self, reverse=False):
+        nums = self.packet_filter.history_nums() + self.packet_filter.matched_nums()
+        return reversed(nums) if reverse else iter(nums)
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def refresh(self):
+        """Сообщить ListBox, что набор строк изменился."""
+        self._modified()
+
+    def invalidate(self):
+        """Сбросить LRU отформатированных строк (смена фильтра, wide-режима и т.п.)."""
+        self._cache.clear()
+        self._modified()
+
+    def clear(self):
+        """Очистить список."""
+        self._cache.clear()
+        self.focus = None
+        self._modified()
+
+
 class PacketListBox(urwid.WidgetWrap):
     """Виджет для отображения списка пакетов"""
     
@@ -4842,8 +9604,13 @@ class PacketListBox(urwid.WidgetWrap):
         self.auto_scroll = True
         self.wide_info = False  # False=short, True=long
 
+        # Состояние инкрементального обновления (см. update_packets)
+        self._match_epoch = None
+        self._last_num = 0
+        self._first_num = 0
+
         self.header = self._create_header()
-        self.packet_list = urwid.SimpleFocusListWalker([])
+        self.packet_list = PacketListWalker(packet_capture, packet_filter, self._format_packet_line)
         self.listbox = urwid.ListBox(self.packet_list)
         
         self.frame = urwid.Frame(
@@ -4920,64 +9687,80 @@ class PacketListBox(urwid.WidgetWrap):
         return self.auto_scroll
 
     def update_packets(self, force_rebuild=False):
-        """Обновить список пакетов"""
-        all_packets = self.packet_capture.get_packets()
-        filtered_packets = self.packet_filter.filter_packets(all_packets)
-
-        current_count = len(self.packet_list)
-        new_count = len(filtered_packets)
-
-        # запомним фокус
-        try:
-            focus_pos = self.listbox.get_focus()[1]
-            if focus_pos is None:
-                focus_pos = 0
-        except Exception:
-            focus_pos = 0
+        """Обновить список пакетов.
 
-        # При force_rebuild — пересобираем все строки
-        if force_rebuild:
-            self.packet_list.clear()
-            for pkt in filtered_packets:
-                self.packet_list.append(self._format_packet_line(pkt))
-
-            if len(self.packet_list) > 0:
-                if self.auto_scroll:
-                    self.listbox.set_focus(len(self.packet_list) - 1)
-                else:
-                    self.listbox.set_focus(min(focus_pos, len(self.packet_list) - 1))
+        Фильтр досчитывается только по новым пакетам (PacketFilter.sync), а строки
+        форматируются лениво в PacketListWalker — здесь только переставляется фокус.
+        LRU строк сбрасывается при смене фильтров, очистке буфера или force_rebuild.
+        """
+        pf = self.packet_filter
+        pf.sync(self.packet_capture)
+        walker = self.packet_list
+
+        changed = False
+        if force_rebuild or self._match_epoch != pf.match_epoch:
+            self._match_epoch = pf.match_epoch
+            walker.invalidate()
+            changed = True
+
+        first_num = pf.first_matched_num()
+        last_num = pf.last_matched_num()
+        if (first_num, last_num) != (self._first_num, self._last_num):
+            self._first_num, self._last_num = first_num, last_num
+            changed = True
+
+        if not last_num:
+            if walker.focus is not None:
+                walker.clear()
             return
 
-        # Старое поведение (инкрементально)
-        if new_count < current_count:
-            self.packet_list.clear()
-            for pkt in filtered_packets:
-                self.packet_list.append(self._format_packet_line(pkt))
-
-            if len(self.packet_list) > 0:
-                if self.auto_scroll:
-                    self.listbox.set_focus(len(self.packet_list) - 1)
-                else:
-                    self.listbox.set_focus(min(focus_pos, len(self.packet_list) - 1))
-
-        elif new_count > current_count:
-            for pkt in filtered_packets[current_count:]:
-                self.packet_list.append(self._format_packet_line(pkt))
+        focus = walker.focus
+        if self.auto_scroll or focus is None:
+            target = last_num
+        elif not pf.is_matched(focus):
+            # пакет в фокусе вытеснен или отфильтрован — ближайший следующий
+            target = pf.next_matched(focus) or last_num
+        else:
+            target = focus
+
+        if target != focus:
+            self._set_focus_num(target)
+        elif changed:
+            walker.refresh()
+
+    def _set_focus_num(self, num):
+        walker = self.packet_list
+        if walker.focus is not None and self.packet_filter.is_matched(walker.focus):
+            # ListBox постарается сохранить позицию строки на экране
+            self.listbox.set_focus(num)
+        else:
+            # старого фокуса больше нет — ListBox не может опереться на него
+            walker.set_focus(num)
 
-            if len(self.packet_list) > 0 and self.auto_scroll:
-                self.listbox.set_focus(len(self.packet_list) - 1)
+    def focus_packet(self, num):
+        """Поставить фокус на пакет num, если он в отображаемом наборе."""
+        if self.packet_filter.is_matched(num):
+            self._set_focus_num(num)
+            return True
+        return False
 
     def get_selected_packet(self):
         """Получить выбранный пакет"""
         if len(self.packet_list) > 0:
             focus_widget, _ = self.listbox.get_focus()
-            if hasattr(focus_widget, 'packet_data'):
-                return focus_widget.packet_data
+            if focus_widget is not None and hasattr(focus_widget, 'packet_data'):
+                pkt = focus_widget.packet_data
+                # пакет мог быть уже вытеснен из кольцевого буфера
+                if isinstance(pkt, PacketView) and not pkt.alive:
+                    return None
+                return pkt
         return None
     
     def clear(self):
         """Очистить список"""
         self.packet_list.clear()
+        self._match_epoch = None
+        self._first_num = self._last_num = 0
 
 
 class FlowListBox(urwid.WidgetWrap):
@@ -5023,7 +9806,7 @@ class FlowListBox(urwid.WidgetWrap):
             f"{'Proto':<6} "
             f"{'Endpoint A':<28} {'Endpoint B':<28} "
             f"{'Pkts':>6} {'A->B':>10} {'B->A':>10} {'Total':>10} "
-            f"{'First':<12} {'Last':<12} {'State':<5} {'TCP':<12}"
+            f"{'First':<12} {'Last':<12} {'State':<5} {'TCP':<12} {'SNI':<32}"
         )
 
         return urwid.AttrMap(urwid.Text(header_text, wrap='clip'), 'header')
@@ -5068,10 +9851,7 @@ class FlowListBox(urwid.WidgetWrap):
         """
         Bidirectional canonical key: (proto, ep_low, ep_high)
         """
-        a = (str(src_ip), int(src_port))
-        b = (str(dst_ip), int(dst_port))
-        ep1, ep2 = (a, b) if a <= b else (b, a)
-        return (proto, ep1[0], ep1[1], ep2[0], ep2[1])
+        return FlowTable.flow_key(proto, src_ip, src_port, dst_ip, dst_port)
 
     @staticmethod
     def _tcp_flag_counters_from_info(info: str):
@@ -5091,9 +9871,17 @@ class FlowListBox(urwid.WidgetWrap):
         return self._canon_flow_key(flow["proto"], flow["a_ip"], flow["a_port"], flow["b_ip"], flow["b_port"])
 
     def packets_for_flow_key(self, packets, flow_key):
-        # packets: список пакетов, из которого выбираем
+        # packets: список пакетов, из которого выбираем;
+        # None — взять пакеты потока из индекса PacketCapture.flows (с учётом источника ALL/filtered)
         if not flow_key:
             return []
+        if packets is None:
+            pkts = self.packet_capture.get_flow_packets(flow_key)
+            predicate = None if self.use_all_packets else self.packet_filter.get_predicate()
+            if predicate is None:
+                return pkts
+            return [p for p in pkts if predicate(p)]
+
         proto, a_ip, a_port, b_ip, b_port = flow_key
         out = []
         for p in packets:
@@ -5265,6 +10053,12 @@ class FlowListBox(urwid.WidgetWrap):
         self.flow_list.clear()
         focus_index = None
 
+        # атрибуты потоков (SNI) — одним снимком на отрисовку, а не lock на каждую строку
+        flow_attrs = {}
+        if self.packet_capture is not None:
+            flow_attrs = self.packet_capture.get_flows_attrs(
+                [(f["proto"], f["a_ip"], f["a_port"], f["b_ip"], f["b_port"]) for f in flows if f["proto"] == "TCP"])
+
         for idx, f in enumerate(flows):
             a = self._truncate(self._canon_endpoint(f["a_ip"], f["a_port"]), 28)
             b = self._truncate(self._canon_endpoint(f["b_ip"], f["b_port"]), 28)
@@ -5286,11 +10080,17 @@ class FlowListBox(urwid.WidgetWrap):
                     state = "SYN"
                 else:
                     state = "-"
+
+            # SNI — атрибут потока из разбора TLS при захвате (FlowTable.attrs)
+            sni = ""
+            if f["proto"] == "TCP":
+                attrs = flow_attrs.get((f["proto"], f["a_ip"], f["a_port"], f["b_ip"], f["b_port"]), {})
+                sni = self._truncate(attrs.get("sni", ""), 32)
             line = (
                 f"{f['proto']:<6} "
                 f"{a:<28} {b:<28} "
                 f"{f.get('pkts', 0):>6} {f.get('bytes_ab', 0):>10} {f.get('bytes_ba', 0):>10} {f.get('bytes', 0):>10} "
-                f"{first:<12} {last:<12} {state:<5} {tcp:<12}"
+                f"{first:<12} {last:<12} {state:<5} {tcp:<12} {sni:<32}"
             )
 
             # line = (
@@ -5331,8 +10131,8 @@ class FlowListBox(urwid.WidgetWrap):
         Обновить таблицу flows на основе текущего display set:
         берём packets -> применяем packet_filter -> агрегируем
         """
-        all_packets = self.packet_capture.get_packets()
-        displayed = self.packet_filter.filter_packets(all_packets)
+        self.packet_filter.sync(self.packet_capture)
+        displayed = self.packet_filter.displayed_packets(self.packet_capture)
 
         self._update_cache(displayed)
         self._render()
@@ -5422,7 +10222,8 @@ class StatusBar(urwid.WidgetWrap):
         self.help_text.set_text(help_content)
 
     def update(self, total_packets, filtered_packets, filter_summary, interface, capture_running,
-                   offline_mode=False, auto_scroll=False, bpf_filter=None):
+                   offline_mode=False, auto_scroll=False, bpf_filter=None, queue_stats=None,
+                   load_progress=None, spool_stats=None):
 
         """Обновить статус"""
         status_text = []
@@ -5432,6 +10233,26 @@ class StatusBar(urwid.WidgetWrap):
                 ('status_label', 'Mode: '),
                 ('status_value', 'OFFLINE  '),
             ])
+
+            # Прогресс фоновой загрузки файла (PcapFileLoader.progress)
+            if load_progress:
+                state = load_progress.get('state')
+                if state == 'loading':
+                    status_text.extend([
+                        ('status_label', 'Loading: '),
+                        ('status_running', f"{load_progress.get('percent', 0):.0f}% "),
+                        ('status_value', f"({load_progress.get('packets_loaded', 0)} pkts)  "),
+                    ])
+                elif state == 'error':
+                    status_text.extend([
+                        ('status_label', 'Load: '),
+                        ('status_paused', 'ERROR (see log)  '),
+                    ])
+                elif state == 'cancelled':
+                    status_text.extend([
+                        ('status_label', 'Load: '),
+                        ('status_paused', 'STOPPED  '),
+                    ])
         else:
             status_text.extend([
                 ('status_label', 'Interface: '),
@@ -5443,6 +10264,34 @@ class StatusBar(urwid.WidgetWrap):
                 status_text.append(('status_running', 'CAPTURING  '))
             else:
                 status_text.append(('status_paused', 'PAUSED  '))
+
+            # Очередь захват -> разбор: глубина/ёмкость, backlog, отброшенные
+            if queue_stats:
+                status_text.extend([
+                    ('status_label', 'Queue: '),
+                    ('status_value', f"{queue_stats.get('queue_depth', 0)}/{queue_stats.get('queue_capacity', 0)}  "),
+                    ('status_label', 'Backlog: '),
+                    ('status_value', f"{queue_stats.get('dissect_backlog', 0)}  "),
+                ])
+                dropped = queue_stats.get('queue_dropped', 0)
+                status_text.extend([
+                    ('status_label', 'Dropped: '),
+                    ('status_paused' if dropped else 'status_value', f'{dropped}  '),
+                ])
+                if 'kernel_drops' in queue_stats:
+                    kdrops = queue_stats['kernel_drops']
+                    status_text.extend([
+                        ('status_label', 'KDrop: '),
+                        ('status_paused' if kdrops else 'status_value', f'{kdrops}  '),
+                    ])
+
+            # Спул на диск: объём и число сегментов
+            if spool_stats:
+                status_text.extend([
+                    ('status_label', 'Spool: '),
+                    ('status_paused' if spool_stats.get('spool_errors') else 'status_value',
+                     f"{spool_stats.get('spool_bytes', 0) // (1024 * 1024)} MB/{spool_stats.get('spool_segments', 0)} seg  "),
+                ])
         
         status_text.extend([
             ('status_label', 'Total: '),
@@ -5478,7 +10327,8 @@ class StatusBar(urwid.WidgetWrap):
 class MainApplication:
     """Главное приложение """
     
-    def __init__(self, packet_capture, packet_filter, packet_exporter, bpf_filter=None, offline_mode=False, enable_ipv6_stats=False):
+    def __init__(self, packet_capture, packet_filter, packet_exporter, bpf_filter=None, offline_mode=False, enable_ipv6_stats=False,
+                 offline_loader=None, search_workers=0):
         """Инициализация главного приложения (TUI).
 
         Args:
@@ -5488,6 +10338,8 @@ class MainApplication:
             bpf_filter: Строка BPF для capture (str|None).
             offline_mode: True если работа из pcap (без live capture).
             enable_ipv6_stats: Включить расширенную IPv6 статистику.
+            offline_loader: PcapFileLoader фоновой загрузки файла (для прогресса), или None.
+            search_workers: число процессов для regex-поиска по payload (0 — без пула).
         """
 
         self.packet_capture = packet_capture
@@ -5495,6 +10347,9 @@ class MainApplication:
         self.packet_exporter = packet_exporter
         self.bpf_filter = bpf_filter
         self.offline_mode = offline_mode
+        self.offline_loader = offline_loader
+        self.search_workers = max(0, int(search_workers or 0))
+        self._search_executor = None
 
         self.PacketDetailView = PacketDetailView
         self.PacketExportDialog = PacketExportDialog
@@ -5524,6 +10379,7 @@ class MainApplication:
         )
         
         self.overlay = None
+        self.save_dialog = None
         self.current_view = self.main_frame
         
         self.palette = [
@@ -5702,8 +10558,8 @@ class MainApplication:
 
     def _get_displayed_packets(self):
         """Пакеты, которые сейчас отображаются (с учётом фильтра)."""
-        all_packets = self.packet_capture.get_packets()
-        return self.packet_filter.filter_packets(all_packets)
+        self.packet_filter.sync(self.packet_capture)
+        return self.packet_filter.displayed_packets(self.packet_capture)
 
     def detail_prev_packet(self, current_pkt):
         pkts = self._get_displayed_packets()
@@ -5735,12 +10591,7 @@ class MainApplication:
         """Открыть detail для конкретного пакета + синхронизировать фокус списка."""
         # 1) поставить фокус в списке пакетов (чтобы после выхода курсор был на правильной строке)
         try:
-            target_num = pkt.get("num")
-            for i, w in enumerate(self.packet_list.packet_list):
-                pd = getattr(w, "packet_data", None)
-                if pd and pd.get("num") == target_num:
-                    self.packet_list.listbox.set_focus(i)
-                    break
+            self.packet_list.focus_packet(pkt.get("num"))
         except Exception:
             pass
 
@@ -5860,15 +10711,12 @@ class MainApplication:
             self.show_message("No flow selected")
             return
 
-        # источник пакетов (см. toggle источника ниже)
-        all_packets = self.packet_capture.get_packets()
-        filtered = self.packet_filter.filter_packets(all_packets)
-
-        base_packets = all_packets if self.flow_view.use_all_packets else filtered
+        # пакеты потока — из индекса потоков (источник ALL/filtered учитывается во flow_view)
         flow_key = self.flow_view.get_selected_flow_key()
-        pkts = self.flow_view.packets_for_flow_key(base_packets, flow_key)
+        pkts = self.flow_view.packets_for_flow_key(None, flow_key)
 
-        detail = FlowDetailView(flow, pkts, on_close_callback=self.close_dialog)
+        detail = FlowDetailView(flow, pkts, on_close_callback=self.close_dialog,
+                                packet_capture=self.packet_capture)
         self.show_overlay(detail, width=80, height=25)
 
     def toggle_flows_view(self):
@@ -5983,22 +10831,58 @@ class MainApplication:
         """Выполнить поиск по payload"""
         self.close_dialog()
         
-        all_packets = self.packet_capture.get_packets()
-        results = self.packet_filter.search_payload(all_packets, search_string, case_sensitive)
-        
-        if results:
+        started = time.time()
+        try:
+            hits = self.packet_filter.search_buffer(
+                self.packet_capture, search_string, case_sensitive,
+                executor=self._get_search_executor()
+            )
+        except Exception as e:
+            self.show_message(f"Search failed: {e}")
+            return
+        elapsed_ms = (time.time() - started) * 1000
+
+        if hits:
             self.packet_filter.clear_filter()
             self.packet_filter.set_filter('payload', search_string)
-            msg = f"Found {len(results)} packets containing '{search_string}'"
+            first_num, first_offset = hits[0]
+            msg = (f"Found {len(hits)} packets containing '{search_string}' ({elapsed_ms:.0f} ms)\n\n"
+                   f"First match: packet #{first_num}, offset {first_offset}")
         else:
-            msg = f"No packets found containing '{search_string}'"
+            msg = f"No packets found containing '{search_string}' ({elapsed_ms:.0f} ms)"
         
         self.show_message(msg)
+
+    def _get_search_executor(self):
+        """Пул процессов для regex-поиска (создаётся при первом поиске), None если --search-workers 0."""
+        if self.search_workers and self._search_executor is None:
+            try:
+                self._search_executor = ProcessPoolExecutor(max_workers=self.search_workers,
+                                                            mp_context=worker_mp_context())
+            except Exception:
+                self.search_workers = 0
+        return self._search_executor
     
     def toggle_auto_scroll(self):
         """Переключить автоскролл"""
         self.packet_list.toggle_auto_scroll()
 
+    def _tls_handshake_lines(self, endpoints, c2s_raw, s2c_raw):
+        """Строки TlsHandshakeView по направлениям: разбор записей (с кэшем разбора
+        PacketCapture) плюс JA3 и сертификат из атрибутов потока."""
+        a_ip, a_port, b_ip, b_port = endpoints
+        capture = self.packet_capture
+        c2s_lines = list(capture.tls_stream_summary(a_ip, a_port, b_ip, b_port, c2s_raw))
+        s2c_lines = list(capture.tls_stream_summary(b_ip, b_port, a_ip, a_port, s2c_raw))
+        attrs = capture.get_flow_attrs(FlowTable.flow_key('TCP', a_ip, a_port, b_ip, b_port))
+        if attrs.get('ja3'):
+            c2s_lines.append(f"JA3={attrs['ja3']}")
+        if attrs.get('cert_subject'):
+            s2c_lines.append(f"Certificate subject={attrs['cert_subject']}")
+        if attrs.get('cert_san'):
+            s2c_lines.append(f"Certificate SAN={attrs['cert_san']}")
+        return c2s_lines, s2c_lines
+
     def follow_stream(self):
         """Follow stream: TCP -> показать reassembled payload, TLS -> handshake summary, UDP -> старый фильтр"""
 
@@ -6017,25 +10901,15 @@ class MainApplication:
             ip1, port1 = flow["a_ip"], int(flow["a_port"])
             ip2, port2 = flow["b_ip"], int(flow["b_port"])
 
-            base_packets = self.packet_capture.get_packets()
-
-            g = guess_tcp_client_server(base_packets, ip1, port1, ip2, port2)
-            if g:
-                a_ip, a_port, b_ip, b_port = g  # client -> server
-            else:
-                # fallback: оставляем как было (A -> B)
-                a_ip, a_port, b_ip, b_port = ip1, port1, ip2, port2
-
-            blocks_c2s, blocks_s2c = build_tcp_stream_reassembled(base_packets, a_ip, a_port, b_ip, b_port)
+            # client -> server по SYN (иначе A -> B), reassembly и raw payload по направлениям
+            # берутся из индекса потоков — без прохода по всему буферу
+            endpoints, blocks_c2s, blocks_s2c, c2s_raw, s2c_raw = \
+                self.packet_capture.follow_tcp_stream(ip1, port1, ip2, port2)
+            a_ip, a_port, b_ip, b_port = endpoints
             title = f"{a_ip}:{a_port}  <->  {b_ip}:{b_port}"
 
-            # --- raw payload по направлениям (для TLS-детекта и summary) ---
-            raw_pair = build_tcp_stream_raw_pair(base_packets, a_ip, a_port, b_ip, b_port)
-            c2s_raw, s2c_raw = raw_pair
-
             if looks_like_tls_stream(c2s_raw) or looks_like_tls_stream(s2c_raw):
-                c2s_lines = tls_summarize_stream(c2s_raw)
-                s2c_lines = tls_summarize_stream(s2c_raw)
+                c2s_lines, s2c_lines = self._tls_handshake_lines(endpoints, c2s_raw, s2c_raw)
 
                 view = TlsHandshakeView(
                     title="TLS Handshake Summary: " + title,
@@ -6086,28 +10960,18 @@ class MainApplication:
             self.show_message("Missing ports for stream")
             return
 
-        base_packets = self.packet_capture.get_packets()
-
         ip1 = selected['src_ip']
         ip2 = selected['dst_ip']
         port1 = int(selected['src_port'])
         port2 = int(selected['dst_port'])
 
-        g = guess_tcp_client_server(base_packets, ip1, port1, ip2, port2)
-        if g:
-            a_ip, a_port, b_ip, b_port = g  # client -> server
-        else:
-            a_ip, a_port, b_ip, b_port = ip1, port1, ip2, port2
-
-        blocks_c2s, blocks_s2c = build_tcp_stream_reassembled(base_packets, a_ip, a_port, b_ip, b_port)
+        endpoints, blocks_c2s, blocks_s2c, c2s_raw, s2c_raw = \
+            self.packet_capture.follow_tcp_stream(ip1, port1, ip2, port2)
+        a_ip, a_port, b_ip, b_port = endpoints
         title = f"{a_ip}:{a_port}  <->  {b_ip}:{b_port}"
 
-        raw_pair = build_tcp_stream_raw_pair(base_packets, a_ip, a_port, b_ip, b_port)
-        c2s_raw, s2c_raw = raw_pair
-
         if looks_like_tls_stream(c2s_raw) or looks_like_tls_stream(s2c_raw):
-            c2s_lines = tls_summarize_stream(c2s_raw)
-            s2c_lines = tls_summarize_stream(s2c_raw)
+            c2s_lines, s2c_lines = self._tls_handshake_lines(endpoints, c2s_raw, s2c_raw)
 
             view = TlsHandshakeView(
                 title="TLS Handshake Summary: " + title,
@@ -6230,15 +11094,32 @@ class MainApplication:
             self.packet_exporter
         )
         
+        # поток для режима "Selected flow": выбранный в Flows view или поток выбранного пакета
+        flow_key = None
+        if getattr(self, "showing_flows", False):
+            flow_key = self.flow_view.get_selected_flow_key()
+        else:
+            pkt = self.packet_list.get_selected_packet()
+            k = FlowTable._key_for(pkt) if pkt is not None else None
+            flow_key = k[0] if k else None
+
         dialog = SaveDialog(
             export_dialog,
             on_save_callback=self.on_save_complete,
-            on_cancel_callback=self.close_dialog
+            on_cancel_callback=self.on_save_cancel,
+            flow_key=flow_key
         )
-        self.show_overlay(dialog, width=60, height=20)
+        self.save_dialog = dialog
+        self.show_overlay(dialog, width=70, height=34)
     
+    def on_save_cancel(self):
+        """Отмена сохранения"""
+        self.save_dialog = None
+        self.close_dialog()
+
     def on_save_complete(self, success, filepath, message):
         """После сохранения"""
+        self.save_dialog = None
         self.close_dialog()
         msg = f"✓ {message}\nFile: {filepath}" if success else f"✗ {message}"
         self.show_message(msg)
@@ -6314,12 +11195,11 @@ class MainApplication:
             return
 
         try:
-            # 1) Берём данные один раз
-            all_packets = self.packet_capture.get_packets()
-            filtered = self.packet_filter.filter_packets(all_packets)
+            # 1) Досчитываем фильтр только по новым пакетам и берём данные один раз
+            displayed_count = self.packet_filter.sync(self.packet_capture)
 
-            # 2) Если фильтры изменились — сбрасываем кэш flows
-            filter_summary = self.packet_filter.get_filter_summary()
+            # 2) Если фильтры изменились (или совпадения пересчитаны) — сбрасываем кэш flows
+            filter_summary = (self.packet_filter.get_filter_summary(), self.packet_filter.match_epoch)
             if getattr(self, "_last_filter_summary", None) is None:
                 self._last_filter_summary = filter_summary
             elif filter_summary != self._last_filter_summary:
@@ -6329,28 +11209,38 @@ class MainApplication:
 
             # 3) Обновляем левую панель (packets или flows)
             if getattr(self, "showing_flows", False):
-                base_packets = all_packets if self.flow_view.use_all_packets else filtered
+                if self.flow_view.use_all_packets:
+                    base_packets = self.packet_capture.get_packets()
+                else:
+                    base_packets = self.packet_filter.displayed_packets(self.packet_capture)
                 self.flow_view.update_flows_from(base_packets)
             else:
                 self.packet_list.update_packets()
 
-            # 4) Stats панель — по filtered
-            self.stats_panel.update(filtered, self.packet_filter, self.packet_capture)
+            # 4) Stats панель — по отображаемому набору (накопители PacketFilter.stats)
+            self.stats_panel.update(self.packet_filter.stats, self.packet_filter, self.packet_capture)
 
             # 5) Status bar
-            total = len(all_packets)
+            total = len(self.packet_capture.packets)
             self.status_bar.update(
                 total,
-                len(filtered),
+                displayed_count,
                 filter_summary,
                 self.packet_capture.interface,
                 self.packet_capture.running,
                 self.offline_mode,
                 self.packet_list.auto_scroll,
-                self.packet_capture.bpf_filter
+                self.packet_capture.bpf_filter,
+                None if self.offline_mode else self.packet_capture.get_queue_stats(),
+                self.offline_loader.progress() if self.offline_loader else None,
+                None if self.offline_mode else self.packet_capture.get_spool_stats()
             )
 
-            # 6) Принудительно перерисовываем экран
+            # 6) Прогресс фонового экспорта (диалог сохранения)
+            if self.save_dialog is not None:
+                self.save_dialog.poll()
+
+            # 7) Принудительно перерисовываем экран
             self.loop.draw_screen()
 
         except Exception as e:
@@ -6379,6 +11269,10 @@ class MainApplication:
         try:
             self.loop.run()
         finally:
+            if self.save_dialog is not None and self.save_dialog.job is not None:
+                self.save_dialog.job.cancel()
+            if self._search_executor is not None:
+                self._search_executor.shutdown(wait=False, cancel_futures=True)
             self.reset_terminal()
     
     def stop(self):
@@ -6402,11 +11296,268 @@ def parse_arguments():
                        help='BPF filter (tcpdump syntax)')
     parser.add_argument('--ipv6', action='store_true',
                        help='Enable IPv6 statistics collection')
+    parser.add_argument('--limit', metavar='<N>', type=int, default=None,
+                       help='Ring buffer size in packets (default: 50000, 5000 with --headless)')
+    parser.add_argument('--arena-mb', metavar='<MB>', type=int, default=None,
+                       help='Raw frame arena size in MB (default: 1 KB per buffer slot, min 16 MB)')
+    parser.add_argument('--dissectors', metavar='<N>', type=int, default=1,
+                       help='Number of packet dissector threads (default: 1)')
+    parser.add_argument('--queue-size', metavar='<N>', type=int, default=20000,
+                       help='Capacity of the capture -> dissector queue in packets (default: 20000)')
+    parser.add_argument('--spool-dir', metavar='<dir>', default=None,
+                       help='Live mode: also write packets to rotating pcapng segments in <dir>')
+    parser.add_argument('--spool-segment-mb', metavar='<MB>', type=int, default=64,
+                       help='Spool segment size in MB (default: 64)')
+    parser.add_argument('--spool-segments', metavar='<N>', type=int, default=16,
+                       help='Number of spool segments to keep; older ones are deleted (default: 16)')
+    parser.add_argument('--flow-state-max', metavar='<N>', type=int, default=131072,
+                       help='Max entries in per-flow state tables (TLS ClientHello buffering, TCP loss tracking); '
+                            'least recently used flows are evicted (default: 131072)')
+    parser.add_argument('--decode-workers', metavar='<N>', type=int, default=None,
+                       help='Offline mode: number of decoder processes (default: CPU count - 1, max 4; 0 = no processes)')
+    parser.add_argument('--packet-range', metavar='<A-B>', default=None,
+                       help='Offline mode: load only packets A..B of the file (1-based, "A-" / "-B" allowed)')
+    parser.add_argument('--time-window', metavar='<A-B>', default=None,
+                       help='Offline mode: load only packets A..B seconds after the first one ("A-" / "-B" allowed)')
+    parser.add_argument('--headless', action='store_true',
+                       help='Run without the UI: capture, aggregate and serve metrics until Ctrl+C (or until the -r file is loaded)')
+    parser.add_argument('--metrics-listen', metavar='<host:port>', default='127.0.0.1:9108',
+                       help='Headless mode: OpenMetrics endpoint address, served at /metrics; "off" disables it (default: 127.0.0.1:9108)')
+    parser.add_argument('--metrics-windows', metavar='<list>', default='10,60,300',
+                       help='Headless mode: sliding windows in seconds, comma-separated (default: 10,60,300)')
+    parser.add_argument('--flow-log', metavar='<file>', default=None,
+                       help='Headless mode: append flow records (JSON lines) to <file>')
+    parser.add_argument('--flow-interval', metavar='<sec>', type=int, default=60,
+                       help='Headless mode: emit a record for long-lived flows every <sec> seconds (default: 60)')
+    parser.add_argument('--flow-idle', metavar='<sec>', type=int, default=15,
+                       help='Headless mode: a flow ends after <sec> seconds without packets (default: 15)')
+    parser.add_argument('--search-workers', metavar='<N>', type=int, default=0,
+                       help='Number of processes for regex payload search (default: 0 = search in the UI process)')
+    parser.add_argument('--backend', choices=('scapy', 'tpacket'), default='scapy',
+                       help='Live capture backend: scapy sniff() or AF_PACKET TPACKET_V3 ring, Linux only (default: scapy)')
+    parser.add_argument('--ring-mb', metavar='<MB>', type=int, default=64,
+                       help='TPACKET_V3 ring size per interface in MB (default: 64)')
+    parser.add_argument('--benchmark', metavar='<sec>', type=int, default=None,
+                       help='Run every available capture backend for <sec> seconds without the UI and print packets per second')
+    parser.add_argument('--replay-bench', action='store_true',
+                       help='Replay synthetic traffic (or the -r file) through the dissectors, filters, flows and '
+                            'stream reassembly without a NIC and print pps, per-stage latency percentiles and peak RSS')
+    parser.add_argument('--bench-packets', metavar='<N>', type=int, default=50000,
+                       help='Replay benchmark: approximate number of synthetic packets (default: 50000)')
+    parser.add_argument('--bench-write', metavar='<file>', default=None,
+                       help='Replay benchmark: also write the synthetic traffic to <file> (pcapng; .pcap / .gz by extension)')
+    parser.add_argument('--bench-save', metavar='<file>', default=None,
+                       help='Replay benchmark: save the results as JSON (use it later as a baseline)')
+    parser.add_argument('--bench-baseline', metavar='<file>', default=None,
+                       help='Replay benchmark: compare with a saved JSON result; exit code 1 on regressions')
+    parser.add_argument('--bench-tolerance', metavar='<pct>', type=float, default=20.0,
+                       help='Replay benchmark: allowed slowdown against the baseline in percent (default: 20)')
     parser.add_argument('--version', action='version', version=f'Packet Monitor v{__version__}')
     
     return parser.parse_args()
 
 
+def run_capture_benchmark(args):
+    """Режим --benchmark: каждый доступный backend захватывает args.benchmark секунд без UI.
+
+    Captured — кадров, снятых с интерфейса (в очередь + отброшено), Dissected — записано
+    в буфер после разбора. Drops — переполнение очереди разбора и (tpacket) кольца ядра.
+    """
+    backends = ['scapy']
+    if sys.platform.startswith('linux'):
+        backends.append('tpacket')
+
+    results = []
+    for backend in backends:
+        print(f"\n  Backend {backend}: capturing for {args.benchmark} s...")
+        capture = PacketCapture(
+            interface=args.interface,
+            packet_limit=args.limit,
+            log_file='./packet_monitor.log',
+            dissector_workers=args.dissectors,
+            queue_size=args.queue_size,
+            backend=backend,
+            ring_mb=args.ring_mb,
+            flow_state_max=args.flow_state_max
+        )
+        capture.set_bpf_filter(args.filter)
+        capture.start_capture()
+        time.sleep(args.benchmark)
+        # снимок до stop_capture: очередь ещё разбирается, считаем только успевшее
+        queue_stats = capture.get_queue_stats()
+        with capture.queue_stats_lock:
+            captured = capture.queue_enqueued + capture.queue_dropped
+        dissected = capture.packet_counter
+        elapsed = max(1e-6, time.time() - capture.start_time)
+        capture.stop_capture()
+        results.append((backend, captured / elapsed, dissected / elapsed,
+                        queue_stats['queue_dropped'], queue_stats.get('kernel_drops')))
+
+    print()
+    print(f"{'Backend':<10}{'Captured pps':>14}{'Dissected pps':>15}{'Queue drops':>13}{'Kernel drops':>14}")
+    for backend, captured_pps, dissected_pps, qdrops, kdrops in results:
+        kd = 'n/a' if kdrops is None else str(kdrops)
+        print(f"{backend:<10}{captured_pps:>14.0f}{dissected_pps:>15.0f}{qdrops:>13}{kd:>14}")
+
+
+def run_replay_benchmark(args):
+    """Режим --replay-bench: синтетический трафик (или файл -r) через разбор и горячие пути UI без NIC.
+
+    Печатает пакеты в секунду, перцентили задержки по стадиям и пиковый RSS.
+    --bench-save сохраняет результат в JSON, --bench-baseline сравнивает с сохранённым
+    и завершается с кодом 1, если метрика хуже baseline больше чем на --bench-tolerance %.
+    """
+    if args.read:
+        try:
+            if not os.path.isfile(args.read):
+                raise FileNotFoundError(args.read)
+            reader = PcapFileLoader(None, args.read,
+                                    packet_range=parse_num_range(args.packet_range),
+                                    time_window=parse_num_range(args.time_window))
+            print(f"  Reading {args.read}...")
+            records = [(frame, ts, linktype, ifname) for _, frame, ts, linktype, ifname in reader._iter_records()]
+        except Exception as e:
+            print(f"\n[ERROR] Failed: {e}")
+            sys.exit(1)
+        workload = f"file:{os.path.basename(args.read)}"
+    else:
+        traffic = SyntheticTraffic(packets=args.bench_packets)
+        print(f"  Generating ~{traffic.packets} synthetic packets "
+              f"(small flows, {traffic.elephants} elephant flows, TLS handshakes, DNS bursts)...")
+        records = traffic.records()
+        workload = f"synthetic:{traffic.packets}:seed={traffic.seed}"
+        if args.bench_write:
+            try:
+                SyntheticTraffic.write(args.bench_write, records)
+                print(f"  ✓ Workload written to {args.bench_write}")
+            except OSError as e:
+                print(f"\n[ERROR] {args.bench_write}: {e}")
+                sys.exit(1)
+
+    if not records:
+        print("\n[ERROR] No packets to replay")
+        sys.exit(1)
+
+    bench = ReplayBenchmark(records, workload=workload, flow_state_max=args.flow_state_max)
+    results = bench.run()
+
+    print()
+    print(f"Workload: {results['workload']}, {results['packets']} packets")
+    print("Throughput: " + ", ".join(f"{k} {v:,.0f} pps" for k, v in results['throughput_pps'].items()))
+    print()
+    print(f"{'Stage':<28}{'Calls':>8}{'p50 us':>11}{'p90 us':>11}{'p99 us':>11}{'max us':>12}")
+    for stage, st in results['stages'].items():
+        if st.get('count'):
+            print(f"{stage:<28}{st['count']:>8}{st['p50_us']:>11.1f}{st['p90_us']:>11.1f}"
+                  f"{st['p99_us']:>11.1f}{st['max_us']:>12.1f}")
+    rss = results['peak_rss_mb']
+    print(f"\nPeak RSS: {'n/a' if rss is None else f'{rss:.1f} MB'}, packet buffer {results['buffer_mb']:.1f} MB")
+
+    regressions = 0
+    if args.bench_baseline:
+        try:
+            with open(args.bench_baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"\n[ERROR] Baseline {args.bench_baseline}: {e}")
+            sys.exit(1)
+        tolerance = args.bench_tolerance / 100.0
+        print(f"\nBaseline: {args.bench_baseline} ({baseline.get('workload')}, v{baseline.get('version')}, "
+              f"{baseline.get('created')}), tolerance {args.bench_tolerance:g}%")
+        if baseline.get('workload') != results['workload']:
+            print("  Warning: the baseline was recorded with a different workload")
+        print(f"{'Metric':<40}{'Baseline':>12}{'Current':>12}{'Change':>9}")
+        for name, base, cur, delta, regressed in ReplayBenchmark.compare(baseline, results, tolerance):
+            regressions += regressed
+            print(f"{name:<40}{base:>12.1f}{cur:>12.1f}{delta:>+8.1f}%{'  REGRESSION' if regressed else ''}")
+        print(f"\n{regressions} regression(s)" if regressions else "\nNo regressions")
+
+    if args.bench_save:
+        try:
+            with open(args.bench_save, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            print(f"  ✓ Results saved to {args.bench_save}")
+        except OSError as e:
+            print(f"\n[ERROR] {args.bench_save}: {e}")
+            sys.exit(1)
+
+    if regressions:
+        sys.exit(1)
+
+
+def run_headless(args, capture, loader=None):
+    """Режим --headless: захват (или загрузка -r) и агрегаты без UI.
+
+    Метрики отдаются по HTTP (OpenMetrics, /metrics), завершённые потоки пишутся
+    в --flow-log. Live-режим работает до SIGINT/SIGTERM, offline — до конца файла.
+    """
+    try:
+        windows = [int(w) for w in args.metrics_windows.split(',') if w.strip()]
+        monitor = HeadlessMonitor(
+            capture,
+            windows=windows,
+            flow_log=args.flow_log,
+            flow_interval=args.flow_interval,
+            flow_idle=args.flow_idle,
+            live=loader is None
+        )
+    except (ValueError, OSError) as e:
+        print(f"\n[ERROR] Headless: {e}")
+        sys.exit(1)
+
+    server = None
+    if args.metrics_listen and args.metrics_listen.lower() != 'off':
+        try:
+            host, port = parse_listen_address(args.metrics_listen)
+            server = monitor.serve(host, port)
+        except (ValueError, OSError) as e:
+            print(f"\n[ERROR] Metrics endpoint {args.metrics_listen}: {e}")
+            monitor.close()
+            sys.exit(1)
+        print(f"  ✓ Metrics: http://{host}:{port}/metrics (windows {', '.join(f'{w}s' for w in monitor.windows)})")
+    if args.flow_log:
+        print(f"  ✓ Flow records: {args.flow_log} (active {monitor.flow_interval}s, idle {monitor.flow_idle}s)")
+
+    stop = threading.Event()
+
+    def on_signal(sig, frame):
+        stop.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    if loader is not None:
+        loader.start()
+    else:
+        capture.set_bpf_filter(args.filter)
+        capture.start_capture()
+    print("\nRunning headless (Ctrl+C to stop)...")
+
+    try:
+        while not stop.wait(1.0):
+            monitor.tick()
+            if loader is not None and loader.finished:
+                break
+    finally:
+        if loader is not None:
+            loader.stop()
+        else:
+            capture.stop_capture()
+            if capture.spool is not None:
+                capture.spool.close()
+        monitor.close()
+        if server is not None:
+            server.shutdown()
+
+        stats = capture.get_statistics()
+        print(f"Packets: {stats['total_packets']}, traffic: {stats['total_bytes']:,} bytes, "
+              f"flow records: {monitor.flow_records_total}")
+        if loader is None:
+            print(f"Dropped (dissector queue full): {stats['queue_dropped']}")
+            if 'kernel_drops' in stats:
+                print(f"Dropped (kernel ring): {stats['kernel_drops']}")
+
+
 def main():
     """Main"""
     args = parse_arguments()
@@ -6431,24 +11582,57 @@ def main():
     print("\nInitializing...")
     
     offline_mode = args.read is not None
+    arena_bytes = args.arena_mb * 1024 * 1024 if args.arena_mb else None
+    if args.limit is None:
+        args.limit = 5000 if args.headless else 50000
+
+    if args.backend == 'tpacket' and not sys.platform.startswith('linux'):
+        print("\n[ERROR] --backend tpacket requires Linux (AF_PACKET)")
+        sys.exit(1)
+
+    if args.replay_bench:
+        run_replay_benchmark(args)
+        return
+
+    if args.benchmark:
+        if offline_mode:
+            print("\n[ERROR] --benchmark measures live capture and cannot be combined with -r")
+            sys.exit(1)
+        run_capture_benchmark(args)
+        return
     
+    loader = None
     if offline_mode:
         print(f"  Reading {args.read}...")
-        capture = PacketCapture(interface='offline', log_file='./packet_monitor.log')
+        capture = PacketCapture(
+            interface='offline',
+            packet_limit=args.limit,
+            log_file='./packet_monitor.log',
+            arena_bytes=arena_bytes,
+            flow_state_max=args.flow_state_max
+        )
         capture.running = False
+
+        decode_workers = args.decode_workers
+        if decode_workers is None:
+            decode_workers = max(1, min(4, (os.cpu_count() or 1) - 1))
         
         try:
-            packets = rdpcap(args.read)
-            print(f"  Loaded {len(packets)} packets")
-            
-            for i, pkt in enumerate(packets, 1):
-                packet_info = capture._parse_packet(pkt)
-                packet_info['num'] = i
-                if hasattr(pkt, 'sniffed_on'):
-                    packet_info['interface'] = str(pkt.sniffed_on)
-                capture.packets.append(packet_info)
-            
-            print(f"  ✓ Ready")
+            packet_range = parse_num_range(args.packet_range)
+            time_window = parse_num_range(args.time_window)
+            if not os.path.isfile(args.read):
+                raise FileNotFoundError(args.read)
+
+            loader = PcapFileLoader(
+                capture, args.read,
+                decode_workers=decode_workers,
+                packet_range=packet_range,
+                time_window=time_window
+            )
+            # в headless-режиме загрузка стартует после подключения агрегатов (run_headless)
+            if not args.headless:
+                loader.start()
+            print(f"  ✓ Loading in background: {decode_workers} decoder process(es), buffer limit {args.limit} packets")
         except Exception as e:
             print(f"\n[ERROR] Failed: {e}")
             sys.exit(1)
@@ -6457,18 +11641,47 @@ def main():
             interface = 'any'
         else:
             interface = args.interface
+
+        spool = None
+        if args.spool_dir:
+            try:
+                spool = CaptureSpool(
+                    args.spool_dir,
+                    segment_bytes=args.spool_segment_mb * 1024 * 1024,
+                    max_segments=args.spool_segments
+                )
+            except Exception as e:
+                print(f"\n[ERROR] Spool: {e}")
+                sys.exit(1)
         
         capture = PacketCapture(
             interface=interface,
-            packet_limit=50000,
-            log_file='./packet_monitor.log'
+            packet_limit=args.limit,
+            log_file='./packet_monitor.log',
+            arena_bytes=arena_bytes,
+            dissector_workers=args.dissectors,
+            queue_size=args.queue_size,
+            spool=spool,
+            backend=args.backend,
+            ring_mb=args.ring_mb,
+            flow_state_max=args.flow_state_max
         )
         
         print(f"  ✓ Interface: {capture.interface}")
         print(f"  ✓ Monitoring: {capture.interfaces}")
-        print(f"  ✓ Buffer limit: 50000")
-        print("  ✓ Starting PAUSED (press P to start)")
+        print(f"  ✓ Buffer limit: {args.limit} packets, arena {capture.packets.arena_bytes // (1024 * 1024)} MB")
+        print(f"  ✓ Dissectors: {capture.dissector_workers}, queue {capture.queue_size} packets")
+        if capture.backend == 'tpacket':
+            print(f"  ✓ Backend: AF_PACKET TPACKET_V3 ring, {capture.ring_mb} MB per interface")
+        if spool is not None:
+            print(f"  ✓ Spool: {spool.directory} ({spool.max_segments} x {spool.segment_bytes // (1024 * 1024)} MB segments)")
+        if not args.headless:
+            print("  ✓ Starting PAUSED (press P to start)")
     
+    if args.headless:
+        run_headless(args, capture, loader)
+        return
+
     pfilter = PacketFilter()
     exporter = PacketExporter()
     
@@ -6482,7 +11695,9 @@ def main():
         capture, pfilter, exporter,
         bpf_filter=args.filter,
         offline_mode=offline_mode,
-        enable_ipv6_stats=args.ipv6
+        enable_ipv6_stats=args.ipv6,
+        offline_loader=loader,
+        search_workers=args.search_workers
     )
     
     def signal_handler(sig, frame):
@@ -6501,11 +11716,19 @@ def main():
         print("\n\nShutdown...")
         if not offline_mode:
             capture.stop_capture()
+            if capture.spool is not None:
+                capture.spool.close()
+        if loader is not None:
+            loader.stop()
         
         stats = capture.get_statistics()
         print(f"Packets captured: {stats['total_packets']}")
         print(f"Traffic: {stats['total_bytes']:,} bytes")
         print(f"Bandwidth: {stats['bandwidth_mbps']:.2f} Mbps")
+        if not offline_mode:
+            print(f"Dropped (dissector queue full): {stats['queue_dropped']}")
+            if 'kernel_drops' in stats:
+                print(f"Dropped (kernel ring): {stats['kernel_drops']}")
         
         all_pkts = capture.get_packets()
         print(f"Packets in buffer: {len(all_pkts)}")